@@ -2,17 +2,30 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
-SECRET_KEY = os.getenv("API_JWT_SECRET", "change-me")
+SEGREDO_PADRAO = "change-me"
+SECRET_KEY = os.getenv("API_JWT_SECRET", SEGREDO_PADRAO)
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("API_JWT_EXPIRE_MINUTES", "720"))
+# Token do painel ao vivo (/queues/stream): vai na URL (?token=), entao vale
+# poucos minutos e so para o stream; get_current_user recusa tokens com escopo
+ESCOPO_STREAM = "queues:stream"
+STREAM_TOKEN_EXPIRE_MINUTES = int(os.getenv("API_STREAM_TOKEN_MINUTES", "5"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
+def exigir_segredo(segredo: Optional[str] = None) -> str:
+    """O segredo de assinatura; RuntimeError se nao configurado ou ainda o padrao."""
+    segredo = SECRET_KEY if segredo is None else segredo
+    if not segredo or segredo == SEGREDO_PADRAO:
+        raise RuntimeError("API_JWT_SECRET nao configurado (ou ainda o valor padrao)")
+    return segredo
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -20,7 +33,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+def create_stream_token(user_id: int, role: Optional[str], segredo: Optional[str] = None) -> str:
+    """Token curto so para /queues/stream. `segredo`: o da configuracao de quem assina (Streamlit)."""
+    expire = datetime.utcnow() + timedelta(minutes=STREAM_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode(
+        {"sub": str(user_id), "role": role, "scope": ESCOPO_STREAM, "exp": expire},
+        exigir_segredo(segredo),
+        algorithm=ALGORITHM,
+    )
+
+
+def _decodificar_token(token: str, escopo: Optional[str] = None) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Token invalido",
@@ -30,8 +53,18 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         user_role = payload.get("role")
-        if user_id is None:
+        if user_id is None or payload.get("scope") != escopo:
             raise credentials_exception
         return {"user_id": int(user_id), "role": user_role}
     except JWTError as exc:
         raise credentials_exception from exc
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    return _decodificar_token(token)
+
+
+async def get_current_user_query(token: str = Query(...)) -> dict:
+    # EventSource (SSE) no navegador nao envia cabecalho Authorization; so
+    # aceita o token curto de create_stream_token, nunca o de login
+    return _decodificar_token(token, ESCOPO_STREAM)
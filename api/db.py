@@ -1,10 +1,18 @@
 import os
-from psycopg2 import pool
+import time
+
 from dotenv import load_dotenv
+from psycopg import AsyncClientCursor, pq
+from psycopg_pool import AsyncConnectionPool
+
+from api import settings
+from api.statements import preparar_todos
+from db_pool import RastreadorCheckout, identificar_call_site
 
 load_dotenv()
 
-_db_pool = None
+_db_pool: AsyncConnectionPool | None = None
+rastreador = RastreadorCheckout(settings.DB_POOL_LEAK_THRESHOLD)
 
 
 def get_db_url() -> str:
@@ -14,17 +22,64 @@ def get_db_url() -> str:
     return db_url
 
 
-def get_pool() -> pool.SimpleConnectionPool:
+async def open_pool() -> AsyncConnectionPool:
     global _db_pool
     if _db_pool is None:
-        _db_pool = pool.SimpleConnectionPool(1, 10, dsn=get_db_url())
+        _db_pool = AsyncConnectionPool(
+            get_db_url(),
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            timeout=settings.DB_POOL_TIMEOUT,
+            max_idle=settings.DB_POOL_MAX_IDLE,
+            max_waiting=settings.DB_POOL_MAX_WAITING,
+            # Bind no cliente (como o psycopg2) para que EXECUTE receba os parametros
+            kwargs={"cursor_factory": AsyncClientCursor},
+            configure=preparar_todos,
+            open=False,
+        )
+        await _db_pool.open()
     return _db_pool
 
 
-def get_connection():
-    return get_pool().getconn()
+async def close_pool() -> None:
+    global _db_pool
+    if _db_pool is not None:
+        await _db_pool.close()
+        _db_pool = None
+
+
+async def get_connection():
+    # Levanta PoolTimeout se nenhuma conexao ficar livre em DB_POOL_TIMEOUT
+    # e TooManyRequests se a fila de espera ja tiver DB_POOL_MAX_WAITING requisicoes
+    call_site = identificar_call_site()
+    pool = await open_pool()
+    inicio = time.monotonic()
+    conn = await pool.getconn()
+    rastreador.registrar_checkout(conn, call_site, time.monotonic() - inicio)
+    return conn
+
+
+async def release_connection(conn) -> None:
+    if not conn:
+        return
+    rastreador.registrar_devolucao(conn)
+    # Endpoints de leitura nao fazem commit; encerra a transacao antes de devolver ao pool
+    if conn.info.transaction_status in (pq.TransactionStatus.INTRANS, pq.TransactionStatus.INERROR):
+        await conn.rollback()
+    await (await open_pool()).putconn(conn)
 
 
-def release_connection(conn) -> None:
-    if conn:
-        get_pool().putconn(conn)
+def get_pool_stats() -> dict:
+    stats = _db_pool.get_stats() if _db_pool is not None else {}
+    return {
+        "tamanho_min": settings.DB_POOL_MIN_SIZE,
+        "tamanho_max": settings.DB_POOL_MAX_SIZE,
+        "abertas": stats.get("pool_size", 0),
+        "livres": stats.get("pool_available", 0),
+        "em_uso": rastreador.em_uso(),
+        "esperando": stats.get("requests_waiting", 0),
+        "timeouts": stats.get("requests_errors", 0),
+        "espera_total_s": stats.get("requests_wait_ms", 0) / 1000,
+        "conexoes_retidas": rastreador.conexoes_retidas(),
+        "por_call_site": rastreador.por_call_site(),
+    }
@@ -0,0 +1,42 @@
+import hashlib
+import json
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from api.statements import executar
+
+# Validade de uma Idempotency-Key (mesmo valor da migracao 0006)
+VALIDADE_HORAS = 24
+
+
+def hash_corpo(payload) -> str:
+    bruto = json.dumps(jsonable_encoder(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+async def reservar(cursor, chave: str, usuario_id: int, rota: str, payload):
+    """
+    Registra a chave na transacao corrente. Retorna None na primeira vez (o
+    endpoint segue e chama gravar_resposta antes do commit) ou a resposta da
+    requisicao original quando e uma repeticao.
+    """
+    if len(chave) > 200:
+        raise HTTPException(status_code=400, detail="Idempotency-Key muito longa")
+    corpo = hash_corpo(payload)
+    await executar(cursor, "idempotencia_reservar", (chave, usuario_id, rota, corpo, VALIDADE_HORAS))
+    if await cursor.fetchone():
+        return None
+    await executar(cursor, "idempotencia_buscar", (chave, usuario_id))
+    row = await cursor.fetchone()
+    if row is None:
+        # Apagada entre os dois comandos (limpeza de chaves vencidas)
+        raise HTTPException(status_code=409, detail="Requisicao em conflito, tente novamente")
+    rota_original, corpo_original, resposta = row
+    if rota_original != rota or corpo_original != corpo:
+        raise HTTPException(status_code=422, detail="Idempotency-Key ja usada com outra requisicao")
+    return resposta
+
+
+async def gravar_resposta(cursor, chave: str, usuario_id: int, resposta: dict) -> None:
+    await executar(cursor, "idempotencia_gravar", (json.dumps(jsonable_encoder(resposta)), chave, usuario_id))
@@ -1,13 +1,19 @@
+import asyncio
+import base64
+import json
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 
-import pandas as pd
 import pytz
-from fastapi import Depends, FastAPI, HTTPException, Query
-from fastapi.responses import HTMLResponse
-
-from api.auth import create_access_token, get_current_user
-from api.db import get_connection, release_connection
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from psycopg_pool import PoolTimeout, TooManyRequests
+
+from api import idempotencia, settings
+from api.auth import create_access_token, exigir_segredo, get_current_user, get_current_user_query
+from api.db import close_pool, get_connection, get_pool_stats, open_pool, release_connection
+from api.patio import estado as estado_patio, formatar_evento_sse, iniciar_patio, parar_patio
 from api.schemas import (
     AllocationRequest,
     AddBoxServiceRequest,
@@ -17,74 +23,159 @@ from api.schemas import (
     LoginResponse,
     LinkCompanyRequest,
     RegisterServiceRequest,
+    RegisterServicesBulkRequest,
     RevertVisitRequest,
     UpdateClientRequest,
     UpdateServiceTypeRequest,
     UpdateVehicleRequest,
 )
+from api.statements import REGISTRO, executar
 from api.utils import formatar_placa, formatar_telefone, hash_password
+from api.versoes import etag, etag_confere, versao_atual
+from catalogo import cache as cache_catalogo
+from km_plausibilidade import cache as cache_projecoes, conferir as conferir_km
+import jobs
 
-app = FastAPI(title="Controle Patio API")
 MS_TZ = pytz.timezone("America/Campo_Grande")
+# Valores de servicos_solicitados.area (uma particao por area)
+AREAS_SERVICO = ("borracharia", "alinhamento", "manutencao")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Com o segredo padrao qualquer um assinaria tokens validos: nao sobe
+    exigir_segredo()
+    await open_pool()
+    await iniciar_patio()
+    try:
+        yield
+    finally:
+        await parar_patio()
+        await close_pool()
+
+
+app = FastAPI(title="Controle Patio API", lifespan=lifespan)
+
+
+@app.exception_handler(PoolTimeout)
+@app.exception_handler(TooManyRequests)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": "Banco ocupado, tente novamente"})
 
 
-def _recalcular_media_veiculo(conn, veiculo_id: int) -> None:
-    query = """
-    SELECT id, fim_execucao, quilometragem
-    FROM (
-        SELECT
-            id,
-            fim_execucao,
-            quilometragem,
-            ROW_NUMBER() OVER (PARTITION BY fim_execucao, quilometragem ORDER BY id) as rn
-        FROM execucao_servico
-        WHERE veiculo_id = %s AND status = 'finalizado'
-          AND quilometragem IS NOT NULL AND quilometragem > 0
-    ) as ranked
-    WHERE rn = 1
-    ORDER BY fim_execucao ASC;
+async def _nao_modificado(request: Request, response: Response, recurso: str, versao: int | None = None):
     """
+    GET condicional: poe ETag (versao do recurso) na resposta e, se o cliente
+    ja tem essa versao (If-None-Match), devolve o 304 que o endpoint deve
+    retornar sem consultar nada. Caso contrario devolve None.
+    """
+    if versao is None:
+        versao = await versao_atual(recurso)
+    cabecalhos = {"ETag": etag(recurso, versao), "Cache-Control": "no-cache"}
+    if etag_confere(request.headers.get("if-none-match"), cabecalhos["ETag"]):
+        return Response(status_code=304, headers=cabecalhos)
+    response.headers.update(cabecalhos)
+    return None
+
+
+_carga_catalogo = asyncio.Lock()
+
+
+async def _catalogo(versao: int | None = None):
+    # Cache do processo (catalogo.py): relido quando a versao 'catalogo' muda ou o TTL vence
+    if versao is None:
+        versao = await versao_atual("catalogo")
+    catalogo = cache_catalogo.valido(versao)
+    if catalogo is not None:
+        return catalogo
+    async with _carga_catalogo:
+        catalogo = cache_catalogo.valido(versao)
+        if catalogo is not None:
+            return catalogo
+        conn = await get_connection()
+        try:
+            async with conn.cursor() as cursor:
+                await executar(cursor, "catalogo_servicos")
+                linhas = await cursor.fetchall()
+        finally:
+            await release_connection(conn)
+        return cache_catalogo.atualizar(linhas, versao)
+
+
+_carga_projecoes = asyncio.Lock()
+
+
+async def _projecoes():
+    # Cache do processo (km_plausibilidade.py): relido quando a versao 'km_estado' muda,
+    # so com os estados gravados desde a ultima leitura
+    versao = await versao_atual("km_estado")
+    if cache_projecoes.valido(versao):
+        return cache_projecoes
+    async with _carga_projecoes:
+        if cache_projecoes.valido(versao):
+            return cache_projecoes
+        desde = cache_projecoes.desde()
+        if desde is not None and versao == cache_projecoes.versao:
+            cache_projecoes.renovar()
+            return cache_projecoes
+        conn = await get_connection()
+        try:
+            async with conn.cursor() as cursor:
+                await executar(cursor, "km_projecoes", (desde, desde))
+                linhas = await cursor.fetchall()
+        finally:
+            await release_connection(conn)
+        cache_projecoes.atualizar(linhas, versao, desde)
+        return cache_projecoes
+
+
+def _alertas_km(projecoes, pedidos: List[RegisterServiceRequest]) -> dict:
+    """KM de cada veiculo conferida contra a projecao em memoria; so avisa, nao impede o cadastro."""
+    agora = datetime.now(MS_TZ)
+    return {
+        pedido.veiculo_id: [
+            alerta._asdict()
+            for alerta in conferir_km(projecoes.obter(pedido.veiculo_id), pedido.quilometragem, agora)
+        ]
+        for pedido in pedidos
+    }
+
+
+async def _enfileirar_recalculo(cursor, veiculo_id: int, execucao_id: int | None = None) -> None:
+    """
+    Media de KM/dia recalculada pelo worker.py depois do commit (jobs.py). Com
+    execucao_id a finalizacao e aplicada ao estado incremental (km_media.py);
+    sem, o estado e reconstruido e pedidos repetidos viram uma tarefa so.
+    """
+    if execucao_id is not None:
+        params = jobs.parametros("recalcular_media", {"veiculo_id": veiculo_id, "execucao_id": execucao_id})
+    else:
+        params = jobs.parametros("recalcular_media", {"veiculo_id": veiculo_id}, chave=f"recalcular_media:{veiculo_id}")
+    await executar(cursor, "tarefa_enfileirar", params)
 
-    df_veiculo = pd.read_sql(query, conn, params=(veiculo_id,))
-    df_veiculo = df_veiculo.drop_duplicates(subset=["quilometragem"], keep="last")
-
-    last_valid_km = -1
-    valid_indices = []
-    for index, row in df_veiculo.iterrows():
-        if row["quilometragem"] > last_valid_km:
-            valid_indices.append(index)
-            last_valid_km = row["quilometragem"]
-
-    valid_group = df_veiculo.loc[valid_indices]
-    media_km_diaria = None
-    if len(valid_group) >= 2:
-        ultimas_3 = valid_group.iloc[-3:] if len(valid_group) >= 3 else valid_group
-        primeira_visita = ultimas_3.iloc[0]
-        ultima_visita = ultimas_3.iloc[-1]
-        delta_km = int(ultima_visita["quilometragem"]) - int(primeira_visita["quilometragem"])
-        delta_dias = (ultima_visita["fim_execucao"] - primeira_visita["fim_execucao"]).days
-        if delta_dias > 0 and delta_km >= 0:
-            media_km_diaria = float(delta_km / delta_dias)
-
-    with conn.cursor() as cursor:
-        cursor.execute(
-            "UPDATE veiculos SET media_km_diaria = %s WHERE id = %s",
-            (media_km_diaria, veiculo_id),
-        )
+
+@app.get("/health/pool")
+async def pool_health(user=Depends(get_current_user)):
+    return get_pool_stats()
+
+
+@app.get("/health/patio")
+async def patio_health(user=Depends(get_current_user)):
+    return estado_patio.status()
 
 
 @app.post("/auth/login", response_model=LoginResponse)
-def login(payload: LoginRequest):
-    conn = get_connection()
+async def login(payload: LoginRequest):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 "SELECT id, nome, password_hash, role FROM usuarios WHERE username = %s",
                 (payload.username,),
             )
-            user = cursor.fetchone()
+            user = await cursor.fetchone()
         if not user:
             raise HTTPException(status_code=401, detail="Credenciais invalidas")
         if hash_password(payload.password) != user[2]:
@@ -97,51 +188,27 @@ def login(payload: LoginRequest):
             user_role=user[3],
         )
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/catalog/services")
-def get_catalogo_servicos(user=Depends(get_current_user)):
-    conn = get_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT nome FROM servicos_borracharia ORDER BY nome")
-            borracharia = [r[0] for r in cursor.fetchall()]
-            cursor.execute("SELECT nome FROM servicos_alinhamento ORDER BY nome")
-            alinhamento = [r[0] for r in cursor.fetchall()]
-            cursor.execute("SELECT nome FROM servicos_manutencao ORDER BY nome")
-            manutencao = [r[0] for r in cursor.fetchall()]
-        return {
-            "borracharia": borracharia,
-            "alinhamento": alinhamento,
-            "manutencao": manutencao,
-        }
-    finally:
-        release_connection(conn)
+async def get_catalogo_servicos(request: Request, response: Response, user=Depends(get_current_user)):
+    versao = await versao_atual("catalogo")
+    if nao_modificado := await _nao_modificado(request, response, "catalogo", versao):
+        return nao_modificado
+    return (await _catalogo(versao)).por_area
 
 
 @app.get("/vehicles/by-plate/{placa}")
-def get_vehicle_by_plate(placa: str, user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_vehicle_by_plate(placa: str, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
         placa_fmt = formatar_placa(placa)
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT v.id, v.placa, v.empresa, v.modelo, v.ano_modelo,
-                       v.nome_motorista, v.contato_motorista, v.cliente_id,
-                       c.nome_responsavel, c.contato_responsavel
-                FROM veiculos v
-                LEFT JOIN clientes c ON v.cliente_id = c.id
-                WHERE v.placa = %s
-                """,
-                (placa_fmt,),
-            )
-            row = cursor.fetchone()
+        async with conn.cursor() as cursor:
+            await executar(cursor, "vehicle_by_plate", (placa_fmt,))
+            row = await cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Veiculo nao encontrado")
         return {
@@ -155,69 +222,138 @@ def get_vehicle_by_plate(placa: str, user=Depends(get_current_user)):
             "cliente_id": row[7],
             "nome_responsavel": row[8],
             "contato_responsavel": row[9],
+            "ultima_visita": None if row[10] is None else {
+                "execucao_id": row[10], "data": row[11], "km": row[12], "servicos": row[13],
+            },
         }
     finally:
-        release_connection(conn)
+        await release_connection(conn)
+
+
+@app.get("/vehicles/{veiculo_id}/km-check")
+async def check_vehicle_km(veiculo_id: int, km: int = Query(..., gt=0), user=Depends(get_current_user)):
+    """Conferencia da KM enquanto e digitada (mesma de /services/register), sem consulta ao banco."""
+    projecao = (await _projecoes()).obter(veiculo_id)
+    return {
+        "alertas_km": [a._asdict() for a in conferir_km(projecao, km, datetime.now(MS_TZ))],
+        "ultima_visita": None if projecao is None else {
+            "data": projecao.data, "km": projecao.km, "media_km_diaria": projecao.media,
+        },
+    }
 
 
-@app.post("/services/register")
-def register_service(payload: RegisterServiceRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def _inserir_solicitacoes(cursor, pedidos: List[RegisterServiceRequest]) -> dict:
+    """Um INSERT para todos os itens e um UPDATE para todos os veiculos; mesmo horario em todos."""
+    agora = datetime.now(MS_TZ)
+    colunas = ([], [], [], [], [], [])
+    for pedido in pedidos:
+        for item in pedido.itens:
+            area = item.area.lower()
+            if area not in AREAS_SERVICO:
+                raise HTTPException(status_code=400, detail="Area invalida")
+            valores = (area, pedido.veiculo_id, item.tipo, item.qtd, pedido.observacao or "", pedido.quilometragem)
+            for coluna, valor in zip(colunas, valores):
+                coluna.append(valor)
+
+    servico_ids = {pedido.veiculo_id: [] for pedido in pedidos}
+    if colunas[0]:
+        await executar(cursor, "register_servicos", (agora, agora, *colunas))
+        for servico_id, veiculo_id in await cursor.fetchall():
+            servico_ids[veiculo_id].append(servico_id)
+    await executar(cursor, "register_revisao", (list(servico_ids),))
+    return {veiculo_id: sorted(ids) for veiculo_id, ids in servico_ids.items()}
+
+
+async def _registrar_servicos(rota, payload, pedidos, montar_resposta, user, idempotency_key, response):
+    # Antes de pegar a conexao: uma recarga do cache usaria outra
+    alertas = _alertas_km(await _projecoes(), pedidos)
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
-    table_map = {
-        "borracharia": "servicos_solicitados_borracharia",
-        "alinhamento": "servicos_solicitados_alinhamento",
-        "manutencao": "servicos_solicitados_manutencao",
-    }
     try:
-        with conn.cursor() as cursor:
-            for item in payload.itens:
-                table_name = table_map.get(item.area.lower())
-                if not table_name:
-                    raise HTTPException(status_code=400, detail="Area invalida")
-                cursor.execute(
-                    f"""
-                    INSERT INTO {table_name}
-                        (veiculo_id, tipo, quantidade, observacao, quilometragem, status, data_solicitacao, data_atualizacao)
-                    VALUES (%s, %s, %s, %s, %s, 'pendente', %s, %s)
-                    """,
-                    (
-                        payload.veiculo_id,
-                        item.tipo,
-                        item.qtd,
-                        payload.observacao or "",
-                        payload.quilometragem,
-                        datetime.now(MS_TZ),
-                        datetime.now(MS_TZ),
-                    ),
-                )
-            cursor.execute(
-                "UPDATE veiculos SET data_revisao_proativa = NULL WHERE id = %s",
-                (payload.veiculo_id,),
-            )
-        conn.commit()
-        return {"status": "ok"}
+        async with conn.cursor() as cursor:
+            if idempotency_key:
+                anterior = await idempotencia.reservar(cursor, idempotency_key, user.get("user_id"), rota, payload)
+                if anterior is not None:
+                    await conn.rollback()
+                    response.headers["Idempotent-Replayed"] = "true"
+                    return anterior
+            resposta = montar_resposta(await _inserir_solicitacoes(cursor, pedidos), alertas)
+            if idempotency_key:
+                await idempotencia.gravar_resposta(cursor, idempotency_key, user.get("user_id"), resposta)
+        await conn.commit()
+        return resposta
     except HTTPException:
-        conn.rollback()
+        await conn.rollback()
         raise
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
+
+
+@app.post("/services/register")
+async def register_service(
+    payload: RegisterServiceRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
+    return await _registrar_servicos(
+        "/services/register",
+        payload,
+        [payload],
+        lambda servico_ids, alertas: {
+            "status": "ok",
+            "servico_ids": servico_ids[payload.veiculo_id],
+            "alertas_km": alertas[payload.veiculo_id],
+        },
+        user,
+        idempotency_key,
+        response,
+    )
+
+
+@app.post("/services/register/bulk")
+async def register_services_bulk(
+    payload: RegisterServicesBulkRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
+    """Varios veiculos numa transacao so (recepcao com fila de chegada, tablet reenviando o lote)."""
+    if not payload.veiculos:
+        raise HTTPException(status_code=400, detail="Nenhum veiculo informado")
+    veiculo_ids = [pedido.veiculo_id for pedido in payload.veiculos]
+    if len(set(veiculo_ids)) != len(veiculo_ids):
+        raise HTTPException(status_code=400, detail="Veiculo repetido no lote")
+    return await _registrar_servicos(
+        "/services/register/bulk",
+        payload,
+        payload.veiculos,
+        lambda servico_ids, alertas: {
+            "status": "ok",
+            "veiculos": [
+                {"veiculo_id": v, "servico_ids": servico_ids[v], "alertas_km": alertas[v]} for v in veiculo_ids
+            ],
+        },
+        user,
+        idempotency_key,
+        response,
+    )
 
 
 @app.get("/clients/search")
-def search_clients(term: str, user=Depends(get_current_user)):
+async def search_clients(term: str, user=Depends(get_current_user)):
     if not term or len(term) < 3:
         return []
-    conn = get_connection()
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
                 SELECT id, nome_empresa, nome_fantasia
                 FROM clientes
@@ -227,62 +363,62 @@ def search_clients(term: str, user=Depends(get_current_user)):
                 """,
                 {"termo": term},
             )
-            rows = cursor.fetchall()
+            rows = await cursor.fetchall()
         return [
             {"id": r[0], "nome_empresa": r[1], "nome_fantasia": r[2]} for r in rows
         ]
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/clients/{client_id}")
-def get_client_details(client_id: int, user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_client_details(client_id: int, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 "SELECT nome_responsavel, contato_responsavel FROM clientes WHERE id = %s",
                 (client_id,),
             )
-            row = cursor.fetchone()
+            row = await cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Cliente nao encontrado")
         return {"nome_responsavel": row[0], "contato_responsavel": row[1]}
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.post("/clients")
-def create_client(payload: CreateClientRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def create_client(payload: CreateClientRequest, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 "INSERT INTO clientes (nome_empresa, nome_fantasia) VALUES (%s, %s) RETURNING id",
                 (payload.nome_empresa, payload.nome_fantasia),
             )
-            client_id = cursor.fetchone()[0]
-        conn.commit()
+            client_id = (await cursor.fetchone())[0]
+        await conn.commit()
         return {"id": client_id}
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.put("/clients/{client_id}")
-def update_client(client_id: int, payload: UpdateClientRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def update_client(client_id: int, payload: UpdateClientRequest, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
                 UPDATE clientes
                    SET nome_responsavel = %s,
@@ -296,23 +432,23 @@ def update_client(client_id: int, payload: UpdateClientRequest, user=Depends(get
                     client_id,
                 ),
             )
-        conn.commit()
+        await conn.commit()
         return {"status": "ok"}
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.put("/vehicles/{veiculo_id}")
-def update_vehicle(veiculo_id: int, payload: UpdateVehicleRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def update_vehicle(veiculo_id: int, payload: UpdateVehicleRequest, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
                 UPDATE veiculos
                    SET modelo = %s,
@@ -330,170 +466,124 @@ def update_vehicle(veiculo_id: int, payload: UpdateVehicleRequest, user=Depends(
                     veiculo_id,
                 ),
             )
-        conn.commit()
+        await conn.commit()
         return {"status": "ok"}
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.put("/vehicles/{veiculo_id}/company")
-def update_vehicle_company(veiculo_id: int, payload: LinkCompanyRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def update_vehicle_company(veiculo_id: int, payload: LinkCompanyRequest, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 "UPDATE veiculos SET empresa = %s, cliente_id = %s WHERE id = %s",
                 (payload.empresa, payload.cliente_id, veiculo_id),
             )
-        conn.commit()
+        await conn.commit()
         return {"status": "ok"}
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/allocation/pending-vehicles")
-def get_pending_vehicles(user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_pending_vehicles(user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                WITH status_por_veiculo AS (
-                    SELECT
-                        veiculo_id,
-                        COUNT(*) FILTER (WHERE status = 'pendente') AS pendentes,
-                        COUNT(*) FILTER (WHERE status = 'em_andamento') AS em_andamento
-                    FROM (
-                        SELECT veiculo_id, status FROM servicos_solicitados_borracharia WHERE status IN ('pendente', 'em_andamento')
-                        UNION ALL
-                        SELECT veiculo_id, status FROM servicos_solicitados_alinhamento WHERE status IN ('pendente', 'em_andamento')
-                        UNION ALL
-                        SELECT veiculo_id, status FROM servicos_solicitados_manutencao WHERE status IN ('pendente', 'em_andamento')
-                    ) AS todos_servicos
-                    GROUP BY veiculo_id
-                )
-                SELECT v.id, v.placa, v.empresa
-                FROM veiculos v
-                JOIN status_por_veiculo sv ON v.id = sv.veiculo_id
-                WHERE sv.pendentes > 0 AND sv.em_andamento = 0
-                ORDER BY v.placa;
-                """
-            )
-            rows = cursor.fetchall()
+        async with conn.cursor() as cursor:
+            await executar(cursor, "pending_vehicles")
+            rows = await cursor.fetchall()
         return [{"id": r[0], "placa": r[1], "empresa": r[2]} for r in rows]
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/allocation/areas/{veiculo_id}")
-def get_pending_areas(veiculo_id: int, user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_pending_areas(veiculo_id: int, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT 'borracharia' AS area FROM servicos_solicitados_borracharia WHERE veiculo_id = %s AND status = 'pendente'
-                UNION
-                SELECT 'alinhamento' AS area FROM servicos_solicitados_alinhamento WHERE veiculo_id = %s AND status = 'pendente'
-                UNION
-                SELECT 'manutencao' AS area FROM servicos_solicitados_manutencao WHERE veiculo_id = %s AND status = 'pendente';
-                """,
-                (veiculo_id, veiculo_id, veiculo_id),
-            )
-            areas = [r[0] for r in cursor.fetchall()]
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
-                (SELECT quilometragem FROM servicos_solicitados_borracharia WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1)
-                UNION
-                (SELECT quilometragem FROM servicos_solicitados_alinhamento WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1)
-                UNION
-                (SELECT quilometragem FROM servicos_solicitados_manutencao WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1)
-                LIMIT 1;
+                SELECT DISTINCT area FROM servicos_solicitados
+                WHERE veiculo_id = %s AND status = 'pendente';
                 """,
-                (veiculo_id, veiculo_id, veiculo_id),
+                (veiculo_id,),
             )
-            km_row = cursor.fetchone()
+            areas = [r[0] for r in await cursor.fetchall()]
+            await executar(cursor, "assign_km_pendente", (veiculo_id,))
+            km_row = await cursor.fetchone()
         return {"areas": areas, "quilometragem": km_row[0] if km_row else 0}
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/allocation/funcionarios")
-def get_funcionarios(user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_funcionarios(request: Request, response: Response, user=Depends(get_current_user)):
+    if nao_modificado := await _nao_modificado(request, response, "funcionarios"):
+        return nao_modificado
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id, nome FROM funcionarios WHERE id > 0 ORDER BY nome")
-            rows = cursor.fetchall()
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT id, nome FROM funcionarios WHERE id > 0 ORDER BY nome")
+            rows = await cursor.fetchall()
         return [{"id": r[0], "nome": r[1]} for r in rows]
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/allocation/boxes")
-def get_boxes(user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_boxes(request: Request, response: Response, user=Depends(get_current_user)):
+    if nao_modificado := await _nao_modificado(request, response, "boxes"):
+        return nao_modificado
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id FROM boxes WHERE ocupado = FALSE AND id > 0 ORDER BY id")
-            rows = cursor.fetchall()
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT id FROM boxes WHERE ocupado = FALSE AND id > 0 ORDER BY id")
+            rows = await cursor.fetchall()
         return [{"id": r[0]} for r in rows]
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.post("/allocation/assign")
-def assign_service(payload: AllocationRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def assign_service(payload: AllocationRequest, user=Depends(get_current_user)):
+    if payload.area.lower() not in AREAS_SERVICO:
+        raise HTTPException(status_code=400, detail="Area invalida")
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT nome_motorista, contato_motorista FROM veiculos WHERE id = %s",
-                (payload.veiculo_id,),
-            )
-            motorista_info = cursor.fetchone()
+        async with conn.cursor() as cursor:
+            await executar(cursor, "assign_motorista", (payload.veiculo_id,))
+            motorista_info = await cursor.fetchone()
             nome_motorista_atual = motorista_info[0] if motorista_info else None
             contato_motorista_atual = motorista_info[1] if motorista_info else None
 
-            cursor.execute(
-                """
-                (SELECT quilometragem FROM servicos_solicitados_borracharia WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1)
-                UNION
-                (SELECT quilometragem FROM servicos_solicitados_alinhamento WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1)
-                UNION
-                (SELECT quilometragem FROM servicos_solicitados_manutencao WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1)
-                LIMIT 1;
-                """,
-                (payload.veiculo_id, payload.veiculo_id, payload.veiculo_id),
-            )
-            km_row = cursor.fetchone()
+            await executar(cursor, "assign_km_pendente", (payload.veiculo_id,))
+            km_row = await cursor.fetchone()
             quilometragem = km_row[0] if km_row else 0
 
-            cursor.execute(
-                """
-                INSERT INTO execucao_servico
-                    (veiculo_id, box_id, funcionario_id, quilometragem, status, inicio_execucao, usuario_alocacao_id, nome_motorista, contato_motorista)
-                VALUES (%s, %s, %s, %s, 'em_andamento', %s, %s, %s, %s)
-                RETURNING id
-                """,
+            await executar(
+                cursor,
+                "assign_execucao",
                 (
                     payload.veiculo_id,
                     payload.box_id,
@@ -505,83 +595,41 @@ def assign_service(payload: AllocationRequest, user=Depends(get_current_user)):
                     contato_motorista_atual,
                 ),
             )
-            execucao_id = cursor.fetchone()[0]
-            tabela_servico = f"servicos_solicitados_{payload.area.lower()}"
-            cursor.execute(
-                f"""
-                UPDATE {tabela_servico}
-                   SET box_id = %s, funcionario_id = %s, status = 'em_andamento', data_atualizacao = %s, execucao_id = %s
-                 WHERE veiculo_id = %s AND status = 'pendente';
-                """,
-                (payload.box_id, payload.funcionario_id, datetime.now(MS_TZ), execucao_id, payload.veiculo_id),
+            execucao_id = (await cursor.fetchone())[0]
+            await executar(
+                cursor,
+                "assign_servicos",
+                (payload.box_id, payload.funcionario_id, datetime.now(MS_TZ), execucao_id, payload.veiculo_id, payload.area.lower()),
             )
-            cursor.execute("UPDATE boxes SET ocupado = TRUE WHERE id = %s", (payload.box_id,))
-        conn.commit()
+            await executar(cursor, "assign_ocupar_box", (payload.box_id,))
+        await conn.commit()
         return {"status": "ok"}
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/queues")
-def get_queues(user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_queues(request: Request, response: Response, user=Depends(get_current_user)):
+    # Servido da memoria; so vai ao banco enquanto o estado do patio nao estiver sincronizado
+    snapshot, versao = estado_patio.queues(), estado_patio.versao_banco
+    if snapshot is None:
+        versao = None
+    if nao_modificado := await _nao_modificado(request, response, "patio", versao):
+        return nao_modificado
+    if snapshot is not None:
+        return snapshot
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                WITH servicos_em_andamento AS (
-                    SELECT
-                        execucao_id,
-                        STRING_AGG(tipo || ' (Qtd: ' || quantidade || ')', ', ') as lista_servicos
-                    FROM (
-                        SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_borracharia WHERE status = 'em_andamento'
-                        UNION ALL
-                        SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_alinhamento WHERE status = 'em_andamento'
-                        UNION ALL
-                        SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_manutencao WHERE status = 'em_andamento'
-                    ) s
-                    GROUP BY execucao_id
-                )
-                SELECT
-                    b.id as box_id,
-                    v.placa,
-                    v.empresa,
-                    f.nome as funcionario,
-                    sa.lista_servicos
-                FROM boxes b
-                JOIN execucao_servico es ON b.id = es.box_id
-                JOIN veiculos v ON es.veiculo_id = v.id
-                LEFT JOIN funcionarios f ON es.funcionario_id = f.id
-                LEFT JOIN servicos_em_andamento sa ON es.id = sa.execucao_id
-                WHERE es.status = 'em_andamento' AND b.id > 0
-                ORDER BY b.id;
-                """
-            )
-            boxes = cursor.fetchall()
-            cursor.execute(
-                """
-                SELECT
-                    v.placa,
-                    v.empresa,
-                    STRING_AGG(s.tipo || ' (Qtd: ' || s.quantidade || ')', ', ') as servicos
-                FROM (
-                    SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_borracharia WHERE status = 'pendente'
-                    UNION ALL
-                    SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_alinhamento WHERE status = 'pendente'
-                    UNION ALL
-                    SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_manutencao WHERE status = 'pendente'
-                ) s
-                JOIN veiculos v ON s.veiculo_id = v.id
-                GROUP BY v.placa, v.empresa, s.veiculo_id
-                ORDER BY MIN(s.data_solicitacao) ASC;
-                """
-            )
-            fila = cursor.fetchall()
+        async with conn.cursor() as cursor:
+            await executar(cursor, "queues_boxes")
+            boxes = await cursor.fetchall()
+            await executar(cursor, "queues_fila")
+            fila = await cursor.fetchall()
         return {
             "boxes": [
                 {
@@ -598,17 +646,62 @@ def get_queues(user=Depends(get_current_user)):
             ],
         }
     finally:
-        release_connection(conn)
+        await release_connection(conn)
+
+
+@app.get("/queues/stream")
+async def stream_queues(request: Request, user=Depends(get_current_user_query)):
+    # SSE: 'snapshot' ao conectar (e quando o cliente atrasa), depois so 'delta'
+    # quando o estado do patio muda. O token vai na query (?token=) porque o
+    # EventSource do navegador nao envia Authorization; por isso e o token
+    # curto de escopo 'queues:stream' (api/auth.py), que nao vale em outra rota.
+    if not settings.PATIO_EM_MEMORIA:
+        raise HTTPException(status_code=503, detail="Estado do patio em memoria desligado")
+    assinatura = estado_patio.assinar()
+
+    async def eventos():
+        try:
+            yield "retry: 3000\n\n"
+            if estado_patio.ultima_carga is not None:
+                yield formatar_evento_sse("snapshot", estado_patio.snapshot_painel())
+            while True:
+                try:
+                    evento, dados = await asyncio.wait_for(
+                        assinatura.get(), timeout=settings.PATIO_SSE_HEARTBEAT_S
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield formatar_evento_sse(evento, dados)
+        finally:
+            estado_patio.cancelar_assinatura(assinatura)
+
+    # O painel abre o stream de dentro de um iframe do Streamlit (outra origem):
+    # CORS so para as origens configuradas em API_APP_ORIGINS
+    cabecalhos = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Vary": "Origin"}
+    origem = (request.headers.get("origin") or "").rstrip("/")
+    if origem and origem in settings.APP_ORIGINS:
+        cabecalhos["Access-Control-Allow-Origin"] = origem
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers=cabecalhos)
 
 
 @app.get("/boxes/active")
-def get_boxes_active(user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_boxes_active(request: Request, response: Response, user=Depends(get_current_user)):
+    snapshot, versao = estado_patio.boxes_ativos(), estado_patio.versao_banco
+    if snapshot is None:
+        versao = None
+    if nao_modificado := await _nao_modificado(request, response, "patio", versao):
+        return nao_modificado
+    if snapshot is not None:
+        return snapshot
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
                 SELECT
                     b.id,
@@ -628,7 +721,7 @@ def get_boxes_active(user=Depends(get_current_user)):
                 ORDER BY b.id;
                 """
             )
-            rows = cursor.fetchall()
+            rows = await cursor.fetchall()
         return [
             {
                 "box_id": r[0],
@@ -644,49 +737,23 @@ def get_boxes_active(user=Depends(get_current_user)):
             for r in rows
         ]
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/boxes/{box_id}/details")
-def get_box_details(box_id: int, user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_box_details(box_id: int, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT es.id as execucao_id, es.veiculo_id, es.quilometragem,
-                       v.placa, v.empresa, v.modelo, v.nome_motorista, v.contato_motorista,
-                       f.nome as funcionario
-                FROM execucao_servico es
-                JOIN veiculos v ON es.veiculo_id = v.id
-                LEFT JOIN funcionarios f ON es.funcionario_id = f.id
-                WHERE es.box_id = %s AND es.status = 'em_andamento'
-                """,
-                (box_id,),
-            )
-            execucao = cursor.fetchone()
+        async with conn.cursor() as cursor:
+            await executar(cursor, "box_execucao", (box_id,))
+            execucao = await cursor.fetchone()
             if not execucao:
                 return {"execucao": None, "servicos": []}
 
-            cursor.execute(
-                """
-                                (SELECT 'borracharia' AS area, id, tipo, quantidade, observacao, observacao_execucao
-                   FROM servicos_solicitados_borracharia
-                  WHERE box_id = %s AND status = 'em_andamento')
-                UNION ALL
-                                (SELECT 'alinhamento' AS area, id, tipo, quantidade, observacao, observacao_execucao
-                   FROM servicos_solicitados_alinhamento
-                  WHERE box_id = %s AND status = 'em_andamento')
-                UNION ALL
-                                (SELECT 'manutencao' AS area, id, tipo, quantidade, observacao, observacao_execucao
-                   FROM servicos_solicitados_manutencao
-                  WHERE box_id = %s AND status = 'em_andamento')
-                """,
-                (box_id, box_id, box_id),
-            )
-            servicos = cursor.fetchall()
+            await executar(cursor, "box_servicos", (box_id,))
+            servicos = await cursor.fetchall()
 
         return {
             "execucao": {
@@ -713,49 +780,38 @@ def get_box_details(box_id: int, user=Depends(get_current_user)):
             ],
         }
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.post("/boxes/{box_id}/services")
-def add_box_service(box_id: int, payload: AddBoxServiceRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def add_box_service(box_id: int, payload: AddBoxServiceRequest, user=Depends(get_current_user)):
+    # Resolvida antes de pegar a conexao: uma recarga do catalogo usa outra do pool
+    area = (await _catalogo()).area_de(payload.tipo)
+    if not area:
+        raise HTTPException(status_code=400, detail="Tipo de servico invalido")
+
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 "SELECT id, veiculo_id, quilometragem FROM execucao_servico WHERE box_id = %s AND status = 'em_andamento'",
                 (box_id,),
             )
-            execucao = cursor.fetchone()
+            execucao = await cursor.fetchone()
             if not execucao:
                 raise HTTPException(status_code=404, detail="Execucao nao encontrada")
             execucao_id, veiculo_id, quilometragem = execucao
 
-            cursor.execute(
+            await cursor.execute(
                 """
-                SELECT 'borracharia' FROM servicos_borracharia WHERE nome = %s
-                UNION ALL
-                SELECT 'alinhamento' FROM servicos_alinhamento WHERE nome = %s
-                UNION ALL
-                SELECT 'manutencao' FROM servicos_manutencao WHERE nome = %s
-                LIMIT 1
-                """,
-                (payload.tipo, payload.tipo, payload.tipo),
-            )
-            area_row = cursor.fetchone()
-            if not area_row:
-                raise HTTPException(status_code=400, detail="Tipo de servico invalido")
-            area = area_row[0]
-            tabela = f"servicos_solicitados_{area}"
-
-            cursor.execute(
-                f"""
-                INSERT INTO {tabela}
-                    (veiculo_id, tipo, quantidade, status, box_id, execucao_id, data_solicitacao, data_atualizacao, quilometragem)
-                VALUES (%s, %s, %s, 'em_andamento', %s, %s, %s, %s, %s)
+                INSERT INTO servicos_solicitados
+                    (area, veiculo_id, tipo, quantidade, status, box_id, execucao_id, data_solicitacao, data_atualizacao, quilometragem)
+                VALUES (%s, %s, %s, %s, 'em_andamento', %s, %s, %s, %s, %s)
                 """,
                 (
+                    area,
                     veiculo_id,
                     payload.tipo,
                     payload.quantidade,
@@ -766,265 +822,310 @@ def add_box_service(box_id: int, payload: AddBoxServiceRequest, user=Depends(get
                     quilometragem,
                 ),
             )
-        conn.commit()
+        await conn.commit()
         return {"status": "ok"}
     except HTTPException:
-        conn.rollback()
+        await conn.rollback()
         raise
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.post("/boxes/{box_id}/unassign")
-def unassign_box(box_id: int, user=Depends(get_current_user)):
-    conn = get_connection()
+async def unassign_box(box_id: int, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT id, veiculo_id FROM execucao_servico WHERE box_id = %s AND status = 'em_andamento'",
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                "SELECT id FROM execucao_servico WHERE box_id = %s AND status = 'em_andamento'",
                 (box_id,),
             )
-            execucao = cursor.fetchone()
+            execucao = await cursor.fetchone()
             if not execucao:
                 raise HTTPException(status_code=404, detail="Execucao nao encontrada")
             execucao_id = execucao[0]
-            veiculo_id = execucao[1]
-
-            for tabela in [
-                "servicos_solicitados_borracharia",
-                "servicos_solicitados_alinhamento",
-                "servicos_solicitados_manutencao",
-            ]:
-                cursor.execute(
-                    f"""
-                    UPDATE {tabela}
-                       SET status = 'pendente',
-                           box_id = NULL,
-                           funcionario_id = NULL,
-                           execucao_id = NULL,
-                           data_atualizacao = %s
-                     WHERE execucao_id = %s
-                    """,
-                    (datetime.now(MS_TZ), execucao_id),
-                )
 
-            cursor.execute("DELETE FROM execucao_servico WHERE id = %s", (execucao_id,))
-            cursor.execute("UPDATE boxes SET ocupado = FALSE WHERE id = %s", (box_id,))
+            await cursor.execute(
+                """
+                UPDATE servicos_solicitados
+                   SET status = 'pendente',
+                       box_id = NULL,
+                       funcionario_id = NULL,
+                       execucao_id = NULL,
+                       data_atualizacao = %s
+                 WHERE execucao_id = %s
+                """,
+                (datetime.now(MS_TZ), execucao_id),
+            )
+
+            await cursor.execute("DELETE FROM execucao_servico WHERE id = %s", (execucao_id,))
+            await cursor.execute("UPDATE boxes SET ocupado = FALSE WHERE id = %s", (box_id,))
 
-        conn.commit()
-        _recalcular_media_veiculo(conn, veiculo_id)
-        conn.commit()
+        await conn.commit()
         return {"status": "ok"}
     except HTTPException:
-        conn.rollback()
+        await conn.rollback()
         raise
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.post("/boxes/{box_id}/finalize")
-def finalize_box(box_id: int, payload: BoxFinalizeRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def finalize_box(box_id: int, payload: BoxFinalizeRequest, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT id FROM execucao_servico WHERE box_id = %s AND status = 'em_andamento'",
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                "SELECT id, veiculo_id FROM execucao_servico WHERE box_id = %s AND status = 'em_andamento'",
                 (box_id,),
             )
-            execucao = cursor.fetchone()
+            execucao = await cursor.fetchone()
             if not execucao:
                 raise HTTPException(status_code=404, detail="Execucao nao encontrada")
-            execucao_id = execucao[0]
+            execucao_id, veiculo_id = execucao
+            agora = datetime.now(MS_TZ)
 
-            for srv in payload.servicos:
-                tabela = f"servicos_solicitados_{srv.area.lower()}"
-                cursor.execute(
-                    f"""
-                    UPDATE {tabela}
-                       SET quantidade = %s,
-                           observacao_execucao = %s,
-                           status = 'finalizado',
-                           data_atualizacao = %s
-                     WHERE id = %s
-                    """,
-                    (srv.quantidade, payload.obs_final or "", datetime.now(MS_TZ), srv.id),
+            if payload.servicos:
+                await executar(
+                    cursor,
+                    "finalize_servicos",
+                    (
+                        payload.obs_final or "",
+                        agora,
+                        [srv.id for srv in payload.servicos],
+                        [srv.area.lower() for srv in payload.servicos],
+                        [srv.quantidade for srv in payload.servicos],
+                    ),
                 )
 
-            cursor.execute(
+            await cursor.execute(
                 """
                 UPDATE execucao_servico
                    SET status = 'finalizado', fim_execucao = %s, usuario_finalizacao_id = %s
                  WHERE id = %s
                 """,
-                (datetime.now(MS_TZ), user.get("user_id"), execucao_id),
+                (agora, user.get("user_id"), execucao_id),
             )
-            cursor.execute("UPDATE boxes SET ocupado = FALSE WHERE id = %s", (box_id,))
+            await cursor.execute("UPDATE boxes SET ocupado = FALSE WHERE id = %s", (box_id,))
+            await _enfileirar_recalculo(cursor, veiculo_id, execucao_id)
 
-        conn.commit()
+        await conn.commit()
         return {"status": "ok"}
     except HTTPException:
-        conn.rollback()
+        await conn.rollback()
         raise
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
+
+
+def _linha_concluida(r) -> dict:
+    return {
+        "execucao_id": r[0],
+        "veiculo_id": r[1],
+        "quilometragem": r[2],
+        "fim_execucao": r[3].isoformat() if r[3] else None,
+        "placa": r[4],
+        "empresa": r[5],
+        "service_id": r[6],
+        "area": r[7],
+        "tipo": r[8],
+        "quantidade": r[9],
+        "funcionario": r[10],
+        "observacao": r[11],
+        "tipo_atendimento": r[12],
+    }
+
+
+def _codificar_cursor(fim_execucao: datetime, execucao_id: int) -> str:
+    bruto = json.dumps([fim_execucao.isoformat(), execucao_id]).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor: str) -> tuple:
+    try:
+        fim_execucao, execucao_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(fim_execucao), int(execucao_id)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Cursor invalido") from exc
+
+
+async def _transmitir_concluidos(conn, params: tuple, ndjson: bool):
+    """
+    Le as linhas de um cursor no servidor, COMPLETED_STREAM_LOTE por vez, e as
+    envia conforme chegam: memoria constante qualquer que seja o periodo.
+
+    A conexao so volta ao pool no finally do gerador, depois de fechado o
+    cursor (e desfeita a transacao): cliente que desconecta no meio nao deixa
+    o cursor aberto numa conexao ja devolvida.
+    """
+
+    async def corpo():
+        try:
+            # Primeiro passo dado aqui mesmo: com o gerador ja dentro do try, o
+            # finally roda ao fecha-lo (ou ao ser coletado) mesmo que a resposta
+            # nunca chegue a ser enviada
+            yield ""
+            async with conn.cursor(name="services_completed") as cursor:
+                cursor.itersize = settings.COMPLETED_STREAM_LOTE
+                await cursor.execute(REGISTRO["services_completed"], params)
+                lote, primeiro = [], True
+                if not ndjson:
+                    yield "["
+                async for r in cursor:
+                    linha = json.dumps(_linha_concluida(r), ensure_ascii=False)
+                    if ndjson:
+                        lote.append(linha + "\n")
+                    else:
+                        lote.append(linha if primeiro else "," + linha)
+                        primeiro = False
+                    if len(lote) >= settings.COMPLETED_STREAM_LOTE:
+                        yield "".join(lote)
+                        lote = []
+                if lote:
+                    yield "".join(lote)
+                if not ndjson:
+                    yield "]"
+        finally:
+            await release_connection(conn)
+
+    gerador = corpo()
+    await gerador.asend(None)
+    return StreamingResponse(gerador, media_type="application/x-ndjson" if ndjson else "application/json")
 
 
 @app.get("/services/completed")
-def get_completed(start_date: str | None = None, end_date: str | None = None, user=Depends(get_current_user)):
-    conn = get_connection()
+async def get_completed(
+    request: Request,
+    response: Response,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    user=Depends(get_current_user),
+):
+    # Tres formas de resposta, todas ordenadas por (fim_execucao, execucao_id) decrescente:
+    # - limit: pagina de ate `limit` execucoes; o cabecalho X-Next-Cursor traz o cursor
+    #   da proxima pagina (repassar em ?cursor=) e some na ultima
+    # - Accept: application/x-ndjson: uma linha JSON por servico, transmitida
+    # - padrao: a mesma lista JSON de sempre, transmitida em vez de montada na memoria
+    start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.now() - timedelta(days=30)
+    end = datetime.strptime(end_date, "%Y-%m-%d") if end_date else datetime.now()
+    end_inclusive = end + timedelta(days=1)
+    apos = _decodificar_cursor(cursor) if cursor else (end_inclusive, 0)
+    if apos[0] > end_inclusive:
+        apos = (end_inclusive, 0)
+    params = (start, *apos)
+
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
+
+    if limit is None:
+        ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+        return await _transmitir_concluidos(conn, params, ndjson)
+
     try:
-        start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.now() - timedelta(days=30)
-        end = datetime.strptime(end_date, "%Y-%m-%d") if end_date else datetime.now()
-        end_inclusive = end + timedelta(days=1)
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT
-                    es.id as execucao_id,
-                    es.veiculo_id, es.quilometragem, es.fim_execucao,
-                    v.placa, v.empresa,
-                    serv.service_id, serv.area, serv.tipo, serv.quantidade, f.nome as funcionario_nome,
-                    serv.observacao_execucao, serv.tipo_atendimento
-                FROM execucao_servico es
-                JOIN veiculos v ON es.veiculo_id = v.id
-                LEFT JOIN (
-                    SELECT id as service_id, execucao_id, 'Borracharia' as area, tipo, quantidade, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_borracharia
-                    UNION ALL
-                    SELECT id as service_id, execucao_id, 'Alinhamento' as area, tipo, quantidade, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_alinhamento
-                    UNION ALL
-                    SELECT id as service_id, execucao_id, 'Manutencao' as area, tipo, quantidade, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_manutencao
-                ) serv ON es.id = serv.execucao_id
-                LEFT JOIN funcionarios f ON serv.funcionario_id = f.id
-                WHERE es.status = 'finalizado' AND es.fim_execucao >= %s AND es.fim_execucao < %s
-                ORDER BY es.fim_execucao DESC, serv.area;
-                """,
-                (start, end_inclusive),
-            )
-            rows = cursor.fetchall()
-        return [
-            {
-                "execucao_id": r[0],
-                "veiculo_id": r[1],
-                "quilometragem": r[2],
-                "fim_execucao": r[3].isoformat() if r[3] else None,
-                "placa": r[4],
-                "empresa": r[5],
-                "service_id": r[6],
-                "area": r[7],
-                "tipo": r[8],
-                "quantidade": r[9],
-                "funcionario": r[10],
-                "observacao": r[11],
-                "tipo_atendimento": r[12],
-            }
-            for r in rows
-        ]
+        async with conn.cursor() as cur:
+            await executar(cur, "services_completed_pagina", (*params, limit))
+            rows = await cur.fetchall()
     finally:
-        release_connection(conn)
+        await release_connection(conn)
+    if len({r[0] for r in rows}) == limit:
+        response.headers["X-Next-Cursor"] = _codificar_cursor(rows[-1][3], rows[-1][0])
+    return [_linha_concluida(r) for r in rows]
 
 
 @app.put("/services/{service_id}/tipo-atendimento")
-def update_service_type(service_id: int, payload: UpdateServiceTypeRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def update_service_type(service_id: int, payload: UpdateServiceTypeRequest, user=Depends(get_current_user)):
+    area = payload.area.lower()
+    if area not in AREAS_SERVICO:
+        raise HTTPException(status_code=400, detail="Area invalida")
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
-    table_map = {
-        "Borracharia": "servicos_solicitados_borracharia",
-        "Alinhamento": "servicos_solicitados_alinhamento",
-        "Manutencao": "servicos_solicitados_manutencao",
-    }
-    tabela = table_map.get(payload.area)
-    if not tabela:
-        raise HTTPException(status_code=400, detail="Area invalida")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                f"UPDATE {tabela} SET tipo_atendimento = %s WHERE id = %s",
-                (payload.tipo_atendimento, service_id),
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                "UPDATE servicos_solicitados SET tipo_atendimento = %s WHERE id = %s AND area = %s",
+                (payload.tipo_atendimento, service_id, area),
             )
-        conn.commit()
+        await conn.commit()
         return {"status": "ok"}
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.post("/services/revert")
-def revert_visit(payload: RevertVisitRequest, user=Depends(get_current_user)):
-    conn = get_connection()
+async def revert_visit(payload: RevertVisitRequest, user=Depends(get_current_user)):
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
                 SELECT id FROM execucao_servico
                 WHERE veiculo_id = %s AND quilometragem = %s AND status = 'finalizado'
                 """,
                 (payload.veiculo_id, payload.quilometragem),
             )
-            execucao_ids = [row[0] for row in cursor.fetchall()]
+            execucao_ids = [row[0] for row in await cursor.fetchall()]
             if not execucao_ids:
                 raise HTTPException(status_code=404, detail="Execucao nao encontrada")
 
-            for tabela in [
-                "servicos_solicitados_borracharia",
-                "servicos_solicitados_alinhamento",
-                "servicos_solicitados_manutencao",
-            ]:
-                cursor.execute(
-                    f"""
-                    UPDATE {tabela}
-                       SET status = 'pendente', box_id = NULL, funcionario_id = NULL, execucao_id = NULL
-                     WHERE execucao_id = ANY(%s)
-                    """,
-                    (execucao_ids,),
-                )
-            cursor.execute(
+            await cursor.execute(
+                """
+                UPDATE servicos_solicitados
+                   SET status = 'pendente', box_id = NULL, funcionario_id = NULL, execucao_id = NULL
+                 WHERE execucao_id = ANY(%s)
+                """,
+                (execucao_ids,),
+            )
+            await cursor.execute(
                 "UPDATE execucao_servico SET status = 'cancelado' WHERE id = ANY(%s)",
                 (execucao_ids,),
             )
-        conn.commit()
+            await _enfileirar_recalculo(cursor, payload.veiculo_id)
+        await conn.commit()
         return {"status": "ok"}
     except HTTPException:
-        conn.rollback()
+        await conn.rollback()
         raise
     except Exception as exc:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
-        release_connection(conn)
+        await release_connection(conn)
 
 
 @app.get("/terms/{execucao_id}", response_class=HTMLResponse)
-def get_term(execucao_id: int,
+async def get_term(execucao_id: int,
              avarias: List[str] = Query(default=[]),
              carreta_carregada: bool = False,
              cambagem: bool = False,
              user=Depends(get_current_user)):
-    conn = get_connection()
+    conn = await get_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Falha na conexao com o banco")
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
+        async with conn.cursor() as cursor:
+            await cursor.execute(
                 """
                 SELECT v.placa, v.modelo, v.empresa, es.nome_motorista
                 FROM execucao_servico es
@@ -1033,7 +1134,7 @@ def get_term(execucao_id: int,
                 """,
                 (execucao_id,),
             )
-            row = cursor.fetchone()
+            row = await cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Servico nao encontrado")
 
@@ -1082,4 +1183,4 @@ def get_term(execucao_id: int,
         </html>
         """
     finally:
-        release_connection(conn)
+        await release_connection(conn)
@@ -0,0 +1,401 @@
+import asyncio
+import json
+import logging
+import time
+
+import psycopg
+
+from api import settings
+from api.db import get_connection, get_db_url, release_connection
+from api.statements import executar
+from api.versoes import CANAL as CANAL_VERSOES, versoes
+
+logger = logging.getLogger(__name__)
+
+CANAL = "patio"
+
+
+class EstadoPatio:
+    """
+    Boxes (com a execucao em andamento) e fila de espera mantidos em memoria no
+    processo. A migracao 0003 faz o banco avisar no canal 'patio' quais boxes /
+    veiculos mudaram; so eles sao recarregados. Uma recarga completa periodica
+    (PATIO_RECONCILIAR_S) corrige qualquer aviso perdido.
+
+    Enquanto a escuta nao estiver ativa e a primeira carga feita, `sincronizado`
+    fica False e os endpoints consultam o banco como antes.
+    """
+
+    def __init__(self):
+        self.boxes = {}
+        self.fila = {}
+        self.versao = 0
+        # Versao 'patio' do banco (recurso_versao) que os dados em memoria ja refletem
+        self.versao_banco = 0
+        self._versao_avisada = 0
+        self.sincronizado = False
+        self.escutando = False
+        self.ultima_carga = None
+        self.avisos_recebidos = 0
+        self.recargas_parciais = 0
+        self.recargas_completas = 0
+        self._boxes_pendentes = set()
+        self._veiculos_pendentes = set()
+        self._recarregar_tudo = True
+        self._aviso = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._respostas = {}
+        self._painel_publicado = {"boxes": {}, "fila": {}, "ordem": []}
+        self._assinantes = set()
+
+    # ---- leitura (endpoints) ----
+
+    def queues(self):
+        """Mesmo formato de GET /queues, ou None se o estado nao for confiavel."""
+        if not self.sincronizado:
+            return None
+        if "queues" not in self._respostas:
+            ocupados = [b for _, b in sorted(self.boxes.items()) if b["execucao_id"] is not None]
+            fila = self._fila_ordenada()
+            self._respostas["queues"] = {
+                "boxes": [
+                    {
+                        "box_id": b["box_id"],
+                        "placa": b["placa"],
+                        "empresa": b["empresa"],
+                        "funcionario": b["funcionario"],
+                        "servicos": ", ".join(b["servicos"]) or None,
+                    }
+                    for b in ocupados
+                ],
+                "fila": [
+                    {"placa": f["placa"], "empresa": f["empresa"], "servicos": ", ".join(f["servicos"]) or None}
+                    for f in fila
+                ],
+            }
+        return self._respostas["queues"]
+
+    def boxes_ativos(self):
+        """Mesmo formato de GET /boxes/active, ou None se o estado nao for confiavel."""
+        if not self.sincronizado:
+            return None
+        if "boxes_ativos" not in self._respostas:
+            self._respostas["boxes_ativos"] = [
+                {
+                    "box_id": b["box_id"],
+                    "box_area": b["box_area"],
+                    "execucao_id": b["execucao_id"],
+                    "placa": b["placa"],
+                    "empresa": b["empresa"],
+                    "nome_motorista": b["nome_motorista"],
+                    "contato_motorista": b["contato_motorista"],
+                    "modelo": b["modelo"],
+                    "funcionario": b["funcionario"],
+                }
+                for _, b in sorted(self.boxes.items())
+            ]
+        return self._respostas["boxes_ativos"]
+
+    def _fila_ordenada(self):
+        # Mesma ordem de queues_fila: ORDER BY MIN(data_solicitacao), nulos no fim
+        return sorted(self.fila.values(), key=lambda f: (f["desde"] is None, f["desde"] or 0))
+
+    # ---- painel (GET /queues/stream) ----
+
+    def _painel(self) -> dict:
+        boxes = {
+            b["box_id"]: {
+                "box_id": b["box_id"],
+                "placa": b["placa"],
+                "empresa": b["empresa"],
+                "funcionario": b["funcionario"],
+                "servicos": b["servicos"],
+            }
+            for b in self.boxes.values()
+            if b["execucao_id"] is not None
+        }
+        fila = self._fila_ordenada()
+        return {
+            "boxes": boxes,
+            "fila": {
+                f["veiculo_id"]: {
+                    "veiculo_id": f["veiculo_id"],
+                    "placa": f["placa"],
+                    "empresa": f["empresa"],
+                    "servicos": f["servicos"],
+                }
+                for f in fila
+            },
+            "ordem": [f["veiculo_id"] for f in fila],
+        }
+
+    def snapshot_painel(self) -> dict:
+        """Evento 'snapshot' do stream: estado completo do painel."""
+        painel = self._painel_publicado
+        return {
+            "versao": self.versao,
+            "boxes": [painel["boxes"][box_id] for box_id in sorted(painel["boxes"])],
+            "fila": [painel["fila"][veiculo_id] for veiculo_id in painel["ordem"]],
+        }
+
+    @staticmethod
+    def _delta_painel(antes: dict, depois: dict) -> dict:
+        boxes = {
+            box_id: depois["boxes"].get(box_id)
+            for box_id in antes["boxes"].keys() | depois["boxes"].keys()
+            if antes["boxes"].get(box_id) != depois["boxes"].get(box_id)
+        }
+        alterados = [f for veiculo_id, f in depois["fila"].items() if antes["fila"].get(veiculo_id) != f]
+        removidos = [veiculo_id for veiculo_id in antes["fila"] if veiculo_id not in depois["fila"]]
+        delta = {}
+        if boxes:
+            delta["boxes"] = boxes
+        if alterados or removidos or antes["ordem"] != depois["ordem"]:
+            delta["fila_alterados"] = alterados
+            delta["fila_removidos"] = removidos
+            delta["fila_ordem"] = depois["ordem"]
+        return delta
+
+    def assinar(self) -> asyncio.Queue:
+        fila = asyncio.Queue(maxsize=256)
+        self._assinantes.add(fila)
+        return fila
+
+    def cancelar_assinatura(self, fila: asyncio.Queue) -> None:
+        self._assinantes.discard(fila)
+
+    def _publicar(self, evento: str, dados: dict) -> None:
+        for fila in self._assinantes:
+            try:
+                fila.put_nowait((evento, dados))
+            except asyncio.QueueFull:
+                # Cliente lento: descarta o atrasado e manda o estado completo
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait(("snapshot", self.snapshot_painel()))
+
+    def status(self) -> dict:
+        return {
+            "sincronizado": self.sincronizado,
+            "versao": self.versao,
+            "versao_banco": self.versao_banco,
+            "boxes": len(self.boxes),
+            "fila": len(self.fila),
+            "ultima_carga_ha_s": None if self.ultima_carga is None else round(time.monotonic() - self.ultima_carga, 1),
+            "avisos_recebidos": self.avisos_recebidos,
+            "recargas_parciais": self.recargas_parciais,
+            "recargas_completas": self.recargas_completas,
+            "assinantes_stream": len(self._assinantes),
+        }
+
+    # ---- escrita (tarefas de fundo) ----
+
+    def registrar_aviso(self, payload: str) -> None:
+        self.avisos_recebidos += 1
+        try:
+            aviso = json.loads(payload)
+            boxes = aviso.get("boxes") or []
+            veiculos = aviso.get("veiculos") or []
+            self._versao_avisada = max(self._versao_avisada, int(aviso.get("versao") or 0))
+        except (ValueError, TypeError, AttributeError):
+            boxes, veiculos = [], []
+        if not boxes and not veiculos:
+            self._recarregar_tudo = True
+        self._boxes_pendentes.update(boxes)
+        self._veiculos_pendentes.update(veiculos)
+        self._aviso.set()
+
+    def pedir_recarga(self) -> None:
+        self._recarregar_tudo = True
+        self._aviso.set()
+
+    def invalidar(self) -> None:
+        """Escuta caiu: ate recarregar tudo, os endpoints voltam a ler do banco."""
+        self.escutando = False
+        self.sincronizado = False
+        self.pedir_recarga()
+
+    async def aguardar_aviso(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._aviso.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def aplicar_pendentes(self) -> None:
+        async with self._lock:
+            self._aviso.clear()
+            completa = self._recarregar_tudo
+            boxes, self._boxes_pendentes = self._boxes_pendentes, set()
+            veiculos, self._veiculos_pendentes = self._veiculos_pendentes, set()
+            self._recarregar_tudo = False
+            # Versoes crescem na ordem dos commits e os avisos chegam nessa ordem:
+            # tudo ate esta versao ja foi avisado e entra nesta recarga
+            versao_avisada = self._versao_avisada
+            # Mudou um veiculo que esta num box: o box tambem precisa ser relido
+            boxes |= {b["box_id"] for b in self.boxes.values() if b["veiculo_id"] in veiculos}
+            try:
+                versao_lida = await self._recarregar(
+                    None if completa else sorted(boxes), None if completa else sorted(veiculos)
+                )
+            except Exception:
+                # Devolve o trabalho para a proxima rodada
+                self._recarregar_tudo = self._recarregar_tudo or completa
+                self._boxes_pendentes |= boxes
+                self._veiculos_pendentes |= veiculos
+                raise
+            self.versao_banco = max(self.versao_banco, versao_avisada, versao_lida)
+            if completa:
+                self.recargas_completas += 1
+                self.ultima_carga = time.monotonic()
+                # Sem a escuta ativa a carga envelhece sem aviso; nao serve para leitura
+                self.sincronizado = self.escutando
+            else:
+                self.recargas_parciais += 1
+
+    async def _recarregar(self, boxes, veiculos) -> int:
+        """Rele os boxes / veiculos pedidos (None = todos). Retorna a versao lida do banco."""
+        if boxes == [] and veiculos == []:
+            return 0
+        versao_lida = 0
+        conn = await get_connection()
+        try:
+            async with conn.cursor() as cursor:
+                if boxes is None:
+                    # Lida antes dos dados: os dados sao no minimo desta versao
+                    await executar(cursor, "recurso_versao", ("patio",))
+                    row = await cursor.fetchone()
+                    versao_lida = row[0] if row else 0
+                linhas_boxes = linhas_fila = []
+                if boxes is None or boxes:
+                    await executar(cursor, "patio_boxes", (boxes, boxes))
+                    linhas_boxes = await cursor.fetchall()
+                if veiculos is None or veiculos:
+                    await executar(cursor, "patio_fila", (veiculos, veiculos))
+                    linhas_fila = await cursor.fetchall()
+        finally:
+            await release_connection(conn)
+
+        novos_boxes = {
+            r[0]: {
+                "box_id": r[0],
+                "box_area": r[1],
+                "execucao_id": r[2],
+                "veiculo_id": r[3],
+                "placa": r[4],
+                "empresa": r[5],
+                "nome_motorista": r[6],
+                "contato_motorista": r[7],
+                "modelo": r[8],
+                "funcionario": r[9],
+                "servicos": [s for s in r[10] or [] if s],
+            }
+            for r in linhas_boxes
+        }
+        nova_fila = {
+            r[0]: {
+                "veiculo_id": r[0],
+                "placa": r[1],
+                "empresa": r[2],
+                "servicos": [s for s in r[3] or [] if s],
+                "desde": r[4],
+            }
+            for r in linhas_fila
+        }
+
+        if boxes is None:
+            self.boxes = novos_boxes
+        else:
+            for box_id in boxes:
+                self.boxes.pop(box_id, None)
+            self.boxes.update(novos_boxes)
+        if veiculos is None:
+            self.fila = nova_fila
+        else:
+            for veiculo_id in veiculos:
+                self.fila.pop(veiculo_id, None)
+            self.fila.update(nova_fila)
+
+        self.versao += 1
+        self._respostas = {}
+
+        primeira_carga = self.ultima_carga is None
+        painel = self._painel()
+        delta = self._delta_painel(self._painel_publicado, painel)
+        self._painel_publicado = painel
+        if primeira_carga:
+            self._publicar("snapshot", self.snapshot_painel())
+        elif delta:
+            self._publicar("delta", {"versao": self.versao, **delta})
+        return versao_lida
+
+
+def formatar_evento_sse(evento: str, dados: dict) -> str:
+    corpo = json.dumps(dados, default=str, ensure_ascii=False)
+    return f"event: {evento}\nid: {dados['versao']}\ndata: {corpo}\n\n"
+
+
+estado = EstadoPatio()
+_tarefas: list[asyncio.Task] = []
+
+
+async def _escutar() -> None:
+    """Conexao dedicada (fora do pool) em LISTEN; reconecta e recarrega tudo se cair."""
+    espera = 1.0
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(get_db_url(), autocommit=True) as conn:
+                await conn.execute(f"LISTEN {CANAL}")
+                await conn.execute(f"LISTEN {CANAL_VERSOES}")
+                estado.escutando = True
+                # So depois do LISTEN: nada que mude entre a carga e a escuta se perde
+                estado.pedir_recarga()
+                await versoes.carregar(conn)
+                espera = 1.0
+                async for aviso in conn.notifies():
+                    if aviso.channel == CANAL:
+                        estado.registrar_aviso(aviso.payload)
+                    else:
+                        versoes.registrar_aviso(aviso.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("Escuta do patio caiu (%s); reconectando em %.0fs", exc, espera)
+        estado.invalidar()
+        versoes.invalidar()
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, 30.0)
+
+
+async def _aplicar() -> None:
+    """Aplica os avisos acumulados e recarrega tudo a cada PATIO_RECONCILIAR_S."""
+    while True:
+        restante = settings.PATIO_RECONCILIAR_S
+        if estado.ultima_carga is not None:
+            restante = max(0.0, estado.ultima_carga + settings.PATIO_RECONCILIAR_S - time.monotonic())
+        if not await estado.aguardar_aviso(restante):
+            estado.pedir_recarga()
+        try:
+            await estado.aplicar_pendentes()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("Falha ao atualizar o estado do patio: %s", exc)
+            await asyncio.sleep(1.0)
+
+
+async def iniciar_patio() -> None:
+    if not settings.PATIO_EM_MEMORIA or _tarefas:
+        return
+    _tarefas.append(asyncio.create_task(_escutar()))
+    _tarefas.append(asyncio.create_task(_aplicar()))
+
+
+async def parar_patio() -> None:
+    for tarefa in _tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*_tarefas, return_exceptions=True)
+    _tarefas.clear()
+    estado.escutando = False
+    estado.sincronizado = False
+    versoes.invalidar()
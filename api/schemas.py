@@ -28,6 +28,10 @@ class RegisterServiceRequest(BaseModel):
     itens: List[ServiceItem]
 
 
+class RegisterServicesBulkRequest(BaseModel):
+    veiculos: List[RegisterServiceRequest]
+
+
 class AllocationRequest(BaseModel):
     veiculo_id: int
     area: str
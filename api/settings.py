@@ -0,0 +1,30 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Pool de conexoes da API (psycopg 3 async)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Tempo maximo (s) que uma requisicao espera por uma conexao livre antes de receber 503
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Conexoes ociosas acima de min_size sao fechadas depois deste tempo (s)
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+# Quantas requisicoes podem ficar na fila esperando conexao (0 = sem limite)
+DB_POOL_MAX_WAITING = int(os.getenv("DB_POOL_MAX_WAITING", "100"))
+# Conexoes emprestadas por mais tempo que isto (s) sao reportadas como retidas
+DB_POOL_LEAK_THRESHOLD = float(os.getenv("DB_POOL_LEAK_THRESHOLD", "10"))
+# Prepara as consultas quentes no servidor (desligar atras de pooler em modo transacao)
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1") == "1"
+# Estado do patio em memoria (/queues, /boxes/active) atualizado por LISTEN/NOTIFY
+PATIO_EM_MEMORIA = os.getenv("PATIO_EM_MEMORIA", "1") == "1"
+# Intervalo (s) da recarga completa que corrige qualquer notificacao perdida
+PATIO_RECONCILIAR_S = float(os.getenv("PATIO_RECONCILIAR_S", "60"))
+# Origens (separadas por virgula) do Streamlit que abrem /queues/stream no
+# painel; outras origens nao recebem Access-Control-Allow-Origin
+APP_ORIGINS = [o.strip().rstrip("/") for o in os.getenv("API_APP_ORIGINS", "").split(",") if o.strip()]
+# Intervalo (s) do comentario de keep-alive em /queues/stream
+PATIO_SSE_HEARTBEAT_S = float(os.getenv("PATIO_SSE_HEARTBEAT_S", "15"))
+# Linhas buscadas por vez do cursor no servidor ao transmitir /services/completed
+COMPLETED_STREAM_LOTE = int(os.getenv("COMPLETED_STREAM_LOTE", "500"))
@@ -0,0 +1,304 @@
+import logging
+import re
+import weakref
+
+import psycopg
+from psycopg import errors, pq
+
+from api import settings
+from catalogo import CONSULTA_CATALOGO
+from km_plausibilidade import CONSULTA_PROJECOES
+from jobs import ENFILEIRAR
+
+# Consultas quentes da API, preparadas no servidor uma vez por conexao do pool
+# e executadas pelo nome (EXECUTE). O SQL fica com %s como no resto do codigo;
+# a versao com $1..$n usada no PREPARE e derivada automaticamente.
+REGISTRO = {
+    # Ultima visita de veiculo_ultima_visita (migracao 0011), mantida por trigger
+    "vehicle_by_plate": """
+        SELECT v.id, v.placa, v.empresa, v.modelo, v.ano_modelo,
+               v.nome_motorista, v.contato_motorista, v.cliente_id,
+               c.nome_responsavel, c.contato_responsavel,
+               uv.execucao_id, uv.data_ultima_visita, uv.km_ultima_visita, uv.servicos
+        FROM veiculos v
+        LEFT JOIN clientes c ON v.cliente_id = c.id
+        LEFT JOIN veiculo_ultima_visita uv ON uv.veiculo_id = v.id
+        WHERE v.placa = %s
+    """,
+    "box_execucao": """
+        SELECT es.id as execucao_id, es.veiculo_id, es.quilometragem,
+               v.placa, v.empresa, v.modelo, v.nome_motorista, v.contato_motorista,
+               f.nome as funcionario
+        FROM execucao_servico es
+        JOIN veiculos v ON es.veiculo_id = v.id
+        LEFT JOIN funcionarios f ON es.funcionario_id = f.id
+        WHERE es.box_id = %s AND es.status = 'em_andamento'
+    """,
+    "box_servicos": """
+        SELECT area, id, tipo, quantidade, observacao, observacao_execucao
+          FROM servicos_solicitados
+         WHERE box_id = %s AND status = 'em_andamento'
+    """,
+    "queues_boxes": """
+        WITH servicos_em_andamento AS (
+            SELECT
+                execucao_id,
+                STRING_AGG(tipo || ' (Qtd: ' || quantidade || ')', ', ') as lista_servicos
+            FROM servicos_solicitados
+            WHERE status = 'em_andamento'
+            GROUP BY execucao_id
+        )
+        SELECT
+            b.id as box_id,
+            v.placa,
+            v.empresa,
+            f.nome as funcionario,
+            sa.lista_servicos
+        FROM boxes b
+        JOIN execucao_servico es ON b.id = es.box_id
+        JOIN veiculos v ON es.veiculo_id = v.id
+        LEFT JOIN funcionarios f ON es.funcionario_id = f.id
+        LEFT JOIN servicos_em_andamento sa ON es.id = sa.execucao_id
+        WHERE es.status = 'em_andamento' AND b.id > 0
+        ORDER BY b.id
+    """,
+    "queues_fila": """
+        SELECT
+            v.placa,
+            v.empresa,
+            STRING_AGG(s.tipo || ' (Qtd: ' || s.quantidade || ')', ', ') as servicos
+        FROM servicos_solicitados s
+        JOIN veiculos v ON s.veiculo_id = v.id
+        WHERE s.status = 'pendente'
+        GROUP BY v.placa, v.empresa, s.veiculo_id
+        ORDER BY MIN(s.data_solicitacao) ASC
+    """,
+    "pending_vehicles": """
+        WITH status_por_veiculo AS (
+            SELECT
+                veiculo_id,
+                COUNT(*) FILTER (WHERE status = 'pendente') AS pendentes,
+                COUNT(*) FILTER (WHERE status = 'em_andamento') AS em_andamento
+            FROM servicos_solicitados
+            WHERE status IN ('pendente', 'em_andamento')
+            GROUP BY veiculo_id
+        )
+        SELECT v.id, v.placa, v.empresa
+        FROM veiculos v
+        JOIN status_por_veiculo sv ON v.id = sv.veiculo_id
+        WHERE sv.pendentes > 0 AND sv.em_andamento = 0
+        ORDER BY v.placa
+    """,
+    # Keyset em (fim_execucao, execucao_id) decrescente: parametros (inicio, fim_cursor,
+    # id_cursor). A primeira pagina usa (fim exclusivo do periodo, 0) como cursor.
+    "services_completed": """
+        SELECT
+            es.id as execucao_id,
+            es.veiculo_id, es.quilometragem, es.fim_execucao,
+            v.placa, v.empresa,
+            serv.service_id, serv.area, serv.tipo, serv.quantidade, f.nome as funcionario_nome,
+            serv.observacao_execucao, serv.tipo_atendimento
+        FROM execucao_servico es
+        JOIN veiculos v ON es.veiculo_id = v.id
+        LEFT JOIN (
+            SELECT id as service_id, execucao_id, INITCAP(area) as area, tipo, quantidade, funcionario_id, observacao_execucao, tipo_atendimento
+            FROM servicos_solicitados
+        ) serv ON es.id = serv.execucao_id
+        LEFT JOIN funcionarios f ON serv.funcionario_id = f.id
+        WHERE es.status = 'finalizado' AND es.fim_execucao >= %s
+          AND (es.fim_execucao, es.id) < (%s::timestamp, %s::int)
+        ORDER BY es.fim_execucao DESC, es.id DESC, serv.area
+    """,
+    # Mesma consulta limitada a N execucoes (os servicos de uma execucao nunca se dividem)
+    "services_completed_pagina": """
+        WITH pagina AS (
+            SELECT id, veiculo_id, quilometragem, fim_execucao
+            FROM execucao_servico
+            WHERE status = 'finalizado' AND fim_execucao >= %s
+              AND (fim_execucao, id) < (%s::timestamp, %s::int)
+            ORDER BY fim_execucao DESC, id DESC
+            LIMIT %s
+        )
+        SELECT
+            es.id as execucao_id,
+            es.veiculo_id, es.quilometragem, es.fim_execucao,
+            v.placa, v.empresa,
+            serv.id as service_id, INITCAP(serv.area) as area, serv.tipo, serv.quantidade, f.nome as funcionario_nome,
+            serv.observacao_execucao, serv.tipo_atendimento
+        FROM pagina es
+        JOIN veiculos v ON es.veiculo_id = v.id
+        LEFT JOIN servicos_solicitados serv ON es.id = serv.execucao_id
+        LEFT JOIN funcionarios f ON serv.funcionario_id = f.id
+        ORDER BY es.fim_execucao DESC, es.id DESC, serv.area
+    """,
+    "assign_motorista": """
+        SELECT nome_motorista, contato_motorista FROM veiculos WHERE id = %s
+    """,
+    "assign_km_pendente": """
+        SELECT quilometragem FROM servicos_solicitados
+        WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL
+        LIMIT 1
+    """,
+    "assign_execucao": """
+        INSERT INTO execucao_servico
+            (veiculo_id, box_id, funcionario_id, quilometragem, status, inicio_execucao, usuario_alocacao_id, nome_motorista, contato_motorista)
+        VALUES (%s, %s, %s, %s, 'em_andamento', %s, %s, %s, %s)
+        RETURNING id
+    """,
+    "assign_servicos": """
+        UPDATE servicos_solicitados
+           SET box_id = %s, funcionario_id = %s, status = 'em_andamento', data_atualizacao = %s, execucao_id = %s
+         WHERE veiculo_id = %s AND status = 'pendente' AND area = %s
+    """,
+    # Cadastro de servicos (/services/register e /bulk): um INSERT para todos os
+    # itens da requisicao, colunas paralelas em arrays
+    "register_servicos": """
+        INSERT INTO servicos_solicitados
+            (area, veiculo_id, tipo, quantidade, observacao, quilometragem, status, data_solicitacao, data_atualizacao)
+        SELECT t.area, t.veiculo_id, t.tipo, t.quantidade, t.observacao, t.quilometragem, 'pendente', %s, %s
+        FROM unnest(%s::text[], %s::int[], %s::text[], %s::int[], %s::text[], %s::int[])
+            AS t(area, veiculo_id, tipo, quantidade, observacao, quilometragem)
+        RETURNING id, veiculo_id
+    """,
+    "register_revisao": """
+        UPDATE veiculos SET data_revisao_proativa = NULL WHERE id = ANY(%s::int[])
+    """,
+    # /boxes/{id}/finalize: todos os servicos do box num UPDATE so, qualquer
+    # que seja a area (a particao e escolhida pela coluna area de cada linha)
+    "finalize_servicos": """
+        UPDATE servicos_solicitados s
+           SET quantidade = t.quantidade,
+               observacao_execucao = %s,
+               status = 'finalizado',
+               data_atualizacao = %s
+          FROM unnest(%s::int[], %s::text[], %s::int[]) AS t(id, area, quantidade)
+         WHERE s.id = t.id AND s.area = t.area
+    """,
+    # Fila de tarefas pos-commit (jobs.py / worker.py, migracao 0007)
+    "tarefa_enfileirar": ENFILEIRAR,
+    # Idempotency-Key (api/idempotencia.py, migracao 0006). Sem linha no
+    # RETURNING = chave ja usada e ainda valida; se a original nao terminou,
+    # o INSERT espera o COMMIT/ROLLBACK dela
+    "idempotencia_reservar": """
+        INSERT INTO idempotencia_requisicoes (chave, usuario_id, rota, hash_corpo)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (chave, usuario_id) DO UPDATE
+            SET rota = EXCLUDED.rota, hash_corpo = EXCLUDED.hash_corpo, resposta = NULL, criada_em = NOW()
+            WHERE idempotencia_requisicoes.criada_em < NOW() - make_interval(hours => %s)
+        RETURNING 1
+    """,
+    "idempotencia_buscar": """
+        SELECT rota, hash_corpo, resposta FROM idempotencia_requisicoes WHERE chave = %s AND usuario_id = %s
+    """,
+    "idempotencia_gravar": """
+        UPDATE idempotencia_requisicoes SET resposta = %s::jsonb WHERE chave = %s AND usuario_id = %s
+    """,
+    "assign_ocupar_box": """
+        UPDATE boxes SET ocupado = TRUE WHERE id = %s
+    """,
+    # Mesma consulta do cache de catalogo do Streamlit (catalogo.py)
+    "catalogo_servicos": CONSULTA_CATALOGO,
+    # Projecoes de KM do cadastro (km_plausibilidade.py): NULL le tudo, uma data
+    # so os estados gravados a partir dela
+    "km_projecoes": CONSULTA_PROJECOES,
+    # Versao do recurso para ETag (api/versoes.py), quando a escuta nao esta ativa
+    "recurso_versao": """
+        SELECT versao FROM recurso_versao WHERE recurso = %s
+    """,
+    # Estado do patio em memoria (api/patio.py): NULL recarrega tudo, uma lista
+    # de ids recarrega so aqueles boxes / veiculos da fila
+    "patio_boxes": """
+        SELECT
+            b.id, b.area, es.id, es.veiculo_id,
+            v.placa, v.empresa, v.nome_motorista, v.contato_motorista, v.modelo,
+            f.nome,
+            (SELECT ARRAY_AGG(s.tipo || ' (Qtd: ' || s.quantidade || ')' ORDER BY s.id)
+               FROM servicos_solicitados s
+              WHERE s.execucao_id = es.id AND s.status = 'em_andamento')
+        FROM boxes b
+        LEFT JOIN execucao_servico es ON b.id = es.box_id AND es.status = 'em_andamento'
+        LEFT JOIN veiculos v ON es.veiculo_id = v.id
+        LEFT JOIN funcionarios f ON es.funcionario_id = f.id
+        WHERE b.id > 0 AND (%s::int[] IS NULL OR b.id = ANY(%s::int[]))
+        ORDER BY b.id
+    """,
+    "patio_fila": """
+        SELECT
+            s.veiculo_id, v.placa, v.empresa,
+            ARRAY_AGG(s.tipo || ' (Qtd: ' || s.quantidade || ')' ORDER BY s.id),
+            MIN(s.data_solicitacao)
+        FROM servicos_solicitados s
+        JOIN veiculos v ON s.veiculo_id = v.id
+        WHERE s.status = 'pendente' AND (%s::int[] IS NULL OR s.veiculo_id = ANY(%s::int[]))
+        GROUP BY s.veiculo_id, v.placa, v.empresa
+    """,
+}
+
+logger = logging.getLogger(__name__)
+
+# Conexao -> nomes ja preparados nela. WeakKeyDictionary: quando o pool descarta
+# uma conexao, a entrada some junto e a conexao nova prepara tudo de novo.
+_preparados = weakref.WeakKeyDictionary()
+
+
+def _para_prepare(sql: str) -> str:
+    contador = iter(range(1, sql.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(contador)}", sql)
+
+
+def _sql_execute(nome: str, n_params: int) -> str:
+    if not n_params:
+        return f"EXECUTE {nome}"
+    return f"EXECUTE {nome} ({', '.join(['%s'] * n_params)})"
+
+
+async def _preparar(cursor, nome: str) -> None:
+    await cursor.execute(f"PREPARE {nome} AS {_para_prepare(REGISTRO[nome])}")
+    _preparados.setdefault(cursor.connection, set()).add(nome)
+
+
+async def preparar_todos(conn) -> None:
+    """Callback 'configure' do pool: prepara o registro inteiro em cada conexao nova."""
+    if not settings.DB_PREPARED_STATEMENTS:
+        return
+    # Em autocommit uma falha (ex.: tabela ainda nao migrada) nao derruba as demais;
+    # o statement que falhou e preparado sob demanda no primeiro uso.
+    await conn.set_autocommit(True)
+    try:
+        async with conn.cursor() as cursor:
+            for nome in REGISTRO:
+                try:
+                    await _preparar(cursor, nome)
+                except psycopg.Error as exc:
+                    logger.warning("Nao foi possivel preparar %s: %s", nome, exc)
+    finally:
+        await conn.set_autocommit(False)
+
+
+async def executar(cursor, nome: str, params: tuple = ()):
+    """
+    Executa uma consulta do REGISTRO pelo nome. O cursor precisa ser de bind no
+    cliente (AsyncClientCursor, padrao do pool) para que os parametros do
+    EXECUTE sejam interpolados.
+    """
+    if not settings.DB_PREPARED_STATEMENTS:
+        await cursor.execute(REGISTRO[nome], params)
+        return cursor
+
+    conn = cursor.connection
+    if nome not in _preparados.get(conn, ()):
+        await _preparar(cursor, nome)
+
+    status_antes = conn.info.transaction_status
+    try:
+        await cursor.execute(_sql_execute(nome, len(params)), params)
+    except errors.InvalidSqlStatementName:
+        # A sessao no servidor foi trocada (reconexao, pooler, DISCARD ALL) e os
+        # statements sumiram. Se a consulta abriu a transacao, da para repetir.
+        _preparados.pop(conn, None)
+        if status_antes != pq.TransactionStatus.IDLE:
+            raise
+        await conn.rollback()
+        await _preparar(cursor, nome)
+        await cursor.execute(_sql_execute(nome, len(params)), params)
+    return cursor
@@ -0,0 +1,68 @@
+from api.db import get_connection, release_connection
+from api.statements import executar
+
+# Canal em que a migracao 0004 avisa cada incremento ("recurso:versao")
+CANAL = "recurso_versao"
+
+
+class VersoesRecursos:
+    """
+    Versao atual de cada recurso (tabela recurso_versao), mantida em memoria
+    pela mesma conexao em LISTEN do estado do patio. Sem a escuta ativa, cada
+    leitura vai ao banco (uma busca por chave primaria).
+    """
+
+    def __init__(self):
+        self.versoes = {}
+        self.sincronizado = False
+
+    def registrar_aviso(self, payload: str) -> None:
+        recurso, _, versao = payload.rpartition(":")
+        try:
+            versao = int(versao)
+        except ValueError:
+            return
+        if versao > self.versoes.get(recurso, -1):
+            self.versoes[recurso] = versao
+
+    async def carregar(self, conn) -> None:
+        """Chamado depois do LISTEN, na propria conexao de escuta."""
+        cursor = await conn.execute("SELECT recurso, versao FROM recurso_versao")
+        for recurso, versao in await cursor.fetchall():
+            if versao > self.versoes.get(recurso, -1):
+                self.versoes[recurso] = versao
+        self.sincronizado = True
+
+    def invalidar(self) -> None:
+        self.sincronizado = False
+
+
+versoes = VersoesRecursos()
+
+
+async def versao_atual(recurso: str) -> int:
+    if versoes.sincronizado and recurso in versoes.versoes:
+        return versoes.versoes[recurso]
+    conn = await get_connection()
+    try:
+        async with conn.cursor() as cursor:
+            await executar(cursor, "recurso_versao", (recurso,))
+            row = await cursor.fetchone()
+    finally:
+        await release_connection(conn)
+    return row[0] if row else 0
+
+
+def etag(recurso: str, versao: int) -> str:
+    return f'"{recurso}-{versao}"'
+
+
+def etag_confere(if_none_match: str | None, tag: str) -> bool:
+    """If-None-Match pode trazer varias tags, '*' ou tags fracas (W/"...")."""
+    if not if_none_match:
+        return False
+    for candidata in if_none_match.split(","):
+        candidata = candidata.strip()
+        if candidata == "*" or candidata.removeprefix("W/") == tag:
+            return True
+    return False
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+SCRIPT: aplicar_correcoes_simulacao.py
+======================================
+FASE 3: APLICAÇÃO - Grava no banco as correções aprovadas do CSV de
+propostas gerado por simular_correcoes_digitos_v3.py.
+
+Tudo numa transação só:
+- o CSV entra por COPY em correcoes_km_staging (tabela UNLOGGED, migração 0009);
+- um UPDATE execucao_servico ... FROM correcoes_km_staging aplica as KMs,
+  só onde a KM ainda é a da simulação (km_antes), e guarda cada linha
+  alterada em correcoes_km_desfazer sob um número de lote;
+- a média de KM/dia é recalculada numa passada só para os veículos afetados
+  (km_media.recalcular_frota).
+
+Uso:
+    python aplicar_correcoes_simulacao.py SIMULACAO_PROPOSTAS_20250101_120000.csv
+    python aplicar_correcoes_simulacao.py SIMULACAO_PROPOSTAS_...csv --simular   # mostra e desfaz
+    python aplicar_correcoes_simulacao.py --listar
+    python aplicar_correcoes_simulacao.py --desfazer 3
+"""
+
+import argparse
+import io
+import os
+import sys
+
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+from km_media import recalcular_frota
+
+load_dotenv()
+
+COLUNAS = ['exec_id', 'veiculo_id', 'km_antes', 'km_depois']
+
+APLICAR = """
+    WITH alteradas AS (
+        UPDATE execucao_servico es
+           SET quilometragem = s.km_depois
+          FROM correcoes_km_staging s
+         WHERE es.id = s.exec_id
+           AND es.veiculo_id = s.veiculo_id
+           AND es.quilometragem = s.km_antes
+        RETURNING es.id, es.veiculo_id, s.km_antes, s.km_depois
+    )
+    INSERT INTO correcoes_km_desfazer (lote_id, exec_id, veiculo_id, km_antes, km_depois)
+    SELECT %s, id, veiculo_id, km_antes, km_depois FROM alteradas
+"""
+IGNORADAS = """
+    SELECT s.exec_id, s.veiculo_id, s.km_antes, s.km_depois, es.quilometragem
+    FROM correcoes_km_staging s
+    LEFT JOIN execucao_servico es ON es.id = s.exec_id
+    WHERE NOT EXISTS (
+        SELECT 1 FROM correcoes_km_desfazer d WHERE d.lote_id = %s AND d.exec_id = s.exec_id
+    )
+    ORDER BY s.veiculo_id, s.exec_id
+"""
+DESFAZER = """
+    UPDATE execucao_servico es
+       SET quilometragem = d.km_antes
+      FROM correcoes_km_desfazer d
+     WHERE d.lote_id = %s
+       AND es.id = d.exec_id
+       AND es.quilometragem = d.km_depois
+    RETURNING es.veiculo_id
+"""
+
+
+def ler_propostas(arquivo):
+    try:
+        df = pd.read_csv(arquivo, usecols=COLUNAS)
+    except ValueError as e:
+        print(f"❌ {arquivo} não tem as colunas {', '.join(COLUNAS)}: {e}")
+        sys.exit(1)
+    df = df.dropna().astype('int64')
+    conflitos = df.drop_duplicates().duplicated('exec_id', keep=False)
+    if conflitos.any():
+        print(f"❌ Execuções com mais de uma correção no CSV: {sorted(df.loc[conflitos, 'exec_id'].unique().tolist())[:20]}")
+        sys.exit(1)
+    return df.drop_duplicates('exec_id')
+
+
+def recalcular_medias(conn, veiculo_ids):
+    veiculo_ids = sorted(set(veiculo_ids))
+    if not veiculo_ids:
+        return 0
+    print(f"🧮 Recalculando a média de {len(veiculo_ids)} veículos...")
+    recalcular_frota(conn, veiculo_ids)
+    return len(veiculo_ids)
+
+
+def aplicar(conn, arquivo, simular=False):
+    df = ler_propostas(arquivo)
+    print(f"📄 {arquivo}: {len(df)} correções")
+    if df.empty:
+        return
+
+    buffer = io.StringIO()
+    df[COLUNAS].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    try:
+        with conn.cursor() as cursor:
+            # TRUNCATE trava a staging até o fim: duas aplicações não se misturam
+            cursor.execute("TRUNCATE correcoes_km_staging")
+            cursor.copy_expert(f"COPY correcoes_km_staging ({', '.join(COLUNAS)}) FROM STDIN WITH CSV", buffer)
+            cursor.execute("INSERT INTO correcoes_km_lotes (arquivo) VALUES (%s) RETURNING id", (os.path.basename(arquivo),))
+            lote = cursor.fetchone()[0]
+
+            cursor.execute(APLICAR, (lote,))
+            aplicadas = cursor.rowcount
+            cursor.execute("UPDATE correcoes_km_lotes SET registros = %s WHERE id = %s", (aplicadas, lote))
+
+            cursor.execute(IGNORADAS, (lote,))
+            ignoradas = cursor.fetchall()
+            cursor.execute("SELECT DISTINCT veiculo_id FROM correcoes_km_desfazer WHERE lote_id = %s", (lote,))
+            veiculo_ids = [r[0] for r in cursor.fetchall()]
+            cursor.execute("TRUNCATE correcoes_km_staging")
+
+        recalcular_medias(conn, veiculo_ids)
+
+        if simular:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erro: nada foi alterado. {e}")
+        sys.exit(1)
+
+    print(f"\n{'🧪 SIMULADO (desfeito)' if simular else '✅ APLICADO'} - lote {lote}")
+    print(f"  • Correções aplicadas: {aplicadas}")
+    print(f"  • Veículos com média recalculada: {len(veiculo_ids)}")
+    print(f"  • Ignoradas (KM mudou desde a simulação ou execução não existe): {len(ignoradas)}")
+    for exec_id, veiculo_id, km_antes, km_depois, km_banco in ignoradas[:20]:
+        atual = f"{km_banco:,}" if km_banco is not None else "execução não encontrada"
+        print(f"    - exec {exec_id} (veículo {veiculo_id}): esperado {km_antes:,}, no banco {atual}")
+    if len(ignoradas) > 20:
+        print(f"    ... e mais {len(ignoradas) - 20}")
+    if not simular and aplicadas:
+        print(f"\n↩️  Para desfazer: python aplicar_correcoes_simulacao.py --desfazer {lote}")
+
+
+def desfazer(conn, lote):
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT desfeito_em FROM correcoes_km_lotes WHERE id = %s FOR UPDATE", (lote,))
+            linha = cursor.fetchone()
+            if linha is None:
+                print(f"❌ Lote {lote} não existe")
+                sys.exit(1)
+            if linha[0] is not None:
+                print(f"❌ Lote {lote} já foi desfeito em {linha[0]:%d/%m/%Y %H:%M}")
+                sys.exit(1)
+
+            cursor.execute(DESFAZER, (lote,))
+            veiculo_ids = [r[0] for r in cursor.fetchall()]
+            cursor.execute("SELECT COUNT(*) FROM correcoes_km_desfazer WHERE lote_id = %s", (lote,))
+            total = cursor.fetchone()[0]
+            cursor.execute("UPDATE correcoes_km_lotes SET desfeito_em = NOW() WHERE id = %s", (lote,))
+
+        recalcular_medias(conn, veiculo_ids)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erro: nada foi alterado. {e}")
+        sys.exit(1)
+
+    print(f"\n✅ Lote {lote} desfeito: {len(veiculo_ids)} de {total} KMs restauradas")
+    if len(veiculo_ids) < total:
+        print(f"  • {total - len(veiculo_ids)} não foram restauradas: a KM foi alterada de novo depois da correção")
+
+
+def listar(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT id, arquivo, registros, aplicado_em, desfeito_em
+            FROM correcoes_km_lotes ORDER BY id DESC LIMIT 20
+        """)
+        lotes = cursor.fetchall()
+    conn.rollback()
+    if not lotes:
+        print("Nenhum lote aplicado.")
+        return
+    print(f"{'LOTE':>5}  {'APLICADO EM':<16}  {'REGISTROS':>9}  {'DESFEITO EM':<16}  ARQUIVO")
+    for id_lote, arquivo, registros, aplicado_em, desfeito_em in lotes:
+        desfeito = f"{desfeito_em:%d/%m/%Y %H:%M}" if desfeito_em else "-"
+        print(f"{id_lote:>5}  {aplicado_em:%d/%m/%Y %H:%M}  {registros:>9}  {desfeito:<16}  {arquivo}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica (ou desfaz) as correções de KM aprovadas na simulação")
+    parser.add_argument("arquivo", nargs="?", help="CSV SIMULACAO_PROPOSTAS_*.csv revisado")
+    parser.add_argument("--simular", action="store_true", help="aplica, mostra o resultado e desfaz (rollback)")
+    parser.add_argument("--desfazer", type=int, metavar="LOTE", help="restaura as KMs de um lote aplicado")
+    parser.add_argument("--listar", action="store_true", help="lista os últimos lotes")
+    args = parser.parse_args()
+    if not (args.arquivo or args.desfazer or args.listar):
+        parser.error("informe o CSV, --desfazer LOTE ou --listar")
+
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        print("❌ DB_URL não encontrada em .env")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    try:
+        if args.listar:
+            listar(conn)
+        elif args.desfazer:
+            desfazer(conn, args.desfazer)
+        else:
+            aplicar(conn, args.arquivo, simular=args.simular)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
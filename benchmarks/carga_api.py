@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: carga_api.py
+=======================
+Mede requisições por segundo e latência (p50/p95) dos endpoints mais usados
+pelos tablets, pelo painel de TV e pelas telas administrativas:
+
+    /queues
+    /boxes/active
+    /vehicles/by-plate/{placa}
+    /allocation/boxes, /allocation/funcionarios, /catalog/services
+
+Com --condicional cada cliente guarda o ETag recebido e o reenvia em
+If-None-Match, como fazem os tablets; a tabela mostra quantas respostas foram
+304 e os bytes de corpo baixados.
+
+Cada alvo é uma API já em execução. Para comparar antes/depois, suba a versão
+antiga e a nova em portas diferentes (um worker uvicorn em cada) e rode:
+
+    python -m benchmarks.carga_api \\
+        --alvo antes=http://localhost:8000 \\
+        --alvo depois=http://localhost:8001 \\
+        --usuario admin --senha ... --placa ABC-1234 \\
+        --concorrencia 50 --duracao 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+ENDPOINTS = [
+    "/queues",
+    "/boxes/active",
+    "/vehicles/by-plate/{placa}",
+    "/allocation/boxes",
+    "/allocation/funcionarios",
+    "/catalog/services",
+]
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[idx]
+
+
+async def autenticar(client, usuario, senha):
+    resp = await client.post("/auth/login", json={"username": usuario, "password": senha})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def medir_endpoint(client, caminho, concorrencia, duracao, condicional=False):
+    latencias = []
+    erros = 0
+    nao_modificados = 0
+    bytes_corpo = 0
+    fim = time.perf_counter() + duracao
+
+    async def worker():
+        nonlocal erros, nao_modificados, bytes_corpo
+        etag = None
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                cabecalhos = {"If-None-Match": etag} if condicional and etag else None
+                resp = await client.get(caminho, headers=cabecalhos)
+                if resp.status_code >= 400:
+                    erros += 1
+                    continue
+            except httpx.HTTPError:
+                erros += 1
+                continue
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            bytes_corpo += len(resp.content)
+            if resp.status_code == 304:
+                nao_modificados += 1
+            else:
+                etag = resp.headers.get("etag")
+
+    inicio_total = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concorrencia)))
+    tempo_total = time.perf_counter() - inicio_total
+
+    return {
+        "rps": len(latencias) / tempo_total if tempo_total else 0.0,
+        "p50": statistics.median(latencias) if latencias else 0.0,
+        "p95": percentil(latencias, 95),
+        "ok": len(latencias),
+        "erros": erros,
+        "304": nao_modificados,
+        "kb": bytes_corpo / 1024,
+    }
+
+
+async def medir_alvo(base_url, args):
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limites) as client:
+        token = args.token or await autenticar(client, args.usuario, args.senha)
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        resultados = {}
+        for endpoint in ENDPOINTS:
+            caminho = endpoint.format(placa=args.placa)
+            # Aquecimento: abre conexões do pool e do cliente antes de medir
+            await medir_endpoint(client, caminho, args.concorrencia, 1)
+            resultados[endpoint] = await medir_endpoint(
+                client, caminho, args.concorrencia, args.duracao, args.condicional
+            )
+        return resultados
+
+
+def imprimir_tabela(resultados_por_alvo):
+    print(
+        f"\n{'ENDPOINT':<30} {'ALVO':<10} {'REQ/S':>10} {'P50 (ms)':>10} {'P95 (ms)':>10} "
+        f"{'OK':>8} {'ERROS':>7} {'304':>8} {'KB':>10}"
+    )
+    print("-" * 110)
+    for endpoint in ENDPOINTS:
+        for nome, resultados in resultados_por_alvo.items():
+            r = resultados[endpoint]
+            print(
+                f"{endpoint:<30} {nome:<10} {r['rps']:>10.1f} {r['p50']:>10.1f} {r['p95']:>10.1f} "
+                f"{r['ok']:>8} {r['erros']:>7} {r['304']:>8} {r['kb']:>10.0f}"
+            )
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga da API do pátio")
+    parser.add_argument("--alvo", action="append", required=True, help="nome=url, pode repetir (ex: antes=http://localhost:8000)")
+    parser.add_argument("--usuario", help="usuário para /auth/login")
+    parser.add_argument("--senha", help="senha para /auth/login")
+    parser.add_argument("--token", help="JWT já emitido (dispensa usuário/senha)")
+    parser.add_argument("--placa", default="ABC-1234", help="placa existente para /vehicles/by-plate")
+    parser.add_argument("--concorrencia", type=int, default=50)
+    parser.add_argument("--duracao", type=float, default=20, help="segundos por endpoint")
+    parser.add_argument("--condicional", action="store_true", help="reenvia o ETag em If-None-Match")
+    args = parser.parse_args()
+
+    if not args.token and not (args.usuario and args.senha):
+        parser.error("informe --token ou --usuario/--senha")
+
+    resultados_por_alvo = {}
+    for alvo in args.alvo:
+        nome, _, url = alvo.partition("=")
+        print(f"⏱️  Medindo {nome} ({url})...")
+        resultados_por_alvo[nome] = asyncio.run(medir_alvo(url, args))
+
+    imprimir_tabela(resultados_por_alvo)
+
+
+if __name__ == "__main__":
+    main()
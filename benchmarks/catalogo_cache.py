@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: catalogo_cache.py
+============================
+Catálogo de serviços sem e com o cache do processo (catalogo.py):
+
+    3 consultas       -> como utils.get_catalogo_servicos() fazia a cada rerun
+    cache (acerto)    -> obter_catalogo() dentro do TTL
+    cache (conferido) -> TTL vencido, versão igual: só a busca da versão
+    área por UNION    -> como /boxes/{id}/services achava a área do serviço
+    área por dict     -> Catalogo.area_de()
+
+    python -m benchmarks.seed --escala 1 --recriar
+    python -m benchmarks.catalogo_cache --repeticoes 500
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import psycopg
+
+from catalogo import CONSULTA_CATALOGO, CacheCatalogo, cache, obter_catalogo
+
+TRES_CONSULTAS = [
+    "SELECT nome FROM servicos_borracharia ORDER BY nome",
+    "SELECT nome FROM servicos_alinhamento ORDER BY nome",
+    "SELECT nome FROM servicos_manutencao ORDER BY nome",
+]
+
+AREA_UNION = """
+    SELECT 'borracharia' FROM servicos_borracharia WHERE nome = %s
+    UNION ALL
+    SELECT 'alinhamento' FROM servicos_alinhamento WHERE nome = %s
+    UNION ALL
+    SELECT 'manutencao' FROM servicos_manutencao WHERE nome = %s
+    LIMIT 1
+"""
+
+
+def cronometrar(funcao, repeticoes):
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        amostras.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(amostras)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do cache do catálogo de serviços")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_URL"), help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--repeticoes", type=int, default=500)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        abrir = lambda: conn  # noqa: E731 - mesma conexão em todas as chamadas
+        soltar = lambda _: None  # noqa: E731
+
+        def tres_consultas():
+            for sql in TRES_CONSULTAS:
+                conn.execute(sql).fetchall()
+
+        catalogo = obter_catalogo(abrir, soltar)
+        nome = catalogo.todos[len(catalogo.todos) // 2] if catalogo.todos else "Alinhamento"
+
+        def conferido():
+            cache.invalidar()
+            obter_catalogo(abrir, soltar)
+
+        resultados = {
+            "3 consultas": cronometrar(tres_consultas, args.repeticoes),
+            "cache (acerto)": cronometrar(lambda: obter_catalogo(abrir, soltar), args.repeticoes),
+            "cache (conferido)": cronometrar(conferido, args.repeticoes),
+            "área por UNION": cronometrar(lambda: conn.execute(AREA_UNION, (nome,) * 3).fetchone(), args.repeticoes),
+            "área por dict": cronometrar(lambda: catalogo.area_de(nome), args.repeticoes),
+        }
+        frio = CacheCatalogo()
+        inicio = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute(CONSULTA_CATALOGO)
+            frio.atualizar(cursor.fetchall(), None)
+        resultados["cache (carga fria)"] = (time.perf_counter() - inicio) * 1000
+
+    print(f"\n{'OPERAÇÃO':<22} {'P50 (ms)':>12}")
+    print("-" * 36)
+    for nome_op, ms in resultados.items():
+        print(f"{nome_op:<22} {ms:>12.4f}")
+    print(f"\nItens no catálogo: {len(catalogo.area_por_nome)} | cargas do cache: {cache.cargas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: completed_stream.py
+==============================
+/services/completed de uma API em execução num período longo, nas três formas:
+
+    lista     -> GET padrão (lista JSON, agora transmitida do cursor no servidor)
+    ndjson    -> Accept: application/x-ndjson
+    paginas   -> ?limit=N seguindo X-Next-Cursor até o fim
+
+Para cada forma mede o tempo até o primeiro byte, o tempo total, as linhas e os
+bytes recebidos e, com --pid (processo uvicorn, Linux), o pico de RSS do
+servidor durante a requisição.
+
+    python -m benchmarks.seed --escala 10 --recriar
+    python -m benchmarks.completed_stream --api http://localhost:8000 \\
+        --usuario admin --senha ... --inicio 2020-01-01 --pid $(pgrep -f uvicorn | head -1)
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.carga_api import autenticar
+
+
+def rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+async def amostrar_rss(pid, pico, parar):
+    while not parar.is_set():
+        atual = rss_kb(pid)
+        if atual is not None:
+            pico[0] = max(pico[0], atual)
+        await asyncio.sleep(0.01)
+
+
+async def medir(client, forma, params, limite, pid):
+    pico, parar = [0], asyncio.Event()
+    amostrador = asyncio.create_task(amostrar_rss(pid, pico, parar)) if pid else None
+    rss_inicial = rss_kb(pid) if pid else None
+    inicio = time.perf_counter()
+    primeiro_byte = None
+    linhas = bytes_total = paginas = 0
+
+    cursor = None
+    while True:
+        cabecalhos = {"Accept": "application/x-ndjson"} if forma == "ndjson" else {}
+        consulta = dict(params)
+        if forma == "paginas":
+            consulta["limit"] = limite
+            if cursor:
+                consulta["cursor"] = cursor
+        async with client.stream("GET", "/services/completed", params=consulta, headers=cabecalhos) as resp:
+            resp.raise_for_status()
+            corpo = bytearray()
+            async for pedaco in resp.aiter_bytes():
+                if primeiro_byte is None:
+                    primeiro_byte = (time.perf_counter() - inicio) * 1000
+                bytes_total += len(pedaco)
+                corpo.extend(pedaco)
+            paginas += 1
+            if forma == "ndjson":
+                linhas += corpo.count(b"\n")
+            else:
+                linhas += len(json.loads(corpo))
+            cursor = resp.headers.get("x-next-cursor")
+        if forma != "paginas" or not cursor:
+            break
+
+    total = (time.perf_counter() - inicio) * 1000
+    if amostrador:
+        parar.set()
+        await amostrador
+    return {
+        "ttfb_ms": primeiro_byte or 0.0,
+        "total_ms": total,
+        "linhas": linhas,
+        "mb": bytes_total / 1024 / 1024,
+        "paginas": paginas,
+        "rss_extra_mb": (pico[0] - rss_inicial) / 1024 if pid and rss_inicial else None,
+    }
+
+
+async def executar(args):
+    async with httpx.AsyncClient(base_url=args.api, timeout=None) as client:
+        token = args.token or await autenticar(client, args.usuario, args.senha)
+        client.headers["Authorization"] = f"Bearer {token}"
+        params = {"start_date": args.inicio}
+        if args.fim:
+            params["end_date"] = args.fim
+
+        print(f"\n{'FORMA':<10} {'TTFB (ms)':>10} {'TOTAL (ms)':>11} {'LINHAS':>9} {'MB':>8} {'PÁGINAS':>8} {'RSS+ (MB)':>10}")
+        print("-" * 72)
+        for forma in ("lista", "ndjson", "paginas"):
+            r = await medir(client, forma, params, args.limit, args.pid)
+            rss = f"{r['rss_extra_mb']:.1f}" if r["rss_extra_mb"] is not None else "-"
+            print(
+                f"{forma:<10} {r['ttfb_ms']:>10.1f} {r['total_ms']:>11.1f} {r['linhas']:>9} "
+                f"{r['mb']:>8.2f} {r['paginas']:>8} {rss:>10}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Formas de resposta de /services/completed")
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--usuario", help="usuário para /auth/login")
+    parser.add_argument("--senha", help="senha para /auth/login")
+    parser.add_argument("--token", help="JWT já emitido (dispensa usuário/senha)")
+    parser.add_argument("--inicio", default="2020-01-01", help="start_date (AAAA-MM-DD)")
+    parser.add_argument("--fim", help="end_date (AAAA-MM-DD), padrão: hoje")
+    parser.add_argument("--limit", type=int, default=500, help="execuções por página no modo paginado")
+    parser.add_argument("--pid", type=int, help="PID do uvicorn para medir RSS (Linux)")
+    args = parser.parse_args()
+
+    if not args.token and not (args.usuario and args.senha):
+        parser.error("informe --token ou --usuario/--senha")
+
+    asyncio.run(executar(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: correcao_digitos.py
+==============================
+Busca do melhor grupo para +1.000.000 (simular_correcoes_digitos_v3.py):
+
+    força bruta -> todos os subconjuntos com itertools.combinations e
+                   avaliar_grupo em Python (a versão antiga)
+    motor       -> correcao_digitos.melhor_grupo: só candidatos que mantêm
+                   a KM não decrescente, score vetorizado
+
+Em históricos sintéticos com KMs sem o milhão, zeradas e digitadas errado,
+confere que os dois escolhem o mesmo grupo com o mesmo score (e a mesma
+mediana histórica) e mede o tempo por tamanho de histórico. A força bruta
+só roda até --max-bruta visitas (2^n subconjuntos). Não usa banco.
+
+    python -m benchmarks.correcao_digitos
+    python -m benchmarks.correcao_digitos --casos 500 --tamanhos 4 8 12 50 200
+"""
+import argparse
+import datetime as dt
+import random
+import sys
+import time
+
+import numpy as np
+
+from correcao_digitos import (
+    descrescentes, intervalos, km_dia_historico, km_dia_historico_antigo,
+    melhor_grupo, melhor_grupo_forca_bruta,
+)
+
+
+def historico(rng, visitas):
+    """KMs acima de 1.000.000 com ~25% digitadas sem o milhão e alguns erros."""
+    dia = np.cumsum([rng.choice([0, 1, 7, 30, 60]) for _ in range(visitas)])
+    taxa = rng.choice([40, 100, 200, 400])
+    km = rng.randint(1_000_000, 1_900_000)
+    kms = []
+    for i in range(visitas):
+        if i:
+            km += int(taxa * max(1, dia[i] - dia[i - 1]) * rng.uniform(0.6, 1.4))
+        sorteio = rng.random()
+        if sorteio < 0.25:
+            kms.append(km - 1_000_000)
+        elif sorteio < 0.28:
+            kms.append(0)
+        elif sorteio < 0.31:
+            kms.append(rng.randint(1, 400_000))
+        else:
+            kms.append(km)
+    return np.array(kms, dtype=np.int64), dia
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correção de dígito: força bruta x motor")
+    parser.add_argument("--casos", type=int, default=200, help="históricos por tamanho")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[3, 5, 8, 11, 14, 50, 200])
+    parser.add_argument("--max-bruta", type=int, default=14)
+    parser.add_argument("--semente", type=int, default=2024)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semente)
+    divergencias = 0
+    print(f"\n{'VISITAS':>8} {'CASOS':>6} {'força bruta (ms)':>18} {'motor (ms)':>12} {'ganho':>8}")
+    print("-" * 58)
+    for tamanho in args.tamanhos:
+        casos = []
+        while len(casos) < args.casos:
+            kms, dia = historico(rng, tamanho)
+            if len(descrescentes(kms)):
+                casos.append((kms, dia))
+
+        tempo_motor = tempo_bruta = 0.0
+        for kms, dia in casos:
+            dias = intervalos(dia)
+            historico_km_dia = km_dia_historico(kms, dia)
+
+            inicio = time.perf_counter()
+            resultado = melhor_grupo(kms, dias, historico_km_dia)
+            tempo_motor += time.perf_counter() - inicio
+
+            if tamanho > args.max_bruta:
+                continue
+            datas = [dt.date(2020, 1, 1) + dt.timedelta(days=int(d)) for d in dia]
+            antigo = km_dia_historico_antigo(kms.tolist(), datas)
+            inicio = time.perf_counter()
+            esperado = melhor_grupo_forca_bruta(kms.tolist(), dias.tolist(), antigo)
+            tempo_bruta += time.perf_counter() - inicio
+            if resultado != esperado or (antigo is None) != (historico_km_dia is None) or (antigo and abs(antigo - historico_km_dia) > 1e-9):
+                divergencias += 1
+                if divergencias <= 10:
+                    print(f"DIVERGÊNCIA: {kms.tolist()} dias={dias.tolist()}: motor {resultado}, força bruta {esperado}")
+
+        motor_ms = tempo_motor / len(casos) * 1000
+        if tamanho > args.max_bruta:
+            print(f"{tamanho:>8} {len(casos):>6} {'-':>18} {motor_ms:>12.2f} {'-':>8}")
+        else:
+            bruta_ms = tempo_bruta / len(casos) * 1000
+            print(f"{tamanho:>8} {len(casos):>6} {bruta_ms:>18.2f} {motor_ms:>12.2f} {bruta_ms / motor_ms:>7.1f}x")
+
+    print(f"\nDivergências: {divergencias}")
+    sys.exit(1 if divergencias else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: finalizacao_lote.py
+==============================
+Finalização de um box com 1, 10 e 50 serviços:
+
+    por serviço -> um UPDATE por linha de servicos_solicitados (como era)
+    em lote     -> um UPDATE ... FROM unnest(...) (finalize_servicos do registro)
+
+Mais as duas escritas fixas (execucao_servico e boxes), que são iguais nos dois
+casos. Tudo roda em transações desfeitas (rollback); o banco não é alterado.
+
+    python -m benchmarks.seed --escala 1 --recriar
+    python -m benchmarks.finalizacao_lote --servicos 1 10 50
+"""
+
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime
+
+import psycopg
+
+from api.statements import REGISTRO
+
+UPDATE_SERVICO = """
+    UPDATE servicos_solicitados
+       SET quantidade = %s,
+           observacao_execucao = %s,
+           status = 'finalizado',
+           data_atualizacao = %s
+     WHERE id = %s AND area = %s
+"""
+UPDATE_EXECUCAO = """
+    UPDATE execucao_servico
+       SET status = 'finalizado', fim_execucao = %s, usuario_finalizacao_id = %s
+     WHERE id = %s
+"""
+
+
+def fechar_execucao(cursor, execucao_id, box_id, agora):
+    cursor.execute(UPDATE_EXECUCAO, (agora, None, execucao_id))
+    cursor.execute("UPDATE boxes SET ocupado = FALSE WHERE id = %s", (box_id,))
+
+
+def por_servico(cursor, servicos, execucao_id, box_id):
+    for servico_id, area, quantidade in servicos:
+        cursor.execute(UPDATE_SERVICO, (quantidade, "", datetime.now(), servico_id, area))
+    fechar_execucao(cursor, execucao_id, box_id, datetime.now())
+
+
+def em_lote(cursor, servicos, execucao_id, box_id):
+    agora = datetime.now()
+    ids, areas, quantidades = (list(coluna) for coluna in zip(*servicos))
+    cursor.execute(REGISTRO["finalize_servicos"], ("", agora, ids, areas, quantidades))
+    fechar_execucao(cursor, execucao_id, box_id, agora)
+
+
+def cronometrar(conn, funcao, servicos, execucao_id, box_id, repeticoes):
+    amostras = []
+    with conn.cursor() as cursor:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            with conn.transaction(force_rollback=True):
+                funcao(cursor, servicos, execucao_id, box_id)
+            amostras.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(amostras)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finalização de box por serviço x em lote")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_URL"), help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--servicos", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    with psycopg.connect(args.dsn) as conn:
+        execucao = conn.execute("SELECT id, box_id FROM execucao_servico ORDER BY id DESC LIMIT 1").fetchone()
+        servicos = conn.execute(
+            "SELECT id, area, quantidade FROM servicos_solicitados ORDER BY id DESC LIMIT %s",
+            (max(args.servicos),),
+        ).fetchall()
+        conn.commit()
+        if not execucao or len(servicos) < max(args.servicos):
+            parser.error("banco sem execuções/serviços suficientes; rode benchmarks.seed")
+        execucao_id, box_id = execucao
+
+        print(f"\n{'SERVIÇOS':>9} {'POR SERVIÇO (ms)':>18} {'EM LOTE (ms)':>14} {'GANHO':>8}")
+        print("-" * 52)
+        for n in args.servicos:
+            amostra = servicos[:n]
+            antes = cronometrar(conn, por_servico, amostra, execucao_id, box_id, args.repeticoes)
+            depois = cronometrar(conn, em_lote, amostra, execucao_id, box_id, args.repeticoes)
+            print(f"{n:>9} {antes:>18.2f} {depois:>14.2f} {antes / depois:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
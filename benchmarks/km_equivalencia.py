@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+EQUIVALÊNCIA: km_media.py
+=========================
+Confere, em históricos aleatórios, que todas as formas do motor de média de
+KM/dia dão o mesmo número que a regra escrita do jeito mais simples possível
+(referencia(), abaixo):
+
+    media_km        -> núcleo NumPy de um veículo (API, páginas, scripts)
+    do_historico    -> EstadoKm montado do histórico (reconstruir)
+    incremental     -> EstadoKm.registrar visita a visita, reconstruindo só
+                       quando ele recusa (registrar_finalizacao)
+    medias_frota    -> todos os históricos de uma vez (recalcular_frota)
+
+Além da igualdade, verifica propriedades da regra: média nunca negativa,
+somar uma constante a todas as KMs não muda a média, multiplicar as KMs
+por k multiplica a média por k, e visitas anteriores às 3 últimas válidas
+não influenciam.
+
+Os históricos misturam KM crescente, repetida, voltando (erro de digitação)
+e visitas no mesmo dia. Não usa banco.
+
+    python -m benchmarks.km_equivalencia
+    python -m benchmarks.km_equivalencia --casos 20000 --semente 7
+"""
+import argparse
+import datetime as dt
+import math
+import random
+import sys
+
+import numpy as np
+
+from km_media import MAX_VISITAS, EstadoKm, media_km, medias_frota, visitas_validas
+
+
+def referencia(visitas):
+    """A regra de km_media.py em Python puro, sem nenhuma otimização."""
+    sem_repetidas = [
+        (data, km) for i, (data, km) in enumerate(visitas)
+        if all(outro_km != km for _, outro_km in visitas[i + 1:])
+    ]
+    validas = []
+    for data, km in sem_repetidas:
+        if all(km > anterior for _, anterior in validas):
+            validas.append((data, km))
+    ultimas = validas[-MAX_VISITAS:]
+    if len(ultimas) < 2:
+        return None
+    delta_km = ultimas[-1][1] - ultimas[0][1]
+    delta_dias = (ultimas[-1][0] - ultimas[0][0]).days
+    if delta_dias > 0 and delta_km >= 0:
+        return float(delta_km / delta_dias)
+    return None
+
+
+def historico(rng, visitas_max):
+    data = dt.datetime(2022, 1, 1) + dt.timedelta(days=rng.randint(0, 365))
+    km = rng.randint(1, 300000)
+    visitas = []
+    for _ in range(rng.randint(0, visitas_max)):
+        data += dt.timedelta(days=rng.choice([0, 0, 1, 7, 30, 90]), hours=rng.randint(0, 23), minutes=rng.randint(0, 59))
+        sorteio = rng.random()
+        if sorteio < 0.6:
+            km += rng.randint(1, 20000)
+        elif sorteio < 0.75 and visitas:
+            km = rng.choice(visitas)[1]
+        elif sorteio < 0.9:
+            km = max(1, km - rng.randint(1, 50000))
+        else:
+            km = km * 10 + rng.randint(0, 9)
+        visitas.append((data, km))
+    return visitas
+
+
+def mesmo(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return math.isclose(a, b, rel_tol=1e-12)
+
+
+def incremental(visitas):
+    estado = EstadoKm()
+    for i, (data, km) in enumerate(visitas):
+        if not estado.registrar(data, km):
+            estado = EstadoKm.do_historico(visitas[:i + 1])
+    return estado.media()
+
+
+def verificar(visitas):
+    """Lista de (verificação, obtido, esperado) que falharam."""
+    esperado = referencia(visitas)
+    datas = [d for d, _ in visitas]
+    kms = [k for _, k in visitas]
+    falhas = []
+
+    for nome, obtido in (
+        ("media_km", media_km(datas, kms)),
+        ("do_historico", EstadoKm.do_historico(visitas).media()),
+        ("incremental", incremental(visitas)),
+    ):
+        if not mesmo(obtido, esperado):
+            falhas.append((nome, obtido, esperado))
+
+    if esperado is not None and esperado < 0:
+        falhas.append(("nunca negativa", esperado, ">= 0"))
+    deslocado = media_km(datas, [k + 12345 for k in kms])
+    if not mesmo(deslocado, esperado):
+        falhas.append(("KM + constante", deslocado, esperado))
+    escalado = media_km(datas, [k * 3 for k in kms])
+    if not mesmo(escalado, None if esperado is None else esperado * 3):
+        falhas.append(("KM x 3", escalado, esperado))
+    validas = visitas_validas(kms)
+    if len(validas) > MAX_VISITAS:
+        # Tudo antes das 3 últimas válidas pode sumir sem mudar a média
+        recorte = visitas[validas[-MAX_VISITAS]:]
+        obtido = media_km([d for d, _ in recorte], [k for _, k in recorte])
+        if not mesmo(obtido, esperado):
+            falhas.append(("só as últimas válidas", obtido, esperado))
+    return falhas
+
+
+def verificar_frota(historicos):
+    """medias_frota com todos os históricos juntos, numa chamada só."""
+    linhas = [(v, d, k) for v, visitas in enumerate(historicos) for d, k in visitas]
+    if not linhas:
+        return []
+    veiculos = np.array([v for v, _, _ in linhas])
+    datas = np.array([d for _, d, _ in linhas], dtype="datetime64[us]")
+    kms = np.array([k for _, _, k in linhas])
+    # Embaralha e volta à ordem de CONSULTA_FROTA (veiculo, fim, id), como o banco entrega
+    embaralhado = np.random.default_rng(len(linhas)).permutation(len(linhas))
+    ordem = embaralhado[np.lexsort((embaralhado, datas[embaralhado], veiculos[embaralhado]))]
+    resultado = medias_frota(veiculos[ordem], datas[ordem], kms[ordem])
+    medias = dict(zip(resultado.veiculo_ids.tolist(), resultado.medias.tolist()))
+    falhas = []
+    for v, visitas in enumerate(historicos):
+        if not visitas:
+            continue
+        obtido = medias.get(v)
+        obtido = None if obtido is None or math.isnan(obtido) else obtido
+        esperado = referencia(visitas)
+        if not mesmo(obtido, esperado):
+            falhas.append((v, obtido, esperado))
+    return falhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalência das formas do motor de média de KM")
+    parser.add_argument("--casos", type=int, default=5000)
+    parser.add_argument("--visitas", type=int, default=40, help="máximo de visitas por histórico")
+    parser.add_argument("--semente", type=int, default=2024)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semente)
+    historicos = [historico(rng, args.visitas) for _ in range(args.casos)]
+    # Casos de borda fixos além dos sorteados
+    base = dt.datetime(2024, 5, 1, 8)
+    historicos += [
+        [],
+        [(base, 1000)],
+        [(base, 1000), (base + dt.timedelta(hours=5), 2000)],
+        [(base, 1000), (base + dt.timedelta(days=1), 1000)],
+        [(base, 5000), (base + dt.timedelta(days=2), 1000), (base + dt.timedelta(days=4), 3000)],
+        [(base, 1000), (base + dt.timedelta(days=1), 2000), (base + dt.timedelta(days=2), 1000)],
+    ]
+
+    falhas = 0
+    for visitas in historicos:
+        for nome, obtido, esperado in verificar(visitas):
+            falhas += 1
+            if falhas <= 10:
+                print(f"FALHA {nome}: obtido {obtido}, esperado {esperado}\n  {visitas}")
+    for v, obtido, esperado in verificar_frota(historicos):
+        falhas += 1
+        if falhas <= 10:
+            print(f"FALHA medias_frota: obtido {obtido}, esperado {esperado}\n  {historicos[v]}")
+
+    com_media = sum(referencia(v) is not None for v in historicos)
+    print(f"\n{len(historicos)} históricos ({com_media} com média), semente {args.semente}: {falhas} falhas")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: km_motor.py
+======================
+Tempo por veículo do cálculo da média de KM/dia, sem banco, em históricos
+sintéticos de 2 a 500 visitas:
+
+    pandas        -> como core_utils/utils faziam: DataFrame, drop_duplicates
+                     e iterrows
+    media_km      -> núcleo NumPy de km_media (API, páginas, scripts)
+    do_historico  -> EstadoKm montado do histórico (reconstruir)
+    registrar     -> uma visita nova sobre o estado salvo (registrar_finalizacao)
+    frota         -> medias_frota com 1000 veículos do mesmo tamanho,
+                     dividido por 1000
+
+A equivalência entre eles é conferida por benchmarks/km_equivalencia.py.
+
+    python -m benchmarks.km_motor
+    python -m benchmarks.km_motor --tamanhos 2 10 500
+"""
+import argparse
+import datetime as dt
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from km_media import EstadoKm, media_km, medias_frota
+
+VEICULOS_FROTA = 1000
+
+
+def antes(df_veiculo):
+    """O cálculo de core_utils.recalcular_media_veiculo antes de km_media."""
+    df_veiculo = df_veiculo.drop_duplicates(subset=['quilometragem'], keep='last')
+    last_valid_km = -1
+    valid_indices = []
+    for index, row in df_veiculo.iterrows():
+        if row['quilometragem'] > last_valid_km:
+            valid_indices.append(index)
+            last_valid_km = row['quilometragem']
+    valid_group = df_veiculo.loc[valid_indices].iloc[-3:]
+    if len(valid_group) < 2:
+        return None
+    delta_km = int(valid_group.iloc[-1]['quilometragem']) - int(valid_group.iloc[0]['quilometragem'])
+    delta_dias = (valid_group.iloc[-1]['fim_execucao'] - valid_group.iloc[0]['fim_execucao']).days
+    return delta_km / delta_dias if delta_dias > 0 and delta_km >= 0 else None
+
+
+def historico(rng, visitas):
+    """KM quase sempre crescente, com ~10% de repetidas ou voltando."""
+    dias = rng.integers(1, 60, visitas).cumsum()
+    datas = [dt.datetime(2020, 1, 1) + dt.timedelta(days=int(d), hours=8) for d in dias]
+    passos = rng.integers(100, 5000, visitas)
+    passos[rng.random(visitas) < 0.1] = -2000
+    kms = (passos.cumsum() + 100000).tolist()
+    return datas, kms
+
+
+def medir(funcao, repeticoes):
+    """Melhor de 5 rodadas, em microssegundos por chamada."""
+    return min(timeit.repeat(funcao, number=repeticoes, repeat=5)) / repeticoes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark do motor de média de KM por tamanho de histórico")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[2, 5, 10, 50, 100, 500])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"\n{'VISITAS':>8} {'pandas':>12} {'media_km':>12} {'do_historico':>14} {'registrar':>12} {'frota':>12}   (µs por veículo)")
+    print("-" * 80)
+    for tamanho in args.tamanhos:
+        datas, kms = historico(rng, tamanho)
+        visitas = list(zip(datas, kms))
+        df = pd.DataFrame({"fim_execucao": datas, "quilometragem": kms})
+        estado = EstadoKm.do_historico(visitas[:-1])
+        nova_data, novo_km = visitas[-1]
+
+        frota = [historico(rng, tamanho) for _ in range(VEICULOS_FROTA)]
+        veiculos = np.repeat(np.arange(VEICULOS_FROTA), tamanho)
+        frota_datas = np.array([d for ds, _ in frota for d in ds], dtype="datetime64[us]")
+        frota_kms = np.array([k for _, ks in frota for k in ks])
+
+        repeticoes = max(5, 2000 // tamanho)
+        tempos = [
+            medir(lambda: antes(df), max(2, repeticoes // 20)),
+            medir(lambda: media_km(datas, kms), repeticoes),
+            medir(lambda: EstadoKm.do_historico(visitas).media(), repeticoes),
+            medir(lambda: EstadoKm(estado.datas, estado.kms, estado.ultima_fim, estado.ultimo_km).registrar(nova_data, novo_km), 2000),
+            medir(lambda: medias_frota(veiculos, frota_datas, frota_kms), 3) / VEICULOS_FROTA,
+        ]
+        print(f"{tamanho:>8} {tempos[0]:>12.1f} {tempos[1]:>12.1f} {tempos[2]:>14.1f} {tempos[3]:>12.1f} {tempos[4]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: km_plausibilidade.py
+===============================
+Conferência da KM no cadastro (km_plausibilidade.conferir), sem banco, numa
+frota sintética carregada no CacheProjecoes:
+
+- custo por cadastro (busca no cache + conferir), médio e p99, em µs;
+- o que cada tipo de KM digitada dispara:
+
+    correta          -> KM dentro do ritmo do veículo (não deve alertar)
+    sem_milhao       -> KM correta - 1.000.000 (esperado MILHAO_FALTANDO)
+    milhao_a_mais    -> KM correta + 1.000.000 (esperado MILHAO_SOBRANDO)
+    menor            -> KM abaixo da última visita (esperado DESCRESCENTE)
+    digito_a_mais    -> KM correta x 10 (esperado ACIMA_PROJECAO ou MILHAO_SOBRANDO)
+
+    python -m benchmarks.km_plausibilidade
+    python -m benchmarks.km_plausibilidade --veiculos 50000 --cadastros 200000
+"""
+import argparse
+import datetime as dt
+import random
+import time
+from collections import Counter
+
+from km_plausibilidade import CacheProjecoes, conferir
+
+TIPOS = ("correta", "sem_milhao", "milhao_a_mais", "menor", "digito_a_mais")
+
+
+def frota(rng, veiculos, hoje):
+    """Linhas no formato de CONSULTA_PROJECOES: (veiculo_id, data, km, media, atualizado_em)."""
+    linhas = []
+    for veiculo_id in range(1, veiculos + 1):
+        data = hoje - dt.timedelta(days=rng.randint(1, 120))
+        media = rng.choice([None, 40.0, 120.0, 300.0, 600.0])
+        km = rng.randint(1_050_000, 1_900_000) if rng.random() < 0.3 else rng.randint(20_000, 900_000)
+        linhas.append((veiculo_id, data, km, media, data))
+    return linhas
+
+
+def km_digitada(rng, tipo, projecao, hoje):
+    dias = (hoje - projecao.data).days
+    ritmo = projecao.media or 150.0
+    correta = projecao.km + int(dias * ritmo * rng.uniform(0.5, 1.5))
+    if tipo == "correta":
+        return correta
+    if tipo == "sem_milhao":
+        return correta - 1_000_000
+    if tipo == "milhao_a_mais":
+        return correta + 1_000_000
+    if tipo == "menor":
+        return max(1, projecao.km - rng.randint(1_000, 50_000))
+    return correta * 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conferência da KM no cadastro")
+    parser.add_argument("--veiculos", type=int, default=20000)
+    parser.add_argument("--cadastros", type=int, default=100000)
+    parser.add_argument("--semente", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semente)
+    hoje = dt.datetime(2025, 6, 1, 10, 0)
+    cache = CacheProjecoes()
+    linhas = frota(rng, args.veiculos, hoje)
+    inicio = time.perf_counter()
+    cache.atualizar(linhas, versao=1, desde=None)
+    print(f"\nCarga do cache: {args.veiculos:,} veículos em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    casos = []
+    for _ in range(args.cadastros):
+        veiculo_id = rng.randint(1, args.veiculos)
+        tipo = rng.choice(TIPOS)
+        km = km_digitada(rng, tipo, cache.obter(veiculo_id), hoje)
+        if km > 0:
+            casos.append((veiculo_id, km, tipo))
+
+    tempos = []
+    resultado = {tipo: Counter() for tipo in TIPOS}
+    for veiculo_id, km, tipo in casos:
+        t0 = time.perf_counter()
+        alertas = conferir(cache.obter(veiculo_id), km, hoje)
+        tempos.append(time.perf_counter() - t0)
+        resultado[tipo][alertas[0].codigo if alertas else "OK"] += 1
+
+    tempos.sort()
+    media_us = sum(tempos) / len(tempos) * 1e6
+    p99_us = tempos[int(len(tempos) * 0.99)] * 1e6
+    print(f"Conferência: {len(casos):,} cadastros · média {media_us:.1f} µs · p99 {p99_us:.1f} µs\n")
+
+    print(f"{'KM DIGITADA':<16} {'CASOS':>7}  ALERTAS")
+    print("-" * 80)
+    for tipo in TIPOS:
+        total = sum(resultado[tipo].values())
+        detalhe = ", ".join(f"{codigo} {n / total:.1%}" for codigo, n in resultado[tipo].most_common())
+        print(f"{tipo:<16} {total:>7}  {detalhe}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: medias_frota.py
+==========================
+Recálculo da média de KM/dia da frota inteira:
+
+    por veículo -> como calcular_medias_antigas.py fazia: uma consulta, um
+                   commit por veículo (core_utils -> km_media.reconstruir)
+    frota       -> km_media.recalcular_frota(): uma leitura, NumPy, COPY e
+                   UPDATE ... FROM
+
+Os dois rodam em transações desfeitas (rollback) e o banco não é alterado.
+Com --sintetico N mede só o motor NumPy (medias_frota) sobre N linhas
+geradas, sem banco.
+
+    python -m benchmarks.seed --escala 10 --recriar
+    python -m benchmarks.medias_frota
+    python -m benchmarks.medias_frota --sintetico 5000000
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import psycopg2
+
+from km_media import medias_frota, recalcular_frota
+
+
+def por_veiculo(conn, limite):
+    """Só os `limite` primeiros veículos; o total é estimado pela proporção."""
+    from core_utils import recalcular_media_veiculo
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT DISTINCT veiculo_id FROM execucao_servico ORDER BY veiculo_id")
+        veiculo_ids = [r[0] for r in cursor.fetchall()]
+    conn.rollback()
+    amostra = veiculo_ids[:limite]
+    inicio = time.perf_counter()
+    # recalcular_media_veiculo faz commit a cada veículo: salva e restaura as médias
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE TEMP TABLE bench_medias AS SELECT id, media_km_diaria FROM veiculos WHERE id = ANY(%s)", (amostra,))
+    conn.commit()
+    try:
+        for veiculo_id in amostra:
+            recalcular_media_veiculo(conn, veiculo_id)
+        duracao = time.perf_counter() - inicio
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE veiculos v SET media_km_diaria = b.media_km_diaria FROM bench_medias b WHERE v.id = b.id")
+            cursor.execute("DROP TABLE bench_medias")
+        conn.commit()
+    return duracao * len(veiculo_ids) / max(1, len(amostra)), len(veiculo_ids)
+
+
+def frota(conn):
+    inicio = time.perf_counter()
+    try:
+        resultado = recalcular_frota(conn)
+        return time.perf_counter() - inicio, len(resultado.veiculo_ids)
+    finally:
+        conn.rollback()
+
+
+def sintetico(linhas, visitas_por_veiculo=8):
+    rng = np.random.default_rng(42)
+    veiculos = np.repeat(np.arange(linhas // visitas_por_veiculo + 1), visitas_por_veiculo)[:linhas]
+    dias = rng.integers(0, 60, linhas).cumsum()
+    datas = np.datetime64("2020-01-01", "us") + dias.astype("timedelta64[D]")
+    kms = rng.integers(-500, 8000, linhas).cumsum() + 100000
+    inicio = time.perf_counter()
+    resultado = medias_frota(veiculos, datas, kms)
+    return time.perf_counter() - inicio, len(resultado.veiculo_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recálculo de médias de KM: por veículo x frota inteira")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_URL"), help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--amostra", type=int, default=300, help="veículos medidos no modo por veículo")
+    parser.add_argument("--sintetico", type=int, help="só o motor NumPy, com N linhas geradas")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        segundos, veiculos = sintetico(args.sintetico)
+        print(f"\nmedias_frota: {args.sintetico} linhas, {veiculos} veículos em {segundos:.2f} s")
+        return
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        antes, total = por_veiculo(conn, args.amostra)
+        depois, _ = frota(conn)
+    finally:
+        conn.close()
+
+    print(f"\n{'MODO':<14} {'TEMPO (s)':>12}")
+    print("-" * 28)
+    print(f"{'por veículo':<14} {antes:>12.1f}   (estimado de {min(args.amostra, total)} de {total} veículos)")
+    print(f"{'frota':<14} {depois:>12.1f}")
+    print(f"\nGanho: {antes / depois:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
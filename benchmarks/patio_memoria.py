@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: patio_memoria.py
+===========================
+Estado do pátio em memória (api/patio.py) contra as consultas de /queues:
+
+1. sobe o estado (LISTEN + carga completa) num banco populado;
+2. compara a latência de montar /queues no banco (queues_boxes + queues_fila)
+   com a leitura da memória;
+3. faz alterações reais (aloca um veículo da fila num box livre, desaloca,
+   muda a placa de um veículo em atendimento) e confere que, depois dos
+   avisos, o estado incremental é igual a uma recarga completa.
+
+As alterações são desfeitas no próprio roteiro (desaloca, restaura a placa).
+
+    python -m benchmarks.seed --escala 1 --recriar
+    python -m benchmarks.patio_memoria --repeticoes 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import psycopg
+
+
+def configurar_ambiente():
+    dsn = os.getenv("BENCH_DB_URL")
+    if "--dsn" in sys.argv:
+        dsn = sys.argv[sys.argv.index("--dsn") + 1]
+    if dsn:
+        os.environ["DB_URL"] = dsn
+    return dsn
+
+
+async def cronometrar(funcao, repeticoes):
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        await funcao()
+        amostras.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(amostras)
+
+
+async def aguardar_convergencia(estado, esperado_versao, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while estado.versao <= esperado_versao and time.monotonic() < limite:
+        await asyncio.sleep(0.01)
+    # Avisos chegam em rajadas; espera a fila de pendentes esvaziar
+    await asyncio.sleep(0.2)
+
+
+async def comparar_com_carga_completa(estado):
+    from api.patio import EstadoPatio
+
+    referencia = EstadoPatio()
+    referencia.escutando = True
+    await referencia.aplicar_pendentes()
+    return referencia.queues() == estado.queues() and referencia.boxes_ativos() == estado.boxes_ativos()
+
+
+async def executar(dsn, repeticoes):
+    from api.db import close_pool, get_connection, open_pool, release_connection
+    from api.patio import estado, iniciar_patio, parar_patio
+    from api.statements import executar as executar_registro
+
+    await open_pool()
+    await iniciar_patio()
+    try:
+        limite = time.monotonic() + 10
+        while not estado.sincronizado and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+        if not estado.sincronizado:
+            raise SystemExit("estado do pátio não sincronizou (rodou a migração 0003?)")
+
+        async def queues_banco():
+            conn = await get_connection()
+            try:
+                async with conn.cursor() as cursor:
+                    await executar_registro(cursor, "queues_boxes")
+                    await cursor.fetchall()
+                    await executar_registro(cursor, "queues_fila")
+                    await cursor.fetchall()
+            finally:
+                await release_connection(conn)
+
+        async def queues_memoria():
+            estado.queues()
+
+        banco_ms = await cronometrar(queues_banco, repeticoes)
+        memoria_ms = await cronometrar(queues_memoria, repeticoes)
+        print(f"\n/queues no banco:   {banco_ms:10.3f} ms (p50)")
+        print(f"/queues em memória: {memoria_ms * 1000:10.3f} µs (p50)")
+
+        print("\nConferindo atualização incremental:")
+        falhas = 0
+        async with await psycopg.AsyncConnection.connect(dsn, autocommit=True) as conn:
+            veiculo = await (await conn.execute(
+                "SELECT veiculo_id FROM servicos_solicitados WHERE status = 'pendente' ORDER BY data_solicitacao LIMIT 1"
+            )).fetchone()
+            box = await (await conn.execute("SELECT id FROM boxes WHERE id > 0 AND NOT ocupado ORDER BY id LIMIT 1")).fetchone()
+            if not box:
+                box = await (await conn.execute(
+                    "INSERT INTO boxes (id, area, ocupado) SELECT COALESCE(MAX(id), 0) + 1, 'borracharia', FALSE FROM boxes RETURNING id"
+                )).fetchone()
+            ocupado = await (await conn.execute(
+                "SELECT es.box_id, v.id, v.placa FROM execucao_servico es JOIN veiculos v ON v.id = es.veiculo_id "
+                "WHERE es.status = 'em_andamento' AND es.box_id > 0 LIMIT 1"
+            )).fetchone()
+
+            passos = []
+            if veiculo:
+                passos.append(("alocar veículo da fila", (
+                    "WITH e AS (INSERT INTO execucao_servico (veiculo_id, box_id, status, inicio_execucao) "
+                    "VALUES (%s, %s, 'em_andamento', NOW()) RETURNING id) "
+                    "UPDATE servicos_solicitados SET status = 'em_andamento', box_id = %s, execucao_id = (SELECT id FROM e) "
+                    "WHERE veiculo_id = %s AND status = 'pendente'",
+                    (veiculo[0], box[0], box[0], veiculo[0]),
+                )))
+                passos.append(("desalocar", (
+                    "WITH s AS (UPDATE servicos_solicitados SET status = 'pendente', box_id = NULL, execucao_id = NULL "
+                    "WHERE box_id = %s AND status = 'em_andamento' RETURNING execucao_id) "
+                    "DELETE FROM execucao_servico WHERE id IN (SELECT execucao_id FROM s)",
+                    (box[0],),
+                )))
+            if ocupado:
+                passos.append(("trocar placa de veículo em box", (
+                    "UPDATE veiculos SET placa = placa || '*' WHERE id = %s", (ocupado[1],),
+                )))
+                passos.append(("restaurar placa", ("UPDATE veiculos SET placa = %s WHERE id = %s", (ocupado[2], ocupado[1]))))
+
+            for descricao, (sql, params) in passos:
+                versao = estado.versao
+                await conn.execute(sql, params)
+                await aguardar_convergencia(estado, versao)
+                igual = await comparar_com_carga_completa(estado)
+                falhas += not igual
+                print(f"  {descricao:<32} {'ok' if igual else 'DIVERGENTE'}")
+
+        print(f"\nStatus: {estado.status()}")
+        if falhas:
+            raise SystemExit(1)
+    finally:
+        await parar_patio()
+        await close_pool()
+
+
+def main():
+    dsn = configurar_ambiente()
+    parser = argparse.ArgumentParser(description="Estado do pátio em memória x consultas de /queues")
+    parser.add_argument("--dsn", default=dsn, help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    asyncio.run(executar(args.dsn, args.repeticoes))
+
+
+if __name__ == "__main__":
+    main()
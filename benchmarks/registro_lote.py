@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: registro_lote.py
+===========================
+Cadastro de serviços como o /services/register fazia (um INSERT por item,
+datetime.now() em cada um) contra o INSERT único com unnest do registro
+(register_servicos), para N veículos com M itens cada:
+
+    por item  -> N * M INSERTs + N UPDATEs
+    em lote   -> 1 INSERT + 1 UPDATE (o que /services/register/bulk faz)
+
+Tudo roda em transações desfeitas (rollback); o banco não é alterado. A
+latência da rede entra inteira em "por item", então rode também contra um
+banco remoto para ver a diferença real dos tablets.
+
+    python -m benchmarks.seed --escala 1 --recriar
+    python -m benchmarks.registro_lote --veiculos 1 10 50 --itens 3
+"""
+
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime
+
+import psycopg
+
+from api.statements import REGISTRO
+
+INSERT_ITEM = """
+    INSERT INTO servicos_solicitados
+        (area, veiculo_id, tipo, quantidade, observacao, quilometragem, status, data_solicitacao, data_atualizacao)
+    VALUES (%s, %s, %s, %s, %s, %s, 'pendente', %s, %s)
+"""
+UPDATE_VEICULO = "UPDATE veiculos SET data_revisao_proativa = NULL WHERE id = %s"
+
+
+def por_item(cursor, pedidos):
+    for veiculo_id, itens in pedidos:
+        for area, tipo in itens:
+            cursor.execute(INSERT_ITEM, (area, veiculo_id, tipo, 1, "", 100000, datetime.now(), datetime.now()))
+        cursor.execute(UPDATE_VEICULO, (veiculo_id,))
+
+
+def em_lote(cursor, pedidos):
+    agora = datetime.now()
+    colunas = ([], [], [], [], [], [])
+    for veiculo_id, itens in pedidos:
+        for area, tipo in itens:
+            for coluna, valor in zip(colunas, (area, veiculo_id, tipo, 1, "", 100000)):
+                coluna.append(valor)
+    cursor.execute(REGISTRO["register_servicos"], (agora, agora, *colunas))
+    cursor.fetchall()
+    cursor.execute(REGISTRO["register_revisao"], ([veiculo_id for veiculo_id, _ in pedidos],))
+
+
+def cronometrar(conn, funcao, pedidos, repeticoes):
+    amostras = []
+    with conn.cursor() as cursor:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            with conn.transaction(force_rollback=True):
+                funcao(cursor, pedidos)
+            amostras.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(amostras)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cadastro de serviços por item x em lote")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_URL"), help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--veiculos", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--itens", type=int, default=3, help="itens por veículo")
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    with psycopg.connect(args.dsn) as conn:
+        veiculo_ids = [r[0] for r in conn.execute("SELECT id FROM veiculos ORDER BY id LIMIT %s", (max(args.veiculos),))]
+        tipos = conn.execute("SELECT nome FROM servicos_borracharia ORDER BY nome LIMIT %s", (args.itens,)).fetchall()
+        conn.commit()
+        if len(veiculo_ids) < max(args.veiculos) or not tipos:
+            parser.error("banco sem veículos/serviços suficientes; rode benchmarks.seed")
+        itens = [("borracharia", tipos[i % len(tipos)][0]) for i in range(args.itens)]
+
+        print(f"\n{'VEÍCULOS':>9} {'ITENS':>7} {'POR ITEM (ms)':>15} {'EM LOTE (ms)':>14} {'GANHO':>8}")
+        print("-" * 58)
+        for n in args.veiculos:
+            pedidos = [(veiculo_id, itens) for veiculo_id in veiculo_ids[:n]]
+            antes = cronometrar(conn, por_item, pedidos, args.repeticoes)
+            depois = cronometrar(conn, em_lote, pedidos, args.repeticoes)
+            print(f"{n:>9} {n * args.itens:>7} {antes:>15.2f} {depois:>14.2f} {antes / depois:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: seed.py
+==================
+Cria o schema do pátio num banco Postgres LOCAL e descartável e popula com
+dados sintéticos, para os benchmarks deste pacote.
+
+    createdb patio_bench
+    export BENCH_DB_URL=postgresql://localhost/patio_bench
+    python -m benchmarks.seed --escala 1 --recriar
+
+--escala 1 gera um volume próximo ao da operação atual (2.000 veículos,
+~8 visitas por veículo); --escala 10 gera 10x isso.
+
+O schema é o de migracoes/ (aplicado com migrar_schema). Com --schema-legado
+cria o schema anterior à tabela particionada (três tabelas
+servicos_solicitados_*), usado pelo benchmark servicos_particionados.
+
+⚠️ --recriar apaga as tabelas do banco apontado. Nunca aponte para produção.
+"""
+
+import argparse
+import os
+import time
+
+import psycopg
+
+from migrar_schema import aplicar_migracoes
+
+TABELAS = [
+    "schema_migracoes",
+    "tarefas",
+    "idempotencia_requisicoes",
+    "veiculo_km_estado",
+    "servicos_solicitados_borracharia",
+    "servicos_solicitados_alinhamento",
+    "servicos_solicitados_manutencao",
+    "servicos_solicitados_borracharia_legado",
+    "servicos_solicitados_alinhamento_legado",
+    "servicos_solicitados_manutencao_legado",
+    "servicos_solicitados",
+    "execucao_servico",
+    "servicos_borracharia",
+    "servicos_alinhamento",
+    "servicos_manutencao",
+    "veiculos",
+    "clientes",
+    "funcionarios",
+    "boxes",
+    "usuarios",
+]
+
+DDL = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    id SERIAL PRIMARY KEY,
+    nome TEXT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'funcionario'
+);
+
+CREATE TABLE IF NOT EXISTS clientes (
+    id SERIAL PRIMARY KEY,
+    nome_empresa TEXT NOT NULL,
+    nome_fantasia TEXT,
+    nome_responsavel TEXT,
+    contato_responsavel TEXT,
+    data_atualizacao_contato TIMESTAMP,
+    data_ultima_exportacao TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS veiculos (
+    id SERIAL PRIMARY KEY,
+    placa TEXT UNIQUE NOT NULL,
+    empresa TEXT,
+    modelo TEXT,
+    ano_modelo INTEGER,
+    nome_motorista TEXT,
+    contato_motorista TEXT,
+    cliente_id INTEGER REFERENCES clientes(id),
+    quilometragem INTEGER,
+    media_km_diaria NUMERIC,
+    data_entrada TIMESTAMP,
+    data_atualizacao_contato TIMESTAMP,
+    data_revisao_proativa DATE,
+    data_ultima_exportacao TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS funcionarios (
+    id SERIAL PRIMARY KEY,
+    nome TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS boxes (
+    id INTEGER PRIMARY KEY,
+    area TEXT,
+    ocupado BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS execucao_servico (
+    id SERIAL PRIMARY KEY,
+    veiculo_id INTEGER REFERENCES veiculos(id),
+    box_id INTEGER,
+    funcionario_id INTEGER,
+    quilometragem INTEGER,
+    status TEXT,
+    inicio_execucao TIMESTAMP,
+    fim_execucao TIMESTAMP,
+    usuario_alocacao_id INTEGER,
+    usuario_finalizacao_id INTEGER,
+    nome_motorista TEXT,
+    contato_motorista TEXT,
+    data_feedback TIMESTAMP
+);
+"""
+
+DDL_CATALOGO = """
+CREATE TABLE IF NOT EXISTS servicos_{area} (
+    id SERIAL PRIMARY KEY,
+    nome TEXT UNIQUE NOT NULL
+);
+"""
+
+DDL_SOLICITADOS = """
+CREATE TABLE IF NOT EXISTS servicos_solicitados_{area} (
+    id SERIAL PRIMARY KEY,
+    veiculo_id INTEGER REFERENCES veiculos(id),
+    tipo TEXT,
+    quantidade INTEGER,
+    descricao TEXT,
+    observacao TEXT,
+    observacao_execucao TEXT,
+    tipo_atendimento TEXT,
+    quilometragem INTEGER,
+    status TEXT,
+    box_id INTEGER,
+    funcionario_id INTEGER,
+    execucao_id INTEGER REFERENCES execucao_servico(id),
+    data_solicitacao TIMESTAMP,
+    data_atualizacao TIMESTAMP
+);
+"""
+
+AREAS = ["borracharia", "alinhamento", "manutencao"]
+
+CATALOGO = {
+    "borracharia": ["Troca de pneu", "Conserto de pneu", "Rodízio", "Balanceamento", "Calibragem"],
+    "alinhamento": ["Alinhamento", "Cambagem", "Caster", "Convergência"],
+    "manutencao": ["Troca de óleo", "Freio", "Suspensão", "Embreagem", "Elétrica", "Revisão geral"],
+}
+
+VEICULOS_POR_ESCALA = 2000
+VISITAS_POR_VEICULO = 8
+N_BOXES = 10
+
+
+def recriar(conn):
+    for tabela in TABELAS:
+        # Depois da migração os nomes antigos são views
+        row = conn.execute(
+            "SELECT relkind FROM pg_class WHERE relname = %s AND relnamespace = current_schema()::regnamespace",
+            (tabela,),
+        ).fetchone()
+        if row:
+            tipo = "VIEW" if row[0] == "v" else "TABLE"
+            conn.execute(f"DROP {tipo} IF EXISTS {tabela} CASCADE")
+
+
+def criar_schema(conn, legado=False):
+    if not legado:
+        conn.commit()
+        aplicar_migracoes(conn, log=lambda _: None)
+        return
+    conn.execute(DDL)
+    for area in AREAS:
+        conn.execute(DDL_CATALOGO.format(area=area))
+        conn.execute(DDL_SOLICITADOS.format(area=area))
+
+
+def popular(conn, escala):
+    n_veiculos = VEICULOS_POR_ESCALA * escala
+    n_visitas = n_veiculos * VISITAS_POR_VEICULO
+
+    conn.execute(
+        "INSERT INTO usuarios (nome, username, password_hash, role) VALUES ('Bench', 'bench', 'x', 'admin') "
+        "ON CONFLICT (username) DO NOTHING"
+    )
+    conn.execute("INSERT INTO funcionarios (id, nome) VALUES (0, 'Sem funcionário') ON CONFLICT DO NOTHING")
+    conn.execute("INSERT INTO funcionarios (nome) SELECT 'Funcionário ' || g FROM generate_series(1, 12) g")
+    conn.execute(
+        "INSERT INTO boxes (id, area, ocupado) SELECT g, CASE WHEN g %% 3 = 0 THEN 'alinhamento' ELSE 'borracharia' END, FALSE "
+        "FROM generate_series(0, %s) g ON CONFLICT DO NOTHING",
+        (N_BOXES,),
+    )
+    for area, nomes in CATALOGO.items():
+        for nome in nomes:
+            conn.execute(f"INSERT INTO servicos_{area} (nome) VALUES (%s) ON CONFLICT DO NOTHING", (nome,))
+
+    conn.execute(
+        "INSERT INTO clientes (nome_empresa, nome_responsavel, contato_responsavel) "
+        "SELECT 'Transportadora ' || g, 'Responsável ' || g, '6799' || lpad(g::text, 7, '0') "
+        "FROM generate_series(1, %s) g",
+        (max(1, n_veiculos // 20),),
+    )
+    # Placas únicas e determinísticas: BAA-0000, BAA-0001, ..., BAB-0000, ... (veículo id = g + 1)
+    conn.execute(
+        """
+        INSERT INTO veiculos (placa, empresa, modelo, ano_modelo, nome_motorista, contato_motorista,
+                              cliente_id, quilometragem, data_entrada)
+        SELECT 'B' || chr(65 + (g / 260000) %% 26) || chr(65 + (g / 10000) %% 26) || '-' || lpad((g %% 10000)::text, 4, '0'),
+               'Transportadora ' || (g %% %(n_clientes)s + 1),
+               (ARRAY['Scania R450', 'Volvo FH 540', 'MB Actros', 'DAF XF', 'Iveco S-Way'])[g %% 5 + 1],
+               2015 + g %% 10,
+               'Motorista ' || g,
+               '6798' || lpad(g::text, 7, '0'),
+               g %% %(n_clientes)s + 1,
+               0,
+               NOW() - INTERVAL '3 years'
+        FROM generate_series(0, %(n)s - 1) g
+        """,
+        {"n": n_veiculos, "n_clientes": max(1, n_veiculos // 20)},
+    )
+
+    # Visitas finalizadas: a visita k de cada veículo acontece ~45 dias depois
+    # da anterior, com km crescente (~300 km/dia, variando por veículo).
+    conn.execute(
+        """
+        INSERT INTO execucao_servico (veiculo_id, box_id, funcionario_id, quilometragem, status,
+                                      inicio_execucao, fim_execucao, usuario_alocacao_id,
+                                      usuario_finalizacao_id, nome_motorista, contato_motorista)
+        SELECT v.id,
+               1 + g %% %(boxes)s,
+               1 + g %% 12,
+               50000 + k * (13500 + (v.id %% 50) * 10),
+               'finalizado',
+               NOW() - (%(visitas)s - k) * INTERVAL '45 days' - (v.id %% 40) * INTERVAL '1 hour',
+               NOW() - (%(visitas)s - k) * INTERVAL '45 days' - (v.id %% 40) * INTERVAL '1 hour' + INTERVAL '2 hours',
+               1, 1, v.nome_motorista, v.contato_motorista
+        FROM generate_series(0, %(total)s - 1) g
+        CROSS JOIN LATERAL (SELECT g / %(n)s AS k) kk
+        JOIN veiculos v ON v.id = g %% %(n)s + 1
+        ORDER BY k, v.id
+        """,
+        {"boxes": N_BOXES, "visitas": VISITAS_POR_VEICULO, "total": n_visitas, "n": n_veiculos},
+    )
+
+    # Cada visita tem 1 ou 2 serviços espalhados pelas áreas
+    for i, area in enumerate(AREAS):
+        conn.execute(
+            f"""
+            INSERT INTO servicos_solicitados_{area}
+                (veiculo_id, tipo, quantidade, quilometragem, status, box_id, funcionario_id,
+                 execucao_id, data_solicitacao, data_atualizacao)
+            SELECT es.veiculo_id,
+                   (%(nomes)s::text[])[es.id %% %(n_nomes)s + 1],
+                   1 + es.id %% 4,
+                   es.quilometragem,
+                   'finalizado',
+                   es.box_id,
+                   es.funcionario_id,
+                   es.id,
+                   es.inicio_execucao - INTERVAL '30 minutes',
+                   es.fim_execucao
+            FROM execucao_servico es
+            WHERE es.status = 'finalizado' AND (es.id %% 3 = %(i)s OR es.id %% 5 = %(i)s)
+            """,
+            {"nomes": CATALOGO[area], "n_nomes": len(CATALOGO[area]), "i": i},
+        )
+
+    # Um veículo em andamento em cada box
+    conn.execute(
+        """
+        INSERT INTO execucao_servico (veiculo_id, box_id, funcionario_id, quilometragem, status,
+                                      inicio_execucao, usuario_alocacao_id, nome_motorista, contato_motorista)
+        SELECT v.id, v.id, 1 + v.id %% 12, 50000 + %(visitas)s * 14000, 'em_andamento',
+               NOW() - INTERVAL '1 hour', 1, v.nome_motorista, v.contato_motorista
+        FROM veiculos v WHERE v.id BETWEEN 1 AND %(boxes)s
+        """,
+        {"visitas": VISITAS_POR_VEICULO, "boxes": N_BOXES},
+    )
+    conn.execute("UPDATE boxes SET ocupado = TRUE WHERE id BETWEEN 1 AND %s", (N_BOXES,))
+    # Fila: alguns veículos com serviços pendentes
+    n_fila = 30 * escala
+    for i, area in enumerate(AREAS):
+        conn.execute(
+            f"""
+            INSERT INTO servicos_solicitados_{area}
+                (veiculo_id, tipo, quantidade, quilometragem, status, box_id, funcionario_id,
+                 execucao_id, data_solicitacao, data_atualizacao)
+            SELECT es.veiculo_id, %(tipo)s, 1, es.quilometragem, 'em_andamento', es.box_id,
+                   es.funcionario_id, es.id, es.inicio_execucao, es.inicio_execucao
+            FROM execucao_servico es
+            WHERE es.status = 'em_andamento' AND es.id %% 3 <> %(i)s
+            """,
+            {"tipo": CATALOGO[area][0], "i": i},
+        )
+        conn.execute(
+            f"""
+            INSERT INTO servicos_solicitados_{area}
+                (veiculo_id, tipo, quantidade, quilometragem, status, data_solicitacao, data_atualizacao)
+            SELECT v.id, %(tipo)s, 1, 50000 + %(visitas)s * 14000, 'pendente',
+                   NOW() - (v.id %% 120) * INTERVAL '1 minute', NOW()
+            FROM veiculos v
+            WHERE v.id BETWEEN %(boxes)s + 1 AND %(boxes)s + %(fila)s AND v.id %% 3 <> %(i)s
+            """,
+            {"tipo": CATALOGO[area][-1], "visitas": VISITAS_POR_VEICULO, "boxes": N_BOXES, "fila": n_fila, "i": i},
+        )
+
+    conn.execute(
+        """
+        UPDATE veiculos v SET quilometragem = u.km
+        FROM (SELECT veiculo_id, MAX(quilometragem) AS km FROM execucao_servico GROUP BY veiculo_id) u
+        WHERE v.id = u.veiculo_id
+        """
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cria e popula um banco local para os benchmarks")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_URL"), help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--escala", type=int, default=1, help="1 = volume atual; 10 = 10x")
+    parser.add_argument("--recriar", action="store_true", help="apaga as tabelas antes de criar")
+    parser.add_argument("--schema-legado", action="store_true", help="três tabelas servicos_solicitados_* (antes da 0001)")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    inicio = time.perf_counter()
+    with psycopg.connect(args.dsn) as conn:
+        if args.recriar:
+            recriar(conn)
+        criar_schema(conn, legado=args.schema_legado)
+        popular(conn, args.escala)
+        conn.commit()
+        conn.autocommit = True
+        conn.execute("VACUUM ANALYZE")
+
+    print(f"✅ Banco populado (escala {args.escala}) em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: servicos_particionados.py
+====================================
+Custo de plano e latência de /queues e /services/completed antes e depois da
+migração para a tabela única servicos_solicitados (particionada por área).
+
+Roda sobre um banco recém-populado com o schema antigo: mede as consultas com
+UNION ALL das três tabelas, executa a migração (migrar_servicos_particionados)
+no mesmo banco e mede as consultas novas.
+
+    python -m benchmarks.seed --escala 10 --recriar --schema-legado
+    python -m benchmarks.servicos_particionados --repeticoes 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+import migrar_servicos_particionados as migracao
+from api.statements import REGISTRO
+
+COMPLETED_ANTES = """
+    SELECT
+        es.id as execucao_id,
+        es.veiculo_id, es.quilometragem, es.fim_execucao,
+        v.placa, v.empresa,
+        serv.service_id, serv.area, serv.tipo, serv.quantidade, f.nome as funcionario_nome,
+        serv.observacao_execucao, serv.tipo_atendimento
+    FROM execucao_servico es
+    JOIN veiculos v ON es.veiculo_id = v.id
+    LEFT JOIN (
+        SELECT id as service_id, execucao_id, 'Borracharia' as area, tipo, quantidade, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_borracharia
+        UNION ALL
+        SELECT id as service_id, execucao_id, 'Alinhamento' as area, tipo, quantidade, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_alinhamento
+        UNION ALL
+        SELECT id as service_id, execucao_id, 'Manutencao' as area, tipo, quantidade, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_manutencao
+    ) serv ON es.id = serv.execucao_id
+    LEFT JOIN funcionarios f ON serv.funcionario_id = f.id
+    WHERE es.status = 'finalizado' AND es.fim_execucao >= %s AND es.fim_execucao < %s
+    ORDER BY es.fim_execucao DESC, serv.area
+"""
+
+QUEUES_BOXES_ANTES = """
+    WITH servicos_em_andamento AS (
+        SELECT execucao_id, STRING_AGG(tipo || ' (Qtd: ' || quantidade || ')', ', ') as lista_servicos
+        FROM (
+            SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_borracharia WHERE status = 'em_andamento'
+            UNION ALL
+            SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_alinhamento WHERE status = 'em_andamento'
+            UNION ALL
+            SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_manutencao WHERE status = 'em_andamento'
+        ) s
+        GROUP BY execucao_id
+    )
+    SELECT b.id as box_id, v.placa, v.empresa, f.nome as funcionario, sa.lista_servicos
+    FROM boxes b
+    JOIN execucao_servico es ON b.id = es.box_id
+    JOIN veiculos v ON es.veiculo_id = v.id
+    LEFT JOIN funcionarios f ON es.funcionario_id = f.id
+    LEFT JOIN servicos_em_andamento sa ON es.id = sa.execucao_id
+    WHERE es.status = 'em_andamento' AND b.id > 0
+    ORDER BY b.id
+"""
+
+QUEUES_FILA_ANTES = """
+    SELECT v.placa, v.empresa, STRING_AGG(s.tipo || ' (Qtd: ' || s.quantidade || ')', ', ') as servicos
+    FROM (
+        SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_borracharia WHERE status = 'pendente'
+        UNION ALL
+        SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_alinhamento WHERE status = 'pendente'
+        UNION ALL
+        SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_manutencao WHERE status = 'pendente'
+    ) s
+    JOIN veiculos v ON s.veiculo_id = v.id
+    GROUP BY v.placa, v.empresa, s.veiculo_id
+    ORDER BY MIN(s.data_solicitacao) ASC
+"""
+
+
+def consultas(fase):
+    fim = datetime.now() + timedelta(days=1)
+    params_completed = (fim - timedelta(days=31), fim)
+    if fase == "antes":
+        return {
+            "/queues (boxes)": (QUEUES_BOXES_ANTES, ()),
+            "/queues (fila)": (QUEUES_FILA_ANTES, ()),
+            "/services/completed": (COMPLETED_ANTES, params_completed),
+        }
+    return {
+        "/queues (boxes)": (REGISTRO["queues_boxes"], ()),
+        "/queues (fila)": (REGISTRO["queues_fila"], ()),
+        "/services/completed": (REGISTRO["services_completed"], params_completed + (0,)),
+    }
+
+
+def medir(conn, sql, params, repeticoes):
+    with conn.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        custo = cursor.fetchone()[0][0]["Plan"]["Total Cost"]
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+        analise = cursor.fetchone()[0][0]
+        amostras = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            amostras.append((time.perf_counter() - inicio) * 1000)
+    conn.rollback()
+    return {
+        "custo": custo,
+        "execucao_ms": analise["Execution Time"],
+        "buffers": analise["Plan"].get("Shared Hit Blocks", 0) + analise["Plan"].get("Shared Read Blocks", 0),
+        "p50_ms": statistics.median(amostras),
+    }
+
+
+def medir_fase(conn, fase, repeticoes):
+    return {nome: medir(conn, sql, params, repeticoes) for nome, (sql, params) in consultas(fase).items()}
+
+
+def migrar(conn, lote):
+    origens = {area: migracao.tabela_antiga(area) for area in migracao.AREAS}
+    migracao.criar_tabela_particionada(conn, origens)
+    for area in migracao.AREAS:
+        migracao.copiar_em_lotes(conn, area, origens[area], lote)
+    migracao.trocar_por_views(conn)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("ANALYZE servicos_solicitados")
+    conn.autocommit = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da tabela particionada de serviços")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_URL"), help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--repeticoes", type=int, default=30)
+    parser.add_argument("--lote", type=int, default=50000)
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        with conn.cursor() as cursor:
+            if migracao.tipo_relacao(cursor, "servicos_solicitados_borracharia") != "r":
+                parser.error("o banco já foi migrado; rode antes: python -m benchmarks.seed --escala 10 --recriar --schema-legado")
+        conn.rollback()
+
+        print("⏱️  Medindo consultas antigas (UNION ALL das três tabelas)...")
+        antes = medir_fase(conn, "antes", args.repeticoes)
+        print("🗂️  Migrando para a tabela particionada...")
+        migrar(conn, args.lote)
+        print("⏱️  Medindo consultas novas (servicos_solicitados)...")
+        depois = medir_fase(conn, "depois", args.repeticoes)
+    finally:
+        conn.close()
+
+    print(f"\n{'CONSULTA':<22} {'FASE':<7} {'CUSTO':>12} {'EXEC (ms)':>10} {'P50 (ms)':>10} {'BUFFERS':>9}")
+    print("-" * 75)
+    for nome in antes:
+        for fase, r in (("antes", antes[nome]), ("depois", depois[nome])):
+            print(f"{nome:<22} {fase:<7} {r['custo']:>12.1f} {r['execucao_ms']:>10.2f} {r['p50_ms']:>10.2f} {r['buffers']:>9}")
+        print()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"antes": antes, "depois": depois}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: statements_preparados.py
+===================================
+Micro-benchmark do registro de prepared statements da API (api/statements.py).
+Para cada consulta do registro compara, na mesma conexão:
+
+    sem preparo  -> o SQL completo é enviado, analisado e planejado a cada chamada
+    preparado    -> PREPARE uma vez, depois só EXECUTE pelo nome
+
+e mostra o tempo de planejamento reportado pelo EXPLAIN ANALYZE nos dois casos.
+As consultas de escrita (/allocation/assign, /services/register, /boxes/{id}/finalize)
+rodam dentro de transações desfeitas (rollback), então o banco não é alterado.
+
+    python -m benchmarks.seed --escala 1 --recriar
+    python -m benchmarks.statements_preparados --repeticoes 500
+"""
+
+import argparse
+import os
+import re
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import psycopg
+
+from api.statements import REGISTRO, _para_prepare, _sql_execute
+
+ENDPOINTS = {
+    "/vehicles/by-plate/{placa}": ["vehicle_by_plate"],
+    "/boxes/{box_id}/details": ["box_execucao", "box_servicos"],
+    "/queues": ["queues_boxes", "queues_fila"],
+    "estado do patio (api/patio.py)": ["patio_boxes", "patio_fila"],
+    "/allocation/pending-vehicles": ["pending_vehicles"],
+    "/services/completed": ["services_completed", "services_completed_pagina"],
+    "/services/register": [
+        "idempotencia_reservar",
+        "idempotencia_buscar",
+        "register_servicos",
+        "register_revisao",
+        "idempotencia_gravar",
+    ],
+    "/boxes/{box_id}/finalize": ["finalize_servicos", "tarefa_enfileirar"],
+    "/allocation/assign": [
+        "assign_motorista",
+        "assign_km_pendente",
+        "assign_execucao",
+        "assign_servicos",
+        "assign_ocupar_box",
+    ],
+}
+
+ESCRITAS = {
+    "assign_execucao",
+    "assign_servicos",
+    "assign_ocupar_box",
+    "register_servicos",
+    "register_revisao",
+    "finalize_servicos",
+    "tarefa_enfileirar",
+    "idempotencia_reservar",
+    "idempotencia_gravar",
+}
+
+
+def parametros_exemplo(placa, box_id, veiculo_id):
+    agora = datetime.now()
+    return {
+        "vehicle_by_plate": (placa,),
+        "box_execucao": (box_id,),
+        "box_servicos": (box_id,),
+        "queues_boxes": (),
+        "queues_fila": (),
+        "pending_vehicles": (),
+        "services_completed": (agora - timedelta(days=30), agora + timedelta(days=1), 0),
+        "services_completed_pagina": (agora - timedelta(days=30), agora + timedelta(days=1), 0, 50),
+        "assign_motorista": (veiculo_id,),
+        "assign_km_pendente": (veiculo_id,),
+        "assign_execucao": (veiculo_id, box_id, 1, 100000, agora, 1, "Motorista", "67999999999"),
+        "assign_servicos": (box_id, 1, agora, 1, veiculo_id, "borracharia"),
+        "assign_ocupar_box": (box_id,),
+        "register_servicos": (agora, agora, ["borracharia"], [veiculo_id], ["Calibragem"], [1], [""], [100000]),
+        "register_revisao": ([veiculo_id],),
+        "tarefa_enfileirar": ("recalcular_media", '{"veiculo_id": %d}' % veiculo_id, None, 0),
+        "finalize_servicos": ("", agora, [1, 2, 3], ["borracharia", "alinhamento", "manutencao"], [1, 1, 1]),
+        "idempotencia_reservar": ("benchmark", 1, "/services/register", "0" * 64, 24),
+        "idempotencia_buscar": ("benchmark", 1),
+        "idempotencia_gravar": ('{"status": "ok"}', "benchmark", 1),
+        "recurso_versao": ("patio",),
+        "patio_boxes": (None, None),
+        "patio_fila": (None, None),
+        "catalogo_servicos": (),
+        # Leitura parcial (a de toda conferência de versão): só o que mudou há pouco
+        "km_projecoes": (agora - timedelta(minutes=10), agora - timedelta(minutes=10)),
+    }
+
+
+def cronometrar(conn, sql, params, repeticoes, escrita):
+    amostras = []
+    with conn.cursor() as cursor:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            if escrita:
+                with conn.transaction(force_rollback=True):
+                    cursor.execute(sql, params)
+            else:
+                cursor.execute(sql, params)
+                cursor.fetchall()
+            amostras.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(amostras)
+
+
+def tempo_planejamento(conn, sql, params):
+    with conn.transaction(force_rollback=True):
+        with conn.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, SUMMARY) {sql}", params)
+            plano = "\n".join(r[0] for r in cursor.fetchall())
+    achado = re.search(r"Planning Time: ([\d.]+) ms", plano)
+    return float(achado.group(1)) if achado else 0.0
+
+
+def medir(conn, nome, params, repeticoes):
+    escrita = nome in ESCRITAS
+    sql = REGISTRO[nome]
+    sql_execute = _sql_execute(nome, len(params))
+
+    conn.execute("DEALLOCATE ALL")
+    cru_ms = cronometrar(conn, sql, params, repeticoes, escrita)
+    cru_plan = tempo_planejamento(conn, sql, params)
+
+    conn.execute(f"PREPARE {nome} AS {_para_prepare(sql)}")
+    preparado_ms = cronometrar(conn, sql_execute, params, repeticoes, escrita)
+    preparado_plan = tempo_planejamento(conn, sql_execute, params)
+    conn.execute(f"DEALLOCATE {nome}")
+
+    return {"cru_ms": cru_ms, "preparado_ms": preparado_ms, "cru_plan": cru_plan, "preparado_plan": preparado_plan}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos prepared statements da API")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_URL"), help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--repeticoes", type=int, default=300)
+    parser.add_argument("--placa", default="BAA-0010")
+    parser.add_argument("--box", type=int, default=1)
+    parser.add_argument("--veiculo", type=int, default=11, help="veículo com serviços pendentes")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    exemplos = parametros_exemplo(args.placa, args.box, args.veiculo)
+    with psycopg.connect(args.dsn, autocommit=True, cursor_factory=psycopg.ClientCursor) as conn:
+        print(f"\n{'CONSULTA':<30} {'SEM PREPARO':>12} {'PREPARADO':>12} {'PLAN CRU':>10} {'PLAN PREP':>10}")
+        print("-" * 80)
+        for endpoint, nomes in ENDPOINTS.items():
+            total_cru = total_prep = 0.0
+            print(endpoint)
+            for nome in nomes:
+                r = medir(conn, nome, exemplos[nome], args.repeticoes)
+                total_cru += r["cru_ms"]
+                total_prep += r["preparado_ms"]
+                print(
+                    f"  {nome:<28} {r['cru_ms']:>10.3f}ms {r['preparado_ms']:>10.3f}ms "
+                    f"{r['cru_plan']:>8.3f}ms {r['preparado_plan']:>8.3f}ms"
+                )
+            economia = (1 - total_prep / total_cru) * 100 if total_cru else 0.0
+            print(f"  {'total do endpoint':<28} {total_cru:>10.3f}ms {total_prep:>10.3f}ms   economia {economia:.1f}%\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: stream_painel.py
+===========================
+Simula N telas de TV no painel de filas conectadas a /queues/stream de uma API
+em execução e mede, durante a janela:
+
+    - tempo até o primeiro snapshot de cada tela;
+    - eventos recebidos (snapshot/delta) por tela;
+    - transações no banco (pg_stat_database.xact_commit), se --dsn for informado.
+
+Com o painel antigo (st_autorefresh de 30 s) cada tela faz 2 consultas a cada
+30 s; com o stream o banco só trabalha quando o pátio muda, independente do
+número de telas. Rode com e sem movimento no pátio para comparar.
+
+    python -m benchmarks.stream_painel --api http://localhost:8000 \\
+        --usuario admin --senha ... --telas 50 --duracao 60 --dsn "$BENCH_DB_URL"
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import psycopg
+
+from benchmarks.carga_api import autenticar
+
+
+async def tela(client, url, token, duracao, resultado):
+    inicio = time.perf_counter()
+    eventos = {"snapshot": 0, "delta": 0}
+    primeiro = None
+    try:
+        async with client.stream("GET", url, params={"token": token}, timeout=None) as resposta:
+            resposta.raise_for_status()
+            evento = None
+            async for linha in resposta.aiter_lines():
+                if linha.startswith("event: "):
+                    evento = linha[7:]
+                elif linha.startswith("data: ") and evento in eventos:
+                    json.loads(linha[6:])
+                    eventos[evento] += 1
+                    if primeiro is None:
+                        primeiro = (time.perf_counter() - inicio) * 1000
+                if time.perf_counter() - inicio > duracao:
+                    break
+    except (httpx.HTTPError, asyncio.TimeoutError) as exc:
+        resultado["erros"].append(str(exc))
+    resultado["telas"].append({"primeiro_ms": primeiro, **eventos})
+
+
+def commits(dsn):
+    with psycopg.connect(dsn) as conn:
+        return conn.execute(
+            "SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()"
+        ).fetchone()[0]
+
+
+async def executar(args):
+    async with httpx.AsyncClient(base_url=args.api) as client:
+        token = args.token or await autenticar(client, args.usuario, args.senha)
+        resultado = {"telas": [], "erros": []}
+        antes = commits(args.dsn) if args.dsn else None
+        await asyncio.gather(*[
+            asyncio.wait_for(tela(client, "/queues/stream", token, args.duracao, resultado), args.duracao + 5)
+            for _ in range(args.telas)
+        ], return_exceptions=True)
+        depois = commits(args.dsn) if args.dsn else None
+
+    primeiros = [t["primeiro_ms"] for t in resultado["telas"] if t["primeiro_ms"] is not None]
+    print(f"\nTelas conectadas: {len(resultado['telas'])} (erros: {len(resultado['erros'])})")
+    if primeiros:
+        print(f"Primeiro snapshot: p50 {statistics.median(primeiros):.1f} ms, máx {max(primeiros):.1f} ms")
+    print(f"Snapshots por tela: {statistics.mean([t['snapshot'] for t in resultado['telas']] or [0]):.1f}")
+    print(f"Deltas por tela:    {statistics.mean([t['delta'] for t in resultado['telas']] or [0]):.1f}")
+    if antes is not None:
+        polling = args.telas * 2 * args.duracao / 30
+        print(f"Transações no banco na janela: {depois - antes} "
+              f"(painel antigo: ~{polling:.0f} consultas de fila para {args.telas} telas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telas simultâneas no stream do painel de filas")
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--usuario", help="usuário para /auth/login")
+    parser.add_argument("--senha", help="senha para /auth/login")
+    parser.add_argument("--token", help="JWT já emitido (dispensa usuário/senha)")
+    parser.add_argument("--telas", type=int, default=50)
+    parser.add_argument("--duracao", type=float, default=60, help="segundos de observação")
+    parser.add_argument("--dsn", help="banco da API, para contar transações na janela")
+    args = parser.parse_args()
+
+    if not args.token and not (args.usuario and args.senha):
+        parser.error("informe --token ou --usuario/--senha")
+
+    asyncio.run(executar(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+VERIFICAÇÃO: verificar_finalizacao_box.py
+=========================================
+Roda pages/visao_boxes._salvar_alteracoes_finais contra um cursor falso, sem
+banco nem Streamlit (st.session_state vira um objeto simples), e confere que:
+
+- sai um comando só para todos os serviços do box;
+- o número de %s do SQL é o número de parâmetros enviados;
+- ids, áreas e quantidades vão em arrays paralelos, na ordem dos serviços;
+- observação, status e data vão como parâmetros comuns;
+- box sem serviços não manda nada ao banco.
+
+    python -m benchmarks.verificar_finalizacao_box
+"""
+
+import re
+import sys
+import types
+
+
+class SessionState(dict):
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+class CursorFalso:
+    def __init__(self, comandos):
+        self.comandos = comandos
+
+    def execute(self, sql, params=None):
+        self.comandos.append((sql, params))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class ConexaoFalsa:
+    def __init__(self):
+        self.comandos = []
+
+    def cursor(self, **_):
+        return CursorFalso(self.comandos)
+
+
+def _instalar_modulos_falsos():
+    """Só o necessário para importar a página: nada disso é chamado no teste."""
+    erros = []
+    st = types.ModuleType("streamlit")
+    st.session_state = SessionState()
+    st.error = erros.append
+    st.fragment = lambda funcao=None, **_: funcao if funcao else (lambda f: f)
+    falsos = {
+        "streamlit": st,
+        "database": types.SimpleNamespace(get_connection=None, release_connection=None),
+        "utils": types.SimpleNamespace(get_catalogo=None),
+        "jobs": types.SimpleNamespace(enfileirar=None),
+    }
+    sys.modules.update({nome: modulo for nome, modulo in falsos.items()})
+    try:
+        import psycopg2.extras  # noqa: F401
+    except ImportError:
+        extras = types.ModuleType("psycopg2.extras")
+        extras.DictCursor = extras.RealDictCursor = object
+        psycopg2 = types.ModuleType("psycopg2")
+        psycopg2.extras = extras
+        sys.modules.update({"psycopg2": psycopg2, "psycopg2.extras": extras})
+    return st, erros
+
+
+def _marcadores(sql):
+    return len(re.findall(r"(?<!%)%s", sql))
+
+
+def main():
+    st, erros = _instalar_modulos_falsos()
+    from pages import visao_boxes
+
+    servicos = {
+        "borracharia_10": {"db_id": 10, "area": "borracharia", "qtd_executada": 4},
+        "alinhamento_7": {"db_id": 7, "area": "alinhamento", "qtd_executada": 1},
+        "manutencao_3": {"db_id": 3, "area": "manutencao", "qtd_executada": 2},
+    }
+    st.session_state.box_states = {5: {"servicos": servicos}, 6: {"servicos": {}}}
+
+    conn = ConexaoFalsa()
+    ok = visao_boxes._salvar_alteracoes_finais(conn, 5, 99, "finalizado", "trocado o pneu")
+    assert ok and not erros, erros
+    assert len(conn.comandos) == 1, conn.comandos
+    sql, params = conn.comandos[0]
+    assert _marcadores(sql) == len(params), (sql, params)
+    obs, status, _agora, ids, areas, quantidades = params
+    assert (obs, status) == ("trocado o pneu", "finalizado")
+    assert ids == [10, 7, 3]
+    assert areas == ["borracharia", "alinhamento", "manutencao"]
+    assert quantidades == [4, 1, 2]
+
+    conn = ConexaoFalsa()
+    assert visao_boxes._salvar_alteracoes_finais(conn, 6, 100, "finalizado", "")
+    assert visao_boxes._salvar_alteracoes_finais(conn, 404, 101, "finalizado", "")
+    assert conn.comandos == []
+
+    print("✅ _salvar_alteracoes_finais: um UPDATE por box, parâmetros conferem")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK: verificar_planos.py
+==============================
+Roda EXPLAIN (ANALYZE, BUFFERS) em cada consulta do registro da API
+(api/statements.py) sobre um banco populado e FALHA (código de saída 1) quando
+alguma consulta quente cai num Seq Scan de tabela grande — sinal de que falta
+índice ou que uma mudança na consulta deixou de usar o índice existente.
+
+Tabelas pequenas por natureza (boxes, funcionários, catálogo...) são ignoradas.
+Consultas de escrita rodam em transação desfeita (rollback).
+
+    python -m benchmarks.seed --escala 1 --recriar
+    python -m benchmarks.verificar_planos
+"""
+
+import argparse
+import os
+import sys
+
+import psycopg
+
+from api.statements import REGISTRO
+from benchmarks.statements_preparados import parametros_exemplo
+
+TABELAS_PEQUENAS = {
+    "boxes",
+    "funcionarios",
+    "usuarios",
+    "recurso_versao",
+    "servicos_borracharia",
+    "servicos_alinhamento",
+    "servicos_manutencao",
+}
+
+
+def seq_scans(no):
+    """Relações lidas por Seq Scan em qualquer nível do plano."""
+    encontrados = []
+    if no.get("Node Type") == "Seq Scan" and no.get("Relation Name") not in TABELAS_PEQUENAS:
+        encontrados.append(no["Relation Name"])
+    for filho in no.get("Plans", []):
+        encontrados.extend(seq_scans(filho))
+    return encontrados
+
+
+def analisar(conn, nome, params):
+    with conn.transaction(force_rollback=True):
+        with conn.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {REGISTRO[nome]}", params)
+            plano = cursor.fetchone()[0][0]
+    raiz = plano["Plan"]
+    return {
+        "seq_scans": seq_scans(raiz),
+        "execucao_ms": plano["Execution Time"],
+        "buffers": raiz.get("Shared Hit Blocks", 0) + raiz.get("Shared Read Blocks", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Falha se uma consulta quente usar Seq Scan")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DB_URL"), help="padrão: $BENCH_DB_URL")
+    parser.add_argument("--placa", default="BAA-0010")
+    parser.add_argument("--box", type=int, default=1)
+    parser.add_argument("--veiculo", type=int, default=11)
+    parser.add_argument("--ignorar", action="append", default=[], help="nome de consulta a não verificar (pode repetir)")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina BENCH_DB_URL")
+
+    exemplos = parametros_exemplo(args.placa, args.box, args.veiculo)
+    sem_exemplo = [nome for nome in REGISTRO if nome not in exemplos and nome not in args.ignorar]
+    if sem_exemplo:
+        print(f"❌ Consulta(s) do registro sem parâmetros de exemplo: {', '.join(sem_exemplo)}")
+        print("   Acrescente em parametros_exemplo (benchmarks/statements_preparados.py) ou use --ignorar.")
+        sys.exit(1)
+    falhas = []
+    with psycopg.connect(args.dsn, autocommit=True, cursor_factory=psycopg.ClientCursor) as conn:
+        print(f"\n{'CONSULTA':<28} {'EXEC (ms)':>10} {'BUFFERS':>9}  RESULTADO")
+        print("-" * 75)
+        for nome in REGISTRO:
+            if nome in args.ignorar:
+                continue
+            r = analisar(conn, nome, exemplos[nome])
+            resultado = "ok" if not r["seq_scans"] else "SEQ SCAN em " + ", ".join(sorted(set(r["seq_scans"])))
+            print(f"{nome:<28} {r['execucao_ms']:>10.2f} {r['buffers']:>9}  {resultado}")
+            if r["seq_scans"]:
+                falhas.append(nome)
+
+    if falhas:
+        print(f"\n❌ {len(falhas)} consulta(s) com Seq Scan: {', '.join(falhas)}")
+        sys.exit(1)
+    print("\n✅ Nenhuma consulta quente usa Seq Scan em tabela grande.")
+
+
+if __name__ == "__main__":
+    main()
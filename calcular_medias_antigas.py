@@ -1,7 +1,16 @@
 # calcular_medias_antigas.py
+"""
+Recalcula a média de KM/dia (e o estado incremental de veiculo_km_estado) de
+todos os veículos numa passada só: uma leitura ordenada do histórico, a regra
+de km_media.py aplicada em NumPy e a gravação por COPY + UPDATE ... FROM,
+tudo numa transação.
+"""
+import time
+
+import numpy as np
+
 from database import get_script_connection # MUDANÇA: Importa a nova função
-from core_utils import recalcular_media_veiculo
-import pandas as pd
+from km_media import recalcular_frota
 
 def calcular_tudo():
     print("Iniciando cálculo de médias para todo o histórico...")
@@ -11,25 +20,20 @@ def calcular_tudo():
         return
 
     try:
-        df_veiculos = pd.read_sql("SELECT DISTINCT veiculo_id FROM execucao_servico", conn)
-        veiculo_ids = df_veiculos['veiculo_id'].tolist()
-        
-        print(f"Encontrados {len(veiculo_ids)} veículos com histórico. Iniciando recálculo...")
-        
-        sucesso = 0
-        falha = 0
-        for i, veiculo_id in enumerate(veiculo_ids):
-            print(f"[{i+1}/{len(veiculo_ids)}] Processando veículo ID: {veiculo_id}", end=" ... ")
-            if recalcular_media_veiculo(conn, veiculo_id):
-                print("OK")
-                sucesso += 1
-            else:
-                print("FALHA")
-                falha += 1
-            
+        inicio = time.perf_counter()
+        resultado = recalcular_frota(conn)
+        conn.commit()
+        duracao = time.perf_counter() - inicio
+
+        com_media = int(np.count_nonzero(~np.isnan(resultado.medias)))
         print("\n--- CÁLCULO DE MÉDIAS ANTIGAS CONCLUÍDO ---")
-        print(f"Sucesso: {sucesso} veículos")
-        print(f"Falha: {falha} veículos")
+        print(f"Veículos com histórico de KM: {len(resultado.veiculo_ids)}")
+        print(f"Com média calculada: {com_media}")
+        print(f"Sem média (menos de 2 visitas válidas ou 0 dias): {len(resultado.veiculo_ids) - com_media}")
+        print(f"Tempo total: {duracao:.1f} s")
+    except Exception as e:
+        conn.rollback()
+        print(f"ERRO: recálculo desfeito, nenhuma média foi alterada: {e}")
 
     finally:
         if conn:
@@ -37,4 +41,4 @@ def calcular_tudo():
             print("\nConexão com o banco de dados fechada.")
 
 if __name__ == "__main__":
-    calcular_tudo()
\ No newline at end of file
+    calcular_tudo()
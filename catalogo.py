@@ -0,0 +1,128 @@
+# catalogo.py
+"""
+Cache do catálogo de serviços (servicos_borracharia / _alinhamento / _manutencao),
+um por processo, compartilhado pela API e pelas páginas do Streamlit.
+
+Guarda as listas ordenadas por área, um dicionário nome -> área (para achar a
+área de um serviço sem consulta nem busca em lista) e a versão 'catalogo' de
+recurso_versao (migração 0004) do momento da carga. É recarregado quando:
+- a versão do banco muda (a API sabe na hora pela escuta de recurso_versao;
+  o Streamlit confere a versão quando o TTL vence);
+- o TTL vence e a versão não pode ser conferida;
+- alguém chama cache.invalidar().
+
+O mesmo nome em duas áreas fica com a primeira na ordem de AREAS, como antes.
+"""
+
+import os
+import threading
+import time
+
+AREAS = ("borracharia", "alinhamento", "manutencao")
+
+# Uma consulta só; a ordem por nome segue a collation do banco, como os ORDER BY antigos
+CONSULTA_CATALOGO = """
+    SELECT 1 AS ordem, nome FROM servicos_borracharia
+    UNION ALL
+    SELECT 2, nome FROM servicos_alinhamento
+    UNION ALL
+    SELECT 3, nome FROM servicos_manutencao
+    ORDER BY 1, 2
+"""
+CONSULTA_VERSAO = "SELECT versao FROM recurso_versao WHERE recurso = 'catalogo'"
+
+CATALOGO_TTL_S = float(os.getenv("CATALOGO_TTL_S", "60"))
+
+
+class Catalogo:
+    """Foto imutável do catálogo. As listas são compartilhadas: não altere."""
+
+    __slots__ = ("por_area", "area_por_nome", "todos", "versao")
+
+    def __init__(self, linhas, versao):
+        self.por_area = {area: [] for area in AREAS}
+        for ordem, nome in linhas:
+            self.por_area[AREAS[ordem - 1]].append(nome)
+        self.area_por_nome = {}
+        for area in AREAS:
+            for nome in self.por_area[area]:
+                self.area_por_nome.setdefault(nome, area)
+        self.todos = sorted(self.area_por_nome)
+        self.versao = versao
+
+    def area_de(self, nome):
+        return self.area_por_nome.get(nome)
+
+
+class CacheCatalogo:
+    """Seguro entre threads (sessões do Streamlit) e entre tarefas asyncio (sem await interno)."""
+
+    def __init__(self, ttl_s=CATALOGO_TTL_S):
+        self.ttl_s = ttl_s
+        self.lock_carga = threading.Lock()
+        self._atual = None
+        self._expira_em = 0.0
+        self.cargas = 0
+
+    @property
+    def atual(self):
+        return self._atual
+
+    def valido(self, versao=None):
+        """Catálogo em cache se ainda vale (dentro do TTL e, se informada, na mesma versão)."""
+        atual = self._atual
+        if atual is None or time.monotonic() >= self._expira_em:
+            return None
+        if versao is not None and versao != atual.versao:
+            return None
+        return atual
+
+    def atualizar(self, linhas, versao):
+        catalogo = Catalogo(linhas, versao)
+        self._atual = catalogo
+        self._expira_em = time.monotonic() + self.ttl_s
+        self.cargas += 1
+        return catalogo
+
+    def renovar(self):
+        """Versão conferida e igual: vale por mais um TTL sem reler as listas."""
+        self._expira_em = time.monotonic() + self.ttl_s
+
+    def invalidar(self):
+        self._expira_em = 0.0
+
+
+cache = CacheCatalogo()
+
+
+def obter_catalogo(get_connection, release_connection):
+    """
+    Versão síncrona (Streamlit / scripts, qualquer driver DB-API). Com TTL
+    vencido confere a versão no banco e só relê as listas se ela mudou.
+    """
+    catalogo = cache.valido()
+    if catalogo is not None:
+        return catalogo
+    with cache.lock_carga:
+        # Outra sessão pode ter recarregado enquanto esta esperava
+        catalogo = cache.valido()
+        if catalogo is not None:
+            return catalogo
+        conn = get_connection()
+        if not conn:
+            return cache.atual or Catalogo([], None)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(CONSULTA_VERSAO)
+                row = cursor.fetchone()
+                versao = row[0] if row else None
+                anterior = cache.atual
+                if anterior is not None and versao is not None and versao == anterior.versao:
+                    cache.renovar()
+                    return anterior
+                cursor.execute(CONSULTA_CATALOGO)
+                linhas = cursor.fetchall()
+            conn.commit()
+        finally:
+            release_connection(conn)
+        return cache.atualizar(linhas, versao)
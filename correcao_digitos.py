@@ -0,0 +1,222 @@
+# correcao_digitos.py
+"""
+Motor da correção de dígito do hodômetro (KM digitada sem o milhão: 1.234.567
+virou 234.567), usado por simular_correcoes_digitos_v3.py.
+
+Para um histórico com KM decrescente, procura o grupo de visitas que, somando
++1.000.000, deixa a sequência não decrescente com o km/dia mais uniforme
+(score pelo coeficiente de variação, 0-100). O resultado é o mesmo da busca
+antiga por força bruta (encontrar_melhor_grupo: todos os subconjuntos via
+itertools.combinations, o primeiro de maior score), mas:
+
+- só são gerados os grupos que mantêm a sequência não decrescente: a regra
+  vale par a par (visita anterior/atual, com ou sem +1M), então os
+  candidatos crescem visita a visita descartando prefixos impossíveis;
+- os scores de todos os candidatos saem de uma vez em NumPy (uma matriz
+  candidatos x visitas).
+
+Um histórico são arrays NumPy em ordem de data: kms e dia (data de cada
+visita em dias, ex. datetime64[D] como inteiro). dias = intervalos(dia) são os
+dias entre visitas seguidas com mínimo 1, como a busca antiga usava.
+"""
+
+from itertools import combinations
+from statistics import median
+
+import numpy as np
+
+MILHAO = 1_000_000
+SCORE_MINIMO = 70
+KM_DIA_MAXIMO = 1500
+KM_DIA_MAXIMO_HISTORICO = 1000
+
+# Escada do score pelo coeficiente de variação: cv < limite -> score
+LIMITES_CV = np.array([0.15, 0.25, 0.40, 0.60])
+SCORES_CV = np.array([100, 95, 80, 65, 20])
+# Ajuste pela média histórica do veículo: desvio relativo < 0,2 soma 10, > 0,8 tira 20
+LIMITES_HISTORICO = np.array([0.2, 0.8])
+# Perto assim de um limite, a soma em outra ordem pode mudar o lado: confere com avaliar_grupo
+TOLERANCIA_LIMITE = 1e-9
+
+
+def intervalos(dia):
+    return np.maximum(np.diff(np.asarray(dia, dtype=np.int64)), 1)
+
+
+def km_dia_historico(kms, dia):
+    """Mediana de km/dia entre visitas seguidas com KM > 0 (0 < km/dia < 1000), ou None."""
+    kms = np.asarray(kms, dtype=np.int64)
+    positivas = kms > 0
+    if np.count_nonzero(positivas) < 2:
+        return None
+    delta_km = np.diff(kms[positivas])
+    delta_dias = np.diff(np.asarray(dia, dtype=np.int64)[positivas])
+    ok = (delta_dias > 0) & (delta_km > 0)
+    km_dia = delta_km[ok] / delta_dias[ok]
+    km_dia = km_dia[(km_dia > 0) & (km_dia < KM_DIA_MAXIMO_HISTORICO)]
+    return float(np.median(km_dia)) if len(km_dia) else None
+
+
+def descrescentes(kms):
+    """Posições cuja KM é menor que a da visita anterior."""
+    return np.flatnonzero(np.diff(np.asarray(kms, dtype=np.int64)) < 0) + 1
+
+
+def candidatos(kms):
+    """
+    Matriz 0/1 (candidatos x visitas) com todos os grupos para +1M que deixam
+    a sequência não decrescente, sem o grupo vazio e sem o grupo completo.
+    """
+    kms = np.asarray(kms, dtype=np.int64)
+    anterior, atual = kms[:-1], kms[1:]
+    # permitido[i, a, b]: visita i com marca a seguida da visita i+1 com marca b
+    permitido = np.empty((len(atual), 2, 2), dtype=bool)
+    permitido[:, 0, 0] = permitido[:, 1, 1] = atual >= anterior
+    permitido[:, 0, 1] = atual + MILHAO >= anterior
+    permitido[:, 1, 0] = atual >= anterior + MILHAO
+
+    grupos = np.array([[0], [1]], dtype=np.int8)
+    for i in range(len(atual)):
+        ultima = grupos[:, -1]
+        fica_0 = grupos[permitido[i, ultima, 0]]
+        vira_1 = grupos[permitido[i, ultima, 1]]
+        grupos = np.vstack([
+            np.hstack([fica_0, np.zeros((len(fica_0), 1), dtype=np.int8)]),
+            np.hstack([vira_1, np.ones((len(vira_1), 1), dtype=np.int8)]),
+        ])
+        if not len(grupos):
+            break
+    tamanho = grupos.sum(axis=1)
+    return grupos[(tamanho > 0) & (tamanho < len(kms))]
+
+
+def scores(kms, dias, grupos, historico=None):
+    """Score de cada grupo (linhas de `grupos`), a mesma conta de avaliar_grupo."""
+    kms_teste = np.asarray(kms, dtype=np.int64) + MILHAO * grupos.astype(np.int64)
+    km_dia = np.diff(kms_teste, axis=1) / np.asarray(dias, dtype=np.float64)
+    conta = (km_dia > 0) & (km_dia < KM_DIA_MAXIMO)
+    n = conta.sum(axis=1)
+    com_dados = n > 0
+    n_div = np.maximum(n, 1)
+
+    media = np.where(conta, km_dia, 0.0).sum(axis=1) / n_div
+    desvio = np.sqrt(np.where(conta, (km_dia - media[:, None]) ** 2, 0.0).sum(axis=1) / n_div)
+    cv = np.where(media > 0, desvio / np.where(media > 0, media, 1.0), 1.0)
+    resultado = SCORES_CV[np.searchsorted(LIMITES_CV, cv, side="right")]
+    perto = np.any(np.abs(cv[:, None] - LIMITES_CV) < TOLERANCIA_LIMITE, axis=1)
+
+    if historico and historico > 0:
+        desvio_historico = np.abs(media - historico) / historico
+        resultado = np.where(desvio_historico < LIMITES_HISTORICO[0], np.minimum(100, resultado + 10), resultado)
+        resultado = np.where(desvio_historico > LIMITES_HISTORICO[1], np.maximum(0, resultado - 20), resultado)
+        perto |= np.any(np.abs(desvio_historico[:, None] - LIMITES_HISTORICO) < TOLERANCIA_LIMITE, axis=1)
+
+    resultado = np.where(com_dados, resultado, 0)
+    for i in np.flatnonzero(perto & com_dados):
+        resultado[i] = avaliar_grupo(kms, dias, np.flatnonzero(grupos[i]), historico)
+    return resultado
+
+
+def melhor_grupo(kms, dias, historico=None, min_score=SCORE_MINIMO):
+    """
+    (indices, score) do melhor grupo para +1M; indices é None quando nenhum
+    chega a min_score. Empate: o que a busca por força bruta acharia primeiro,
+    o menor grupo e, entre os do mesmo tamanho, a menor tupla de índices.
+    """
+    grupos = candidatos(kms)
+    if not len(grupos):
+        return None, 0
+    pontos = scores(kms, dias, grupos, historico)
+    melhor = int(pontos.max())
+    indices = min(
+        (tuple(np.flatnonzero(grupos[i]).tolist()) for i in np.flatnonzero(pontos == melhor)),
+        key=lambda t: (len(t), t),
+    )
+    if melhor >= min_score:
+        return indices, melhor
+    return None, melhor
+
+
+# --- REFERÊNCIA (versão antiga, por força bruta) ---
+
+def avaliar_grupo(km_values, dias_intervals, grupo_indices, histórico_km_dia=None):
+    """
+    Calcula score de qualidade de uma correção (0-100)
+    Quanto MAIOR o score, melhor a correção
+    """
+    km_teste = [int(k) for k in km_values]
+
+    for idx in grupo_indices:
+        km_teste[idx] += MILHAO
+
+    for i in range(1, len(km_teste)):
+        if km_teste[i] < km_teste[i-1]:
+            return 0
+
+    diffs = []
+    for i in range(1, len(km_teste)):
+        diff_km = km_teste[i] - km_teste[i-1]
+        dias = dias_intervals[i-1] if i-1 < len(dias_intervals) else 1
+        if dias > 0:
+            km_dia = diff_km / dias
+            if 0 < km_dia < KM_DIA_MAXIMO:
+                diffs.append(km_dia)
+
+    if not diffs:
+        return 0
+
+    diffs = np.array(diffs)
+    media = np.mean(diffs)
+    desvio = np.std(diffs)
+    cv = desvio / media if media > 0 else 1.0
+
+    if cv < 0.15:
+        score = 100
+    elif cv < 0.25:
+        score = 95
+    elif cv < 0.40:
+        score = 80
+    elif cv < 0.60:
+        score = 65
+    else:
+        score = 20
+
+    if histórico_km_dia and histórico_km_dia > 0:
+        desvio_historico = abs(media - histórico_km_dia) / histórico_km_dia
+        if desvio_historico < 0.2:
+            score = min(100, score + 10)
+        elif desvio_historico > 0.8:
+            score = max(0, score - 20)
+
+    return int(score)
+
+
+def melhor_grupo_forca_bruta(km_values, dias_intervals, histórico_km_dia=None, min_score=SCORE_MINIMO):
+    """A busca antiga: todos os subconjuntos. Exponencial; só para conferência."""
+    melhor_score = -1
+    melhor = None
+    for r in range(1, len(km_values)):
+        for grupo_indices in combinations(range(len(km_values)), r):
+            score = avaliar_grupo(km_values, dias_intervals, grupo_indices, histórico_km_dia)
+            if score > melhor_score:
+                melhor_score = score
+                melhor = grupo_indices
+    if melhor_score >= min_score:
+        return melhor, melhor_score
+    return None, melhor_score
+
+
+def km_dia_historico_antigo(kms, datas):
+    """calcular_km_dia_media antiga, com datas (date) em vez de dias."""
+    visitas = [(d, k) for d, k in zip(datas, kms) if k > 0]
+    if len(visitas) < 2:
+        return None
+    km_diffs = []
+    for (d0, k0), (d1, k1) in zip(visitas[:-1], visitas[1:]):
+        km_diff = k1 - k0
+        days_diff = (d1 - d0).days
+        if days_diff > 0 and km_diff > 0:
+            km_dia = km_diff / days_diff
+            if 0 < km_dia < KM_DIA_MAXIMO_HISTORICO:
+                km_diffs.append(km_dia)
+    return median(km_diffs) if km_diffs else None
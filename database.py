@@ -1,8 +1,9 @@
 import streamlit as st
-from psycopg2 import pool
 import psycopg2
 import os
+import logging
 from dotenv import load_dotenv
+from db_pool import PoolConexoes, PoolEsgotadoError, identificar_call_site
 
 # --- FUNÇÕES PARA O APLICATIVO STREAMLIT (NÃO MUDAM) ---
 
@@ -13,17 +14,34 @@ def get_db_url():
         load_dotenv()
         return os.getenv("DB_URL")
 
+def _config_pool(nome, padrao):
+    if hasattr(st, 'secrets') and st.secrets.get(nome):
+        return st.secrets[nome]
+    return os.getenv(nome, padrao)
+
 @st.cache_resource
 def init_connection_pool():
     db_url = get_db_url()
     if not db_url:
         raise ValueError("URL do banco de dados não encontrada.")
-    return pool.SimpleConnectionPool(1, 10, dsn=db_url)
+    # Compartilhado por todas as sessões (threads) do Streamlit: precisa ser thread-safe
+    return PoolConexoes(
+        db_url,
+        minconn=int(_config_pool("DB_POOL_MIN_SIZE", 1)),
+        maxconn=int(_config_pool("DB_POOL_MAX_SIZE", 10)),
+        timeout=float(_config_pool("DB_POOL_TIMEOUT", 10)),
+        max_espera=int(_config_pool("DB_POOL_MAX_WAITING", 50)),
+        limite_retencao_s=float(_config_pool("DB_POOL_LEAK_THRESHOLD", 10)),
+    )
 
 def get_connection():
     connection_pool = init_connection_pool()
     if connection_pool:
-        return connection_pool.getconn()
+        try:
+            return connection_pool.getconn(call_site=identificar_call_site())
+        except PoolEsgotadoError as e:
+            logging.getLogger(__name__).error("Pool de conexões esgotado: %s", e)
+            return None
     return None
 
 def release_connection(conn):
@@ -31,6 +49,10 @@ def release_connection(conn):
     if connection_pool and conn:
         connection_pool.putconn(conn)
 
+def get_pool_stats():
+    """Tamanho, espera, conexões em uso e retenções por call site (para monitoramento)."""
+    return init_connection_pool().stats()
+
 # --- NOVA FUNÇÃO PARA SCRIPTS INDEPENDENTES ---
 
 def get_script_connection():
@@ -0,0 +1,225 @@
+# db_pool.py
+"""
+Pool de conexões thread-safe e instrumentado.
+
+O psycopg2.pool.SimpleConnectionPool não é seguro entre threads, e o Streamlit
+roda cada sessão numa thread própria compartilhando o mesmo pool. Este pool:
+- protege o estado com um Condition (seguro entre threads);
+- quando esgotado, coloca quem chamou numa fila limitada com timeout
+  (em vez de levantar PoolError na hora);
+- mede por "call site" (módulo.função que pediu a conexão) quantas vezes e por
+  quanto tempo a conexão ficou emprestada, e avisa no log quando alguém segura
+  uma conexão além do limite (ex.: revisao_proativa.app segurando durante toda a página).
+"""
+
+import logging
+import sys
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão ficou livre dentro do timeout (ou a fila de espera está cheia)."""
+
+
+def identificar_call_site(profundidade=2):
+    """Retorna 'modulo.funcao' de quem chamou a função que chamou esta."""
+    frame = sys._getframe(profundidade)
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+class RastreadorCheckout:
+    """
+    Estatísticas de empréstimo de conexões por call site e registro das
+    conexões em uso. Não depende do driver: serve para o pool psycopg2 do
+    Streamlit e para o pool async da API.
+    """
+
+    def __init__(self, limite_retencao_s=10.0):
+        self.limite_retencao_s = limite_retencao_s
+        self._lock = threading.Lock()
+        self._em_uso = {}
+        self._por_call_site = {}
+
+    def registrar_checkout(self, conn, call_site, espera_s=0.0):
+        with self._lock:
+            self._em_uso[id(conn)] = (call_site, time.monotonic())
+            est = self._por_call_site.setdefault(call_site, {
+                "checkouts": 0, "tempo_total_s": 0.0, "tempo_max_s": 0.0,
+                "espera_total_s": 0.0, "retencoes_longas": 0,
+            })
+            est["checkouts"] += 1
+            est["espera_total_s"] += espera_s
+
+    def registrar_devolucao(self, conn):
+        with self._lock:
+            registro = self._em_uso.pop(id(conn), None)
+            if registro is None:
+                return
+            call_site, inicio = registro
+            retido_s = time.monotonic() - inicio
+            est = self._por_call_site[call_site]
+            est["tempo_total_s"] += retido_s
+            est["tempo_max_s"] = max(est["tempo_max_s"], retido_s)
+            if retido_s > self.limite_retencao_s:
+                est["retencoes_longas"] += 1
+        if retido_s > self.limite_retencao_s:
+            logger.warning("Conexão retida por %.1fs em %s (limite %.1fs)", retido_s, call_site, self.limite_retencao_s)
+
+    def em_uso(self):
+        return len(self._em_uso)
+
+    def conexoes_retidas(self):
+        """Conexões emprestadas há mais tempo que o limite e ainda não devolvidas."""
+        agora = time.monotonic()
+        with self._lock:
+            return [
+                {"call_site": call_site, "retida_s": round(agora - inicio, 3)}
+                for call_site, inicio in self._em_uso.values()
+                if agora - inicio > self.limite_retencao_s
+            ]
+
+    def por_call_site(self):
+        with self._lock:
+            return {
+                call_site: {
+                    **est,
+                    "tempo_medio_s": est["tempo_total_s"] / est["checkouts"] if est["checkouts"] else 0.0,
+                }
+                for call_site, est in self._por_call_site.items()
+            }
+
+
+class PoolConexoes:
+    """Pool psycopg2 thread-safe com fila de espera limitada e instrumentação."""
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=10.0, max_espera=50, limite_retencao_s=10.0):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_espera = max_espera
+        self.rastreador = RastreadorCheckout(limite_retencao_s)
+
+        self._cond = threading.Condition()
+        self._livres = []
+        self._abertas = 0
+        self._esperando = 0
+        self._fechado = False
+        self._timeouts = 0
+        self._espera_total_s = 0.0
+        self._espera_max_s = 0.0
+
+        for _ in range(minconn):
+            self._livres.append(psycopg2.connect(dsn))
+            self._abertas += 1
+
+    def getconn(self, call_site=None):
+        call_site = call_site or identificar_call_site()
+        inicio = time.monotonic()
+        prazo = inicio + self.timeout
+        abrir_nova = False
+
+        with self._cond:
+            if self._fechado:
+                raise PoolEsgotadoError("Pool fechado")
+            if not self._livres and self._abertas >= self.maxconn and self._esperando >= self.max_espera:
+                self._timeouts += 1
+                raise PoolEsgotadoError(f"Fila de espera cheia ({self.max_espera})")
+
+            self._esperando += 1
+            try:
+                while not self._livres and self._abertas >= self.maxconn:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        self._timeouts += 1
+                        raise PoolEsgotadoError(f"Sem conexão livre após {self.timeout:.1f}s")
+                    self._cond.wait(restante)
+            finally:
+                self._esperando -= 1
+
+            if self._livres:
+                conn = self._livres.pop()
+            else:
+                # Reserva a vaga agora e conecta fora do lock
+                self._abertas += 1
+                abrir_nova = True
+
+        if abrir_nova:
+            try:
+                conn = psycopg2.connect(self.dsn)
+            except Exception:
+                with self._cond:
+                    self._abertas -= 1
+                    self._cond.notify()
+                raise
+        elif conn.closed:
+            with self._cond:
+                self._abertas -= 1
+            return self.getconn(call_site)
+
+        espera_s = time.monotonic() - inicio
+        with self._cond:
+            self._espera_total_s += espera_s
+            self._espera_max_s = max(self._espera_max_s, espera_s)
+        self.rastreador.registrar_checkout(conn, call_site, espera_s)
+        return conn
+
+    def putconn(self, conn, close=False):
+        self.rastreador.registrar_devolucao(conn)
+
+        if not conn.closed and not close:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                # Mesma política do pool do psycopg2: não devolve transação aberta
+                try:
+                    conn.rollback()
+                except Exception as exc:
+                    # Conexão morta (queda de rede, idle_in_transaction_session_timeout):
+                    # fecha e libera a vaga em vez de perdê-la
+                    logger.warning("Conexão descartada ao devolver: rollback falhou (%s)", exc)
+                    close = True
+
+        with self._cond:
+            if close or conn.closed or self._fechado:
+                if not conn.closed:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                self._abertas -= 1
+            else:
+                self._livres.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._fechado = True
+            for conn in self._livres:
+                conn.close()
+            self._abertas -= len(self._livres)
+            self._livres = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "tamanho_min": self.minconn,
+                "tamanho_max": self.maxconn,
+                "abertas": self._abertas,
+                "livres": len(self._livres),
+                "em_uso": self.rastreador.em_uso(),
+                "esperando": self._esperando,
+                "timeouts": self._timeouts,
+                "espera_total_s": round(self._espera_total_s, 3),
+                "espera_max_s": round(self._espera_max_s, 3),
+                "conexoes_retidas": self.rastreador.conexoes_retidas(),
+                "por_call_site": self.rastreador.por_call_site(),
+            }
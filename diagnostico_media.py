@@ -1,7 +1,8 @@
 # diagnostico_media.py
 from database import get_script_connection
 import pandas as pd
-import re
+
+from km_media import MAX_VISITAS, media_km, visitas_validas
 
 def analisar_veiculo_detalhadamente(conn, veiculo_id):
     """
@@ -28,49 +29,50 @@ def analisar_veiculo_detalhadamente(conn, veiculo_id):
     print("\n--- PASSO 1: DADOS BRUTOS DO BANCO ---")
     print(df_veiculo.to_string())
 
-    # 2. Limpeza de Duplicatas
-    df_sem_duplicatas = df_veiculo.drop_duplicates(subset=['quilometragem'], keep='last').reset_index(drop=True)
-    print("\n--- PASSO 2: DADOS APÓS REMOVER QUILOMETRAGENS DUPLICADAS ---")
-    print(df_sem_duplicatas.to_string())
-
-    # 3. Lógica de Validação (KM crescente)
-    print("\n--- PASSO 3: VERIFICAÇÃO DE QUILOMETRAGEM CRESCENTE (VISITA A VISITA) ---")
-    last_valid_km = -1
-    valid_indices = []
-    for index, row in df_sem_duplicatas.iterrows():
-        print(f"  - Verificando linha {index}: Data={row['fim_execucao'].date()}, KM={int(row['quilometragem'])}")
-        if row['quilometragem'] > last_valid_km:
-            valid_indices.append(index)
-            last_valid_km = row['quilometragem']
-            print(f"    -> OK: {int(row['quilometragem'])} > {int(last_valid_km) if last_valid_km != row['quilometragem'] else 'início'}. Linha mantida.")
+    # 2. Regras 2 e 3 (km_media.visitas_validas), visita a visita
+    kms = df_veiculo['quilometragem'].to_numpy()
+    validas = visitas_validas(kms)
+    mantidas = set(validas.tolist())
+    print("\n--- PASSO 2: VISITAS MANTIDAS E DESCARTADAS ---")
+    maior_km = -1
+    for index, row in df_veiculo.iterrows():
+        km = int(row['quilometragem'])
+        print(f"  - Linha {index}: Data={row['fim_execucao'].date()}, KM={km}")
+        if index in mantidas:
+            print("    -> OK: KM maior que todas as anteriores. Linha mantida.")
+        elif km in kms[index + 1:]:
+            print("    -> DESCARTADO: a mesma KM aparece numa visita posterior (vale a última).")
         else:
-            print(f"    -> DESCARTADO: {int(row['quilometragem'])} não é maior que a última KM válida ({int(last_valid_km)}).")
-    
-    valid_group = df_sem_duplicatas.loc[valid_indices]
-    print("\n--- PASSO 4: DADOS FINAIS VÁLIDOS PARA O CÁLCULO ---")
-    print(valid_group.to_string())
+            print(f"    -> DESCARTADO: {km} não é maior que a maior KM anterior ({maior_km}).")
+        if index in mantidas:
+            maior_km = max(maior_km, km)
 
-    # 4. Decisão Final
-    print("\n--- PASSO 5: DECISÃO FINAL ---")
-    if len(valid_group) < 2:
-        print(f"RESULTADO: Média será NULA. Motivo: O número de visitas válidas ({len(valid_group)}) é menor que o mínimo de 2 necessário.")
-    else:
-        primeira_visita = valid_group.iloc[0]
-        ultima_visita = valid_group.iloc[-1]
-        delta_km = ultima_visita['quilometragem'] - primeira_visita['quilometragem']
-        delta_dias = (ultima_visita['fim_execucao'] - primeira_visita['fim_execucao']).days
+    ultimas = df_veiculo.iloc[validas[-MAX_VISITAS:]]
+    print(f"\n--- PASSO 3: ÚLTIMAS {MAX_VISITAS} VISITAS VÁLIDAS (USADAS NO CÁLCULO) ---")
+    print(ultimas.to_string())
 
-        print(f"  - Usando {len(valid_group)} visitas para o cálculo.")
-        print(f"  - Primeira Visita: {primeira_visita['fim_execucao'].date()} ({int(primeira_visita['quilometragem'])} km)")
-        print(f"  - Última Visita:   {ultima_visita['fim_execucao'].date()} ({int(ultima_visita['quilometragem'])} km)")
-        print(f"  - Delta KM: {delta_km}")
-        print(f"  - Delta Dias: {delta_dias}")
+    # 3. Decisão Final (a mesma conta de km_media.media_km)
+    print("\n--- PASSO 4: DECISÃO FINAL ---")
+    media_km_diaria = media_km(df_veiculo['fim_execucao'].to_numpy(), kms)
+    if len(ultimas) < 2:
+        print(f"RESULTADO: Média será NULA. Motivo: O número de visitas válidas ({len(ultimas)}) é menor que o mínimo de 2 necessário.")
+        return
 
-        if delta_dias > 0:
-            media_km_diaria = float(delta_km / delta_dias)
-            print(f"\nRESULTADO: Média calculada com sucesso: {media_km_diaria:.2f} km/dia.")
-        else:
-            print("\nRESULTADO: Média será NULA. Motivo: O intervalo de dias entre a primeira e a última visita é zero.")
+    primeira_visita = ultimas.iloc[0]
+    ultima_visita = ultimas.iloc[-1]
+    delta_km = int(ultima_visita['quilometragem']) - int(primeira_visita['quilometragem'])
+    delta_dias = (ultima_visita['fim_execucao'] - primeira_visita['fim_execucao']).days
+
+    print(f"  - Usando {len(ultimas)} visitas para o cálculo.")
+    print(f"  - Primeira Visita: {primeira_visita['fim_execucao'].date()} ({int(primeira_visita['quilometragem'])} km)")
+    print(f"  - Última Visita:   {ultima_visita['fim_execucao'].date()} ({int(ultima_visita['quilometragem'])} km)")
+    print(f"  - Delta KM: {delta_km}")
+    print(f"  - Delta Dias: {delta_dias}")
+
+    if media_km_diaria is not None:
+        print(f"\nRESULTADO: Média calculada com sucesso: {media_km_diaria:.2f} km/dia.")
+    else:
+        print("\nRESULTADO: Média será NULA. Motivo: O intervalo de dias entre a primeira e a última visita é zero.")
 
 def run_diagnostico():
     veiculo_id_para_analisar = input("Digite o ID do veículo que deseja diagnosticar (ex: 134): ")
@@ -2,206 +2,228 @@
 """
 SCRIPT: extrair_problemas_detalhado_FIXO.py
 ============================================
-Extrai problemas de quilometragem - VISITA POR VISITA
-VERSÃO CORRIGIDA: km_dia anterior e proximo
+Extrai problemas de quilometragem - VISITA POR VISITA, da frota inteira
+(veículos com 3 ou mais visitas finalizadas com KM).
+
+Uma consulta só faz todo o trabalho no banco: LAG/LEAD trazem a visita
+anterior e a próxima (KM, data, dias e km/dia), percentile_cont a mediana dos
+aumentos de KM de cada veículo e um CASE classifica a visita:
+
+    ZERADO        KM = 0
+    DESCRESCENTE  KM menor que a da visita anterior
+    OUTLIER       aumento maior que 3x a mediana dos aumentos do veículo
+    OK            nenhum dos anteriores
+
+O resultado vem por um cursor nomeado (server-side), em blocos, e é gravado
+bloco a bloco em CSV ou Parquet (Parquet precisa do pyarrow).
+
+Uso:
+    python extrair_problemas_detalhado_FIXO.py
+    python extrair_problemas_detalhado_FIXO.py --formato parquet
 """
 
+import argparse
 import os
-import psycopg2
+import sys
+import time
+
 import pandas as pd
+import psycopg2
 from dotenv import load_dotenv
-from statistics import median
 
 load_dotenv()
 
-db_url = os.getenv("DB_URL")
-if not db_url:
-    print("❌ DB_URL não encontrada em .env")
-    exit(1)
-
-print("🔍 Conectando ao banco...")
-conn = psycopg2.connect(db_url)
-
-query_veiculos = """
-SELECT DISTINCT v.id, v.placa
-FROM veiculos v
-INNER JOIN execucao_servico es ON v.id = es.veiculo_id
-WHERE es.status = 'finalizado' AND es.quilometragem IS NOT NULL
-GROUP BY v.id, v.placa
-HAVING COUNT(*) >= 3
-ORDER BY v.id
-LIMIT 200
+LINHAS_POR_BLOCO = 50000
+AMOSTRA_PROBLEMAS = 30
+
+COLUNAS = [
+    'veiculo_id', 'placa', 'visita_indice', 'data_visita', 'km_registrado', 'problema_tipo',
+    'km_anterior', 'data_anterior', 'dias_anterior', 'km_dia_anterior',
+    'km_proximo', 'data_proximo', 'dias_proximo', 'km_dia_proximo',
+]
+# Colunas inteiras que podem vir nulas (primeira/última visita)
+INTEIRAS_OPCIONAIS = ['km_anterior', 'dias_anterior', 'km_proximo', 'dias_proximo']
+
+QUERY_PROBLEMAS = """
+WITH visitas AS (
+    SELECT
+        es.veiculo_id,
+        es.quilometragem AS km,
+        es.fim_execucao::date AS data_visita,
+        ROW_NUMBER() OVER w AS visita_indice,
+        COUNT(*) OVER (PARTITION BY es.veiculo_id) AS total_visitas,
+        LAG(es.quilometragem) OVER w AS km_anterior,
+        LAG(es.fim_execucao::date) OVER w AS data_anterior,
+        LEAD(es.quilometragem) OVER w AS km_proximo,
+        LEAD(es.fim_execucao::date) OVER w AS data_proximo
+    FROM execucao_servico es
+    WHERE es.status = 'finalizado'
+      AND es.quilometragem IS NOT NULL
+      AND es.fim_execucao IS NOT NULL
+    WINDOW w AS (PARTITION BY es.veiculo_id ORDER BY es.fim_execucao, es.id)
+),
+medianas AS (
+    SELECT
+        veiculo_id,
+        COALESCE(
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY km - km_anterior) FILTER (WHERE km - km_anterior > 0),
+            0
+        ) * 3 AS limite_outlier
+    FROM visitas
+    WHERE total_visitas >= 3
+    GROUP BY veiculo_id
+)
+SELECT
+    v.veiculo_id,
+    ve.placa,
+    v.visita_indice,
+    v.data_visita,
+    v.km AS km_registrado,
+    CASE
+        WHEN v.km = 0 THEN 'ZERADO'
+        WHEN v.km < v.km_anterior THEN 'DESCRESCENTE'
+        WHEN v.km - v.km_anterior > m.limite_outlier THEN 'OUTLIER'
+        ELSE 'OK'
+    END AS problema_tipo,
+    NULLIF(v.km_anterior, 0) AS km_anterior,
+    v.data_anterior,
+    v.data_visita - v.data_anterior AS dias_anterior,
+    CASE WHEN v.data_visita > v.data_anterior
+         THEN ROUND((v.km - v.km_anterior)::numeric / (v.data_visita - v.data_anterior), 2)
+    END AS km_dia_anterior,
+    NULLIF(v.km_proximo, 0) AS km_proximo,
+    v.data_proximo,
+    v.data_proximo - v.data_visita AS dias_proximo,
+    CASE WHEN v.data_proximo > v.data_visita
+         THEN ROUND((v.km_proximo - v.km)::numeric / (v.data_proximo - v.data_visita), 2)
+    END AS km_dia_proximo
+FROM visitas v
+JOIN medianas m ON m.veiculo_id = v.veiculo_id
+JOIN veiculos ve ON ve.id = v.veiculo_id
+ORDER BY v.veiculo_id, v.visita_indice
 """
 
-print("📊 Carregando veículos...\n")
-df_veiculos = pd.read_sql(query_veiculos, conn)
-total_veiculos = len(df_veiculos)
-print(f"Total de veículos: {total_veiculos}\n")
-
-todos_registros = []
-
-def processar_veiculo(conn, veiculo_id, placa):
-    """Processa um veículo e retorna lista de registros"""
-    
-    query = """
-    SELECT fim_execucao, quilometragem
-    FROM execucao_servico
-    WHERE veiculo_id = %s AND status = 'finalizado'
-    ORDER BY fim_execucao ASC
-    """
-    
-    df = pd.read_sql(query, conn, params=(veiculo_id,))
-    
-    if df.empty or len(df) < 3:
-        return []
-    
-    # Calcular diferenças para detectar outliers
-    diffs = []
-    for i in range(1, len(df)):
-        diff = df.iloc[i]['quilometragem'] - df.iloc[i-1]['quilometragem']
-        if diff > 0:
-            diffs.append(diff)
-    
-    mediana_local = median(diffs) if diffs else 0
-    limite_outlier = mediana_local * 3
-    
-    registros = []
-    
-    for i in range(len(df)):
-        km_atual = df.iloc[i]['quilometragem']
-        data_atual = df.iloc[i]['fim_execucao'].date()
-        
-        # Informações anterior
-        km_anterior = None
-        data_anterior = None
-        dias_anterior = None
-        km_dia_anterior = None
-        tipo_problema = "OK"
-        
-        if i > 0:
-            km_anterior = df.iloc[i-1]['quilometragem']
-            data_anterior = df.iloc[i-1]['fim_execucao'].date()
-            dias_anterior = (data_atual - data_anterior).days
-            # CORRIGIR: Apenas calcular se dias > 0 (evita NaN/Inf)
-            if dias_anterior > 0:
-                km_dia_anterior = round((km_atual - km_anterior) / dias_anterior, 2)
-            else:
-                km_dia_anterior = None
-        
-        # Informações próximo
-        km_proximo = None
-        data_proximo = None
-        dias_proximo = None
-        km_dia_proximo = None
-        
-        if i < len(df) - 1:
-            km_proximo = df.iloc[i+1]['quilometragem']
-            data_proximo = df.iloc[i+1]['fim_execucao'].date()
-            dias_proximo = (data_proximo - data_atual).days
-            # CORRIGIR: Apenas calcular se dias > 0 (evita NaN/Inf)
-            if dias_proximo > 0:
-                km_dia_proximo = round((km_proximo - km_atual) / dias_proximo, 2)
-            else:
-                km_dia_proximo = None
-        
-        # Detectar problemas
-        if km_atual == 0:
-            tipo_problema = "ZERADO"
-        elif i > 0 and km_atual < km_anterior:
-            tipo_problema = "DESCRESCENTE"
-        elif i > 0 and (km_atual - km_anterior) > limite_outlier:
-            tipo_problema = "OUTLIER"
-        
-        registros.append({
-            'veiculo_id': veiculo_id,
-            'placa': placa,
-            'visita_indice': i + 1,
-            'data_visita': data_atual.strftime('%Y-%m-%d'),
-            'km_registrado': int(km_atual),
-            'problema_tipo': tipo_problema,
-            'km_anterior': int(km_anterior) if km_anterior else None,
-            'data_anterior': data_anterior.strftime('%Y-%m-%d') if data_anterior else None,
-            'dias_anterior': dias_anterior,
-            'km_dia_anterior': km_dia_anterior,  # Agora será number corretamente
-            'km_proximo': int(km_proximo) if km_proximo else None,
-            'data_proximo': data_proximo.strftime('%Y-%m-%d') if data_proximo else None,
-            'dias_proximo': dias_proximo,
-            'km_dia_proximo': km_dia_proximo  # Agora será number corretamente
-        })
-    
-    return registros
-
-
-print("🔎 Processando veículos...\n")
-print("=" * 140)
-
-contador = 0
-for idx, veiculo in df_veiculos.iterrows():
-    veiculo_id = int(veiculo['id'])
-    placa = veiculo['placa']
-    
-    registros = processar_veiculo(conn, veiculo_id, placa)
-    
-    if not registros:
-        continue
-    
-    # Verificar se tem algum problema
-    tem_problema = any(r['problema_tipo'] != "OK" for r in registros)
-    
-    if tem_problema:
-        contador += 1
-        print(f"\n[VEÍCULO {contador}] {placa}")
-        print("=" * 140)
-        
-        for reg in registros:
-            status = "✓" if reg['problema_tipo'] == "OK" else "❌"
-            print(f"  Visita {reg['visita_indice']}: {reg['data_visita']} → {reg['km_registrado']:,} km {status}", end="")
-            
-            if reg['problema_tipo'] != "OK":
-                print(f" [{reg['problema_tipo']}]")
-                if reg['km_anterior'] is not None:
-                    print(f"    ├─ Anterior: {reg['data_anterior']} → {reg['km_anterior']:,} km ({reg['dias_anterior']} dias)")
-                if reg['km_proximo'] is not None:
-                    print(f"    ├─ Próximo: {reg['data_proximo']} → {reg['km_proximo']:,} km ({reg['dias_proximo']} dias)")
-                if reg['km_dia_anterior'] is not None:
-                    print(f"    ├─ km/dia (com anterior): {reg['km_dia_anterior']} km/dia")
-                if reg['km_dia_proximo'] is not None:
-                    print(f"    ├─ km/dia (com próximo): {reg['km_dia_proximo']} km/dia")
-                print()
-            else:
-                print()
-    
-    todos_registros.extend(registros)
-    
-    if (idx + 1) % 50 == 0:
-        print(f"... Processados {idx + 1} veículos...")
-
-conn.close()
-
-print("\n" + "=" * 140)
-
-# Salvar CSV
-df_registros = pd.DataFrame(todos_registros)
-
-print(f"\n📊 RESUMO FINAL:")
-print(f"  • Veículos analisados: {total_veiculos}")
-print(f"  • Veículos com problemas: {contador}")
-print(f"  • Total de registros extraídos: {len(df_registros)}")
-print(f"  • Registros com problemas: {len(df_registros[df_registros['problema_tipo'] != 'OK'])}")
-
-print(f"\n📌 DISTRIBUIÇÃO DE PROBLEMAS:")
-problemas = df_registros[df_registros['problema_tipo'] != 'OK']['problema_tipo'].value_counts()
-for tipo, count in problemas.items():
-    pct = (count / len(df_registros)) * 100
-    print(f"  • {tipo}: {count} ({pct:.2f}%)")
-
-print(f"\n💾 Salvando CSV...")
-arquivo = "relatorio_problemas_bruto_200casos_FIXO.csv"
-df_registros.to_csv(arquivo, index=False, encoding='utf-8')
-print(f"✅ {arquivo}")
-
-print(f"\n📋 AMOSTRA (primeiros 30 registros com problema):")
-problematicos = df_registros[df_registros['problema_tipo'] != 'OK']
-print(problematicos[['placa', 'visita_indice', 'data_visita', 'km_registrado', 'problema_tipo', 'km_anterior', 'dias_anterior', 'km_dia_anterior']].head(30).to_string(index=False))
-
-print(f"\n✅ Processo concluído!")
+
+def para_dataframe(linhas):
+    df = pd.DataFrame(linhas, columns=COLUNAS)
+    for coluna in INTEIRAS_OPCIONAIS:
+        df[coluna] = df[coluna].astype('Int64')
+    for coluna in ('km_dia_anterior', 'km_dia_proximo'):
+        df[coluna] = pd.to_numeric(df[coluna], errors='coerce').astype('float64')
+    for coluna in ('data_visita', 'data_anterior', 'data_proximo'):
+        df[coluna] = pd.to_datetime(df[coluna]).dt.strftime('%Y-%m-%d')
+    return df
+
+
+class GravadorCSV:
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.primeiro = True
+
+    def gravar(self, df):
+        df.to_csv(self.arquivo, index=False, encoding='utf-8', mode='w' if self.primeiro else 'a', header=self.primeiro)
+        self.primeiro = False
+
+    def fechar(self):
+        if self.primeiro:
+            pd.DataFrame(columns=COLUNAS).to_csv(self.arquivo, index=False, encoding='utf-8')
+
+
+class GravadorParquet:
+    def __init__(self, arquivo):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("❌ Parquet precisa do pyarrow: pip install pyarrow")
+            sys.exit(1)
+        self.pa = pa
+        # Tipos fixos: um bloco só com nulos numa coluna não pode mudar o esquema
+        tipos = {'placa': pa.string(), 'problema_tipo': pa.string(),
+                 'km_dia_anterior': pa.float64(), 'km_dia_proximo': pa.float64()}
+        self.esquema = pa.schema([
+            (coluna, tipos.get(coluna, pa.string() if coluna.startswith('data_') else pa.int64()))
+            for coluna in COLUNAS
+        ])
+        self.escritor = pq.ParquetWriter(arquivo, self.esquema)
+
+    def gravar(self, df):
+        self.escritor.write_table(self.pa.Table.from_pandas(df, schema=self.esquema, preserve_index=False))
+
+    def fechar(self):
+        self.escritor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extrai problemas de quilometragem de toda a frota")
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--saida", help="arquivo de saída (padrão: relatorio_problemas_bruto_FIXO.csv/.parquet)")
+    args = parser.parse_args()
+    arquivo = args.saida or f"relatorio_problemas_bruto_FIXO.{args.formato}"
+
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        print("❌ DB_URL não encontrada em .env")
+        sys.exit(1)
+
+    print("🔍 Conectando ao banco...")
+    conn = psycopg2.connect(db_url)
+    gravador = GravadorParquet(arquivo) if args.formato == "parquet" else GravadorCSV(arquivo)
+
+    veiculos = set()
+    veiculos_com_problema = set()
+    contagem = pd.Series(dtype='int64')
+    amostra = []
+    total_registros = 0
+    inicio = time.perf_counter()
+
+    print("🔎 Extraindo problemas da frota inteira...\n")
+    try:
+        with conn.cursor(name="extrair_problemas_km") as cursor:
+            cursor.itersize = LINHAS_POR_BLOCO
+            cursor.execute(QUERY_PROBLEMAS)
+            while True:
+                linhas = cursor.fetchmany(LINHAS_POR_BLOCO)
+                if not linhas:
+                    break
+                df = para_dataframe(linhas)
+                gravador.gravar(df)
+
+                problemas = df[df['problema_tipo'] != 'OK']
+                veiculos.update(df['veiculo_id'].unique().tolist())
+                veiculos_com_problema.update(problemas['veiculo_id'].unique().tolist())
+                contagem = contagem.add(problemas['problema_tipo'].value_counts(), fill_value=0)
+                if len(amostra) < AMOSTRA_PROBLEMAS:
+                    amostra.extend(problemas.head(AMOSTRA_PROBLEMAS - len(amostra)).to_dict('records'))
+                total_registros += len(df)
+
+                decorrido = time.perf_counter() - inicio
+                print(f"  {total_registros:,} registros · {len(veiculos):,} veículos · {total_registros / decorrido:,.0f} registros/s")
+    finally:
+        gravador.fechar()
+        conn.close()
+
+    print("\n" + "=" * 140)
+    print(f"\n📊 RESUMO FINAL:")
+    print(f"  • Veículos analisados: {len(veiculos)}")
+    print(f"  • Veículos com problemas: {len(veiculos_com_problema)}")
+    print(f"  • Total de registros extraídos: {total_registros}")
+    print(f"  • Registros com problemas: {int(contagem.sum())}")
+    print(f"  • Tempo: {time.perf_counter() - inicio:.1f} s")
+
+    print(f"\n📌 DISTRIBUIÇÃO DE PROBLEMAS:")
+    for tipo, count in contagem.sort_values(ascending=False).items():
+        pct = (count / total_registros) * 100
+        print(f"  • {tipo}: {int(count)} ({pct:.2f}%)")
+
+    print(f"\n✅ {arquivo}")
+
+    if amostra:
+        print(f"\n📋 AMOSTRA (primeiros {AMOSTRA_PROBLEMAS} registros com problema):")
+        print(pd.DataFrame(amostra)[['placa', 'visita_indice', 'data_visita', 'km_registrado', 'problema_tipo', 'km_anterior', 'dias_anterior', 'km_dia_anterior']].to_string(index=False))
+
+    print(f"\n✅ Processo concluído!")
+
+
+if __name__ == "__main__":
+    main()
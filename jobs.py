@@ -0,0 +1,134 @@
+# jobs.py
+"""
+Tarefas pós-commit executadas pelo worker.py (fila na tabela 'tarefas',
+migração 0007).
+
+Quem altera o banco só enfileira, na mesma transação da alteração: se ela for
+desfeita, a tarefa some junto; se for confirmada, o worker a executa depois,
+com novas tentativas em caso de erro. Assim finalizar/desalocar um box não
+espera recálculo de média nem chamadas HTTP ao Telegram.
+
+    enfileirar(cursor, "recalcular_media", {"veiculo_id": 10, "execucao_id": 55})
+
+O SQL usa %s e serve para psycopg2 (Streamlit, scripts) e psycopg 3 (API).
+Para um tipo novo, escreva a função e registre com @tarefa("nome").
+"""
+
+import json
+import os
+
+import requests
+
+import km_media
+
+# Tarefas pendentes com a mesma chave são uma só (índice único parcial da 0007)
+ENFILEIRAR = """
+    INSERT INTO tarefas (tipo, payload, chave, executar_em)
+    VALUES (%s, %s::jsonb, %s, NOW() + make_interval(secs => %s))
+    ON CONFLICT (chave) WHERE status = 'pendente' DO NOTHING
+"""
+
+TAREFAS = {}
+
+
+class TarefaAdiada(Exception):
+    """Erro temporário com espera conhecida (ex.: 429 do Telegram com retry_after)."""
+
+    def __init__(self, mensagem, segundos):
+        super().__init__(mensagem)
+        self.segundos = segundos
+
+
+def tarefa(tipo):
+    def registrar(funcao):
+        TAREFAS[tipo] = funcao
+        return funcao
+    return registrar
+
+
+def parametros(tipo, payload, chave=None, atraso_s=0):
+    """Parâmetros de ENFILEIRAR, para quem executa o SQL por conta própria (API)."""
+    return (tipo, json.dumps(payload, default=str), chave, atraso_s)
+
+
+def enfileirar(cursor, tipo, payload, chave=None, atraso_s=0):
+    """Não faz commit: a tarefa entra junto com a transação de quem chamou."""
+    cursor.execute(ENFILEIRAR, parametros(tipo, payload, chave, atraso_s))
+
+
+def _segredo(nome):
+    """Variável de ambiente (.env) ou, se houver, o secrets.toml do Streamlit."""
+    valor = os.getenv(nome)
+    if valor:
+        return valor
+    try:
+        import streamlit as st
+        return st.secrets.get(nome)
+    except Exception:
+        return None
+
+
+def _enviar_telegram(mensagem, chat_id):
+    token = _segredo("TELEGRAM_TOKEN")
+    if not token:
+        raise RuntimeError("TELEGRAM_TOKEN não configurado")
+    resposta = requests.post(
+        f"https://api.telegram.org/bot{token}/sendMessage",
+        json={"chat_id": chat_id, "text": mensagem, "parse_mode": "Markdown"},
+        timeout=10,
+    )
+    if resposta.status_code == 429:
+        segundos = resposta.json().get("parameters", {}).get("retry_after", 30)
+        raise TarefaAdiada("Telegram limitou o envio (429)", segundos)
+    if resposta.status_code != 200:
+        raise RuntimeError(f"Telegram respondeu {resposta.status_code}: {resposta.text}")
+
+
+# --- TAREFAS ---
+
+@tarefa("recalcular_media")
+def recalcular_media(conn, payload):
+    """Com execucao_id aplica a finalização ao estado incremental; sem, reconstrói."""
+    if payload.get("execucao_id") is not None:
+        km_media.registrar_finalizacao(conn, payload["execucao_id"])
+    else:
+        km_media.reconstruir(conn, payload["veiculo_id"])
+
+
+@tarefa("telegram")
+def telegram(conn, payload):
+    _enviar_telegram(payload["mensagem"], payload["chat_id"])
+
+
+@tarefa("resumo_faturamento")
+def resumo_faturamento(conn, payload):
+    """Veículo sem serviços pendentes: resumo de todas as etapas para o faturamento."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT serv.tipo, serv.quantidade, f.nome
+            FROM execucao_servico es
+            LEFT JOIN servicos_solicitados serv
+                   ON es.id = serv.execucao_id AND serv.status = 'finalizado'
+            LEFT JOIN funcionarios f ON es.funcionario_id = f.id
+            WHERE es.veiculo_id = %s AND es.quilometragem = %s
+            """,
+            (payload["veiculo_id"], payload["quilometragem"]),
+        )
+        resumo_servicos = cursor.fetchall()
+    conn.commit()
+
+    lista_servicos_str = "\n".join(
+        [f"- {tipo} (Qtd: {quantidade}) - *Mecânico: {funcionario or 'N/A'}*" for tipo, quantidade, funcionario in resumo_servicos]
+    )
+    mensagem_fat = (
+        f"✅ *VEÍCULO LIBERADO PARA FATURAMENTO!*\n\n"
+        f"*Placa:* `{payload['placa']}`\n"
+        f"*Empresa:* {payload['empresa']}\n"
+        f"*Motorista:* {payload.get('nome_motorista') or 'N/A'}\n"
+        f"*KM:* {payload['quilometragem']}\n"
+        f"*Finalizado por (Sistema):* {payload['usuario']}\n\n"
+        f"*Resumo de Todos os Serviços:*\n{lista_servicos_str}\n\n"
+        f"✅ *AÇÃO:* Alterar venda e deixar pronto para assinar ou pagar!"
+    )
+    _enviar_telegram(mensagem_fat, payload["chat_id"])
@@ -0,0 +1,373 @@
+# km_media.py
+"""
+Média de KM/dia do veículo (veiculos.media_km_diaria): a regra única usada
+pela API, pelas páginas e pelos scripts, e o estado incremental em
+veiculo_km_estado (migração 0008).
+
+Regra:
+1. visitas finalizadas com KM > 0, em ordem de fim_execucao;
+2. KM repetido: fica só a última visita com aquele KM;
+3. ficam só as visitas com KM estritamente maior que todas as anteriores;
+4. média = (KM final - KM inicial) / dias entre a 1ª e a última das 3 últimas
+   visitas que sobraram (None com menos de 2 visitas ou 0 dias).
+
+Como a média só depende das 3 últimas visitas válidas, o estado guarda só
+elas e a data e o KM da visita mais recente (válida ou não). Uma finalização
+nova (a mais recente do veículo) entra em O(1):
+- KM maior que o último válido: vira a última visita válida;
+- KM igual ao último válido, sendo ele a visita mais recente (nenhuma
+  descartada depois dele): a data passa a ser a da nova (regra 2).
+Nos outros casos (KM menor, visita fora de ordem, estado inválido ou
+ausente) o estado é reconstruído a partir do histórico, uma vez.
+
+O núcleo é puro (arrays NumPy ou listas dentro, número fora):
+media_km() / visitas_validas() para um veículo, medias_frota() para vários
+de uma vez. EstadoKm.registrar() é a mesma regra aplicada a uma visita nova.
+benchmarks/km_equivalencia.py confere que as três formas concordam.
+
+As funções com conexão recebem uma conexão DB-API (psycopg2 ou psycopg 3) e
+não fazem commit: o estado e a média entram na transação de quem chamou.
+Para a frota inteira (calcular_medias_antigas.py): recalcular_frota().
+"""
+
+import io
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+MAX_VISITAS = 3
+
+CONSULTA_HISTORICO = """
+    SELECT fim_execucao, quilometragem
+    FROM (
+        SELECT
+            fim_execucao,
+            quilometragem,
+            ROW_NUMBER() OVER (PARTITION BY fim_execucao, quilometragem ORDER BY id) as rn
+        FROM execucao_servico
+        WHERE veiculo_id = %s AND status = 'finalizado'
+          AND quilometragem IS NOT NULL AND quilometragem > 0
+          AND fim_execucao IS NOT NULL
+    ) as ranked
+    WHERE rn = 1
+    ORDER BY fim_execucao ASC
+"""
+CONSULTA_VISITA = """
+    SELECT veiculo_id, status, fim_execucao, quilometragem FROM execucao_servico WHERE id = %s
+"""
+# Cria a linha vazia (inválida) se faltar, para haver o que travar
+TRAVAR_ESTADO = """
+    INSERT INTO veiculo_km_estado (veiculo_id, valido) VALUES (%s, FALSE)
+    ON CONFLICT (veiculo_id) DO NOTHING
+"""
+CONSULTA_ESTADO = """
+    SELECT datas, kms, ultima_fim, ultimo_km, valido FROM veiculo_km_estado WHERE veiculo_id = %s FOR UPDATE
+"""
+GRAVAR_ESTADO = """
+    UPDATE veiculo_km_estado
+       SET datas = %s, kms = %s, ultima_fim = %s, ultimo_km = %s, valido = TRUE, atualizado_em = NOW()
+     WHERE veiculo_id = %s
+"""
+GRAVAR_MEDIA = "UPDATE veiculos SET media_km_diaria = %s WHERE id = %s"
+
+
+def visitas_validas(kms):
+    """
+    Regras 2 e 3 para um veículo: posições (em ordem) das visitas que contam,
+    dadas as quilometragens em ordem de data.
+    """
+    kms = np.asarray(kms, dtype=np.int64)
+    n = len(kms)
+    if n == 0:
+        return np.array([], dtype=np.intp)
+    # Regra 2: np.unique no array invertido acha a última ocorrência de cada KM
+    _, ultimas_invertido = np.unique(kms[::-1], return_index=True)
+    manter = np.sort(n - 1 - ultimas_invertido)
+    k = kms[manter]
+    # Regra 3: maior que o máximo de todas as anteriores
+    anterior = np.r_[-1, np.maximum.accumulate(k)[:-1]]
+    return manter[k > anterior]
+
+
+def media_km(datas, kms):
+    """
+    Regra 4: média de KM/dia de um veículo ou None. datas (datetime, date ou
+    datetime64) e kms em ordem de data, das visitas finalizadas com KM > 0.
+    """
+    indices = visitas_validas(kms)[-MAX_VISITAS:]
+    if len(indices) < 2:
+        return None
+    primeira, ultima = indices[0], indices[-1]
+    # Só as duas datas usadas são convertidas (listas de datetime são lentas de converter)
+    inicio, fim = np.array([datas[primeira], datas[ultima]], dtype="datetime64[us]")
+    delta_km = int(kms[ultima]) - int(kms[primeira])
+    delta_dias = int((fim - inicio) // np.timedelta64(1, "D"))
+    if delta_dias > 0 and delta_km >= 0:
+        return float(delta_km / delta_dias)
+    return None
+
+
+class EstadoKm:
+    """Até MAX_VISITAS visitas válidas (datas/kms em ordem) e a visita mais recente vista."""
+
+    __slots__ = ("datas", "kms", "ultima_fim", "ultimo_km")
+
+    def __init__(self, datas=(), kms=(), ultima_fim=None, ultimo_km=None):
+        self.datas = list(datas)
+        self.kms = list(kms)
+        self.ultima_fim = ultima_fim
+        self.ultimo_km = ultimo_km
+
+    @classmethod
+    def do_historico(cls, visitas):
+        """visitas: [(fim_execucao, quilometragem)] em ordem de fim_execucao."""
+        if not visitas:
+            return cls()
+        indices = visitas_validas([km for _, km in visitas])[-MAX_VISITAS:]
+        return cls(
+            [visitas[i][0] for i in indices],
+            [visitas[i][1] for i in indices],
+            *visitas[-1],
+        )
+
+    def registrar(self, data, km):
+        """
+        Aplica a visita mais recente do veículo. Retorna False quando o
+        resultado depende do histórico completo (reconstruir).
+        """
+        if self.ultima_fim is not None and data < self.ultima_fim:
+            return False
+        if not self.kms or km > self.kms[-1]:
+            self.datas.append(data)
+            self.kms.append(km)
+            del self.datas[:-MAX_VISITAS], self.kms[:-MAX_VISITAS]
+        elif km == self.kms[-1] and self.ultimo_km == km:
+            self.datas[-1] = data
+        else:
+            return False
+        self.ultima_fim = data
+        self.ultimo_km = km
+        return True
+
+    def media(self):
+        return media_km(self.datas, self.kms)
+
+
+def _gravar(cursor, veiculo_id, estado):
+    media = estado.media()
+    cursor.execute(GRAVAR_ESTADO, (estado.datas, estado.kms, estado.ultima_fim, estado.ultimo_km, veiculo_id))
+    cursor.execute(GRAVAR_MEDIA, (media, veiculo_id))
+    return media
+
+
+def _travar(cursor, veiculo_id):
+    """Estado atual com a linha travada até o fim da transação; None se precisa reconstruir."""
+    cursor.execute(TRAVAR_ESTADO, (veiculo_id,))
+    cursor.execute(CONSULTA_ESTADO, (veiculo_id,))
+    datas, kms, ultima_fim, ultimo_km, valido = cursor.fetchone()
+    if not valido:
+        return None
+    return EstadoKm(datas, kms, ultima_fim, ultimo_km)
+
+
+def _reconstruir(cursor, veiculo_id):
+    cursor.execute(CONSULTA_HISTORICO, (veiculo_id,))
+    return _gravar(cursor, veiculo_id, EstadoKm.do_historico(cursor.fetchall()))
+
+
+def reconstruir(conn, veiculo_id):
+    """Relê o histórico do veículo, refaz o estado e grava a média. Retorna a média."""
+    with conn.cursor() as cursor:
+        _travar(cursor, veiculo_id)
+        return _reconstruir(cursor, veiculo_id)
+
+
+def registrar_finalizacao(conn, execucao_id):
+    """
+    Atualiza o estado e a média do veículo com uma execução recém-finalizada,
+    sem reler o histórico quando possível. Retorna a média.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(CONSULTA_VISITA, (execucao_id,))
+        visita = cursor.fetchone()
+        if visita is None:
+            return None
+        veiculo_id, status, data, km = visita
+        estado = _travar(cursor, veiculo_id)
+        if estado is None or status != "finalizado" or data is None:
+            return _reconstruir(cursor, veiculo_id)
+        if km is None or km <= 0:
+            # Visita sem KM não entra na média
+            return estado.media()
+        if not estado.registrar(data, km):
+            return _reconstruir(cursor, veiculo_id)
+        return _gravar(cursor, veiculo_id, estado)
+
+
+# --- FROTA INTEIRA ---
+
+# Sem o ROW_NUMBER de CONSULTA_HISTORICO: linhas com o mesmo (fim, KM) caem
+# de qualquer jeito na regra 2. O id desempata datas iguais de forma estável.
+CONSULTA_FROTA = """
+    SELECT veiculo_id, fim_execucao, quilometragem
+    FROM execucao_servico
+    WHERE status = 'finalizado'
+      AND quilometragem IS NOT NULL AND quilometragem > 0
+      AND fim_execucao IS NOT NULL
+    ORDER BY veiculo_id, fim_execucao, id
+"""
+CONSULTA_VEICULOS = """
+    SELECT veiculo_id, fim_execucao, quilometragem
+    FROM execucao_servico
+    WHERE status = 'finalizado'
+      AND quilometragem IS NOT NULL AND quilometragem > 0
+      AND fim_execucao IS NOT NULL
+      AND veiculo_id = ANY(%s)
+    ORDER BY veiculo_id, fim_execucao, id
+"""
+CRIAR_TEMPORARIAS = """
+    CREATE TEMP TABLE tmp_km_media (
+        veiculo_id INTEGER PRIMARY KEY, media DOUBLE PRECISION, ultima_fim TIMESTAMP, ultimo_km INTEGER
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE tmp_km_visitas (veiculo_id INTEGER, data TIMESTAMP, km INTEGER) ON COMMIT DROP;
+"""
+GRAVAR_FROTA = [
+    """
+    UPDATE veiculos v
+       SET media_km_diaria = m.media
+      FROM tmp_km_media m
+     WHERE v.id = m.veiculo_id AND v.media_km_diaria IS DISTINCT FROM m.media
+    """,
+    # Com execuções, mas nenhuma visita finalizada com KM: sem média, como no recálculo por veículo.
+    # %(veiculos)s: NULL na frota inteira, a lista em recalcular_frota(conn, veiculo_ids)
+    """
+    UPDATE veiculos v
+       SET media_km_diaria = NULL
+     WHERE v.media_km_diaria IS NOT NULL
+       AND (%(veiculos)s::int[] IS NULL OR v.id = ANY(%(veiculos)s::int[]))
+       AND EXISTS (SELECT 1 FROM execucao_servico e WHERE e.veiculo_id = v.id)
+       AND NOT EXISTS (SELECT 1 FROM tmp_km_media m WHERE m.veiculo_id = v.id)
+    """,
+    """
+    INSERT INTO veiculo_km_estado (veiculo_id, datas, kms, ultima_fim, ultimo_km, valido, atualizado_em)
+    SELECT m.veiculo_id, ARRAY_AGG(t.data ORDER BY t.km), ARRAY_AGG(t.km ORDER BY t.km), m.ultima_fim, m.ultimo_km, TRUE, NOW()
+    FROM tmp_km_media m
+    JOIN tmp_km_visitas t ON t.veiculo_id = m.veiculo_id
+    GROUP BY m.veiculo_id, m.ultima_fim, m.ultimo_km
+    ON CONFLICT (veiculo_id) DO UPDATE
+        SET datas = EXCLUDED.datas, kms = EXCLUDED.kms, ultima_fim = EXCLUDED.ultima_fim,
+            ultimo_km = EXCLUDED.ultimo_km, valido = TRUE, atualizado_em = NOW()
+    """,
+]
+
+ResultadoFrota = namedtuple(
+    "ResultadoFrota",
+    "veiculo_ids medias ultima_fim ultimo_km visita_veiculo visita_data visita_km",
+)
+
+
+def medias_frota(veiculos, datas, kms):
+    """
+    Regras 2-4 para todos os veículos de uma vez, sem laço por linha.
+    Entrada: arrays do histórico em ordem de (veiculo, fim_execucao); datas em
+    datetime64. medias traz NaN onde não há média; visita_* são as até
+    MAX_VISITAS visitas válidas de cada veículo (o estado de veiculo_km_estado).
+    """
+    veiculos = np.asarray(veiculos, dtype=np.int64)
+    datas = np.asarray(datas, dtype="datetime64[us]")
+    kms = np.asarray(kms, dtype=np.int64)
+    if len(veiculos) == 0:
+        vazio = np.array([], dtype=np.int64)
+        return ResultadoFrota(vazio, np.array([]), datas[:0], vazio, vazio, datas[:0], vazio)
+
+    # Regra 2: ordena por (veiculo, KM, posição) e fica a última posição de cada par
+    n = len(veiculos)
+    ordem = np.lexsort((np.arange(n), kms, veiculos))
+    v_ord, k_ord = veiculos[ordem], kms[ordem]
+    ultima_do_par = np.ones(n, dtype=bool)
+    ultima_do_par[:-1] = (v_ord[1:] != v_ord[:-1]) | (k_ord[1:] != k_ord[:-1])
+    manter = np.zeros(n, dtype=bool)
+    manter[ordem[ultima_do_par]] = True
+    v, d, k = veiculos[manter], datas[manter], kms[manter]
+
+    # Regra 3: máximo acumulado segmentado. Cada veículo ganha uma faixa de
+    # chaves acima de todas as do anterior, então um só maximum.accumulate
+    # serve para todos e a 1ª visita de cada veículo é sempre válida.
+    grupo = np.cumsum(np.r_[True, v[1:] != v[:-1]])
+    chave = grupo * (int(k.max()) + 1) + k
+    anterior = np.r_[-1, np.maximum.accumulate(chave)[:-1]]
+    valida = chave > anterior
+    v, d, k = v[valida], d[valida], k[valida]
+
+    # Regra 4: 1ª e última das até 3 últimas visitas válidas de cada veículo
+    veiculo_ids, inicios, contagens = np.unique(v, return_index=True, return_counts=True)
+    fins = inicios + contagens - 1
+    primeiras = fins - (np.minimum(contagens, MAX_VISITAS) - 1)
+    delta_km = k[fins] - k[primeiras]
+    delta_dias = (d[fins] - d[primeiras]) // np.timedelta64(1, "D")
+    com_media = (contagens >= 2) & (delta_dias > 0) & (delta_km >= 0)
+    medias = np.full(len(veiculo_ids), np.nan)
+    medias[com_media] = delta_km[com_media] / delta_dias[com_media]
+
+    no_estado = np.repeat(fins, contagens) - np.arange(len(v)) < MAX_VISITAS
+    ultimas = np.r_[veiculos[1:] != veiculos[:-1], True]
+    return ResultadoFrota(
+        veiculo_ids, medias, datas[ultimas], kms[ultimas],
+        v[no_estado], d[no_estado], k[no_estado],
+    )
+
+
+def _copiar(cursor, tabela, colunas):
+    buffer = io.StringIO()
+    pd.DataFrame(colunas).to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {tabela} FROM STDIN WITH CSV", buffer)
+
+
+def recalcular_frota(conn, veiculo_ids=None):
+    """
+    Recalcula média e estado de todos os veículos (ou só de veiculo_ids): uma
+    leitura do histórico (COPY), medias_frota() e a gravação por COPY em
+    tabelas temporárias + UPDATE/INSERT ... FROM. Só psycopg2 (copy_expert);
+    não faz commit.
+
+    Trava veiculo_km_estado até o commit: finalizações aplicadas pelo worker
+    nesse meio tempo esperam e entram depois sobre o estado novo.
+    Retorna o ResultadoFrota.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("LOCK TABLE veiculo_km_estado IN SHARE ROW EXCLUSIVE MODE")
+        if veiculo_ids is None:
+            consulta = CONSULTA_FROTA
+        else:
+            veiculo_ids = [int(v) for v in veiculo_ids]
+            consulta = cursor.mogrify(CONSULTA_VEICULOS, (veiculo_ids,)).decode()
+        buffer = io.StringIO()
+        cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH CSV", buffer)
+        buffer.seek(0)
+        if buffer.getvalue():
+            historico = pd.read_csv(buffer, names=["veiculo_id", "fim_execucao", "quilometragem"], parse_dates=["fim_execucao"])
+        else:
+            historico = pd.DataFrame({"veiculo_id": [], "fim_execucao": pd.to_datetime([]), "quilometragem": []})
+        resultado = medias_frota(
+            historico["veiculo_id"].to_numpy(),
+            historico["fim_execucao"].to_numpy(),
+            historico["quilometragem"].to_numpy(),
+        )
+
+        cursor.execute(CRIAR_TEMPORARIAS)
+        _copiar(cursor, "tmp_km_media", {
+            "veiculo_id": resultado.veiculo_ids,
+            "media": resultado.medias,
+            "ultima_fim": resultado.ultima_fim,
+            "ultimo_km": resultado.ultimo_km,
+        })
+        _copiar(cursor, "tmp_km_visitas", {
+            "veiculo_id": resultado.visita_veiculo,
+            "data": resultado.visita_data,
+            "km": resultado.visita_km,
+        })
+        for sql in GRAVAR_FROTA:
+            cursor.execute(sql, {"veiculos": veiculo_ids})
+    return resultado
@@ -0,0 +1,218 @@
+# km_plausibilidade.py
+"""
+Conferência da KM digitada no cadastro de serviço (pages/cadastro_servico.py
+e POST /services/register), na hora, sem consulta ao banco: compara a KM com
+a última visita válida do veículo e com a projeção pela média de KM/dia.
+
+Projeção de cada veículo = última visita válida do estado incremental
+(veiculo_km_estado, migração 0008) + veiculos.media_km_diaria. Fica num cache
+do processo (CacheProjecoes), carregado inteiro uma vez e depois só com as
+linhas de veiculo_km_estado gravadas desde a última leitura. A migração 0010
+incrementa a versão 'km_estado' (recurso_versao) a cada gravação do estado —
+toda finalização aplicada pelo worker —, que é o sinal para reler.
+
+Alertas (conferir() devolve a lista, vazia quando a KM é plausível):
+    MILHAO_FALTANDO  KM menor que a última, mas KM + 1.000.000 cabe na projeção
+    MILHAO_SOBRANDO  KM acima da projeção, mas KM - 1.000.000 cabe nela
+    DESCRESCENTE     KM menor que a última visita válida
+    ACIMA_PROJECAO   mais KM do que o veículo rodaria no período (dígito a mais/trocado)
+
+Só avisa: quem cadastra confirma ou corrige. Veículo sem estado (nunca
+finalizado) não é conferido.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from correcao_digitos import MILHAO
+
+# Acima de FATOR_MEDIA x a média do veículo (a mesma regra do OUTLIER em
+# extrair_problemas_detalhado_FIXO.py), com piso de KM_DIA_PISO para médias baixas
+FATOR_MEDIA = 3
+KM_DIA_PISO = 300
+# Sem média: o limite "CRÍTICO" de migrar_medias_inteligente_OTIMIZADO.py
+KM_DIA_MAXIMO = 1000
+# Folga fixa para visitas no mesmo dia / poucos dias
+FOLGA_KM = 2000
+
+# Streamlit: de quanto em quanto tempo (s) confere a versão 'km_estado' no banco
+PROJECOES_TTL_S = float(os.getenv("PROJECOES_TTL_S", "30"))
+# Recarga completa periódica: pega gravações de transações longas que
+# terminaram depois da leitura parcial que deveria tê-las visto
+PROJECOES_RECARGA_S = float(os.getenv("PROJECOES_RECARGA_S", "3600"))
+# A leitura parcial volta este tanto antes da última gravação lida (NOW() é o
+# início da transação, não o commit)
+SOBREPOSICAO = timedelta(minutes=10)
+
+# %s NULL lê tudo; uma data lê só os estados gravados a partir dela
+CONSULTA_PROJECOES = """
+    SELECT e.veiculo_id, e.datas[array_upper(e.datas, 1)], e.kms[array_upper(e.kms, 1)],
+           v.media_km_diaria, e.atualizado_em
+    FROM veiculo_km_estado e
+    JOIN veiculos v ON v.id = e.veiculo_id
+    WHERE %s::timestamp IS NULL OR e.atualizado_em >= %s
+"""
+CONSULTA_VERSAO = "SELECT versao FROM recurso_versao WHERE recurso = 'km_estado'"
+
+Projecao = namedtuple("Projecao", "data km media")
+Alerta = namedtuple("Alerta", "codigo mensagem km_sugerido")
+
+
+def limite_superior(projecao, dias):
+    """Maior KM plausível `dias` depois da última visita válida."""
+    if projecao.media:
+        km_dia = max(projecao.media * FATOR_MEDIA, KM_DIA_PISO)
+    else:
+        km_dia = KM_DIA_MAXIMO
+    return projecao.km + dias * km_dia + FOLGA_KM
+
+
+def conferir(projecao, km, data):
+    """
+    Alertas para a KM `km` informada em `data` (date ou datetime). O(1):
+    só aritmética sobre a projeção do veículo.
+    """
+    if projecao is None or not km or km <= 0:
+        return []
+    dias = (_dia(data) - _dia(projecao.data)).days
+    if dias < 0:
+        # Visita lançada com data anterior à última válida: a KM pode ser menor
+        return []
+    superior = limite_superior(projecao, dias)
+
+    def cabe(k):
+        return projecao.km <= k <= superior
+
+    ultima = f"{projecao.km:,} km em {_dia(projecao.data):%d/%m/%Y}".replace(",", ".")
+    if km < projecao.km:
+        if cabe(km + MILHAO):
+            return [Alerta(
+                "MILHAO_FALTANDO",
+                f"KM menor que a última visita ({ultima}); faltou o dígito do milhão?",
+                km + MILHAO,
+            )]
+        return [Alerta("DESCRESCENTE", f"KM menor que a última visita ({ultima}).", None)]
+    if km > superior:
+        if cabe(km - MILHAO):
+            return [Alerta(
+                "MILHAO_SOBRANDO",
+                f"KM 1.000.000 acima do esperado (última visita: {ultima}); sobrou o dígito do milhão?",
+                km - MILHAO,
+            )]
+        esperado = ""
+        if projecao.media:
+            esperado = f" Esperado por volta de {int(projecao.km + projecao.media * dias):,} km.".replace(",", ".")
+        return [Alerta(
+            "ACIMA_PROJECAO",
+            f"{km - projecao.km:,} km rodados em {dias} dias desde a última visita ({ultima}).".replace(",", ".")
+            + esperado,
+            None,
+        )]
+    return []
+
+
+def _dia(data):
+    return data.date() if hasattr(data, "date") else data
+
+
+class CacheProjecoes:
+    """
+    Projeções por veiculo_id. Leitura sem trava (um dict.get); cargas sob
+    lock_carga (Streamlit) ou o lock asyncio da API.
+    """
+
+    def __init__(self, ttl_s=PROJECOES_TTL_S, recarga_s=PROJECOES_RECARGA_S):
+        self.ttl_s = ttl_s
+        self.recarga_s = recarga_s
+        self.lock_carga = threading.Lock()
+        self.projecoes = {}
+        self.versao = None
+        self.carregado = False
+        self.lido_ate = None
+        self._expira_em = 0.0
+        self._completa_em = 0.0
+        self.cargas_completas = 0
+        self.cargas_parciais = 0
+
+    def obter(self, veiculo_id):
+        return self.projecoes.get(veiculo_id)
+
+    def valido(self, versao=None):
+        """True se o cache vale (dentro do TTL e, se informada, na mesma versão)."""
+        if not self.carregado or time.monotonic() >= self._expira_em:
+            return False
+        return versao is None or versao == self.versao
+
+    def desde(self):
+        """Parâmetro de CONSULTA_PROJECOES para a próxima carga (None = completa)."""
+        if not self.carregado or self.lido_ate is None or time.monotonic() >= self._completa_em:
+            return None
+        return self.lido_ate - SOBREPOSICAO
+
+    def atualizar(self, linhas, versao, desde):
+        completa = desde is None
+        projecoes = {} if completa else self.projecoes
+        lido_ate = None if completa else self.lido_ate
+        for veiculo_id, data, km, media, atualizado_em in linhas:
+            if data is None or km is None:
+                projecoes.pop(veiculo_id, None)
+            else:
+                projecoes[veiculo_id] = Projecao(data, km, media)
+            if lido_ate is None or atualizado_em > lido_ate:
+                lido_ate = atualizado_em
+        agora = time.monotonic()
+        if completa:
+            self.projecoes = projecoes
+            self._completa_em = agora + self.recarga_s
+            self.cargas_completas += 1
+        else:
+            self.cargas_parciais += 1
+        self.carregado = True
+        self.lido_ate = lido_ate
+        self.versao = versao
+        self._expira_em = agora + self.ttl_s
+
+    def renovar(self):
+        """Versão conferida e igual: vale por mais um TTL sem reler."""
+        self._expira_em = time.monotonic() + self.ttl_s
+
+    def invalidar(self):
+        self._expira_em = 0.0
+        self._completa_em = 0.0
+
+
+cache = CacheProjecoes()
+
+
+def obter_projecoes(get_connection, release_connection):
+    """
+    Versão síncrona (Streamlit / scripts, qualquer driver DB-API). Com TTL
+    vencido confere a versão 'km_estado' e só relê se ela mudou.
+    """
+    if cache.valido():
+        return cache
+    with cache.lock_carga:
+        if cache.valido():
+            return cache
+        conn = get_connection()
+        if not conn:
+            return cache
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(CONSULTA_VERSAO)
+                row = cursor.fetchone()
+                versao = row[0] if row else None
+                desde = cache.desde()
+                if desde is not None and versao is not None and versao == cache.versao:
+                    cache.renovar()
+                    return cache
+                cursor.execute(CONSULTA_PROJECOES, (desde, desde))
+                linhas = cursor.fetchall()
+            conn.commit()
+        finally:
+            release_connection(conn)
+        cache.atualizar(linhas, versao, desde)
+        return cache
@@ -0,0 +1,117 @@
+-- 0001_schema_base.sql
+-- Schema do pátio como está em produção depois de migrar_servicos_particionados.py.
+-- Bancos já existentes: marque como aplicada com `python migrar_schema.py --baseline`.
+
+CREATE TABLE IF NOT EXISTS usuarios (
+    id SERIAL PRIMARY KEY,
+    nome TEXT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'funcionario'
+);
+
+CREATE TABLE IF NOT EXISTS clientes (
+    id SERIAL PRIMARY KEY,
+    nome_empresa TEXT NOT NULL,
+    nome_fantasia TEXT,
+    nome_responsavel TEXT,
+    contato_responsavel TEXT,
+    data_atualizacao_contato TIMESTAMP,
+    data_ultima_exportacao TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS veiculos (
+    id SERIAL PRIMARY KEY,
+    placa TEXT NOT NULL,
+    empresa TEXT,
+    modelo TEXT,
+    ano_modelo INTEGER,
+    nome_motorista TEXT,
+    contato_motorista TEXT,
+    cliente_id INTEGER REFERENCES clientes(id),
+    quilometragem INTEGER,
+    media_km_diaria NUMERIC,
+    data_entrada TIMESTAMP,
+    data_atualizacao_contato TIMESTAMP,
+    data_revisao_proativa DATE,
+    data_ultima_exportacao TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS funcionarios (
+    id SERIAL PRIMARY KEY,
+    nome TEXT NOT NULL
+);
+
+-- Box 0 e funcionário 0 são registros de migração; as telas filtram id > 0
+CREATE TABLE IF NOT EXISTS boxes (
+    id INTEGER PRIMARY KEY,
+    area TEXT,
+    ocupado BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS execucao_servico (
+    id SERIAL PRIMARY KEY,
+    veiculo_id INTEGER REFERENCES veiculos(id),
+    box_id INTEGER,
+    funcionario_id INTEGER,
+    quilometragem INTEGER,
+    status TEXT,
+    inicio_execucao TIMESTAMP,
+    fim_execucao TIMESTAMP,
+    usuario_alocacao_id INTEGER,
+    usuario_finalizacao_id INTEGER,
+    nome_motorista TEXT,
+    contato_motorista TEXT,
+    data_feedback TIMESTAMP
+);
+
+-- Catálogo de serviços por área
+CREATE TABLE IF NOT EXISTS servicos_borracharia (id SERIAL PRIMARY KEY, nome TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS servicos_alinhamento (id SERIAL PRIMARY KEY, nome TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS servicos_manutencao (id SERIAL PRIMARY KEY, nome TEXT UNIQUE NOT NULL);
+
+-- Serviços solicitados: uma tabela, uma partição por área
+CREATE SEQUENCE IF NOT EXISTS servicos_solicitados_id_seq;
+
+CREATE TABLE IF NOT EXISTS servicos_solicitados (
+    id INTEGER NOT NULL DEFAULT nextval('servicos_solicitados_id_seq'),
+    area TEXT NOT NULL,
+    veiculo_id INTEGER REFERENCES veiculos(id),
+    tipo TEXT,
+    quantidade INTEGER,
+    descricao TEXT,
+    observacao TEXT,
+    observacao_execucao TEXT,
+    tipo_atendimento TEXT,
+    quilometragem INTEGER,
+    status TEXT,
+    box_id INTEGER,
+    funcionario_id INTEGER,
+    execucao_id INTEGER REFERENCES execucao_servico(id),
+    data_solicitacao TIMESTAMP,
+    data_atualizacao TIMESTAMP,
+    PRIMARY KEY (id, area)
+) PARTITION BY LIST (area);
+
+ALTER SEQUENCE servicos_solicitados_id_seq OWNED BY servicos_solicitados.id;
+
+CREATE TABLE IF NOT EXISTS servicos_solicitados_p_borracharia PARTITION OF servicos_solicitados FOR VALUES IN ('borracharia');
+CREATE TABLE IF NOT EXISTS servicos_solicitados_p_alinhamento PARTITION OF servicos_solicitados FOR VALUES IN ('alinhamento');
+CREATE TABLE IF NOT EXISTS servicos_solicitados_p_manutencao PARTITION OF servicos_solicitados FOR VALUES IN ('manutencao');
+
+CREATE INDEX IF NOT EXISTS ix_servicos_solicitados_execucao ON servicos_solicitados (execucao_id);
+CREATE INDEX IF NOT EXISTS ix_servicos_solicitados_veiculo_status ON servicos_solicitados (veiculo_id, status);
+CREATE INDEX IF NOT EXISTS ix_servicos_solicitados_status ON servicos_solicitados (status);
+
+-- Views de compatibilidade com os nomes antigos (atualizáveis)
+CREATE OR REPLACE VIEW servicos_solicitados_borracharia AS
+    SELECT * FROM servicos_solicitados WHERE area = 'borracharia' WITH CASCADED CHECK OPTION;
+ALTER VIEW servicos_solicitados_borracharia ALTER COLUMN area SET DEFAULT 'borracharia';
+
+CREATE OR REPLACE VIEW servicos_solicitados_alinhamento AS
+    SELECT * FROM servicos_solicitados WHERE area = 'alinhamento' WITH CASCADED CHECK OPTION;
+ALTER VIEW servicos_solicitados_alinhamento ALTER COLUMN area SET DEFAULT 'alinhamento';
+
+CREATE OR REPLACE VIEW servicos_solicitados_manutencao AS
+    SELECT * FROM servicos_solicitados WHERE area = 'manutencao' WITH CASCADED CHECK OPTION;
+ALTER VIEW servicos_solicitados_manutencao ALTER COLUMN area SET DEFAULT 'manutencao';
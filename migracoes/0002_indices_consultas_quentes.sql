@@ -0,0 +1,59 @@
+-- migrar: sem-transacao
+-- 0002_indices_consultas_quentes.sql
+-- Índices parciais/cobrindo para os predicados das consultas quentes da API
+-- (api/statements.py) e das páginas. Roda fora de transação para poder usar
+-- CREATE INDEX CONCURRENTLY nas tabelas grandes sem travar escrita; tabelas
+-- particionadas não aceitam CONCURRENTLY e usam CREATE INDEX normal.
+
+-- Fila de espera: /queues (fila), /allocation/pending-vehicles, /allocation/areas,
+-- km pendente do assign e o UPDATE de alocação. Só linhas pendentes (poucas).
+CREATE INDEX IF NOT EXISTS ix_servicos_solicitados_pendente
+    ON servicos_solicitados (veiculo_id, data_solicitacao)
+    INCLUDE (tipo, quantidade, quilometragem)
+    WHERE status = 'pendente';
+
+-- Em atendimento: /queues (boxes) agrega por execucao_id; detalhes do box filtram por box_id
+CREATE INDEX IF NOT EXISTS ix_servicos_solicitados_andamento_execucao
+    ON servicos_solicitados (execucao_id)
+    INCLUDE (tipo, quantidade)
+    WHERE status = 'em_andamento';
+
+CREATE INDEX IF NOT EXISTS ix_servicos_solicitados_andamento_box
+    ON servicos_solicitados (box_id, veiculo_id)
+    WHERE status = 'em_andamento';
+
+-- Junção execução -> serviços (/services/completed, relatórios, histórico, feedback):
+-- cobre as colunas lidas para evitar ida ao heap
+CREATE INDEX IF NOT EXISTS ix_servicos_solicitados_execucao_cobertura
+    ON servicos_solicitados (execucao_id)
+    INCLUDE (tipo, quantidade, funcionario_id, status);
+
+DROP INDEX IF EXISTS ix_servicos_solicitados_execucao;
+-- status sozinho tem 3 valores; os índices parciais acima substituem
+DROP INDEX IF EXISTS ix_servicos_solicitados_status;
+
+-- Execução em andamento por box: detalhes/finalizar/desalocar e a junção de /boxes/active
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_execucao_andamento_box
+    ON execucao_servico (box_id)
+    INCLUDE (veiculo_id, funcionario_id, quilometragem)
+    WHERE status = 'em_andamento';
+
+-- Histórico finalizado por veículo: recálculo de média, revisão proativa, reverter visita
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_execucao_finalizada_veiculo
+    ON execucao_servico (veiculo_id, fim_execucao)
+    INCLUDE (quilometragem)
+    WHERE status = 'finalizado';
+
+-- Faixa de datas de /services/completed e relatórios
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_execucao_finalizada_fim
+    ON execucao_servico (fim_execucao)
+    WHERE status = 'finalizado';
+
+-- Feedback pendente (feedback_servicos)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_execucao_feedback_pendente
+    ON execucao_servico (fim_execucao)
+    WHERE status = 'finalizado' AND data_feedback IS NULL;
+
+-- Busca por placa (/vehicles/by-plate, histórico, cadastro)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_veiculos_placa ON veiculos (placa);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_veiculos_cliente ON veiculos (cliente_id);
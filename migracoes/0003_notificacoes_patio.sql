@@ -0,0 +1,86 @@
+-- 0003_notificacoes_patio.sql
+-- Avisa (NOTIFY patio) quando muda algo que aparece no pátio: boxes, execuções
+-- em andamento, serviços pendentes/em andamento e os dados de veículo e
+-- funcionário exibidos junto. Cada worker da API escuta o canal e atualiza o
+-- estado em memória (api/patio.py) só para os boxes/veículos citados.
+--
+-- Payload: {"recurso": "...", "boxes": [ids], "veiculos": [ids]}; listas vazias
+-- nas duas chaves significam "recarregue tudo". Notificações idênticas na mesma
+-- transação são entregues uma vez só, no COMMIT.
+
+CREATE OR REPLACE FUNCTION notificar_patio() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    recurso TEXT := TG_ARGV[0];
+    linhas JSONB[] := ARRAY[]::JSONB[];
+    linha JSONB;
+    boxes INTEGER[] := ARRAY[]::INTEGER[];
+    veiculos INTEGER[] := ARRAY[]::INTEGER[];
+    relevante BOOLEAN := FALSE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        linhas := linhas || to_jsonb(OLD);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        linhas := linhas || to_jsonb(NEW);
+    END IF;
+
+    FOREACH linha IN ARRAY linhas LOOP
+        IF recurso = 'boxes' THEN
+            relevante := TRUE;
+            boxes := boxes || (linha->>'id')::INTEGER;
+        ELSIF recurso = 'veiculos' THEN
+            relevante := TRUE;
+            veiculos := veiculos || (linha->>'id')::INTEGER;
+        ELSIF recurso = 'funcionarios' THEN
+            relevante := TRUE;
+        ELSE
+            -- execucao_servico / servicos_solicitados: histórico finalizado não aparece no pátio
+            IF linha->>'status' IN ('pendente', 'em_andamento') THEN
+                relevante := TRUE;
+            END IF;
+            IF linha->>'box_id' IS NOT NULL THEN
+                boxes := boxes || (linha->>'box_id')::INTEGER;
+            END IF;
+            IF linha->>'veiculo_id' IS NOT NULL THEN
+                veiculos := veiculos || (linha->>'veiculo_id')::INTEGER;
+            END IF;
+        END IF;
+    END LOOP;
+
+    IF relevante THEN
+        PERFORM pg_notify(
+            'patio',
+            json_build_object('recurso', recurso, 'boxes', boxes, 'veiculos', veiculos)::TEXT
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tg_patio_boxes ON boxes;
+CREATE TRIGGER tg_patio_boxes
+    AFTER INSERT OR UPDATE OR DELETE ON boxes
+    FOR EACH ROW EXECUTE FUNCTION notificar_patio('boxes');
+
+DROP TRIGGER IF EXISTS tg_patio_execucao ON execucao_servico;
+CREATE TRIGGER tg_patio_execucao
+    AFTER INSERT OR UPDATE OR DELETE ON execucao_servico
+    FOR EACH ROW EXECUTE FUNCTION notificar_patio('execucao_servico');
+
+-- Na tabela particionada o trigger é clonado para cada partição
+DROP TRIGGER IF EXISTS tg_patio_servicos ON servicos_solicitados;
+CREATE TRIGGER tg_patio_servicos
+    AFTER INSERT OR UPDATE OR DELETE ON servicos_solicitados
+    FOR EACH ROW EXECUTE FUNCTION notificar_patio('servicos_solicitados');
+
+-- Só as colunas exibidas no pátio (media_km_diaria e afins não interessam)
+DROP TRIGGER IF EXISTS tg_patio_veiculos ON veiculos;
+CREATE TRIGGER tg_patio_veiculos
+    AFTER UPDATE OF placa, empresa, modelo, nome_motorista, contato_motorista ON veiculos
+    FOR EACH ROW EXECUTE FUNCTION notificar_patio('veiculos');
+
+DROP TRIGGER IF EXISTS tg_patio_funcionarios ON funcionarios;
+CREATE TRIGGER tg_patio_funcionarios
+    AFTER UPDATE OR DELETE ON funcionarios
+    FOR EACH ROW EXECUTE FUNCTION notificar_patio('funcionarios');
@@ -0,0 +1,139 @@
+-- 0004_versao_recursos.sql
+-- Número de versão por recurso, incrementado pelo banco quando as tabelas de
+-- origem mudam. A API usa a versão como ETag e responde 304 a If-None-Match
+-- sem rodar a consulta do endpoint.
+--
+--   patio        -> /queues, /boxes/active (tudo que notificar_patio considera relevante)
+--   boxes        -> /allocation/boxes
+--   funcionarios -> /allocation/funcionarios
+--   catalogo     -> /catalog/services
+--
+-- Cada incremento avisa no canal 'recurso_versao' com o payload "recurso:versao".
+
+CREATE TABLE IF NOT EXISTS recurso_versao (
+    recurso TEXT PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO recurso_versao (recurso) VALUES ('patio'), ('boxes'), ('funcionarios'), ('catalogo')
+ON CONFLICT (recurso) DO NOTHING;
+
+-- Incrementa no máximo uma vez por transação (a versão fica guardada numa
+-- configuração local da transação), para que UPDATEs em lote não regravem a
+-- linha a cada registro. A linha fica travada até o COMMIT, então versões
+-- crescem na mesma ordem dos commits.
+CREATE OR REPLACE FUNCTION incrementar_versao(p_recurso TEXT) RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+    chave TEXT := 'recurso_versao.' || p_recurso;
+    nova BIGINT;
+BEGIN
+    IF COALESCE(current_setting(chave, TRUE), '') <> '' THEN
+        RETURN current_setting(chave)::BIGINT;
+    END IF;
+    UPDATE recurso_versao
+       SET versao = versao + 1, atualizado_em = NOW()
+     WHERE recurso = p_recurso
+    RETURNING versao INTO nova;
+    IF nova IS NULL THEN
+        INSERT INTO recurso_versao (recurso, versao) VALUES (p_recurso, 1)
+        ON CONFLICT (recurso) DO UPDATE SET versao = recurso_versao.versao + 1, atualizado_em = NOW()
+        RETURNING versao INTO nova;
+    END IF;
+    PERFORM set_config(chave, nova::TEXT, TRUE);
+    PERFORM pg_notify('recurso_versao', p_recurso || ':' || nova);
+    RETURN nova;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION tg_incrementar_versao() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM incrementar_versao(TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tg_versao_boxes ON boxes;
+CREATE TRIGGER tg_versao_boxes
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON boxes
+    FOR EACH STATEMENT EXECUTE FUNCTION tg_incrementar_versao('boxes');
+
+DROP TRIGGER IF EXISTS tg_versao_funcionarios ON funcionarios;
+CREATE TRIGGER tg_versao_funcionarios
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON funcionarios
+    FOR EACH STATEMENT EXECUTE FUNCTION tg_incrementar_versao('funcionarios');
+
+DROP TRIGGER IF EXISTS tg_versao_catalogo ON servicos_borracharia;
+CREATE TRIGGER tg_versao_catalogo
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON servicos_borracharia
+    FOR EACH STATEMENT EXECUTE FUNCTION tg_incrementar_versao('catalogo');
+
+DROP TRIGGER IF EXISTS tg_versao_catalogo ON servicos_alinhamento;
+CREATE TRIGGER tg_versao_catalogo
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON servicos_alinhamento
+    FOR EACH STATEMENT EXECUTE FUNCTION tg_incrementar_versao('catalogo');
+
+DROP TRIGGER IF EXISTS tg_versao_catalogo ON servicos_manutencao;
+CREATE TRIGGER tg_versao_catalogo
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON servicos_manutencao
+    FOR EACH STATEMENT EXECUTE FUNCTION tg_incrementar_versao('catalogo');
+
+-- Pátio: a mesma regra de relevância de 0003 passa a incrementar a versão
+-- 'patio' e a levá-la no aviso, para o estado em memória saber a que versão
+-- do banco seus dados correspondem.
+CREATE OR REPLACE FUNCTION notificar_patio() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    recurso TEXT := TG_ARGV[0];
+    linhas JSONB[] := ARRAY[]::JSONB[];
+    linha JSONB;
+    boxes INTEGER[] := ARRAY[]::INTEGER[];
+    veiculos INTEGER[] := ARRAY[]::INTEGER[];
+    relevante BOOLEAN := FALSE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        linhas := linhas || to_jsonb(OLD);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        linhas := linhas || to_jsonb(NEW);
+    END IF;
+
+    FOREACH linha IN ARRAY linhas LOOP
+        IF recurso = 'boxes' THEN
+            relevante := TRUE;
+            boxes := boxes || (linha->>'id')::INTEGER;
+        ELSIF recurso = 'veiculos' THEN
+            relevante := TRUE;
+            veiculos := veiculos || (linha->>'id')::INTEGER;
+        ELSIF recurso = 'funcionarios' THEN
+            relevante := TRUE;
+        ELSE
+            -- execucao_servico / servicos_solicitados: histórico finalizado não aparece no pátio
+            IF linha->>'status' IN ('pendente', 'em_andamento') THEN
+                relevante := TRUE;
+            END IF;
+            IF linha->>'box_id' IS NOT NULL THEN
+                boxes := boxes || (linha->>'box_id')::INTEGER;
+            END IF;
+            IF linha->>'veiculo_id' IS NOT NULL THEN
+                veiculos := veiculos || (linha->>'veiculo_id')::INTEGER;
+            END IF;
+        END IF;
+    END LOOP;
+
+    IF relevante THEN
+        PERFORM pg_notify(
+            'patio',
+            json_build_object(
+                'recurso', recurso,
+                'boxes', boxes,
+                'veiculos', veiculos,
+                'versao', incrementar_versao('patio')
+            )::TEXT
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
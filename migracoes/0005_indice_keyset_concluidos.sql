@@ -0,0 +1,11 @@
+-- migrar: sem-transacao
+-- 0005_indice_keyset_concluidos.sql
+-- /services/completed pagina por (fim_execucao, id) decrescente. Com o id no
+-- índice a comparação de linha (fim_execucao, id) < (cursor) vira um Index
+-- Scan Backward que para no LIMIT, sem ordenar o período inteiro.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_execucao_finalizada_fim_id
+    ON execucao_servico (fim_execucao, id)
+    WHERE status = 'finalizado';
+
+-- Substituído pelo índice acima (mesmo predicado, mesma primeira coluna)
+DROP INDEX CONCURRENTLY IF EXISTS ix_execucao_finalizada_fim;
@@ -0,0 +1,17 @@
+-- 0006_idempotencia_requisicoes.sql
+-- Idempotency-Key dos POST de cadastro: a primeira requisição grava a chave e
+-- a resposta na mesma transação dos dados; uma repetição (tablet reenviando
+-- em Wi-Fi instável) recebe a resposta gravada em vez de cadastrar de novo.
+-- Uma repetição que chega com a original ainda em andamento espera o COMMIT
+-- dela na chave primária. Chaves com mais de 24 h podem ser reaproveitadas.
+CREATE TABLE IF NOT EXISTS idempotencia_requisicoes (
+    chave TEXT NOT NULL,
+    usuario_id INTEGER NOT NULL,
+    rota TEXT NOT NULL,
+    hash_corpo TEXT NOT NULL,
+    resposta JSONB,
+    criada_em TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (chave, usuario_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotencia_criada_em ON idempotencia_requisicoes (criada_em);
@@ -0,0 +1,45 @@
+-- 0007_fila_tarefas.sql
+-- Fila de tarefas pós-commit (recálculo de média de KM, avisos no Telegram).
+-- A API e o Streamlit só inserem a tarefa, na mesma transação da alteração que
+-- a originou; o worker.py reivindica com FOR UPDATE SKIP LOCKED (vários
+-- workers não pegam a mesma tarefa), executa e reagenda com espera crescente
+-- em caso de erro.
+--
+-- status: pendente -> executando -> concluida | falhou (tentativas esgotadas)
+-- chave: tarefas pendentes com a mesma chave são uma só (ex.: dois recálculos
+-- do mesmo veículo antes de o worker chegar neles).
+
+CREATE TABLE IF NOT EXISTS tarefas (
+    id BIGSERIAL PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    chave TEXT,
+    status TEXT NOT NULL DEFAULT 'pendente',
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    max_tentativas INTEGER NOT NULL DEFAULT 5,
+    executar_em TIMESTAMP NOT NULL DEFAULT NOW(),
+    iniciada_em TIMESTAMP,
+    concluida_em TIMESTAMP,
+    erro TEXT,
+    criada_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- A busca do worker: só as pendentes, na ordem em que vencem
+CREATE INDEX IF NOT EXISTS ix_tarefas_pendentes ON tarefas (executar_em, id) WHERE status = 'pendente';
+CREATE UNIQUE INDEX IF NOT EXISTS ux_tarefas_pendente_chave ON tarefas (chave) WHERE status = 'pendente';
+-- Recuperação de tarefas de um worker que morreu no meio
+CREATE INDEX IF NOT EXISTS ix_tarefas_executando ON tarefas (iniciada_em) WHERE status = 'executando';
+
+-- Acorda os workers em LISTEN no COMMIT de quem enfileirou (um aviso por transação)
+CREATE OR REPLACE FUNCTION notificar_tarefas() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('tarefas', '');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tg_notificar_tarefas ON tarefas;
+CREATE TRIGGER tg_notificar_tarefas
+    AFTER INSERT ON tarefas
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_tarefas();
@@ -0,0 +1,56 @@
+-- 0008_veiculo_km_estado.sql
+-- Estado incremental da média de KM/dia por veículo (km_media.py): as até 3
+-- últimas visitas válidas (KM estritamente crescente) e a data e o KM da
+-- visita mais recente com KM (válida ou não). Uma finalização nova é aplicada
+-- sobre esse estado sem reler o histórico do veículo.
+--
+-- Qualquer outra mudança no histórico finalizado (reverter visita, corrigir
+-- data/KM, mesclar veículos, inserir já finalizado) marca o estado como
+-- inválido e o próximo recálculo o reconstrói a partir do histórico.
+-- Veículo sem linha aqui também é reconstruído no primeiro recálculo.
+
+CREATE TABLE IF NOT EXISTS veiculo_km_estado (
+    veiculo_id INTEGER PRIMARY KEY REFERENCES veiculos(id) ON DELETE CASCADE,
+    datas TIMESTAMP[] NOT NULL DEFAULT '{}',
+    kms INTEGER[] NOT NULL DEFAULT '{}',
+    ultima_fim TIMESTAMP,
+    ultimo_km INTEGER,
+    valido BOOLEAN NOT NULL DEFAULT TRUE,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION invalidar_km_estado() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        -- Finalização comum: aplicada pelo worker (tarefa recalcular_media com execucao_id)
+        IF NEW.status = 'finalizado' AND OLD.status IS DISTINCT FROM 'finalizado'
+           AND NEW.veiculo_id IS NOT DISTINCT FROM OLD.veiculo_id THEN
+            RETURN NULL;
+        END IF;
+        IF OLD.status IS DISTINCT FROM 'finalizado' AND NEW.status IS DISTINCT FROM 'finalizado' THEN
+            RETURN NULL;
+        END IF;
+        IF NEW.status IS NOT DISTINCT FROM OLD.status
+           AND NEW.veiculo_id IS NOT DISTINCT FROM OLD.veiculo_id
+           AND NEW.quilometragem IS NOT DISTINCT FROM OLD.quilometragem
+           AND NEW.fim_execucao IS NOT DISTINCT FROM OLD.fim_execucao THEN
+            RETURN NULL;
+        END IF;
+        UPDATE veiculo_km_estado SET valido = FALSE
+         WHERE veiculo_id IN (OLD.veiculo_id, NEW.veiculo_id) AND valido;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF OLD.status = 'finalizado' THEN
+            UPDATE veiculo_km_estado SET valido = FALSE WHERE veiculo_id = OLD.veiculo_id AND valido;
+        END IF;
+    ELSIF NEW.status = 'finalizado' THEN
+        UPDATE veiculo_km_estado SET valido = FALSE WHERE veiculo_id = NEW.veiculo_id AND valido;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tg_invalidar_km_estado ON execucao_servico;
+CREATE TRIGGER tg_invalidar_km_estado
+    AFTER INSERT OR UPDATE OR DELETE ON execucao_servico
+    FOR EACH ROW EXECUTE FUNCTION invalidar_km_estado();
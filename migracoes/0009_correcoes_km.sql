@@ -0,0 +1,31 @@
+-- 0009_correcoes_km.sql
+-- Aplicação das correções de dígito do hodômetro aprovadas na simulação
+-- (aplicar_correcoes_simulacao.py).
+--
+-- correcoes_km_staging recebe o CSV por COPY e é só área de passagem:
+-- UNLOGGED (sem WAL) e esvaziada em cada aplicação. Cada aplicação vira um
+-- lote em correcoes_km_lotes e cada linha alterada fica em correcoes_km_desfazer
+-- com a KM de antes, para desfazer o lote inteiro depois.
+CREATE UNLOGGED TABLE IF NOT EXISTS correcoes_km_staging (
+    exec_id INTEGER NOT NULL,
+    veiculo_id INTEGER NOT NULL,
+    km_antes INTEGER NOT NULL,
+    km_depois INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS correcoes_km_lotes (
+    id SERIAL PRIMARY KEY,
+    arquivo TEXT NOT NULL,
+    registros INTEGER NOT NULL DEFAULT 0,
+    aplicado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+    desfeito_em TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS correcoes_km_desfazer (
+    lote_id INTEGER NOT NULL REFERENCES correcoes_km_lotes(id) ON DELETE CASCADE,
+    exec_id INTEGER NOT NULL,
+    veiculo_id INTEGER NOT NULL,
+    km_antes INTEGER NOT NULL,
+    km_depois INTEGER NOT NULL,
+    PRIMARY KEY (lote_id, exec_id)
+);
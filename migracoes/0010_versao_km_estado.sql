@@ -0,0 +1,13 @@
+-- 0010_versao_km_estado.sql
+-- Versão 'km_estado' (recurso_versao, migração 0004): incrementada a cada
+-- transação que grava veiculo_km_estado — finalização aplicada pelo worker,
+-- reconstrução, recálculo da frota. A API e o Streamlit usam a versão para
+-- saber quando reler as projeções de KM do cadastro (km_plausibilidade.py).
+
+INSERT INTO recurso_versao (recurso) VALUES ('km_estado')
+ON CONFLICT (recurso) DO NOTHING;
+
+DROP TRIGGER IF EXISTS tg_versao_km_estado ON veiculo_km_estado;
+CREATE TRIGGER tg_versao_km_estado
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON veiculo_km_estado
+    FOR EACH STATEMENT EXECUTE FUNCTION tg_incrementar_versao('km_estado');
@@ -0,0 +1,163 @@
+-- 0011_veiculo_ultima_visita.sql
+-- Última visita de cada veículo: a execução finalizada com KM mais recente
+-- (fim_execucao, depois id), com a data, a KM e os serviços finalizados dela
+-- já agregados. Lida direto pela Revisão Proativa, pelo Feedback de Serviços
+-- e por GET /vehicles/by-plate, no lugar de procurar a última execução de
+-- cada veículo em execucao_servico e agregar servicos_solicitados a cada
+-- leitura.
+--
+-- Mantida pelos triggers abaixo: qualquer escrita que mude o histórico
+-- finalizado de um veículo (finalizar, reverter, corrigir data/KM, mesclar
+-- veículos) ou os serviços da execução que é a última visita recalcula só a
+-- linha daquele veículo. Para reconstruir a tabela inteira:
+--     python reconstruir_ultima_visita.py
+
+CREATE TABLE IF NOT EXISTS veiculo_ultima_visita (
+    veiculo_id INTEGER PRIMARY KEY REFERENCES veiculos(id) ON DELETE CASCADE,
+    execucao_id INTEGER NOT NULL,
+    data_ultima_visita TIMESTAMP NOT NULL,
+    km_ultima_visita INTEGER NOT NULL,
+    servicos TEXT,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_veiculo_ultima_visita_execucao ON veiculo_ultima_visita (execucao_id);
+
+-- Recalcula a linha de um veículo (apaga se ele não tem mais visita finalizada
+-- com KM). A trava por veículo faz duas transações que mexem no mesmo veículo
+-- recalcularem uma depois da outra: o SELECT seguinte já vê o commit da primeira.
+CREATE OR REPLACE FUNCTION atualizar_ultima_visita(p_veiculo_id INTEGER) RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF p_veiculo_id IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM pg_advisory_xact_lock(hashtext('veiculo_ultima_visita'), p_veiculo_id);
+
+    INSERT INTO veiculo_ultima_visita AS uv
+        (veiculo_id, execucao_id, data_ultima_visita, km_ultima_visita, servicos, atualizado_em)
+    SELECT es.veiculo_id, es.id, es.fim_execucao, es.quilometragem,
+           (SELECT STRING_AGG(DISTINCT s.tipo, '; ')
+              FROM servicos_solicitados s
+             WHERE s.execucao_id = es.id AND s.status = 'finalizado'),
+           NOW()
+    FROM execucao_servico es
+    WHERE es.veiculo_id = p_veiculo_id
+      AND es.status = 'finalizado'
+      AND es.quilometragem IS NOT NULL
+      AND es.fim_execucao IS NOT NULL
+    ORDER BY es.fim_execucao DESC, es.id DESC
+    LIMIT 1
+    ON CONFLICT (veiculo_id) DO UPDATE
+       SET execucao_id = EXCLUDED.execucao_id,
+           data_ultima_visita = EXCLUDED.data_ultima_visita,
+           km_ultima_visita = EXCLUDED.km_ultima_visita,
+           servicos = EXCLUDED.servicos,
+           atualizado_em = EXCLUDED.atualizado_em
+     WHERE (uv.execucao_id, uv.data_ultima_visita, uv.km_ultima_visita, uv.servicos)
+           IS DISTINCT FROM
+           (EXCLUDED.execucao_id, EXCLUDED.data_ultima_visita, EXCLUDED.km_ultima_visita, EXCLUDED.servicos);
+
+    IF NOT EXISTS (
+        SELECT 1 FROM execucao_servico
+        WHERE veiculo_id = p_veiculo_id AND status = 'finalizado'
+          AND quilometragem IS NOT NULL AND fim_execucao IS NOT NULL
+    ) THEN
+        DELETE FROM veiculo_ultima_visita WHERE veiculo_id = p_veiculo_id;
+    END IF;
+END;
+$$;
+
+-- Reconstrói a tabela inteira numa passada (DISTINCT ON sobre o histórico
+-- finalizado). Devolve o número de veículos gravados.
+CREATE OR REPLACE FUNCTION reconstruir_ultima_visita() RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    gravados INTEGER;
+BEGIN
+    LOCK TABLE veiculo_ultima_visita IN EXCLUSIVE MODE;
+    DELETE FROM veiculo_ultima_visita;
+    INSERT INTO veiculo_ultima_visita
+        (veiculo_id, execucao_id, data_ultima_visita, km_ultima_visita, servicos)
+    SELECT u.veiculo_id, u.id, u.fim_execucao, u.quilometragem,
+           (SELECT STRING_AGG(DISTINCT s.tipo, '; ')
+              FROM servicos_solicitados s
+             WHERE s.execucao_id = u.id AND s.status = 'finalizado')
+    FROM (
+        SELECT DISTINCT ON (es.veiculo_id) es.veiculo_id, es.id, es.fim_execucao, es.quilometragem
+        FROM execucao_servico es
+        JOIN veiculos v ON v.id = es.veiculo_id
+        WHERE es.status = 'finalizado'
+          AND es.quilometragem IS NOT NULL
+          AND es.fim_execucao IS NOT NULL
+        ORDER BY es.veiculo_id, es.fim_execucao DESC, es.id DESC
+    ) u;
+    GET DIAGNOSTICS gravados = ROW_COUNT;
+    RETURN gravados;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION tg_ultima_visita_execucao() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        IF OLD.status IS DISTINCT FROM 'finalizado' AND NEW.status IS DISTINCT FROM 'finalizado' THEN
+            RETURN NULL;
+        END IF;
+        IF NEW.status IS NOT DISTINCT FROM OLD.status
+           AND NEW.veiculo_id IS NOT DISTINCT FROM OLD.veiculo_id
+           AND NEW.quilometragem IS NOT DISTINCT FROM OLD.quilometragem
+           AND NEW.fim_execucao IS NOT DISTINCT FROM OLD.fim_execucao THEN
+            RETURN NULL;
+        END IF;
+        PERFORM atualizar_ultima_visita(NEW.veiculo_id);
+        IF OLD.veiculo_id IS DISTINCT FROM NEW.veiculo_id THEN
+            PERFORM atualizar_ultima_visita(OLD.veiculo_id);
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF OLD.status = 'finalizado' THEN
+            PERFORM atualizar_ultima_visita(OLD.veiculo_id);
+        END IF;
+    ELSIF NEW.status = 'finalizado' THEN
+        PERFORM atualizar_ultima_visita(NEW.veiculo_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tg_ultima_visita_execucao ON execucao_servico;
+CREATE TRIGGER tg_ultima_visita_execucao
+    AFTER INSERT OR UPDATE OR DELETE ON execucao_servico
+    FOR EACH ROW EXECUTE FUNCTION tg_ultima_visita_execucao();
+
+-- Serviços só importam quando a execução já é a última visita de alguém (serviço
+-- finalizado depois da execução, revertido, tipo trocado); na finalização comum
+-- os serviços são gravados antes da execução e o trigger acima já os agrega.
+CREATE OR REPLACE FUNCTION tg_ultima_visita_servicos() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    alvo INTEGER;
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND NEW.execucao_id IS NOT DISTINCT FROM OLD.execucao_id
+       AND NEW.tipo IS NOT DISTINCT FROM OLD.tipo
+       AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+        RETURN NULL;
+    END IF;
+    FOR alvo IN
+        SELECT veiculo_id FROM veiculo_ultima_visita
+        WHERE execucao_id IN (OLD.execucao_id, NEW.execucao_id)
+    LOOP
+        PERFORM atualizar_ultima_visita(alvo);
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+-- Na tabela particionada o trigger é clonado para cada partição
+DROP TRIGGER IF EXISTS tg_ultima_visita_servicos ON servicos_solicitados;
+CREATE TRIGGER tg_ultima_visita_servicos
+    AFTER INSERT OR UPDATE OR DELETE ON servicos_solicitados
+    FOR EACH ROW EXECUTE FUNCTION tg_ultima_visita_servicos();
+
+SELECT reconstruir_ultima_visita();
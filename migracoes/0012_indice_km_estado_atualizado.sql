@@ -0,0 +1,8 @@
+-- migrar: sem-transacao
+-- 0012_indice_km_estado_atualizado.sql
+-- As projeções de KM do cadastro (km_plausibilidade.py) são relidas só a
+-- partir da última gravação lida: atualizado_em >= (lido_ate - SOBREPOSICAO).
+-- Sem índice essa leitura parcial percorre veiculo_km_estado inteira (uma
+-- linha por veículo) a cada mudança da versão 'km_estado'.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_veiculo_km_estado_atualizado
+    ON veiculo_km_estado (atualizado_em);
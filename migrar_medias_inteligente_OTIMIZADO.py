@@ -1,37 +1,81 @@
-# migrar_medias_inteligente_OTIMIZADO.py - VERSÃO CORRIGIDA (BUG FILTRAGEM)
+# migrar_medias_inteligente_OTIMIZADO.py
 """
-✅ VERSÃO ULTRA OTIMIZADA: 5x mais rápida!
-- Antes: 30 minutos
-- Agora: 3-5 minutos
-- Processamento: APENAS 3 últimas visitas ÚTEIS (sem duplicatas)
-- NOVO: Progresso numerado [1/9000] [2/9000] etc
-- ✅ CORRIGIDO: Lógica de filtragem de KM crescente (não descartava visitas válidas)
+Recalcula a média de KM/dia de todos os veículos descartando saltos de KM
+implausíveis (> 500 km/dia entre visitas) e gera o relatório desses saltos.
+
+Pipeline:
+- um cursor nomeado (server-side) lê o histórico inteiro ordenado por
+  veiculo_id, em blocos, sem carregar tudo na memória;
+- um gerador junta as linhas de cada veículo e monta lotes de veículos;
+- um pool de processos (--workers) valida e calcula cada lote com a regra de
+  km_media (KM repetida vale a última, só KM crescente, 3 últimas visitas)
+  mais o filtro de plausibilidade de validar_quilometragem();
+- as médias são gravadas de uma vez (UPDATE ... FROM VALUES, um commit) e o
+  relatório sai num CSV só.
+
+Uso:
+    python migrar_medias_inteligente_OTIMIZADO.py                  # todos, um worker por CPU
+    python migrar_medias_inteligente_OTIMIZADO.py 500              # só os 500 primeiros veículos
+    python migrar_medias_inteligente_OTIMIZADO.py --workers 4
 """
 
+import argparse
+import itertools
+import multiprocessing
 import os
-import psycopg2
+import time
+from collections import deque
+
 import pandas as pd
+import psycopg2
+import psycopg2.extras
 from dotenv import load_dotenv
-from datetime import datetime
-import sys
+
+from km_media import media_km, visitas_validas
 
 load_dotenv()
 
+ARQUIVO_CSV = "relatorio_completo_problemas_km.csv"
+VEICULOS_POR_LOTE = 200
+LINHAS_POR_BLOCO = 20000
+PROGRESSO_A_CADA_S = 2.0
+
+CONSULTA_HISTORICO = """
+    SELECT veiculo_id, fim_execucao, quilometragem
+    FROM execucao_servico
+    WHERE status = 'finalizado'
+      AND quilometragem IS NOT NULL AND quilometragem > 0
+      AND fim_execucao IS NOT NULL
+    ORDER BY veiculo_id, fim_execucao, id
+"""
+CONTAR_VEICULOS = """
+    SELECT COUNT(DISTINCT veiculo_id)
+    FROM execucao_servico
+    WHERE status = 'finalizado' AND quilometragem IS NOT NULL AND quilometragem > 0
+      AND fim_execucao IS NOT NULL
+"""
+GRAVAR_MEDIAS = """
+    UPDATE veiculos v
+       SET media_km_diaria = t.media
+      FROM (VALUES %s) AS t(id, media)
+     WHERE v.id = t.id
+"""
+
 
 def validar_quilometragem(km_atual, km_anterior, dias_entre_visitas):
     """Valida se um KM faz sentido"""
-    
+
     if km_anterior is None:
         return True, "Primeira visita", 0
-    
+
     if km_atual < km_anterior:
         return False, "KM descrescente (impossível)", 0
-    
+
     if dias_entre_visitas <= 0:
         return True, "Mesma data", 0
-    
+
     km_por_dia = (km_atual - km_anterior) / dias_entre_visitas
-    
+
     if km_por_dia > 1000:
         return False, f"CRÍTICO: {km_por_dia:.0f} km/dia", km_por_dia
     elif km_por_dia > 500:
@@ -40,281 +84,245 @@ def validar_quilometragem(km_atual, km_anterior, dias_entre_visitas):
         return True, f"Normal", km_por_dia
 
 
-def migrar_otimizado(max_veiculos=None):
+def analisar_veiculo(veiculo_id, datas, kms):
     """
-    VERSÃO ULTRA OTIMIZADA
-    - Usa query SQL para fazer 90% do trabalho
-    - Python filtra para 3 últimas ÚTEIS
-    - 5x mais rápido que versão anterior
-    - NOVO: Progresso numerado
-    - ✅ CORRIGIDO: Lógica de filtragem (não descartava visitas após erro de KM)
+    Média e problemas de um veículo: (processado, media ou None, problemas).
+    A média usa só as visitas válidas que não vieram de um salto implausível.
     """
-    
+    indices = visitas_validas(kms)
+    if len(indices) < 2:
+        return False, None, []
+
+    plausiveis = [indices[0]]
+    problemas = []
+    for anterior, atual in zip(indices[:-1], indices[1:]):
+        # Dias de calendário, como no relatório de sempre
+        dias = (datas[atual].date() - datas[anterior].date()).days
+        valido, motivo, _ = validar_quilometragem(kms[atual], kms[anterior], dias)
+        if valido:
+            plausiveis.append(atual)
+        else:
+            problemas.append({
+                'veiculo_id': veiculo_id,
+                'data': datas[atual].strftime('%d/%m/%Y'),
+                'km': int(kms[atual]),
+                'km_anterior': int(kms[anterior]),
+                'dias': dias,
+                'motivo': motivo,
+            })
+
+    media = media_km([datas[i] for i in plausiveis], [kms[i] for i in plausiveis])
+    return True, media, problemas
+
+
+def analisar_lote(lote):
+    """Roda nos processos do pool: [(veiculo_id, datas, kms)] -> resultados do lote."""
+    medias, problemas, visitas, processados = [], [], 0, 0
+    for veiculo_id, datas, kms in lote:
+        visitas += len(kms)
+        processado, media, problemas_veiculo = analisar_veiculo(veiculo_id, datas, kms)
+        processados += processado
+        if media is not None:
+            medias.append((veiculo_id, media))
+        problemas.extend(problemas_veiculo)
+    return len(lote), visitas, processados, medias, problemas
+
+
+def historicos(cursor, max_veiculos=None):
+    """Uma tupla (veiculo_id, datas, kms) por veículo, na ordem do cursor."""
+    veiculos = itertools.groupby(cursor, key=lambda linha: linha[0])
+    for veiculo_id, linhas in itertools.islice(veiculos, max_veiculos):
+        linhas = list(linhas)
+        yield veiculo_id, [l[1] for l in linhas], [l[2] for l in linhas]
+
+
+def em_lotes(itens, tamanho):
+    iterador = iter(itens)
+    while True:
+        lote = list(itertools.islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def calcular(lotes, workers):
+    """
+    Resultados de analisar_lote na ordem dos lotes. Com pool, no máximo
+    4 lotes por worker ficam em voo: a leitura do banco não corre à frente do
+    cálculo e a memória fica limitada mesmo com o histórico inteiro.
+    """
+    if workers <= 1:
+        yield from map(analisar_lote, lotes)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        em_voo = deque()
+        for lote in lotes:
+            em_voo.append(pool.apply_async(analisar_lote, (lote,)))
+            if len(em_voo) >= workers * 4:
+                yield em_voo.popleft().get()
+        while em_voo:
+            yield em_voo.popleft().get()
+
+
+class Progresso:
+    """Uma linha a cada PROGRESSO_A_CADA_S com a vazão, em vez de uma por veículo."""
+
+    def __init__(self, total):
+        self.total = total
+        self.veiculos = 0
+        self.visitas = 0
+        self.inicio = time.perf_counter()
+        self.ultimo = self.inicio
+
+    def somar(self, veiculos, visitas, forcar=False):
+        self.veiculos += veiculos
+        self.visitas += visitas
+        agora = time.perf_counter()
+        if not forcar and agora - self.ultimo < PROGRESSO_A_CADA_S:
+            return
+        self.ultimo = agora
+        decorrido = max(agora - self.inicio, 1e-9)
+        vazao = self.veiculos / decorrido
+        linha = f"  {self.veiculos:,}/{self.total:,} veículos · {self.visitas:,} visitas · {vazao:,.0f} veículos/s ({self.visitas / decorrido:,.0f} visitas/s)"
+        if vazao > 0 and self.veiculos < self.total:
+            linha += f" · faltam ~{(self.total - self.veiculos) / vazao:.0f} s"
+        print(linha, flush=True)
+
+
+def processar(conn, workers, max_veiculos=None):
+    """Lê, calcula e devolve (medias, problemas, estatísticas), sem gravar nada."""
+    with conn.cursor() as cursor:
+        cursor.execute(CONTAR_VEICULOS)
+        total = cursor.fetchone()[0]
+    if max_veiculos:
+        total = min(total, max_veiculos)
+
+    progresso = Progresso(total)
+    medias, problemas, processados = [], [], 0
+
+    leitor = conn.cursor(name="migrar_medias_historico")
+    leitor.itersize = LINHAS_POR_BLOCO
+    leitor.execute(CONSULTA_HISTORICO)
+    try:
+        lotes = em_lotes(historicos(leitor, max_veiculos), VEICULOS_POR_LOTE)
+        for n_veiculos, n_visitas, n_processados, medias_lote, problemas_lote in calcular(lotes, workers):
+            processados += n_processados
+            medias.extend(medias_lote)
+            problemas.extend(problemas_lote)
+            progresso.somar(n_veiculos, n_visitas)
+    finally:
+        leitor.close()
+    progresso.somar(0, 0, forcar=True)
+
+    estatisticas = {
+        'total': progresso.veiculos,
+        'processados': processados,
+        'com_media': len(medias),
+        'segundos': time.perf_counter() - progresso.inicio,
+    }
+    return medias, problemas, estatisticas
+
+
+def gravar_medias(conn, medias):
+    with conn.cursor() as cursor:
+        psycopg2.extras.execute_values(
+            cursor, GRAVAR_MEDIAS, medias, template="(%s::int, %s::float8)", page_size=1000
+        )
+    conn.commit()
+
+
+def exportar_problemas(conn, problemas):
+    """Completa a placa dos veículos com problema (uma consulta) e grava o CSV."""
+    df_problemas = pd.DataFrame(problemas)
+    veiculo_ids = [int(v) for v in df_problemas['veiculo_id'].unique()]
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT id, placa FROM veiculos WHERE id = ANY(%s)", (veiculo_ids,))
+        placas = dict(cursor.fetchall())
+    df_problemas.insert(1, 'placa', df_problemas['veiculo_id'].map(placas))
+    df_problemas = df_problemas.sort_values('placa', kind='stable')
+    df_problemas.to_csv(ARQUIVO_CSV, index=False, encoding='utf-8')
+    return df_problemas
+
+
+def resumo_problemas(df_problemas):
+    print("VEÍCULOS COM DADOS SUSPEITOS (Primeiros 30):")
+    print("-" * 100)
+    por_placa = list(df_problemas.groupby('placa', sort=True))
+    for placa, probs in por_placa[:30]:
+        print(f"\n{placa}:")
+        for prob in probs.head(2).itertuples():
+            print(f"  {prob.data} → {prob.km:,} km ({prob.motivo})")
+        if len(probs) > 2:
+            print(f"  ... e mais {len(probs) - 2}")
+    if len(por_placa) > 30:
+        print(f"\n... e mais {len(por_placa) - 30} veículos com problemas")
+
+
+def migrar_otimizado(max_veiculos=None, workers=None):
     db_url = os.getenv("DB_URL")
     if not db_url:
         print("ERRO: DB_URL não encontrada em .env")
         return
-    
+    workers = workers or os.cpu_count() or 1
+
     conn = psycopg2.connect(db_url)
-    
-    print("\n" + "="*100)
-    print("⚡ MIGRAÇÃO ULTRA OTIMIZADA - 5x MAIS RÁPIDA")
-    print("="*100)
-    print("Processamento: APENAS 3 últimas visitas ÚTEIS (sem duplicatas)")
-    print("NOVO: Progresso numerado em tempo real")
-    print("CORRIGIDO: Lógica de filtragem de KM crescente\n")
-    
-    # ⚡ OTIMIZAÇÃO 1: Buscar veículos com uma query única
-    print("📊 Carregando dados...\n")
-    
-    query_veiculos = """
-    SELECT DISTINCT v.id, v.placa
-    FROM veiculos v
-    INNER JOIN execucao_servico es ON v.id = es.veiculo_id
-    WHERE es.status = 'finalizado' AND es.quilometragem IS NOT NULL AND es.quilometragem > 0
-    ORDER BY v.id
-    """
-    
-    if max_veiculos:
-        query_veiculos += f" LIMIT {max_veiculos}"
-    
-    df_veiculos = pd.read_sql(query_veiculos, conn)
-    total_veiculos = len(df_veiculos)
-    print(f"Total de veículos: {total_veiculos}\n")
-    print("="*100)
-    print("PROGRESSO:")
-    print("="*100 + "\n")
-    
-    problemas_encontrados = []
-    veiculos_processados = 0
-    veiculos_com_erro = 0
-    
-    # ⚡ OTIMIZAÇÃO 2: Processar em LOTES (não um por um)
-    for idx, veiculo in df_veiculos.iterrows():
-        veiculo_id = int(veiculo['id'])
-        placa = veiculo['placa']
-        
-        # ✅ CORRIGIDO: Buscar TODAS as visitas (sem LIMIT 3 no SQL)
-        # O LIMIT 3 será aplicado APÓS remover duplicatas e validar em Python
-        query = """
-        SELECT
-            fim_execucao,
-            quilometragem
-        FROM (
-            SELECT 
-                fim_execucao,
-                quilometragem,
-                ROW_NUMBER() OVER (PARTITION BY fim_execucao, quilometragem ORDER BY id DESC) as rn
-            FROM execucao_servico
-            WHERE veiculo_id = %s
-                AND status = 'finalizado'
-                AND quilometragem IS NOT NULL
-                AND quilometragem > 0
-        ) as dedup
-        WHERE rn = 1
-        ORDER BY fim_execucao ASC
-        """
-        
+    try:
+        print("\n" + "="*100)
+        print(f"⚡ MIGRAÇÃO DE MÉDIAS DE KM - {workers} worker(s)")
+        print("="*100 + "\n")
+
         try:
-            df = pd.read_sql(query, conn, params=(veiculo_id,))
+            medias, problemas, est = processar(conn, workers, max_veiculos)
+            conn.rollback()  # fecha a transação de leitura do cursor nomeado
+            print(f"\n💾 Gravando {len(medias):,} médias...")
+            gravar_medias(conn, medias)
         except Exception as e:
-            print(f"ERRO lendo {placa}: {e}")
-            continue
-        
-        if df.empty or len(df) < 2:
-            continue
-        
-        # Ordenar em ordem ascendente
-        df = df.sort_values('fim_execucao').reset_index(drop=True)
-        df['fim_execucao'] = pd.to_datetime(df['fim_execucao']).dt.date
-        
-        # ✅ CORRIGIDO: Remover visitas descrescentes (sem manter km anterior fixo)
-        # Algoritmo: percorre todas as visitas e mantém apenas as crescentes
-        valid_visitas_list = []
-        
-        for index, row in df.iterrows():
-            if len(valid_visitas_list) == 0:
-                # Primeira visita sempre é válida
-                valid_visitas_list.append(row.to_dict())
-            elif row['quilometragem'] > valid_visitas_list[-1]['quilometragem']:
-                # Se for MAIOR que a última adicionada, adiciona
-                valid_visitas_list.append(row.to_dict())
-            # Se for MENOR ou IGUAL, ignora (descrescente ou duplicada)
-        
-        # Converter de volta para estrutura de dados
-        if not valid_visitas_list or len(valid_visitas_list) < 2:
-            continue
-        
-        veiculos_processados += 1
-        
-        # ⚡ OTIMIZAÇÃO 3: Processamento eficiente em memória
-        km_anterior = None
-        data_anterior = None
-        visitas_validas = []
-        problemas = []
-        
-        for visita in valid_visitas_list:
-            km_atual = visita['quilometragem']
-            data_atual = visita['fim_execucao']
-            
-            if km_anterior is None:
-                visitas_validas.append({
-                    'data': data_atual,
-                    'km': km_atual,
-                    'valido': True
-                })
-                km_anterior = km_atual
-                data_anterior = data_atual
-                continue
-            
-            dias = (data_atual - data_anterior).days
-            valido, motivo, km_por_dia = validar_quilometragem(km_atual, km_anterior, dias)
-            
-            if not valido:
-                problemas.append({
-                    'veiculo_id': veiculo_id,
-                    'placa': placa,
-                    'data': data_atual.strftime('%d/%m/%Y'),
-                    'km': int(km_atual),
-                    'km_anterior': int(km_anterior),
-                    'dias': dias,
-                    'motivo': motivo
-                })
-            else:
-                visitas_validas.append({
-                    'data': data_atual,
-                    'km': km_atual,
-                    'valido': True
-                })
-            
-            km_anterior = km_atual
-            data_anterior = data_atual
-        
-        # Registrar problemas
-        if problemas:
-            veiculos_com_erro += 1
-            problemas_encontrados.extend(problemas)
-        
-        # ✅ CORRIGIDO: Pegar APENAS as 3 ÚLTIMAS VISITAS ÚTEIS/VÁLIDAS
-        if len(visitas_validas) >= 2:
-            ultimas_3 = visitas_validas[-3:] if len(visitas_validas) >= 3 else visitas_validas
-            
-            primeira = ultimas_3[0]
-            ultima = ultimas_3[-1]
-            
-            delta_km = ultima['km'] - primeira['km']
-            delta_dias = (ultima['data'] - primeira['data']).days
-            
-            if delta_dias > 0 and delta_km >= 0:
-                media = delta_km / delta_dias
-                
-                try:
-                    cur = conn.cursor()
-                    cur.execute(
-                        "UPDATE veiculos SET media_km_diaria = %s WHERE id = %s",
-                        (media, veiculo_id)
-                    )
-                    conn.commit()
-                    cur.close()
-                except Exception as e:
-                    conn.rollback()
-        
-        # ✅ NOVO: Mostrar progresso numerado a CADA veículo
-        print(f"  [{veiculos_processados}/{total_veiculos}] {placa} ✓")
-    
-    print("\n" + "="*100)
-    print("RELATÓRIO FINAL")
-    print("="*100 + "\n")
-    
-    # Calcular veículos descartados
-    veiculos_descartados = total_veiculos - veiculos_processados
-    percentual_processado = (veiculos_processados / total_veiculos * 100) if total_veiculos > 0 else 0
-    
-    print(f"Veículos processados: {veiculos_processados}")
-    print(f"Veículos descartados: {veiculos_descartados}")
-    print(f"Percentual processado: {percentual_processado:.1f}%")
-    print(f"Veículos com problemas: {veiculos_com_erro}")
-    print(f"Total de problemas encontrados: {len(problemas_encontrados)}\n")
-    
-    print("MOTIVOS DOS DESCARTES:")
-    print(f"  • Apenas 1 visita (< 2 necessárias): {veiculos_descartados}")
-    print(f"  • Sem dados válidos: 0")
-    print(f"  └─ Total: {veiculos_descartados}\n")
-    
-    # ⚡ OTIMIZAÇÃO 4: Mostrar apenas resumo (não todos)
-    if problemas_encontrados:
-        print("VEÍCULOS COM DADOS SUSPEITOS (Primeiros 30):")
-        print("-" * 100)
-        
-        por_placa = {}
-        for prob in problemas_encontrados:
-            if prob['placa'] not in por_placa:
-                por_placa[prob['placa']] = []
-            por_placa[prob['placa']].append(prob)
-        
-        mostrados = 0
-        for placa, probs in sorted(por_placa.items()):
-            if mostrados >= 30:  # Mostrar apenas 30 para ser rápido
-                print(f"\n... e mais {len(por_placa) - 30} veículos com problemas")
-                break
-            
-            print(f"\n{placa}:")
-            for prob in probs[:2]:  # Mostrar max 2 por veículo
-                print(f"  {prob['data']} → {prob['km']:,} km ({prob['motivo']})")
-            if len(probs) > 2:
-                print(f"  ... e mais {len(probs) - 2}")
-            mostrados += 1
-    
-    # ⚡ OTIMIZAÇÃO 5: Exportar CSV apenas se necessário
-    if problemas_encontrados:
-        arquivo_csv = "relatorio_completo_problemas_km.csv"
-        
+            conn.rollback()
+            print(f"ERRO: migração interrompida, nenhuma média foi alterada: {e}")
+            return
+
         print("\n" + "="*100)
-        print(f"📁 EXPORTANDO RELATÓRIO CSV")
+        print("RELATÓRIO FINAL")
         print("="*100 + "\n")
-        
-        df_problemas = pd.DataFrame(problemas_encontrados)
-        df_problemas = df_problemas.sort_values('placa')
-        df_problemas.to_csv(arquivo_csv, index=False, encoding='utf-8')
-        
-        print(f"✅ Arquivo criado: {arquivo_csv}")
-        print(f"   Total de registros: {len(df_problemas)}")
-        print(f"   Colunas: {', '.join(df_problemas.columns.tolist())}\n")
-        
-        print("ESTATÍSTICAS:")
-        print(f"  - Veículos únicos: {df_problemas['placa'].nunique()}")
-        print(f"  - Total de problemas: {len(df_problemas)}")
-        print(f"  - KM descrescente: {len(df_problemas[df_problemas['motivo'].str.contains('descrescente')])}")
-        print(f"  - CRÍTICO: {len(df_problemas[df_problemas['motivo'].str.contains('CRÍTICO')])}")
-        print(f"  - ALTO: {len(df_problemas[df_problemas['motivo'].str.contains('ALTO')])}\n")
-    
-    conn.close()
-    
-    print("="*100)
-    print("✅ MIGRAÇÃO CONCLUÍDA COM SUCESSO!")
-    print("="*100)
-    print("\n⚡ OTIMIZAÇÕES APLICADAS:")
-    print("   ✓ Query SQL otimizada (deduplica no banco)")
-    print("   ✓ Python filtra para 3 ÚLTIMAS ÚTEIS")
-    print("   ✓ Remove duplicatas (mesma data/km)")
-    print("   ✓ Valida crescimento de KM")
-    print("   ✓ Processamento em memória eficiente")
-    print("   ✓ Progresso numerado em tempo real [N/TOTAL]")
-    print("   ✓ Resumo de saída (30 primeiros + CSV completo)")
-    print("   ✓ Sem loops desnecessários")
-    print("   ✓ ✅ CORRIGIDO: Filtragem não descarta visitas válidas após erro")
-    print("\n📊 RESULTADO:")
-    print(f"   • Tempo estimado: 3-5 minutos")
-    print(f"   • CSV com TODOS os {len(problemas_encontrados)} problemas")
-    print(f"   • Console com progresso numerado")
-    print(f"   • Console com resumo (rápido de ler)")
-    print(f"   • Pronto para análise em Excel")
-    print(f"   • ✅ SINCRONIZADO COM utils.py\n")
+        descartados = est['total'] - est['processados']
+        percentual = (est['processados'] / est['total'] * 100) if est['total'] else 0
+        com_problemas = len({p['veiculo_id'] for p in problemas})
+        print(f"Veículos lidos: {est['total']:,}")
+        print(f"Veículos processados: {est['processados']:,} ({percentual:.1f}%)")
+        print(f"Veículos descartados (menos de 2 visitas válidas): {descartados:,}")
+        print(f"Médias gravadas: {est['com_media']:,}")
+        print(f"Veículos com problemas: {com_problemas:,}")
+        print(f"Total de problemas encontrados: {len(problemas):,}")
+        print(f"Tempo de cálculo: {est['segundos']:.1f} s\n")
+
+        if problemas:
+            df_problemas = exportar_problemas(conn, problemas)
+            resumo_problemas(df_problemas)
+
+            print("\n" + "="*100)
+            print(f"📁 RELATÓRIO CSV: {ARQUIVO_CSV}")
+            print("="*100 + "\n")
+            print(f"   Total de registros: {len(df_problemas)}")
+            print(f"   Colunas: {', '.join(df_problemas.columns.tolist())}\n")
+            print("ESTATÍSTICAS:")
+            print(f"  - Veículos únicos: {df_problemas['placa'].nunique()}")
+            print(f"  - CRÍTICO: {int(df_problemas['motivo'].str.contains('CRÍTICO').sum())}")
+            print(f"  - ALTO: {int(df_problemas['motivo'].str.contains('ALTO').sum())}\n")
+
+        print("="*100)
+        print("✅ MIGRAÇÃO CONCLUÍDA COM SUCESSO!")
+        print("="*100 + "\n")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula as médias de KM/dia descartando saltos implausíveis")
+    parser.add_argument("max_veiculos", nargs="?", type=int, help="processa só os N primeiros veículos (por id)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processos de cálculo (padrão: nº de CPUs; 1 = sem pool)")
+    args = parser.parse_args()
+    migrar_otimizado(max_veiculos=args.max_veiculos, workers=args.workers)
 
 
 if __name__ == "__main__":
-    max_v = None
-    if len(sys.argv) > 1:
-        max_v = int(sys.argv[1])
-    
-    migrar_otimizado(max_veiculos=max_v)
+    main()
@@ -0,0 +1,196 @@
+# migrar_schema.py
+"""
+🧱 MIGRAÇÕES DE SCHEMA
+
+Aplica, em ordem, os arquivos migracoes/NNNN_descricao.sql que ainda não foram
+aplicados no banco, registrando cada um em schema_migracoes (versão, nome,
+checksum, data). Cada arquivo roda numa transação própria; arquivos que
+começam com a linha `-- migrar: sem-transacao` rodam comando a comando em
+autocommit (necessário para CREATE INDEX CONCURRENTLY).
+
+Uso:
+    python migrar_schema.py             # aplica as pendentes
+    python migrar_schema.py --status    # lista aplicadas/pendentes
+    python migrar_schema.py --ate 2     # aplica até a versão 2
+    python migrar_schema.py --baseline  # banco já existente: marca a 0001 como aplicada sem rodar
+
+Um arquivo já aplicado não deve ser editado: o checksum é conferido e a
+execução para se ele mudou. Para alterar o schema, crie um arquivo novo.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+from pathlib import Path
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DIR_MIGRACOES = Path(__file__).resolve().parent / "migracoes"
+MARCADOR_SEM_TRANSACAO = "-- migrar: sem-transacao"
+# Impede dois processos migrando ao mesmo tempo (deploy em paralelo, etc.)
+CHAVE_LOCK = 7_241_001
+
+
+class MigracaoAlteradaError(Exception):
+    """Um arquivo de migração já aplicado foi modificado depois."""
+
+
+def listar_migracoes():
+    """[(versao, nome, sql, checksum)] em ordem de versão."""
+    migracoes = []
+    for caminho in sorted(DIR_MIGRACOES.glob("*.sql")):
+        achado = re.match(r"^(\d+)_(.+)\.sql$", caminho.name)
+        if not achado:
+            continue
+        sql = caminho.read_text(encoding="utf-8")
+        checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        migracoes.append((int(achado.group(1)), caminho.name, sql, checksum))
+    return migracoes
+
+
+def _comandos(sql):
+    """Divide um arquivo sem transação em comandos (um por ';' no fim da linha)."""
+    partes = re.split(r";\s*$", sql, flags=re.MULTILINE)
+    comandos = []
+    for parte in partes:
+        linhas = [l for l in parte.strip().splitlines() if l.strip() and not l.strip().startswith("--")]
+        if linhas:
+            comandos.append(parte.strip())
+    return comandos
+
+
+def _garantir_controle(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migracoes (
+                versao INTEGER PRIMARY KEY,
+                nome TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                aplicada_em TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+    conn.commit()
+
+
+def aplicadas(conn):
+    """{versao: (nome, checksum)} das migrações registradas no banco."""
+    _garantir_controle(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT versao, nome, checksum FROM schema_migracoes ORDER BY versao")
+        resultado = {versao: (nome, checksum) for versao, nome, checksum in cursor.fetchall()}
+    conn.commit()
+    return resultado
+
+
+def _registrar(conn, versao, nome, checksum):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO schema_migracoes (versao, nome, checksum) VALUES (%s, %s, %s)",
+            (versao, nome, checksum),
+        )
+
+
+def _aplicar(conn, versao, nome, sql, checksum):
+    if sql.lstrip().startswith(MARCADOR_SEM_TRANSACAO):
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                for comando in _comandos(sql):
+                    cursor.execute(comando)
+        finally:
+            conn.autocommit = False
+        _registrar(conn, versao, nome, checksum)
+        conn.commit()
+    else:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+            _registrar(conn, versao, nome, checksum)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def aplicar_migracoes(conn, ate=None, baseline=False, log=print):
+    """
+    Aplica as migrações pendentes (até a versão `ate`, se informada).
+    Funciona com conexões psycopg2 e psycopg 3. Retorna as versões aplicadas.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (CHAVE_LOCK,))
+    conn.commit()
+    try:
+        ja_aplicadas = aplicadas(conn)
+        novas = []
+        for versao, nome, sql, checksum in listar_migracoes():
+            if ate is not None and versao > ate:
+                break
+            if versao in ja_aplicadas:
+                if ja_aplicadas[versao][1] != checksum:
+                    raise MigracaoAlteradaError(f"{nome} foi alterada depois de aplicada (checksum diferente)")
+                continue
+            if baseline and versao == 1:
+                _registrar(conn, versao, nome, checksum)
+                conn.commit()
+                log(f"📌 {nome} marcada como aplicada (baseline)")
+                continue
+            log(f"▶️  Aplicando {nome}...")
+            _aplicar(conn, versao, nome, sql, checksum)
+            novas.append(versao)
+            log(f"✅ {nome}")
+        return novas
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (CHAVE_LOCK,))
+        conn.commit()
+
+
+def imprimir_status(conn):
+    ja_aplicadas = aplicadas(conn)
+    for versao, nome, _, checksum in listar_migracoes():
+        if versao not in ja_aplicadas:
+            estado = "pendente"
+        elif ja_aplicadas[versao][1] != checksum:
+            estado = "ALTERADA"
+        else:
+            estado = "aplicada"
+        print(f"  {versao:04d}  {estado:<9} {nome}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica as migrações de schema pendentes")
+    parser.add_argument("--status", action="store_true", help="só lista o estado das migrações")
+    parser.add_argument("--ate", type=int, help="aplica até esta versão (inclusive)")
+    parser.add_argument("--baseline", action="store_true", help="marca a 0001 como aplicada sem executar")
+    args = parser.parse_args()
+
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        print("ERRO: DB_URL não encontrada em .env")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    try:
+        if args.status:
+            imprimir_status(conn)
+            return
+        novas = aplicar_migracoes(conn, ate=args.ate, baseline=args.baseline)
+        if not novas:
+            print("✅ Schema já está atualizado.")
+    except MigracaoAlteradaError as e:
+        print(f"ERRO: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
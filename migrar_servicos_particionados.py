@@ -0,0 +1,270 @@
+# migrar_servicos_particionados.py
+"""
+🗂️ MIGRAÇÃO: servicos_solicitados_{borracharia,alinhamento,manutencao} -> servicos_solicitados
+
+Cria a tabela única servicos_solicitados, particionada por LIST(area), copia os
+dados das três tabelas antigas em lotes e, no fim, troca as tabelas antigas por
+views de compatibilidade com os mesmos nomes (páginas antigas continuam
+funcionando, inclusive INSERT/UPDATE/DELETE, porque as views são atualizáveis).
+
+Etapas (o script pode ser interrompido e rodado de novo; retoma de onde parou):
+1. Cria servicos_solicitados + partições + índices (se ainda não existirem)
+2. Copia cada tabela antiga em lotes de --lote linhas, com commit por lote
+3. Troca (numa transação curta, com as tabelas antigas travadas para escrita):
+   - copia as linhas novas que chegaram durante a etapa 2
+   - reaplica as linhas alteradas/removidas durante a etapa 2
+   - renomeia as tabelas antigas para *_legado e cria as views no lugar
+   - acerta a sequence de ids
+
+Os ids originais são preservados. Como cada tabela antiga tinha a sua própria
+sequence, o mesmo id pode existir em duas áreas: a chave é (id, area).
+As tabelas *_legado ficam intactas para conferência; apague-as manualmente.
+
+Uso:
+    python migrar_servicos_particionados.py              # migra tudo
+    python migrar_servicos_particionados.py --lote 5000
+    python migrar_servicos_particionados.py --sem-troca  # só copia (etapas 1 e 2)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AREAS = ["borracharia", "alinhamento", "manutencao"]
+
+
+def tabela_antiga(area):
+    return f"servicos_solicitados_{area}"
+
+
+def tipo_relacao(cursor, nome):
+    """'r' tabela, 'v' view, 'p' tabela particionada, None se não existe."""
+    cursor.execute(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = current_schema() AND c.relname = %s",
+        (nome,),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def colunas(cursor, tabela):
+    """[(nome, tipo)] na ordem da tabela."""
+    cursor.execute(
+        """
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+        """,
+        (tabela,),
+    )
+    return cursor.fetchall()
+
+
+def criar_tabela_particionada(conn, origens):
+    """
+    Cria servicos_solicitados com a união das colunas das tabelas antigas
+    (na ordem da borracharia) mais a coluna area, particionada por área.
+    """
+    with conn.cursor() as cursor:
+        if tipo_relacao(cursor, "servicos_solicitados") == "p":
+            print("✅ servicos_solicitados já existe")
+            return
+
+        definicoes = {}
+        for area in AREAS:
+            for nome, tipo in colunas(cursor, origens[area]):
+                definicoes.setdefault(nome, tipo)
+
+        cols_sql = []
+        for nome, tipo in definicoes.items():
+            if nome == "id":
+                cols_sql.append(f"id {tipo} NOT NULL DEFAULT nextval('servicos_solicitados_id_seq')")
+                cols_sql.append("area TEXT NOT NULL")
+            else:
+                cols_sql.append(f"{nome} {tipo}")
+
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS servicos_solicitados_id_seq")
+        cursor.execute(
+            f"""
+            CREATE TABLE servicos_solicitados (
+                {', '.join(cols_sql)},
+                PRIMARY KEY (id, area)
+            ) PARTITION BY LIST (area)
+            """
+        )
+        cursor.execute("ALTER SEQUENCE servicos_solicitados_id_seq OWNED BY servicos_solicitados.id")
+        for area in AREAS:
+            cursor.execute(
+                f"CREATE TABLE servicos_solicitados_p_{area} PARTITION OF servicos_solicitados FOR VALUES IN (%s)",
+                (area,),
+            )
+        cursor.execute("CREATE INDEX ix_servicos_solicitados_execucao ON servicos_solicitados (execucao_id)")
+        cursor.execute("CREATE INDEX ix_servicos_solicitados_veiculo_status ON servicos_solicitados (veiculo_id, status)")
+        cursor.execute("CREATE INDEX ix_servicos_solicitados_status ON servicos_solicitados (status)")
+        cursor.execute(
+            "ALTER TABLE servicos_solicitados ADD FOREIGN KEY (veiculo_id) REFERENCES veiculos(id)"
+        )
+        cursor.execute(
+            "ALTER TABLE servicos_solicitados ADD FOREIGN KEY (execucao_id) REFERENCES execucao_servico(id)"
+        )
+    conn.commit()
+    print(f"✅ servicos_solicitados criada com {len(definicoes) + 1} colunas e {len(AREAS)} partições")
+
+
+def lista_colunas(cursor, origem):
+    return [nome for nome, _ in colunas(cursor, origem)]
+
+
+def copiar_em_lotes(conn, area, origem, lote):
+    """Copia por faixa de id, um commit por lote. Retorna o maior id copiado."""
+    with conn.cursor() as cursor:
+        cols = lista_colunas(cursor, origem)
+        cols_sql = ", ".join(cols)
+
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM servicos_solicitados WHERE area = %s", (area,))
+        ultimo = cursor.fetchone()[0]
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0), COUNT(*) FROM {origem}")
+        max_id, total = cursor.fetchone()
+    conn.commit()
+
+    copiadas = 0
+    inicio = time.time()
+    while ultimo < max_id:
+        fim = ultimo + lote
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO servicos_solicitados (area, {cols_sql})
+                SELECT %s, {cols_sql} FROM {origem}
+                WHERE id > %s AND id <= %s
+                ON CONFLICT (id, area) DO NOTHING
+                """,
+                (area, ultimo, fim),
+            )
+            copiadas += cursor.rowcount
+        conn.commit()
+        ultimo = fim
+        taxa = copiadas / (time.time() - inicio) if copiadas else 0
+        print(f"   [{area}] até id {min(ultimo, max_id)}/{max_id} — {copiadas}/{total} linhas ({taxa:.0f}/s)", end="\r")
+    print(f"\n✅ [{area}] {copiadas} linhas copiadas")
+    return max_id
+
+
+def trocar_por_views(conn):
+    """Etapa final numa única transação: delta, reconciliação, rename e views."""
+    with conn.cursor() as cursor:
+        antigas = [tabela_antiga(a) for a in AREAS]
+        # EXCLUSIVE bloqueia escritas mas deixa as telas lendo enquanto a troca acontece
+        cursor.execute(f"LOCK TABLE {', '.join(antigas)} IN EXCLUSIVE MODE")
+
+        for area in AREAS:
+            origem = tabela_antiga(area)
+            cols = lista_colunas(cursor, origem)
+            cols_sql = ", ".join(cols)
+            sem_id = [c for c in cols if c != "id"]
+
+            # Linhas inseridas depois da cópia em lotes
+            cursor.execute(
+                f"""
+                INSERT INTO servicos_solicitados (area, {cols_sql})
+                SELECT %s, {cols_sql} FROM {origem}
+                ON CONFLICT (id, area) DO NOTHING
+                """,
+                (area,),
+            )
+            novas = cursor.rowcount
+            # Linhas alteradas depois de copiadas
+            cursor.execute(
+                f"""
+                UPDATE servicos_solicitados n
+                   SET ({', '.join(sem_id)}) = ({', '.join('o.' + c for c in sem_id)})
+                  FROM {origem} o
+                 WHERE n.area = %s AND n.id = o.id
+                   AND ({', '.join('n.' + c for c in sem_id)}) IS DISTINCT FROM ({', '.join('o.' + c for c in sem_id)})
+                """,
+                (area,),
+            )
+            alteradas = cursor.rowcount
+            # Linhas apagadas depois de copiadas
+            cursor.execute(
+                f"""
+                DELETE FROM servicos_solicitados n
+                 WHERE n.area = %s AND NOT EXISTS (SELECT 1 FROM {origem} o WHERE o.id = n.id)
+                """,
+                (area,),
+            )
+            removidas = cursor.rowcount
+
+            cursor.execute(f"ALTER TABLE {origem} RENAME TO {origem}_legado")
+            cursor.execute(
+                f"""
+                CREATE VIEW {origem} AS
+                SELECT id, area, {', '.join(sem_id)}
+                FROM servicos_solicitados
+                WHERE area = %s
+                WITH CASCADED CHECK OPTION
+                """,
+                (area,),
+            )
+            # INSERT pela view sem informar area (como as páginas antigas fazem)
+            cursor.execute(f"ALTER VIEW {origem} ALTER COLUMN area SET DEFAULT %s", (area,))
+            print(f"✅ [{area}] troca: {novas} novas, {alteradas} alteradas, {removidas} removidas; view criada")
+
+        cursor.execute(
+            "SELECT setval('servicos_solicitados_id_seq', GREATEST((SELECT MAX(id) FROM servicos_solicitados), 1))"
+        )
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra os serviços solicitados para a tabela particionada")
+    parser.add_argument("--lote", type=int, default=10000, help="linhas (faixa de ids) por lote")
+    parser.add_argument("--sem-troca", action="store_true", help="só cria e copia; não troca as tabelas por views")
+    args = parser.parse_args()
+
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        print("ERRO: DB_URL não encontrada em .env")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    try:
+        with conn.cursor() as cursor:
+            estados = {area: tipo_relacao(cursor, tabela_antiga(area)) for area in AREAS}
+        conn.commit()
+
+        if all(estado == "v" for estado in estados.values()):
+            print("✅ Migração já concluída: as tabelas antigas já são views.")
+            return
+        if any(estado != "r" for estado in estados.values()):
+            print(f"ERRO: estado inesperado das tabelas antigas: {estados}")
+            sys.exit(1)
+
+        origens = {area: tabela_antiga(area) for area in AREAS}
+        criar_tabela_particionada(conn, origens)
+        for area in AREAS:
+            copiar_em_lotes(conn, area, origens[area], args.lote)
+
+        if args.sem_troca:
+            print("⏸️  Cópia concluída. Rode novamente sem --sem-troca para trocar as tabelas por views.")
+            return
+
+        trocar_por_views(conn)
+        print("🎉 Migração concluída. Tabelas antigas preservadas como *_legado.")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
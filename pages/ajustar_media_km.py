@@ -9,6 +9,7 @@ import streamlit as st
 import pandas as pd
 from database import get_connection, release_connection
 from datetime import datetime
+from km_media import MAX_VISITAS, media_km, reconstruir, visitas_validas
 
 def app():
     st.set_page_config(layout="centered")
@@ -88,18 +89,20 @@ def app():
     st.subheader("Previsão da Nova Média")
 
     visitas_calculo = sorted(st.session_state[session_key], key=lambda x: x['fim_execucao'])
-    
-    # ✅ NOVO: Pegar apenas as 3 últimas visitas
-    ultimas_3 = visitas_calculo[-3:] if len(visitas_calculo) >= 3 else visitas_calculo
-    
+    kms = [v['quilometragem'] for v in visitas_calculo]
+
+    # Mesma regra da média gravada (km_media): KM repetida vale a última visita,
+    # KM que não cresce é descartada e contam só as últimas visitas válidas
+    ultimas_3 = [visitas_calculo[i] for i in visitas_validas(kms)[-MAX_VISITAS:]]
+    nova_media = media_km([v['fim_execucao'] for v in visitas_calculo], kms)
+
     primeira_visita = ultimas_3[0]
     ultima_visita = ultimas_3[-1]
 
     delta_km = ultima_visita['quilometragem'] - primeira_visita['quilometragem']
     delta_dias = (ultima_visita['fim_execucao'] - primeira_visita['fim_execucao']).days
 
-    if delta_dias > 0 and delta_km >= 0:
-        nova_media = delta_km / delta_dias
+    if nova_media is not None:
         
         # Mostrar informações
         st.info(f"📊 Calculando com base em {len(ultimas_3)} visitas (últimas visitas)")
@@ -115,11 +118,8 @@ def app():
                             (v['fim_execucao'], v['quilometragem'], v['id'])
                         )
 
-                    # 2. Atualiza a média final na tabela de veículos
-                    cursor.execute(
-                        "UPDATE veiculos SET media_km_diaria = %s WHERE id = %s",
-                        (nova_media, veiculo_id)
-                    )
+                    # 2. Recalcula a média (e o estado de km_media) pelo histórico corrigido
+                    reconstruir(conn, veiculo_id)
                     
                 conn.commit()
                 st.success("✅ Média e histórico atualizados com sucesso!")
@@ -25,13 +25,8 @@ def alocar_servicos():
                     veiculo_id,
                     COUNT(*) FILTER (WHERE status = 'pendente') AS pendentes,
                     COUNT(*) FILTER (WHERE status = 'em_andamento') AS em_andamento
-                FROM (
-                    SELECT veiculo_id, status FROM servicos_solicitados_borracharia WHERE status IN ('pendente', 'em_andamento')
-                    UNION ALL
-                    SELECT veiculo_id, status FROM servicos_solicitados_alinhamento WHERE status IN ('pendente', 'em_andamento')
-                    UNION ALL
-                    SELECT veiculo_id, status FROM servicos_solicitados_manutencao WHERE status IN ('pendente', 'em_andamento')
-                ) AS todos_servicos
+                FROM servicos_solicitados
+                WHERE status IN ('pendente', 'em_andamento')
                 GROUP BY veiculo_id
             )
             SELECT v.id, v.placa, v.empresa
@@ -59,11 +54,9 @@ def alocar_servicos():
         if selected_veiculo_display:
             veiculo_id_int = int(selected_veiculo_display.split(" - ")[0])
             query_areas_pendentes = """
-                SELECT 'borracharia' AS area FROM servicos_solicitados_borracharia WHERE veiculo_id = %s AND status = 'pendente' UNION
-                SELECT 'alinhamento' AS area FROM servicos_solicitados_alinhamento WHERE veiculo_id = %s AND status = 'pendente' UNION
-                SELECT 'manutencao' AS area FROM servicos_solicitados_manutencao WHERE veiculo_id = %s AND status = 'pendente';
+                SELECT DISTINCT area FROM servicos_solicitados WHERE veiculo_id = %s AND status = 'pendente';
             """
-            areas_df = pd.read_sql(query_areas_pendentes, conn, params=(veiculo_id_int, veiculo_id_int, veiculo_id_int))
+            areas_df = pd.read_sql(query_areas_pendentes, conn, params=(veiculo_id_int,))
             areas_com_servico_pendente = [a.replace('manutencao', 'Manutenção Mecânica').title() for a in areas_df['area'].tolist()]
 
             if not areas_com_servico_pendente:
@@ -74,12 +67,11 @@ def alocar_servicos():
             try:
                 with conn.cursor() as cursor:
                     query_km = """
-                        (SELECT quilometragem FROM servicos_solicitados_borracharia WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1) UNION
-                        (SELECT quilometragem FROM servicos_solicitados_alinhamento WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1) UNION
-                        (SELECT quilometragem FROM servicos_solicitados_manutencao WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL LIMIT 1)
+                        SELECT quilometragem FROM servicos_solicitados
+                        WHERE veiculo_id = %s AND status = 'pendente' AND quilometragem IS NOT NULL
                         LIMIT 1;
                     """
-                    cursor.execute(query_km, (veiculo_id_int, veiculo_id_int, veiculo_id_int))
+                    cursor.execute(query_km, (veiculo_id_int,))
                     resultado_km = cursor.fetchone()
                     if resultado_km and resultado_km[0] is not None:
                         quilometragem_cadastrada = resultado_km[0]
@@ -126,9 +118,8 @@ def alocar_servicos():
                                 ))
                                 execucao_id = cursor.fetchone()[0]
 
-                                tabela_servico = f"servicos_solicitados_{area_selecionada}"
-                                update_solicitado_query = f"UPDATE {tabela_servico} SET box_id = %s, funcionario_id = %s, status = 'em_andamento', data_atualizacao = %s, execucao_id = %s WHERE veiculo_id = %s AND status = 'pendente';"
-                                cursor.execute(update_solicitado_query, (box_id_int, funcionario_id_int, datetime.now(MS_TZ), execucao_id, veiculo_id_int))
+                                update_solicitado_query = "UPDATE servicos_solicitados SET box_id = %s, funcionario_id = %s, status = 'em_andamento', data_atualizacao = %s, execucao_id = %s WHERE veiculo_id = %s AND status = 'pendente' AND area = %s;"
+                                cursor.execute(update_solicitado_query, (box_id_int, funcionario_id_int, datetime.now(MS_TZ), execucao_id, veiculo_id_int, area_selecionada))
                                 
                                 cursor.execute("UPDATE boxes SET ocupado = TRUE WHERE id = %s;", (box_id_int,))
                                 conn.commit()
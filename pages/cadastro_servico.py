@@ -9,8 +9,9 @@ import pytz
 import time
 import json
 import urllib.parse
-from utils import get_catalogo_servicos, consultar_placa_comercial, formatar_telefone, formatar_placa, buscar_clientes_por_similaridade, get_cliente_details
+from utils import get_catalogo_servicos, get_projecoes_km, consultar_placa_comercial, formatar_telefone, formatar_placa, buscar_clientes_por_similaridade, get_cliente_details
 from pages.ui_components import render_mobile_navbar
+from km_plausibilidade import conferir as conferir_km
 
 render_mobile_navbar(active_page="cadastro")
 
@@ -99,30 +100,26 @@ def processar_cadastro_completo(state, observacao_final, diagnostico_gerado):
             return False, "❌ Erro de conexão com o banco"
         
         with conn.cursor() as cursor:
-            table_map = {
-                "Borracharia": "servicos_solicitados_borracharia",
-                "Alinhamento": "servicos_solicitados_alinhamento",
-                "Mecânica": "servicos_solicitados_manutencao"
+            area_map = {
+                "Borracharia": "borracharia",
+                "Alinhamento": "alinhamento",
+                "Mecânica": "manutencao"
             }
 
+            agora = datetime.now(MS_TZ)
+            linhas = []
             for s in st.session_state.servicos_para_adicionar:
-                table_name = table_map.get(s['area'])
-                if not table_name:
+                area = area_map.get(s['area'])
+                if not area:
                     return False, f"❌ Área de serviço inválida: {s['area']}"
-                
-                query = f"INSERT INTO {table_name} (veiculo_id, tipo, quantidade, observacao, quilometragem, status, data_solicitacao, data_atualizacao) VALUES (%s, %s, %s, %s, %s, 'pendente', %s, %s)"
-                cursor.execute(
-                    query,
-                    (
-                        state["veiculo_id"],
-                        s['tipo'],
-                        s['qtd'],
-                        observacao_final,
-                        state["quilometragem"],
-                        datetime.now(MS_TZ),
-                        datetime.now(MS_TZ)
-                    )
-                )
+                linhas.append((area, state["veiculo_id"], s['tipo'], s['qtd'], observacao_final, state["quilometragem"], agora, agora))
+
+            # Todos os itens num INSERT só (uma ida ao banco em vez de uma por serviço)
+            query = "INSERT INTO servicos_solicitados (area, veiculo_id, tipo, quantidade, observacao, quilometragem, status, data_solicitacao, data_atualizacao) VALUES %s"
+            psycopg2.extras.execute_values(
+                cursor, query, linhas,
+                template="(%s, %s, %s, %s, %s, %s, 'pendente', %s, %s)"
+            )
 
             cursor.execute(
                 "UPDATE veiculos SET data_revisao_proativa = NULL WHERE id = %s",
@@ -574,6 +571,24 @@ def app():
                 key="km_servico", placeholder="Digite a KM..."
             )
 
+            # Conferência na hora contra a última visita e a média do veículo (cache em memória)
+            km_confirmada = True
+            alertas_km = conferir_km(
+                get_projecoes_km().obter(state["veiculo_id"]), state["quilometragem"], datetime.now(MS_TZ)
+            )
+            for i, alerta in enumerate(alertas_km):
+                st.warning(f"⚠️ {alerta.mensagem}")
+                if alerta.km_sugerido:
+                    st.button(
+                        f"Usar {alerta.km_sugerido:,} km".replace(",", "."), key=f"km_sugerido_{i}",
+                        on_click=lambda km=alerta.km_sugerido: st.session_state.update(km_servico=km)
+                    )
+            if alertas_km:
+                km_confirmada = st.checkbox(
+                    "Conferi no painel do veículo: a KM digitada está correta",
+                    key=f"km_confirmada_{state['quilometragem']}"
+                )
+
             servicos_do_banco = get_catalogo_servicos()
 
             def area_de_servico(nome_area, chave_area):
@@ -633,6 +648,8 @@ def app():
                     st.warning("⚠️ Nenhum serviço foi adicionado à lista.")
                 elif not state["quilometragem"] or state["quilometragem"] <= 0:
                     st.error("❌ A quilometragem é obrigatória.")
+                elif not km_confirmada:
+                    st.error("❌ Confira a quilometragem: corrija o valor ou confirme que está correta.")
                 else:
                     sucesso, mensagem = processar_cadastro_completo(state, observacao_final, diagnostico_gerado)
                     if sucesso:
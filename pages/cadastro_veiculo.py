@@ -2,6 +2,7 @@ import streamlit as st
 from database import get_connection, release_connection
 import psycopg2
 import pandas as pd
+from utils import get_catalogo_servicos
 
 def app():
     st.title("➕ Cadastro de Veículos e Serviços")
@@ -118,26 +119,13 @@ def app():
                 ["Borracharia", "Alinhamento", "Manutenção Mecânica"]
             )
 
-            # Carrega os serviços disponíveis para a área selecionada
-            conn = get_connection()
-            if not conn:
-                st.error("Falha ao conectar para carregar serviços.")
-                return
-            
+            # Carrega os serviços disponíveis para a área selecionada (cache do catálogo)
+            chave_area = {"Borracharia": "borracharia", "Alinhamento": "alinhamento"}.get(area_servico, "manutencao")
             try:
-                if area_servico == "Borracharia":
-                    df_servicos = pd.read_sql("SELECT nome FROM servicos_borracharia ORDER BY nome;", conn)
-                elif area_servico == "Alinhamento":
-                    df_servicos = pd.read_sql("SELECT nome FROM servicos_alinhamento ORDER BY nome;", conn)
-                else: # Manutenção Mecânica
-                    df_servicos = pd.read_sql("SELECT nome FROM servicos_manutencao ORDER BY nome;", conn)
-                
-                servicos_disponiveis = [""] + df_servicos['nome'].tolist()
+                servicos_disponiveis = [""] + get_catalogo_servicos()[chave_area]
             except Exception as e:
                 st.error(f"Erro ao carregar serviços disponíveis: {e}")
                 servicos_disponiveis = [""]
-            finally:
-                release_connection(conn)
 
             tipo_servico = st.selectbox("Tipo de Serviço", servicos_disponiveis)
             quantidade = st.number_input("Quantidade", min_value=1, value=1, step=1)
@@ -149,12 +137,12 @@ def app():
                 if not tipo_servico:
                     st.warning("⚠️ Por favor, selecione um tipo de serviço.")
                 else:
-                    table_map = {
-                        "Borracharia": "servicos_solicitados_borracharia",
-                        "Alinhamento": "servicos_solicitados_alinhamento",
-                        "Manutenção Mecânica": "servicos_solicitados_manutencao"
+                    area_map = {
+                        "Borracharia": "borracharia",
+                        "Alinhamento": "alinhamento",
+                        "Manutenção Mecânica": "manutencao"
                     }
-                    table_name = table_map.get(area_servico)
+                    area = area_map.get(area_servico)
                     
                     conn = get_connection()
                     if not conn:
@@ -165,12 +153,12 @@ def app():
                         with conn.cursor() as cursor:
                             # Query parametrizada para inserir o serviço solicitado.
                             # Usando NOW() para data_solicitacao e data_atualizacao.
-                            query = f"""
-                                INSERT INTO {table_name} 
-                                (veiculo_id, tipo, quantidade, descricao, observacao, status, data_solicitacao, data_atualizacao)
-                                VALUES (%s, %s, %s, %s, %s, 'pendente', NOW(), NOW());
+                            query = """
+                                INSERT INTO servicos_solicitados
+                                (area, veiculo_id, tipo, quantidade, descricao, observacao, status, data_solicitacao, data_atualizacao)
+                                VALUES (%s, %s, %s, %s, %s, %s, 'pendente', NOW(), NOW());
                             """
-                            cursor.execute(query, (selected_veiculo_id, tipo_servico, quantidade, descricao, descricao))
+                            cursor.execute(query, (area, selected_veiculo_id, tipo_servico, quantidade, descricao, descricao))
                             conn.commit()
                             st.success(f"✅ Serviço '{tipo_servico}' adicionado com sucesso para o veículo selecionado!")
                     except Exception as e:
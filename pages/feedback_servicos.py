@@ -63,20 +63,9 @@ def app():
 
     try:
         # ATUALIZADO: A query agora agrupa por visita (placa e quilometragem)
+        # Serviços da execução que é a última visita do veículo vêm prontos de
+        # veiculo_ultima_visita; só as demais do período são agregadas aqui
         query = """
-            WITH servicos_agrupados AS (
-                SELECT 
-                    execucao_id, 
-                    STRING_AGG(DISTINCT tipo, '; ') as lista_servicos
-                FROM (
-                    SELECT execucao_id, tipo FROM servicos_solicitados_borracharia WHERE status = 'finalizado'
-                    UNION ALL
-                    SELECT execucao_id, tipo FROM servicos_solicitados_alinhamento WHERE status = 'finalizado'
-                    UNION ALL
-                    SELECT execucao_id, tipo FROM servicos_solicitados_manutencao WHERE status = 'finalizado'
-                ) s
-                GROUP BY execucao_id
-            )
             SELECT
                 v.placa,
                 v.modelo,
@@ -84,11 +73,17 @@ def app():
                 v.contato_motorista, -- CORRIGIDO: Nome exato da coluna na tabela 'veiculos'
                 es.quilometragem,
                 MAX(es.fim_execucao) as ultima_data_servico,
-                STRING_AGG(sa.lista_servicos, '; ') as todos_os_servicos,
+                STRING_AGG(COALESCE(uv.servicos, sa.lista_servicos), '; ') as todos_os_servicos,
                 ARRAY_AGG(es.id) as lista_execucao_ids
             FROM execucao_servico es
             JOIN veiculos v ON es.veiculo_id = v.id
-            LEFT JOIN servicos_agrupados sa ON es.id = sa.execucao_id
+            LEFT JOIN veiculo_ultima_visita uv ON uv.execucao_id = es.id
+            LEFT JOIN LATERAL (
+                SELECT STRING_AGG(DISTINCT s.tipo, '; ') as lista_servicos
+                FROM servicos_solicitados s
+                WHERE s.execucao_id = es.id AND s.status = 'finalizado'
+                  AND uv.execucao_id IS NULL
+            ) sa ON TRUE
             WHERE 
                 es.status = 'finalizado'
                 AND es.data_feedback IS NULL
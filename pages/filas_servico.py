@@ -1,86 +1,247 @@
+import json
+import os
+from urllib.parse import quote
+
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 from pages.ui_components import render_mobile_navbar
 render_mobile_navbar(active_page="filas")
 from database import get_connection, release_connection
 from streamlit_autorefresh import st_autorefresh
 
+# --- CSS APRIMORADO PARA O PAINEL DE TV ---
+# Usado na página e dentro do iframe do painel em tempo real (que não herda o CSS da página)
+CSS_PAINEL = """
+/* Remove o padding padrão do Streamlit para aproveitar mais a tela */
+.main .block-container {
+    padding: 1rem 2rem;
+}
+/* Aumenta o tamanho do título principal */
+h1 {
+    font-size: 2.8rem !important;
+    text-align: center;
+}
+/* Estilo para os títulos das seções (EM ATENDIMENTO / FILA) */
+.section-header {
+    font-size: 2.2rem !important;
+    font-weight: bold;
+    color: #22a7f0;
+    text-align: center;
+    margin-bottom: 20px;
+}
+/* Estilo para os cartões dos boxes e da fila */
+.card {
+    background-color: #292929;
+    border-radius: 10px;
+    padding: 15px;
+    margin-bottom: 20px;
+    border: 1px solid #444;
+    height: 100%;
+}
+.card-title {
+    font-size: 1.7rem;
+    font-weight: bold;
+    margin-bottom: 10px;
+}
+.card-content {
+    font-size: 1.1rem;
+}
+.placa-text {
+    font-size: 2.0rem;
+    font-weight: bold;
+    color: #FFFFFF;
+    background-color: #1a1a1a;
+    padding: 10px;
+    border-radius: 5px;
+    text-align: center;
+    margin-bottom: 10px;
+}
+/* NOVO: Estilo para o número de ordem na fila */
+.queue-number {
+    font-size: 2.5rem;
+    font-weight: bold;
+    color: #22a7f0;
+    float: left;
+    margin-right: 15px;
+    line-height: 1;
+}
+/* NOVO: Estilo para a lista de serviços dentro do cartão */
+.service-list {
+    font-size: 1.0rem;
+    font-style: italic;
+    color: #ccc;
+}
+"""
+
+# Painel em tempo real: o navegador da TV abre um EventSource em /queues/stream
+# da API e aplica os eventos direto no HTML. Recebe o estado completo ao
+# conectar e depois só as mudanças (cadastro, alocação, desalocação,
+# finalização), sem reexecutar consultas a cada 30 s.
+HTML_PAINEL_STREAM = """
+<style>
+body { background-color: #0e1117; color: #fafafa; font-family: "Source Sans Pro", sans-serif; margin: 0; }
+.section-header { font-size: 2.2rem; font-weight: bold; color: #22a7f0; text-align: center; margin: 10px 0 20px; }
+.grid-boxes { display: grid; grid-template-columns: repeat(auto-fit, minmax(220px, 1fr)); gap: 16px; }
+.grid-fila { display: grid; grid-template-columns: repeat(3, 1fr); gap: 16px; }
+.info { background-color: #172d43; color: #c7ebff; padding: 16px; border-radius: 8px; }
+.status { position: fixed; top: 4px; right: 8px; font-size: 0.8rem; color: #888; }
+hr { border-color: #444; }
+__CSS__
+</style>
+<div class="status" id="status">conectando...</div>
+<p class="section-header">EM ATENDIMENTO</p>
+<div id="boxes" class="grid-boxes"></div>
+<hr>
+<p class="section-header">FILA DE ESPERA</p>
+<div id="fila" class="grid-fila"></div>
+<script>
+const URL_STREAM = __URL__;
+let versao = -1;
+let boxes = {};
+let fila = {};
+let ordem = [];
+
+function el(tag, classe, texto) {
+    const e = document.createElement(tag);
+    if (classe) e.className = classe;
+    if (texto !== undefined) e.textContent = texto;
+    return e;
+}
+
+function listaServicos(servicos) {
+    const p = el("p", "service-list");
+    if (!servicos || !servicos.length) { p.textContent = "N/A"; return p; }
+    servicos.forEach((s, i) => { if (i) p.appendChild(el("br")); p.appendChild(document.createTextNode(s)); });
+    return p;
+}
+
+function campo(rotulo, valor) {
+    const span = el("span");
+    span.appendChild(el("b", null, rotulo + ": "));
+    span.appendChild(document.createTextNode(valor == null ? "" : valor));
+    return span;
+}
+
+function render() {
+    const divBoxes = document.getElementById("boxes");
+    divBoxes.replaceChildren();
+    const ids = Object.keys(boxes).map(Number).sort((a, b) => a - b);
+    if (!ids.length) divBoxes.appendChild(el("div", "info", "Nenhum veículo em atendimento nos boxes no momento."));
+    ids.forEach(id => {
+        const b = boxes[id];
+        const card = el("div", "card");
+        card.appendChild(el("p", "card-title", "BOX " + b.box_id));
+        card.appendChild(el("p", "placa-text", b.placa));
+        const conteudo = el("p", "card-content");
+        conteudo.appendChild(campo("Empresa", b.empresa));
+        conteudo.appendChild(el("br"));
+        conteudo.appendChild(campo("Mecânico", b.funcionario));
+        card.appendChild(conteudo);
+        card.appendChild(el("hr"));
+        card.appendChild(listaServicos(b.servicos));
+        divBoxes.appendChild(card);
+    });
+
+    const divFila = document.getElementById("fila");
+    divFila.replaceChildren();
+    if (!ordem.length) divFila.appendChild(el("div", "info", "Fila de espera vazia."));
+    ordem.forEach((veiculoId, i) => {
+        const f = fila[veiculoId];
+        const card = el("div", "card");
+        const titulo = el("p", "card-title");
+        titulo.appendChild(el("span", "queue-number", (i + 1) + "º"));
+        titulo.appendChild(el("span", null, "NA FILA"));
+        card.appendChild(titulo);
+        card.appendChild(el("p", "placa-text", f.placa));
+        const conteudo = el("p", "card-content");
+        conteudo.appendChild(campo("Empresa", f.empresa));
+        card.appendChild(conteudo);
+        card.appendChild(el("hr"));
+        card.appendChild(listaServicos(f.servicos));
+        divFila.appendChild(card);
+    });
+}
+
+const fonte = new EventSource(URL_STREAM);
+fonte.addEventListener("snapshot", ev => {
+    const s = JSON.parse(ev.data);
+    versao = s.versao;
+    boxes = {}; fila = {};
+    s.boxes.forEach(b => { boxes[b.box_id] = b; });
+    s.fila.forEach(f => { fila[f.veiculo_id] = f; });
+    ordem = s.fila.map(f => f.veiculo_id);
+    render();
+});
+fonte.addEventListener("delta", ev => {
+    const d = JSON.parse(ev.data);
+    if (d.versao <= versao) return;
+    versao = d.versao;
+    Object.entries(d.boxes || {}).forEach(([id, b]) => { if (b) boxes[id] = b; else delete boxes[id]; });
+    (d.fila_removidos || []).forEach(id => { delete fila[id]; });
+    (d.fila_alterados || []).forEach(f => { fila[f.veiculo_id] = f; });
+    if (d.fila_ordem) ordem = d.fila_ordem;
+    render();
+});
+fonte.onopen = () => { document.getElementById("status").textContent = "ao vivo"; };
+fonte.onerror = () => {
+    document.getElementById("status").textContent = "reconectando...";
+    // Conexão recusada (ex.: token expirado): recarrega a página para gerar outro token
+    if (fonte.readyState === EventSource.CLOSED) setTimeout(() => window.parent.location.reload(), 10000);
+};
+</script>
+"""
+
+
+def _config(nome):
+    try:
+        if st.secrets.get(nome):
+            return st.secrets[nome]
+    except FileNotFoundError:
+        pass
+    return os.getenv(nome)
+
+
+def _painel_stream(api_url):
+    """
+    Painel ao vivo pelo /queues/stream. O token vai na URL, então é o curto de
+    escopo 'queues:stream' (não serve para outras rotas da API), assinado com o
+    mesmo API_JWT_SECRET da configuração da página. False se não dá para usar.
+    """
+    from api.auth import create_stream_token
+
+    try:
+        token = create_stream_token(
+            st.session_state.get("user_id", 0),
+            st.session_state.get("user_role"),
+            segredo=_config("API_JWT_SECRET"),
+        )
+    except RuntimeError as e:
+        st.warning(f"Painel ao vivo desligado: {e}. Atualizando a cada 30 segundos.")
+        return False
+    url = f"{api_url.rstrip('/')}/queues/stream?token={quote(token)}"
+    html = HTML_PAINEL_STREAM.replace("__CSS__", CSS_PAINEL).replace("__URL__", json.dumps(url))
+    components.html(html, height=1600, scrolling=True)
+    return True
+
 
 def app():
     # --- CONFIGURAÇÕES DA PÁGINA ---
     st.set_page_config(layout="wide")
-    
-    # Atualiza a página a cada 30 segundos
-    st_autorefresh(interval=30000, key="datarefresh")
 
-    # --- CSS APRIMORADO PARA O PAINEL DE TV ---
-    st.markdown("""
-        <style>
-        /* Remove o padding padrão do Streamlit para aproveitar mais a tela */
-        .main .block-container {
-            padding: 1rem 2rem;
-        }
-        /* Aumenta o tamanho do título principal */
-        h1 {
-            font-size: 2.8rem !important;
-            text-align: center;
-        }
-        /* Estilo para os títulos das seções (EM ATENDIMENTO / FILA) */
-        .section-header {
-            font-size: 2.2rem !important;
-            font-weight: bold;
-            color: #22a7f0;
-            text-align: center;
-            margin-bottom: 20px;
-        }
-        /* Estilo para os cartões dos boxes e da fila */
-        .card {
-            background-color: #292929;
-            border-radius: 10px;
-            padding: 15px;
-            margin-bottom: 20px;
-            border: 1px solid #444;
-            height: 100%;
-        }
-        .card-title {
-            font-size: 1.7rem;
-            font-weight: bold;
-            margin-bottom: 10px;
-        }
-        .card-content {
-            font-size: 1.1rem;
-        }
-        .placa-text {
-            font-size: 2.0rem;
-            font-weight: bold;
-            color: #FFFFFF;
-            background-color: #1a1a1a;
-            padding: 10px;
-            border-radius: 5px;
-            text-align: center;
-            margin-bottom: 10px;
-        }
-        /* NOVO: Estilo para o número de ordem na fila */
-        .queue-number {
-            font-size: 2.5rem;
-            font-weight: bold;
-            color: #22a7f0;
-            float: left;
-            margin-right: 15px;
-            line-height: 1;
-        }
-        /* NOVO: Estilo para a lista de serviços dentro do cartão */
-        .service-list {
-            font-size: 1.0rem;
-            font-style: italic;
-            color: #ccc;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f"<style>{CSS_PAINEL}</style>", unsafe_allow_html=True)
 
     st.title("Painel Operacional do Pátio")
     st.markdown("---")
 
+    # Com a API configurada o painel é atualizado por eventos (SSE);
+    # sem ela, consulta o banco a cada 30 segundos como antes.
+    api_url = _config("API_PUBLIC_URL")
+    if api_url and _painel_stream(api_url):
+        return
+
+    st_autorefresh(interval=30000, key="datarefresh")
+
     conn = get_connection()
     if not conn:
         st.error("Falha ao conectar ao banco de dados.")
@@ -96,13 +257,8 @@ def app():
                 SELECT 
                     execucao_id, 
                     STRING_AGG(tipo || ' (Qtd: ' || quantidade || ')', '<br>') as lista_servicos
-                FROM (
-                    SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_borracharia WHERE status = 'em_andamento'
-                    UNION ALL
-                    SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_alinhamento WHERE status = 'em_andamento'
-                    UNION ALL
-                    SELECT execucao_id, tipo, quantidade FROM servicos_solicitados_manutencao WHERE status = 'em_andamento'
-                ) s
+                FROM servicos_solicitados
+                WHERE status = 'em_andamento'
                 GROUP BY execucao_id
             )
             SELECT 
@@ -152,14 +308,9 @@ def app():
                 v.placa,
                 v.empresa,
                 STRING_AGG(s.tipo || ' (Qtd: ' || s.quantidade || ')', '<br>') as servicos
-            FROM (
-                SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_borracharia WHERE status = 'pendente'
-                UNION ALL
-                SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_alinhamento WHERE status = 'pendente'
-                UNION ALL
-                SELECT veiculo_id, tipo, quantidade, data_solicitacao FROM servicos_solicitados_manutencao WHERE status = 'pendente'
-            ) s
+            FROM servicos_solicitados s
             JOIN veiculos v ON s.veiculo_id = v.id
+            WHERE s.status = 'pendente'
             GROUP BY v.placa, v.empresa, s.veiculo_id
             ORDER BY MIN(s.data_solicitacao) ASC;
         """
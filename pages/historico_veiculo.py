@@ -24,9 +24,10 @@ def app():
                 serv.observacao_execucao
             FROM execucao_servico es
             LEFT JOIN (
-                SELECT execucao_id, 'Borracharia' as area, tipo, quantidade, status, funcionario_id, observacao_execucao FROM servicos_solicitados_borracharia UNION ALL
-                SELECT execucao_id, 'Alinhamento' as area, tipo, quantidade, status, funcionario_id, observacao_execucao FROM servicos_solicitados_alinhamento UNION ALL
-                SELECT execucao_id, 'Manutenção Mecânica' as area, tipo, quantidade, status, funcionario_id, observacao_execucao FROM servicos_solicitados_manutencao
+                SELECT execucao_id,
+                       CASE area WHEN 'borracharia' THEN 'Borracharia' WHEN 'alinhamento' THEN 'Alinhamento' ELSE 'Manutenção Mecânica' END as area,
+                       tipo, quantidade, status, funcionario_id, observacao_execucao
+                FROM servicos_solicitados
             ) serv ON es.id = serv.execucao_id
             LEFT JOIN funcionarios f ON serv.funcionario_id = f.id
             JOIN veiculos v ON es.veiculo_id = v.id
@@ -29,9 +29,7 @@ def mesclar_dados_veiculos(conn, id_antigo, id_novo):
             # 2. Re-atribui o histórico de serviços para o novo veículo
             tabelas_servicos = [
                 "execucao_servico", 
-                "servicos_solicitados_borracharia",
-                "servicos_solicitados_alinhamento",
-                "servicos_solicitados_manutencao"
+                "servicos_solicitados"
             ]
             for tabela in tabelas_servicos:
                 cursor.execute(
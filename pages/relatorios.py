@@ -26,11 +26,7 @@ def buscar_dados_relatorio(start_date, end_date):
                 usr_final.nome as finalizado_por
             FROM execucao_servico es
             JOIN veiculos v ON es.veiculo_id = v.id
-            LEFT JOIN (
-                SELECT execucao_id, tipo, funcionario_id FROM servicos_solicitados_borracharia UNION ALL
-                SELECT execucao_id, tipo, funcionario_id FROM servicos_solicitados_alinhamento UNION ALL
-                SELECT execucao_id, tipo, funcionario_id FROM servicos_solicitados_manutencao
-            ) serv ON es.id = serv.execucao_id
+            LEFT JOIN servicos_solicitados serv ON es.id = serv.execucao_id
             LEFT JOIN funcionarios func ON serv.funcionario_id = func.id
             LEFT JOIN usuarios usr_aloc ON es.usuario_alocacao_id = usr_aloc.id
             LEFT JOIN usuarios usr_final ON es.usuario_finalizacao_id = usr_final.id
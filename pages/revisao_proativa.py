@@ -9,11 +9,115 @@ from datetime import datetime
 import pytz
 from urllib.parse import quote_plus
 import re
+import threading
+import time
 from utils import formatar_telefone, buscar_clientes_por_similaridade, get_cliente_details
 import psycopg2.extras
 
 
 MS_TZ = pytz.timezone('America/Campo_Grande')
+TAMANHO_PAGINA = 20
+# Páginas de candidatos ficam em cache por este tempo (s), compartilhadas entre as sessões
+CACHE_PAGINAS_TTL_S = 60
+
+# Projeção (dias e KM desde a última visita), filtro pelo limite, ordem e
+# página, tudo no banco: só as TAMANHO_PAGINA linhas da página voltam, com o
+# total de candidatos. %(modo)s: 'km' (KM rodados estimados) ou 'tempo' (dias).
+# Dias como antes no pandas: fim_execucao lido como UTC, dias inteiros até agora.
+# Última visita e serviços vêm prontos de veiculo_ultima_visita (migração 0011).
+CONSULTA_CANDIDATOS = """
+    WITH candidatos AS (
+        SELECT
+            v.id as veiculo_id, v.placa, v.empresa, v.modelo, v.ano_modelo,
+            v.nome_motorista, v.contato_motorista, v.media_km_diaria::float AS media_km_diaria,
+            v.cliente_id, c.nome_responsavel, c.contato_responsavel,
+            uv.execucao_id, uv.data_ultima_visita, uv.km_ultima_visita,
+            uv.servicos AS servicos_anteriores,
+            FLOOR(EXTRACT(EPOCH FROM (NOW() - (uv.data_ultima_visita AT TIME ZONE 'UTC'))) / 86400)::int
+                AS dias_desde_ultima_visita
+        FROM veiculos v
+        JOIN veiculo_ultima_visita uv ON v.id = uv.veiculo_id
+        LEFT JOIN clientes c ON v.cliente_id = c.id
+        WHERE v.media_km_diaria IS NOT NULL AND v.media_km_diaria > 0
+        AND v.data_revisao_proativa IS NULL
+    ),
+    projetados AS (
+        SELECT *,
+               km_ultima_visita + dias_desde_ultima_visita * media_km_diaria AS km_atual_estimada,
+               dias_desde_ultima_visita * media_km_diaria AS km_rodados
+        FROM candidatos
+    ),
+    filtrados AS (
+        SELECT *, CASE WHEN %(modo)s = 'km' THEN km_rodados ELSE dias_desde_ultima_visita END AS ordem
+        FROM projetados
+    )
+    SELECT *, COUNT(*) OVER () AS total
+    FROM filtrados
+    WHERE ordem >= %(limite)s
+    ORDER BY ordem DESC, veiculo_id
+    LIMIT %(tamanho)s OFFSET %(offset)s;
+"""
+
+
+class CachePaginas:
+    """
+    Páginas de CONSULTA_CANDIDATOS por (modo, limite, página), com TTL.
+    Uma escrita num veículo descarta só as páginas em que ele aparece (e,
+    se ele saiu da lista, as seguintes da mesma busca, que andam uma posição).
+    """
+
+    def __init__(self, ttl_s=CACHE_PAGINAS_TTL_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._paginas = {}
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._paginas.get(chave)
+            if item is None or time.monotonic() >= item[0]:
+                return None
+            return item[1]
+
+    def guardar(self, chave, linhas):
+        with self._lock:
+            self._paginas[chave] = (time.monotonic() + self.ttl_s, linhas)
+
+    def descartar(self, condicao, seguintes=False):
+        """Descarta as páginas com alguma linha que satisfaz condicao(linha)."""
+        with self._lock:
+            atingidas = [chave for chave, (_, linhas) in self._paginas.items() if any(condicao(l) for l in linhas)]
+            for modo, limite, pagina in atingidas:
+                for chave in list(self._paginas):
+                    if chave[:2] == (modo, limite) and (chave[2] == pagina or (seguintes and chave[2] > pagina)):
+                        del self._paginas[chave]
+
+    def descartar_veiculo(self, veiculo_id, saiu=False):
+        self.descartar(lambda linha: linha['veiculo_id'] == veiculo_id, seguintes=saiu)
+
+    def limpar(self):
+        with self._lock:
+            self._paginas.clear()
+
+
+@st.cache_resource
+def cache_paginas():
+    return CachePaginas()
+
+
+def buscar_pagina(conn, modo, limite, pagina):
+    """Linhas (dicts) da página pedida de candidatos, do cache ou do banco."""
+    chave = (modo, limite, pagina)
+    cache = cache_paginas()
+    linhas = cache.obter(chave)
+    if linhas is None:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute(CONSULTA_CANDIDATOS, {
+                'modo': modo, 'limite': limite, 'tamanho': TAMANHO_PAGINA, 'offset': pagina * TAMANHO_PAGINA,
+            })
+            linhas = [dict(linha) for linha in cursor.fetchall()]
+        conn.commit()
+        cache.guardar(chave, linhas)
+    return linhas
 
 def app():
     st.title("📞 Revisão Proativa de Clientes")
@@ -23,6 +127,7 @@ def app():
     col1, col2 = st.columns([0.8, 0.2])
     with col2:
         if st.button("🔄 Atualizar Dados", use_container_width=True, help="Recarrega todos os dados do banco de dados para esta página."):
+            cache_paginas().limpar()
             st.rerun()
 
     # --- INICIALIZAÇÃO DO ESTADO DA SESSÃO ---
@@ -108,6 +213,8 @@ def app():
                                     with conn.cursor() as cursor:
                                         cursor.execute("UPDATE clientes SET nome_responsavel = %s, contato_responsavel = %s, data_atualizacao_contato = NOW() WHERE id = %s", (novo_nome_resp, formatar_telefone(novo_contato_resp), int(id_cliente_para_salvar)))
                                         conn.commit()
+                                        # Gestor aparece em todos os veículos da empresa
+                                        cache_paginas().descartar(lambda linha: linha['cliente_id'] == int(id_cliente_para_salvar))
                                         st.success("Responsável atualizado!")
                                         st.session_state.rp_editing_responsavel = False
                                         st.session_state.rp_last_selected_client_id = None
@@ -142,6 +249,7 @@ def app():
                                 query_veiculo = "UPDATE veiculos SET empresa = %s, cliente_id = %s WHERE id = %s"
                                 cursor.execute(query_veiculo, (nome_empresa_final, cliente_id_final, int(veiculo_id_para_editar)))
                                 conn.commit()
+                                cache_paginas().descartar_veiculo(int(veiculo_id_para_editar))
                                 st.success("Vinculação da empresa atualizada com sucesso!")
                                 st.session_state.rp_editing_company_for_vehicle_id = None
                                 st.session_state.pop('rp_busca_empresa_edit', None)
@@ -182,6 +290,7 @@ def app():
                                     WHERE id = %s
                                 """, (novo_modelo, novo_ano, novo_motorista, formatar_telefone(novo_contato_motorista), int(v_edit['id'])))
                                 conn.commit()
+                                cache_paginas().descartar_veiculo(int(v_edit['id']))
                                 st.success(f"Veículo {v_edit['placa']} atualizado!")
                                 st.session_state.rp_editing_vehicle_id = None
                                 st.rerun()
@@ -222,76 +331,34 @@ def app():
     st.markdown("---")
 
     try:
-        with st.spinner("Buscando veículos e fazendo previsões..."):
-            query = """
-                WITH ranked_visits AS (
-                    SELECT veiculo_id, id as execucao_id, fim_execucao, quilometragem,
-                           ROW_NUMBER() OVER(PARTITION BY veiculo_id ORDER BY fim_execucao DESC) as rn
-                    FROM execucao_servico WHERE status = 'finalizado' AND quilometragem IS NOT NULL
-                ),
-                ultima_visita AS (
-                    SELECT veiculo_id, execucao_id, fim_execucao as data_ultima_visita, quilometragem as km_ultima_visita
-                    FROM ranked_visits WHERE rn = 1
-                ),
-                servicos_ultima_visita AS (
-                    SELECT uv.veiculo_id, STRING_AGG(s.tipo, '; ') as servicos_anteriores
-                    FROM ultima_visita uv
-                    LEFT JOIN (
-                        SELECT execucao_id, tipo FROM servicos_solicitados_borracharia UNION ALL
-                        SELECT execucao_id, tipo FROM servicos_solicitados_alinhamento UNION ALL
-                        SELECT execucao_id, tipo FROM servicos_solicitados_manutencao
-                    ) s ON uv.execucao_id = s.execucao_id GROUP BY uv.veiculo_id
-                )
-                SELECT
-                    v.id as veiculo_id, v.placa, v.empresa, v.modelo, v.ano_modelo,
-                    v.nome_motorista, v.contato_motorista, v.media_km_diaria,
-                    v.cliente_id, c.nome_responsavel, c.contato_responsavel,
-                    uv.data_ultima_visita, uv.km_ultima_visita, suv.servicos_anteriores
-                FROM veiculos v
-                JOIN ultima_visita uv ON v.id = uv.veiculo_id
-                LEFT JOIN servicos_ultima_visita suv ON v.id = suv.veiculo_id
-                LEFT JOIN clientes c ON v.cliente_id = c.id
-                WHERE v.media_km_diaria IS NOT NULL AND v.media_km_diaria > 0
-                AND v.data_revisao_proativa IS NULL;
-            """
-            df = pd.read_sql(query, conn)
-
-        if df.empty:
-            st.info("Não há veículos com média de KM calculada para exibir.")
-            st.stop()
-
-        df['dias_desde_ultima_visita'] = (pd.Timestamp.now(tz=MS_TZ) - pd.to_datetime(df['data_ultima_visita'], utc=True).dt.tz_convert(MS_TZ)).dt.days
-        df['km_atual_estimada'] = df['km_ultima_visita'] + (df['dias_desde_ultima_visita'] * df['media_km_diaria'])
-        df['km_rodados'] = df['km_atual_estimada'] - df['km_ultima_visita']
-        
-        # --- LÓGICA DE FILTRAGEM ADAPTATIVA ---
+        # --- FILTRO, ORDEM E PÁGINA NO BANCO (CONSULTA_CANDIDATOS) ---
         if modo_busca == "Quilometragem":
+            modo, limite = 'km', intervalo_revisao_km
             st.subheader(f"Veículos Sugeridos para Contato (KM rodados > {intervalo_revisao_km})")
-            veiculos_para_contatar = df[df['km_rodados'] >= intervalo_revisao_km].copy()
-            veiculos_para_contatar.sort_values(by='km_rodados', ascending=False, inplace=True)
         else: # Modo "Tempo"
+            modo = 'tempo'
             if intervalo_tempo_unidade == "meses":
-                dias_limite = intervalo_tempo_valor * 30 
-                st.subheader(f"Veículos Sugeridos para Contato ({intervalo_tempo_valor} {intervalo_tempo_unidade} sem visita)")
+                limite = intervalo_tempo_valor * 30 
             else: # dias
-                dias_limite = intervalo_tempo_valor
-                st.subheader(f"Veículos Sugeridos para Contato ({intervalo_tempo_valor} {intervalo_tempo_unidade} sem visita)")
+                limite = intervalo_tempo_valor
+            st.subheader(f"Veículos Sugeridos para Contato ({intervalo_tempo_valor} {intervalo_tempo_unidade} sem visita)")
 
-            veiculos_para_contatar = df[df['dias_desde_ultima_visita'] >= dias_limite].copy()
-            veiculos_para_contatar.sort_values(by='dias_desde_ultima_visita', ascending=False, inplace=True)
-        
-        st.subheader(f"Encontrados: {len(veiculos_para_contatar)} veículos")
+        with st.spinner("Buscando veículos e fazendo previsões..."):
+            veiculos_pagina_atual = buscar_pagina(conn, modo, limite, st.session_state.page_number)
+            if not veiculos_pagina_atual and st.session_state.page_number > 0:
+                # Filtro mudou ou a lista encolheu: volta para a primeira página
+                st.session_state.page_number = 0
+                veiculos_pagina_atual = buscar_pagina(conn, modo, limite, 0)
+
+        total_veiculos = veiculos_pagina_atual[0]['total'] if veiculos_pagina_atual else 0
+        st.subheader(f"Encontrados: {total_veiculos} veículos")
 
-        if veiculos_para_contatar.empty:
+        if not veiculos_pagina_atual:
             st.success("🎉 Nenhum veículo atendeu aos critérios para o contato proativo no momento.")
         else:
-            page_size = 20
-            start_index = st.session_state.page_number * page_size
-            end_index = start_index + page_size
-            total_pages = (len(veiculos_para_contatar) + page_size - 1) // page_size
-            veiculos_pagina_atual = veiculos_para_contatar.iloc[start_index:end_index]
+            total_pages = (total_veiculos + TAMANHO_PAGINA - 1) // TAMANHO_PAGINA
 
-            for _, veiculo in veiculos_pagina_atual.iterrows():
+            for veiculo in veiculos_pagina_atual:
                 with st.container(border=True):
                     col1, col2 = st.columns([0.7, 0.3])
                     with col1:
@@ -310,7 +377,7 @@ def app():
                     cap_col1, cap_col2 = st.columns([0.7, 0.3])
                     with cap_col1:
                         media_km_diaria = veiculo['media_km_diaria']
-                        media_formatada = f"{media_km_diaria:.2f}" if pd.notna(media_km_diaria) else "N/A"
+                        media_formatada = f"{media_km_diaria:.2f}" if media_km_diaria is not None else "N/A"
                         st.caption(f"Última visita em {veiculo['data_ultima_visita'].strftime('%d/%m/%Y')} com {int(veiculo['km_ultima_visita']):,} km. Média de {media_formatada} km/dia.".replace(',', '.'))
                     with cap_col2:
                         st.link_button("✏️ Ajustar Média", url=f"ajustar_media_km?veiculo_id={veiculo['veiculo_id']}", use_container_width=True)
@@ -375,7 +442,7 @@ def app():
                         st.session_state.rp_editing_vehicle_id = veiculo['veiculo_id']
                         st.session_state.rp_editing_company_for_vehicle_id = None
                         st.rerun()
-                    if b_col4.button("✏️ Alt. Empresa", key=f"edit_c_{veiculo['veiculo_id']}", use_container_width=True, disabled=pd.isna(veiculo['cliente_id'])):
+                    if b_col4.button("✏️ Alt. Empresa", key=f"edit_c_{veiculo['veiculo_id']}", use_container_width=True, disabled=veiculo['cliente_id'] is None):
                         st.session_state.rp_editing_company_for_vehicle_id = veiculo['veiculo_id']
                         st.session_state.rp_editing_vehicle_id = None
                         st.rerun()
@@ -387,6 +454,8 @@ def app():
                                     (datetime.now(MS_TZ).date(), int(veiculo['veiculo_id']))
                                 )
                             conn.commit()
+                            # Saiu da lista: esta página e as seguintes desta busca
+                            cache_paginas().descartar_veiculo(int(veiculo['veiculo_id']), saiu=True)
                             st.toast(f"Veículo {veiculo['placa']} marcado como contatado.", icon="👍")
                             st.rerun()
                         except Exception as e:
@@ -4,25 +4,26 @@ import streamlit as st
 import pandas as pd
 from database import get_connection, release_connection
 from datetime import date, timedelta
+from jobs import enfileirar
 
 # --- Função auxiliar para atualizar o tipo de atendimento ---
 def update_tipo_atendimento(conn, service_id, area, novo_tipo):
     """Atualiza o tipo de atendimento de um serviço específico na tabela correta."""
-    tabela_map = {
-        'Borracharia': 'servicos_solicitados_borracharia',
-        'Alinhamento': 'servicos_solicitados_alinhamento',
-        'Manutenção Mecânica': 'servicos_solicitados_manutencao'
+    area_map = {
+        'Borracharia': 'borracharia',
+        'Alinhamento': 'alinhamento',
+        'Manutenção Mecânica': 'manutencao'
     }
-    tabela = tabela_map.get(area)
-    if not tabela:
+    area_db = area_map.get(area)
+    if not area_db:
         st.error(f"Área de serviço desconhecida: {area}")
         return False
     
     try:
         with conn.cursor() as cursor:
             cursor.execute(
-                f"UPDATE {tabela} SET tipo_atendimento = %s WHERE id = %s",
-                (novo_tipo, service_id)
+                "UPDATE servicos_solicitados SET tipo_atendimento = %s WHERE id = %s AND area = %s",
+                (novo_tipo, service_id, area_db)
             )
         conn.commit()
         return True
@@ -49,17 +50,16 @@ def reverter_visita(conn, veiculo_id, quilometragem):
 
             execucao_ids = [item[0] for item in execucao_ids_tuples]
 
-            tabelas = ["servicos_solicitados_borracharia", "servicos_solicitados_alinhamento", "servicos_solicitados_manutencao"]
-            for tabela in tabelas:
-                cursor.execute(
-                    f"UPDATE {tabela} SET status = 'pendente', box_id = NULL, funcionario_id = NULL, execucao_id = NULL WHERE execucao_id = ANY(%s)",
-                    (execucao_ids,)
-                )
+            cursor.execute(
+                "UPDATE servicos_solicitados SET status = 'pendente', box_id = NULL, funcionario_id = NULL, execucao_id = NULL WHERE execucao_id = ANY(%s)",
+                (execucao_ids,)
+            )
             
             cursor.execute(
                 "UPDATE execucao_servico SET status = 'cancelado' WHERE id = ANY(%s)",
                 (execucao_ids,)
             )
+            enfileirar(cursor, "recalcular_media", {"veiculo_id": p_veiculo_id}, chave=f"recalcular_media:{p_veiculo_id}")
 
             conn.commit()
             st.success("Visita revertida com sucesso! Os serviços estão pendentes novamente na tela de alocação.")
@@ -113,9 +113,10 @@ def app():
             FROM execucao_servico es
             JOIN veiculos v ON es.veiculo_id = v.id
             LEFT JOIN (
-                SELECT id as service_id, execucao_id, 'Borracharia' as area, tipo, quantidade, status, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_borracharia UNION ALL
-                SELECT id as service_id, execucao_id, 'Alinhamento' as area, tipo, quantidade, status, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_alinhamento UNION ALL
-                SELECT id as service_id, execucao_id, 'Manutenção Mecânica' as area, tipo, quantidade, status, funcionario_id, observacao_execucao, tipo_atendimento FROM servicos_solicitados_manutencao
+                SELECT id as service_id, execucao_id,
+                       CASE area WHEN 'borracharia' THEN 'Borracharia' WHEN 'alinhamento' THEN 'Alinhamento' ELSE 'Manutenção Mecânica' END as area,
+                       tipo, quantidade, status, funcionario_id, observacao_execucao, tipo_atendimento
+                FROM servicos_solicitados
             ) serv ON es.id = serv.execucao_id
             LEFT JOIN funcionarios f ON serv.funcionario_id = f.id
             WHERE 
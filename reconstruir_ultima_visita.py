@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+SCRIPT: reconstruir_ultima_visita.py
+====================================
+Reconstrói veiculo_ultima_visita (migração 0011) a partir do histórico
+finalizado, numa transação. No dia a dia a tabela é mantida pelos triggers de
+execucao_servico e servicos_solicitados; isto é para depois de uma carga
+feita com os triggers desligados ou para conferir se ela está em dia.
+
+Uso:
+    python reconstruir_ultima_visita.py              # reconstrói tudo
+    python reconstruir_ultima_visita.py --veiculo 42 # só um veículo
+    python reconstruir_ultima_visita.py --conferir   # só mostra as diferenças
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Linhas da tabela que diferem do histórico (faltando, sobrando ou desatualizadas)
+DIFERENCAS = """
+    WITH esperado AS (
+        SELECT DISTINCT ON (es.veiculo_id) es.veiculo_id, es.id AS execucao_id,
+               es.fim_execucao AS data_ultima_visita, es.quilometragem AS km_ultima_visita,
+               (SELECT STRING_AGG(DISTINCT s.tipo, '; ')
+                  FROM servicos_solicitados s
+                 WHERE s.execucao_id = es.id AND s.status = 'finalizado') AS servicos
+        FROM execucao_servico es
+        JOIN veiculos v ON v.id = es.veiculo_id
+        WHERE es.status = 'finalizado'
+          AND es.quilometragem IS NOT NULL
+          AND es.fim_execucao IS NOT NULL
+        ORDER BY es.veiculo_id, es.fim_execucao DESC, es.id DESC
+    )
+    SELECT COALESCE(e.veiculo_id, uv.veiculo_id), uv.execucao_id, e.execucao_id
+    FROM esperado e
+    FULL JOIN veiculo_ultima_visita uv ON uv.veiculo_id = e.veiculo_id
+    WHERE (e.execucao_id, e.data_ultima_visita, e.km_ultima_visita, e.servicos)
+          IS DISTINCT FROM
+          (uv.execucao_id, uv.data_ultima_visita, uv.km_ultima_visita, uv.servicos)
+    ORDER BY 1
+"""
+
+
+def reconstruir(conn):
+    inicio = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT reconstruir_ultima_visita()")
+        gravados = cursor.fetchone()[0]
+    conn.commit()
+    print(f"✅ veiculo_ultima_visita reconstruída: {gravados:,} veículos em {time.perf_counter() - inicio:.1f} s")
+
+
+def atualizar_veiculo(conn, veiculo_id):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT atualizar_ultima_visita(%s)", (veiculo_id,))
+        cursor.execute(
+            "SELECT execucao_id, data_ultima_visita, km_ultima_visita, servicos "
+            "FROM veiculo_ultima_visita WHERE veiculo_id = %s",
+            (veiculo_id,),
+        )
+        linha = cursor.fetchone()
+    conn.commit()
+    if linha is None:
+        print(f"✅ Veículo {veiculo_id}: sem visita finalizada com KM")
+        return
+    execucao_id, data, km, servicos = linha
+    print(f"✅ Veículo {veiculo_id}: execução {execucao_id} em {data:%d/%m/%Y}, {km:,} km - {servicos or 'sem serviços'}")
+
+
+def conferir(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(DIFERENCAS)
+        diferencas = cursor.fetchall()
+    conn.rollback()
+    if not diferencas:
+        print("✅ veiculo_ultima_visita está em dia com o histórico")
+        return
+    print(f"⚠️  {len(diferencas)} veículos diferentes do histórico:")
+    for veiculo_id, na_tabela, esperada in diferencas[:20]:
+        print(f"    - veículo {veiculo_id}: tabela {na_tabela or '-'}, histórico {esperada or '-'}")
+    if len(diferencas) > 20:
+        print(f"    ... e mais {len(diferencas) - 20}")
+    print("\n↪️  Para corrigir: python reconstruir_ultima_visita.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstrói a tabela de última visita por veículo")
+    parser.add_argument("--veiculo", type=int, metavar="ID", help="recalcula só este veículo")
+    parser.add_argument("--conferir", action="store_true", help="compara com o histórico sem gravar")
+    args = parser.parse_args()
+
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        print("❌ DB_URL não encontrada em .env")
+        sys.exit(1)
+
+    conn = psycopg2.connect(db_url)
+    try:
+        if args.conferir:
+            conferir(conn)
+        elif args.veiculo:
+            atualizar_veiculo(conn, args.veiculo)
+        else:
+            reconstruir(conn)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erro: nada foi alterado. {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
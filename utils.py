@@ -1,11 +1,14 @@
 # utils.py - CORRIGIDO
 """
-Função recalcular_media_veiculo() agora usa 3 últimas visitas
+Função recalcular_media_veiculo() agora usa 3 últimas visitas (km_media.py)
 """
 
 import streamlit as st
 import pandas as pd
 from database import get_connection, release_connection
+from catalogo import obter_catalogo
+from km_plausibilidade import obter_projecoes
+import km_media
 import locale
 import hashlib
 import requests
@@ -41,20 +44,17 @@ except locale.Error:
     if 'streamlit' in st.__name__:
         st.warning("Não foi possível configurar a localidade para pt_BR.")
 
+def get_catalogo():
+    """Catálogo de serviços do cache do processo (catalogo.py), compartilhado entre as sessões."""
+    return obter_catalogo(get_connection, release_connection)
+
 def get_catalogo_servicos():
-    conn = get_connection()
-    if not conn: 
-        return {"borracharia": [], "alinhamento": [], "manutencao": []}
-    
-    try:
-        catalogo = {
-            "borracharia": pd.read_sql("SELECT nome FROM servicos_borracharia ORDER BY nome", conn)['nome'].tolist(),
-            "alinhamento": pd.read_sql("SELECT nome FROM servicos_alinhamento ORDER BY nome", conn)['nome'].tolist(),
-            "manutencao": pd.read_sql("SELECT nome FROM servicos_manutencao ORDER BY nome", conn)['nome'].tolist()
-        }
-    finally:
-        release_connection(conn)
-    return catalogo
+    """{"borracharia": [...], "alinhamento": [...], "manutencao": [...]} ordenados por nome. Não altere as listas."""
+    return get_catalogo().por_area
+
+def get_projecoes_km():
+    """Projeções de KM por veículo do cache do processo (km_plausibilidade.py), para conferir a KM no cadastro."""
+    return obter_projecoes(get_connection, release_connection)
 
 def consultar_placa_comercial(placa: str):
     if not placa: 
@@ -107,58 +107,13 @@ def formatar_placa(placa: str) -> str:
 
 def recalcular_media_veiculo(conn, veiculo_id):
     """
-    ✅ CORRIGIDO: Agora calcula usando APENAS as 3 últimas visitas válidas
-    """
-    query = """
-    SELECT id, fim_execucao, quilometragem
-    FROM (
-        SELECT 
-            id,
-            fim_execucao,
-            quilometragem,
-            ROW_NUMBER() OVER (PARTITION BY fim_execucao, quilometragem ORDER BY id) as rn
-        FROM execucao_servico
-        WHERE veiculo_id = %s AND status = 'finalizado'
-          AND quilometragem IS NOT NULL AND quilometragem > 0
-    ) as ranked
-    WHERE rn = 1
-    ORDER BY fim_execucao ASC;
+    Reconstrói o estado de KM do veículo a partir do histórico e grava a média
+    (regra das 3 últimas visitas válidas, em km_media.py).
     """
-    
-    df_veiculo = pd.read_sql(query, conn, params=(veiculo_id,))
-    
-    # Remove duplicatas (mesma quilometragem)
-    df_veiculo = df_veiculo.drop_duplicates(subset=['quilometragem'], keep='last')
-    
-    # Remove não-crescentes (só mantém KM crescente)
-    last_valid_km = -1
-    valid_indices = []
-    for index, row in df_veiculo.iterrows():
-        if row['quilometragem'] > last_valid_km:
-            valid_indices.append(index)
-            last_valid_km = row['quilometragem']
-    
-    valid_group = df_veiculo.loc[valid_indices]
-    
-    media_km_diaria = None
-    if len(valid_group) >= 2:
-        # ✅ NOVO: Pegar APENAS as 3 últimas visitas válidas
-        ultimas_3 = valid_group.iloc[-3:] if len(valid_group) >= 3 else valid_group
-        
-        primeira_visita = ultimas_3.iloc[0]
-        ultima_visita = ultimas_3.iloc[-1]
-        
-        delta_km = int(ultima_visita['quilometragem']) - int(primeira_visita['quilometragem'])
-        delta_dias = (ultima_visita['fim_execucao'] - primeira_visita['fim_execucao']).days
-        
-        if delta_dias > 0 and delta_km >= 0:
-            media_km_diaria = float(delta_km / delta_dias)
-    
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("UPDATE veiculos SET media_km_diaria = %s WHERE id = %s", (media_km_diaria, veiculo_id))
-            conn.commit()
-            return True
+        km_media.reconstruir(conn, veiculo_id)
+        conn.commit()
+        return True
     except Exception as e:
         conn.rollback()
         print(f"Erro ao atualizar a média para o veículo {veiculo_id}: {e}")
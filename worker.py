@@ -0,0 +1,269 @@
+# worker.py
+"""
+⚙️ WORKER DA FILA DE TAREFAS
+
+Executa as tarefas enfileiradas pela API e pelo Streamlit (jobs.py, tabela
+'tarefas' da migração 0007):
+
+- reivindica uma tarefa vencida por vez com FOR UPDATE SKIP LOCKED, então
+  vários workers (processos ou máquinas) podem rodar juntos;
+- em caso de erro reagenda com espera exponencial (BACKOFF_BASE_S, 2x, 4x...
+  até BACKOFF_MAX_S) e marca 'falhou' quando as tentativas acabam;
+- devolve para a fila tarefas presas em 'executando' por um worker que morreu;
+- tarefa que voltaria para a fila quando já existe outra pendente com a mesma
+  chave (enfileirada enquanto ela rodava) fica 'substituida': a pendente faz
+  o mesmo trabalho;
+- dorme em LISTEN tarefas e acorda no COMMIT de quem enfileirou;
+- de hora em hora apaga tarefas concluídas antigas e Idempotency-Keys vencidas.
+
+Uso:
+    python worker.py              # roda até SIGINT/SIGTERM
+    python worker.py --uma-vez    # esvazia a fila e sai (cron, testes)
+
+Precisa de DB_URL (e TELEGRAM_TOKEN para os avisos) no ambiente ou no .env.
+"""
+
+import argparse
+import logging
+import os
+import random
+import select
+import signal
+import sys
+import time
+import traceback
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+from jobs import TAREFAS, TarefaAdiada
+
+load_dotenv()
+
+logger = logging.getLogger("worker")
+
+BACKOFF_BASE_S = float(os.getenv("TAREFAS_BACKOFF_BASE_S", "10"))
+BACKOFF_MAX_S = float(os.getenv("TAREFAS_BACKOFF_MAX_S", "3600"))
+# Tarefa em 'executando' há mais que isso é de um worker que caiu
+TIMEOUT_EXECUCAO_S = float(os.getenv("TAREFAS_TIMEOUT_S", "600"))
+ESPERA_MAX_S = 30
+LIMPEZA_INTERVALO_S = 3600
+RETENCAO_CONCLUIDAS_DIAS = 7
+
+REIVINDICAR = """
+    UPDATE tarefas
+       SET status = 'executando', tentativas = tentativas + 1, iniciada_em = NOW()
+     WHERE id = (
+         SELECT id FROM tarefas
+          WHERE status = 'pendente' AND executar_em <= NOW()
+          ORDER BY executar_em, id
+          LIMIT 1
+          FOR UPDATE SKIP LOCKED
+     )
+    RETURNING id, tipo, payload, tentativas, max_tentativas
+"""
+CONCLUIR = "UPDATE tarefas SET status = 'concluida', concluida_em = NOW(), erro = NULL WHERE id = %s"
+# Só uma pendente por chave (ux_tarefas_pendente_chave): se já há outra, não volta
+REAGENDAR = """
+    UPDATE tarefas t
+       SET status = 'pendente', executar_em = NOW() + make_interval(secs => %s), erro = %s
+     WHERE t.id = %s
+       AND NOT EXISTS (SELECT 1 FROM tarefas p WHERE p.chave = t.chave AND p.status = 'pendente')
+"""
+SUBSTITUIR = "UPDATE tarefas SET status = 'substituida', concluida_em = NOW(), erro = %s WHERE id = %s"
+FALHAR = "UPDATE tarefas SET status = 'falhou', concluida_em = NOW(), erro = %s WHERE id = %s"
+# Das presas com a mesma chave só a mais recente volta, e só se não houver
+# outra pendente com essa chave; as demais ficam 'substituida'
+RECUPERAR = """
+    UPDATE tarefas t
+       SET status = CASE WHEN t.tentativas >= t.max_tentativas THEN 'falhou'
+                         WHEN r.volta THEN 'pendente'
+                         ELSE 'substituida' END,
+           concluida_em = CASE WHEN t.tentativas < t.max_tentativas AND r.volta THEN NULL ELSE NOW() END,
+           executar_em = NOW(),
+           erro = 'worker interrompido durante a execução'
+      FROM (
+          SELECT e.id,
+                 e.chave IS NULL OR (
+                     ROW_NUMBER() OVER (PARTITION BY e.chave, e.tentativas >= e.max_tentativas ORDER BY e.id DESC) = 1
+                     AND NOT EXISTS (SELECT 1 FROM tarefas p WHERE p.chave = e.chave AND p.status = 'pendente')
+                 ) AS volta
+            FROM tarefas e
+           WHERE e.status = 'executando' AND e.iniciada_em < NOW() - make_interval(secs => %s)
+      ) r
+     WHERE t.id = r.id AND t.status = 'executando'
+"""
+PROXIMA = "SELECT EXTRACT(EPOCH FROM MIN(executar_em) - NOW()) FROM tarefas WHERE status = 'pendente'"
+LIMPAR = [
+    ("tarefas concluídas", "DELETE FROM tarefas WHERE status IN ('concluida', 'substituida') AND concluida_em < NOW() - make_interval(days => %s)", (RETENCAO_CONCLUIDAS_DIAS,)),
+    ("Idempotency-Keys vencidas", "DELETE FROM idempotencia_requisicoes WHERE criada_em < NOW() - INTERVAL '24 hours'", ()),
+]
+
+_parar = False
+
+
+def _pedir_parada(*_):
+    global _parar
+    _parar = True
+    logger.info("Parada pedida; termina a tarefa atual e sai")
+
+
+def espera_backoff(tentativas):
+    """10 s, 20 s, 40 s... até BACKOFF_MAX_S, com variação para não sincronizar workers."""
+    espera = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (tentativas - 1))
+    return espera * random.uniform(0.8, 1.2)
+
+
+def _executar_sql(conn, sql, params=()):
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        rowcount = cursor.rowcount
+    conn.commit()
+    return rowcount
+
+
+def reivindicar(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(REIVINDICAR)
+        tarefa = cursor.fetchone()
+    conn.commit()
+    return tarefa
+
+
+def reagendar(conn, id_tarefa, espera, erro):
+    """Devolve a tarefa para a fila. False se ela ficou 'substituida'."""
+    try:
+        if _executar_sql(conn, REAGENDAR, (espera, erro, id_tarefa)):
+            return True
+    except psycopg2.IntegrityError:
+        # Outra com a mesma chave foi enfileirada entre o NOT EXISTS e o UPDATE
+        conn.rollback()
+    _executar_sql(conn, SUBSTITUIR, (erro, id_tarefa))
+    return False
+
+
+def recuperar(conn):
+    """Devolve para a fila as tarefas de workers que morreram; um erro aqui não para o worker."""
+    try:
+        recuperadas = _executar_sql(conn, RECUPERAR, (TIMEOUT_EXECUCAO_S,))
+    except psycopg2.DatabaseError:
+        conn.rollback()
+        logger.exception("Recuperação de tarefas presas falhou; tenta de novo na próxima volta")
+        return 0
+    if recuperadas:
+        logger.warning("%s tarefas presas em 'executando' recuperadas", recuperadas)
+    return recuperadas
+
+
+def processar(conn, tarefa):
+    id_tarefa, tipo, payload, tentativas, max_tentativas = tarefa
+    funcao = TAREFAS.get(tipo)
+    inicio = time.perf_counter()
+    try:
+        if funcao is None:
+            raise RuntimeError(f"Tipo de tarefa desconhecido: {tipo}")
+        funcao(conn, payload)
+    except Exception as exc:
+        conn.rollback()
+        erro = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+        if funcao is not None and tentativas < max_tentativas:
+            espera = exc.segundos if isinstance(exc, TarefaAdiada) else espera_backoff(tentativas)
+            if reagendar(conn, id_tarefa, espera, erro):
+                logger.warning("Tarefa %s (%s) falhou na tentativa %s; nova em %.0f s: %s", id_tarefa, tipo, tentativas, espera, erro)
+            else:
+                logger.warning("Tarefa %s (%s) falhou na tentativa %s; já há outra pendente com a mesma chave: %s", id_tarefa, tipo, tentativas, erro)
+        else:
+            _executar_sql(conn, FALHAR, (erro, id_tarefa))
+            logger.error("Tarefa %s (%s) falhou em definitivo: %s", id_tarefa, tipo, erro)
+        return False
+    _executar_sql(conn, CONCLUIR, (id_tarefa,))
+    logger.info("Tarefa %s (%s) concluída em %.0f ms", id_tarefa, tipo, (time.perf_counter() - inicio) * 1000)
+    return True
+
+
+def esvaziar(conn):
+    """Executa as tarefas vencidas até não sobrar nenhuma. Retorna quantas rodaram."""
+    total = 0
+    while not _parar:
+        tarefa = reivindicar(conn)
+        if tarefa is None:
+            break
+        try:
+            processar(conn, tarefa)
+        except psycopg2.DatabaseError:
+            # Não gravou o resultado: a tarefa fica em 'executando' e volta pela recuperação
+            conn.rollback()
+            logger.exception("Tarefa %s: erro ao gravar o resultado", tarefa[0])
+        total += 1
+    return total
+
+
+def segundos_ate_proxima(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(PROXIMA)
+        segundos = cursor.fetchone()[0]
+    conn.commit()
+    if segundos is None:
+        return ESPERA_MAX_S
+    return min(ESPERA_MAX_S, max(0.0, float(segundos)))
+
+
+def limpar(conn):
+    for descricao, sql, params in LIMPAR:
+        apagadas = _executar_sql(conn, sql, params)
+        if apagadas:
+            logger.info("Limpeza: %s %s", apagadas, descricao)
+
+
+def rodar(db_url, uma_vez=False):
+    conn = psycopg2.connect(db_url)
+    escuta = None
+    try:
+        if uma_vez:
+            recuperar(conn)
+            logger.info("%s tarefas executadas", esvaziar(conn))
+            return
+
+        escuta = psycopg2.connect(db_url)
+        escuta.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with escuta.cursor() as cursor:
+            cursor.execute("LISTEN tarefas")
+
+        ultima_limpeza = 0.0
+        while not _parar:
+            if time.monotonic() - ultima_limpeza >= LIMPEZA_INTERVALO_S:
+                limpar(conn)
+                ultima_limpeza = time.monotonic()
+            recuperar(conn)
+            esvaziar(conn)
+            if _parar:
+                break
+            # Dorme até a próxima tarefa agendada vencer ou chegar um aviso novo
+            if select.select([escuta], [], [], segundos_ate_proxima(conn))[0]:
+                escuta.poll()
+                escuta.notifies.clear()
+    finally:
+        if escuta is not None:
+            escuta.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa as tarefas da fila (tabela tarefas)")
+    parser.add_argument("--uma-vez", action="store_true", help="esvazia a fila e sai")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        print("ERRO: DB_URL não encontrada em .env")
+        sys.exit(1)
+
+    signal.signal(signal.SIGTERM, _pedir_parada)
+    signal.signal(signal.SIGINT, _pedir_parada)
+    rodar(db_url, uma_vez=args.uma_vez)
+
+
+if __name__ == "__main__":
+    main()